@@ -0,0 +1,97 @@
+"""
+Activity Ingestion
+Buffers activity_log events (read, completed, favorited, ... from
+view_book(), /api/log-activity and friends) and the matching "read once"
+history rows, and writes them in batches through a log_writer.BatchWriter
+instead of one committed INSERT per event on the request thread.
+
+Repeats of the same (user, book, activity type) inside COALESCE_SECONDS are
+dropped before they reach the queue, so reloading a book page or a client
+re-sending an event doesn't add rows. history rows are written with
+INSERT OR IGNORE against the unique (user_id, book_id) index.
+"""
+
+import os
+import time
+import threading
+from datetime import datetime
+
+# activity_log.activity_type values the profile/activity pages know how to show
+ACTIVITY_TYPES = frozenset({'read', 'started', 'completed', 'summarized', 'favorited'})
+
+COALESCE_SECONDS = float(os.environ.get("ACTIVITY_COALESCE_SECONDS", "300") or "300")
+MAX_KEYS = int(os.environ.get("ACTIVITY_MAX_KEYS", "50000") or "50000")
+
+ACTIVITY_INSERT = """
+    INSERT INTO activity_log (user_id, book_id, activity_type, summary_generated, timestamp)
+    VALUES (?, ?, ?, ?, ?)
+"""
+HISTORY_INSERT = "INSERT OR IGNORE INTO history (user_id, book_id, date_read) VALUES (?, ?, ?)"
+
+
+def write_rows(conn, rows):
+    """BatchWriter writer: rows are ('activity', ...) or ('history', ...) tuples."""
+    activity = [row[1:] for row in rows if row[0] == 'activity']
+    history = [row[1:] for row in rows if row[0] == 'history']
+    if history:
+        conn.executemany(HISTORY_INSERT, history)
+    if activity:
+        conn.executemany(ACTIVITY_INSERT, activity)
+
+
+class ActivityRecorder:
+    """Coalesces activity events per (user, book, type) and queues the rest."""
+
+    def __init__(self, writer, window=COALESCE_SECONDS, max_keys=MAX_KEYS, clock=time.monotonic):
+        self.writer = writer
+        self.window = window
+        self.max_keys = max_keys
+        self.clock = clock
+        self._seen = {}
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.coalesced = 0
+
+    def _first_in_window(self, key):
+        now = self.clock()
+        with self._lock:
+            last = self._seen.get(key)
+            if last is not None and now - last < self.window:
+                self.coalesced += 1
+                return False
+            if len(self._seen) >= self.max_keys:
+                self._seen = {k: t for k, t in self._seen.items() if now - t < self.window}
+                if len(self._seen) >= self.max_keys:
+                    self._seen.clear()
+            self._seen[key] = now
+            self.accepted += 1
+            return True
+
+    def record(self, user_id, book_id, activity_type, summary_generated=0):
+        """Queue an activity_log row unless the same event was seen in the window.
+
+        Returns True when the event was queued.
+        """
+        if not self._first_in_window((user_id, book_id, activity_type)):
+            return False
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        return self.writer.submit(('activity', user_id, book_id, activity_type,
+                                   1 if summary_generated else 0, timestamp))
+
+    def record_read(self, user_id, book_id):
+        """A book page view: a 'read' activity plus the user's history row for the book."""
+        if not self.record(user_id, book_id, 'read'):
+            return False
+        self.writer.submit(('history', user_id, book_id, datetime.now().strftime("%Y-%m-%d")))
+        return True
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                'accepted': self.accepted,
+                'coalesced': self.coalesced,
+                'window_seconds': self.window,
+                'tracked_keys': len(self._seen),
+            }
+        stats['writer'] = self.writer.stats()
+        return stats
@@ -0,0 +1,271 @@
+"""
+AI Result Cache
+ImageSummaryAI results (manga page summaries, cover analyses, extracted
+text) stored in the ai_results table, keyed by
+    sha256(image bytes) + operation + model + prompt version
+so the same image is never sent to the API twice for the same question,
+whichever chapter, book or upload it arrives through. Changing the model
+(OPENAI_MODEL) or a prompt (image_summary_ai.PROMPT_VERSIONS) changes the
+key, so old answers simply stop matching and age out.
+
+Eviction: entries expire after AI_CACHE_TTL_DAYS; past AI_CACHE_MAX_ENTRIES
+entries or AI_CACHE_MAX_MB of stored text the least recently used ones are
+dropped, checked every AI_CACHE_EVICT_EVERY inserts (so the limits can be
+overshot by that many entries in between).
+
+Hits stay reads: an entry's last_used_at (its LRU position) and hit count
+are written at most once per AI_CACHE_TOUCH_SECONDS, carrying the hits
+counted in memory since, rather than on every hit.
+
+image_summaries stays the per-page index the reader reads; the summarize
+endpoint fills it from this cache.
+
+CLI:  python ai_cache.py stats [--db PATH]
+      python ai_cache.py purge [--operation OP] [--db PATH]
+"""
+
+import os
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger('novus.ai_cache')
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+TTL = float(os.environ.get("AI_CACHE_TTL_DAYS", "90") or "90") * 86400
+MAX_ENTRIES = int(os.environ.get("AI_CACHE_MAX_ENTRIES", "50000") or "50000")
+MAX_BYTES = int(float(os.environ.get("AI_CACHE_MAX_MB", "64") or "64") * 1024 * 1024)
+TOUCH_SECONDS = float(os.environ.get("AI_CACHE_TOUCH_SECONDS", "300") or "300")
+EVICT_EVERY = int(os.environ.get("AI_CACHE_EVICT_EVERY", "100") or "100")
+
+# operation -> ImageSummaryAI method
+OPERATIONS = {
+    'manga_page': 'summarize_manga_page',
+    'book_cover': 'summarize_book_cover',
+    'image_text': 'extract_text_from_image',
+}
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS ai_results (
+        key            TEXT PRIMARY KEY,
+        content_hash   TEXT NOT NULL,
+        operation      TEXT NOT NULL,
+        model          TEXT NOT NULL,
+        prompt_version INTEGER NOT NULL,
+        result         TEXT NOT NULL,
+        bytes          INTEGER NOT NULL,
+        hits           INTEGER NOT NULL DEFAULT 0,
+        created_at     REAL NOT NULL,
+        last_used_at   REAL NOT NULL,
+        expires_at     REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ai_results_last_used ON ai_results(last_used_at)",
+    "CREATE INDEX IF NOT EXISTS idx_ai_results_expires ON ai_results(expires_at)",
+    "CREATE INDEX IF NOT EXISTS idx_ai_results_hash ON ai_results(content_hash)",
+]
+
+
+def install(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+
+
+def make_key(content_hash, operation, model, prompt_version):
+    return hashlib.sha256(f"{content_hash}\0{operation}\0{model}\0{prompt_version}".encode('utf-8')).hexdigest()
+
+
+def file_hash(path):
+    """sha256 hex digest of a file's bytes (the same digest chapter_pages.content_hash holds)."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _evict(conn, now, max_entries, max_bytes):
+    """Drop expired entries, then the least recently used beyond max_entries / max_bytes."""
+    expired = conn.execute("DELETE FROM ai_results WHERE expires_at <= ?", (now,)).rowcount
+    evicted = conn.execute("""
+        DELETE FROM ai_results WHERE key IN (
+            SELECT key FROM (
+                SELECT key, ROW_NUMBER() OVER w AS n, SUM(bytes) OVER w AS total
+                FROM ai_results
+                WINDOW w AS (ORDER BY last_used_at DESC, key)
+            ) WHERE n > ? OR total > ?
+        )
+    """, (max_entries, max_bytes)).rowcount
+    return expired, evicted
+
+
+class ResultCache:
+    """Persistent (content hash, operation, model, prompt version) -> result text."""
+
+    def __init__(self, connect, ttl=TTL, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES, clock=time.time,
+                 touch_interval=TOUCH_SECONDS, evict_every=EVICT_EVERY):
+        self.connect = connect
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.touch_interval = touch_interval
+        self.evict_every = max(1, evict_every)
+        self._lock = threading.Lock()
+        self._unwritten_hits = {}   # key -> hits not yet added to ai_results.hits
+        self._puts = 0
+        self._hits = 0
+        self._misses = 0
+        self._computes = 0
+        self._failures = 0
+        self._expired = 0
+        self._evictions = 0
+
+    def _count(self, name, n=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + n)
+
+    def get(self, content_hash, operation, model, prompt_version):
+        """Cached result, or None; a hit refreshes the entry's LRU position (at most every touch_interval)."""
+        key = make_key(content_hash, operation, model, prompt_version)
+        now = self.clock()
+        conn = self.connect()
+        try:
+            row = conn.execute("SELECT result, expires_at, last_used_at FROM ai_results WHERE key = ?",
+                               (key,)).fetchone()
+            if row and row[1] > now:
+                with self._lock:
+                    self._hits += 1
+                    hits = self._unwritten_hits.pop(key, 0) + 1
+                    if now - row[2] < self.touch_interval:
+                        self._unwritten_hits[key] = hits
+                        hits = 0
+                if hits:
+                    conn.execute("UPDATE ai_results SET hits = hits + ?, last_used_at = ? WHERE key = ?",
+                                 (hits, now, key))
+                    conn.commit()
+                return row[0]
+        finally:
+            conn.close()
+        self._count('_misses')
+        return None
+
+    def put(self, content_hash, operation, model, prompt_version, result):
+        if result is None:
+            return None
+        now = self.clock()
+        conn = self.connect()
+        try:
+            conn.execute("""
+                INSERT INTO ai_results (key, content_hash, operation, model, prompt_version, result, bytes,
+                                        created_at, last_used_at, expires_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET result = excluded.result, bytes = excluded.bytes,
+                    created_at = excluded.created_at, last_used_at = excluded.last_used_at,
+                    expires_at = excluded.expires_at
+            """, (make_key(content_hash, operation, model, prompt_version), content_hash, operation, model,
+                  prompt_version, result, len(result.encode('utf-8')), now, now, now + self.ttl))
+            with self._lock:
+                self._puts += 1
+                due = self._puts % self.evict_every == 0
+            expired, evicted = _evict(conn, now, self.max_entries, self.max_bytes) if due else (0, 0)
+            conn.commit()
+        finally:
+            conn.close()
+        with self._lock:
+            self._expired += expired
+            self._evictions += evicted
+        return result
+
+    def get_or_compute(self, content_hash, operation, model, prompt_version, compute):
+        """(result, cached): the stored result, or compute() stored on success."""
+        result = self.get(content_hash, operation, model, prompt_version)
+        if result is not None:
+            return result, True
+        try:
+            result = compute()
+        except Exception:
+            self._count('_failures')
+            raise
+        self._count('_computes')
+        try:
+            self.put(content_hash, operation, model, prompt_version, result)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not store AI result: {e}")
+        return result, False
+
+    def stats(self):
+        conn = self.connect()
+        try:
+            entries, size, saved = conn.execute(
+                "SELECT COUNT(*), TOTAL(bytes), TOTAL(hits) FROM ai_results").fetchone()
+            by_operation = {op: {'entries': n, 'saved_calls': int(h)} for op, n, h in conn.execute(
+                "SELECT operation, COUNT(*), TOTAL(hits) FROM ai_results GROUP BY operation")}
+        finally:
+            conn.close()
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else None,
+                'computes': self._computes,
+                'failures': self._failures,
+                'expired': self._expired,
+                'evictions': self._evictions,
+                'entries': entries,
+                'bytes': int(size),
+                'saved_calls_total': int(saved),   # across workers and restarts, written every touch_interval
+                'by_operation': by_operation,
+                'ttl_days': round(self.ttl / 86400, 2),
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+            }
+
+
+def image_result(cache, ai, operation, image_path, content_hash=None, **kwargs):
+    """(result, cached) for ImageSummaryAI `operation` on an image, asking the API only on a miss.
+
+    content_hash is the image's sha256 when the caller already has it (chapter_pages).
+    """
+    from image_summary_ai import PROMPT_VERSIONS
+
+    method = getattr(ai, OPERATIONS[operation])
+    variant = operation + ''.join(f":{k}={v}" for k, v in sorted(kwargs.items()))
+    return cache.get_or_compute(content_hash or file_hash(image_path), variant, ai.model,
+                                PROMPT_VERSIONS[operation], lambda: method(image_path, **kwargs))
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog="python ai_cache.py", description="AI result cache tools")
+    parser.add_argument("command", choices=["stats", "purge"])
+    parser.add_argument("--db", default=os.path.join(APP_ROOT, "library.db"))
+    parser.add_argument("--operation", choices=sorted(OPERATIONS), default=None)
+    args = parser.parse_args(argv)
+
+    connect = lambda: sqlite3.connect(args.db, timeout=30)
+    if args.command == "stats":
+        print(json.dumps(ResultCache(connect).stats(), indent=2))
+        return
+    conn = connect()
+    try:
+        if args.operation:
+            n = conn.execute("DELETE FROM ai_results WHERE operation = ? OR operation LIKE ?",
+                             (args.operation, args.operation + ':%')).rowcount
+        else:
+            n = conn.execute("DELETE FROM ai_results").rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"removed {n} cached results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+AI Client
+One HTTP client for every OpenAI call in the app (ImageSummaryAI and the
+/ai_summary text fallback), shared by all threads of a worker process:
+
+  - a pooled requests.Session, so calls reuse keep-alive TCP+TLS connections
+    instead of opening a new one per request (AI_POOL_SIZE),
+  - at most AI_MAX_CONCURRENCY calls in flight; callers wait up to
+    AI_QUEUE_TIMEOUT seconds for a slot,
+  - retries with exponential backoff and full jitter on 429 / 5xx and
+    connection errors (AI_MAX_RETRIES), honouring Retry-After,
+  - stream_chat() relays a streamed completion token by token (SSE from
+    the provider), under the same slots, retries and breaker,
+  - a circuit breaker: error_count counts consecutive failed calls and
+    last_error keeps the latest one; after AI_BREAKER_THRESHOLD failures the
+    circuit opens and calls fail fast with AIUnavailable for
+    AI_BREAKER_RESET seconds, then a single trial call decides whether it
+    closes again.
+
+OPENAI_BASE_URL points the client at another OpenAI-compatible endpoint
+(e.g. a local stub server in tests).
+"""
+
+import os
+import json
+import time
+import random
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+    REQUESTS_AVAILABLE = True
+except ImportError:
+    requests = HTTPAdapter = None
+    REQUESTS_AVAILABLE = False
+
+logger = logging.getLogger('novus.ai_client')
+
+BASE_URL = os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1").rstrip('/')
+POOL_SIZE = int(os.environ.get("AI_POOL_SIZE", "8") or "8")
+MAX_CONCURRENCY = int(os.environ.get("AI_MAX_CONCURRENCY", "4") or "4")
+QUEUE_TIMEOUT = float(os.environ.get("AI_QUEUE_TIMEOUT", "30") or "30")
+MAX_RETRIES = int(os.environ.get("AI_MAX_RETRIES", "3") or "3")
+BACKOFF_BASE = float(os.environ.get("AI_BACKOFF_BASE", "0.5") or "0.5")
+BACKOFF_MAX = float(os.environ.get("AI_BACKOFF_MAX", "20") or "20")
+BREAKER_THRESHOLD = int(os.environ.get("AI_BREAKER_THRESHOLD", "5") or "5")
+BREAKER_RESET = float(os.environ.get("AI_BREAKER_RESET", "60") or "60")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+AUTH_STATUSES = {401, 403}
+
+
+class AIUnavailable(Exception):
+    """The provider is considered down (circuit open) or every slot stayed busy."""
+
+
+class AIClient:
+    """Pooled, bounded, retrying OpenAI client with a circuit breaker."""
+
+    def __init__(self, base_url=BASE_URL, api_key=None, pool_size=POOL_SIZE, max_concurrency=MAX_CONCURRENCY,
+                 queue_timeout=QUEUE_TIMEOUT, max_retries=MAX_RETRIES, backoff_base=BACKOFF_BASE,
+                 backoff_max=BACKOFF_MAX, breaker_threshold=BREAKER_THRESHOLD, breaker_reset=BREAKER_RESET,
+                 clock=time.monotonic, sleep=time.sleep):
+        if not REQUESTS_AVAILABLE:
+            raise RuntimeError("the requests package is required for AI calls")
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.queue_timeout = queue_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.clock = clock
+        self.sleep = sleep
+        self.max_concurrency = max_concurrency
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        # breaker state
+        self.error_count = 0
+        self.last_error = None
+        self._opened_at = None
+        self._trial = False
+        # counters
+        self._calls = 0
+        self._attempts = 0
+        self._retries = 0
+        self._failures = 0
+        self._rejected = 0
+        self._in_flight = 0
+
+    # ---- circuit breaker ----
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def _state(self):
+        if self._opened_at is None:
+            return 'closed'
+        if self.clock() - self._opened_at >= self.breaker_reset:
+            return 'half_open'
+        return 'open'
+
+    def _admit(self):
+        """Raise AIUnavailable while the circuit is open; let one trial call through once it's half open.
+
+        Returns True for the trial call.
+        """
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return False
+            if state == 'half_open' and not self._trial:
+                self._trial = True
+                return True
+            self._rejected += 1
+            raise AIUnavailable(f"AI provider unavailable (circuit open): {self.last_error}")
+
+    def _succeeded(self):
+        with self._lock:
+            self.error_count = 0
+            self._opened_at = None
+            self._trial = False
+
+    def _failed(self, error):
+        with self._lock:
+            self.error_count += 1
+            self.last_error = str(error)
+            self._failures += 1
+            if self._trial or (self._opened_at is None and self.error_count >= self.breaker_threshold):
+                logger.warning(f"AI circuit opened after {self.error_count} failures: {error}")
+                self._opened_at = self.clock()
+            self._trial = False
+
+    # ---- requests ----
+    def _backoff(self, attempt, response=None):
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    @contextmanager
+    def _slot(self):
+        """Admission (breaker) plus one of max_concurrency slots, held for the with block."""
+        trial = self._admit()
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._rejected += 1
+                self._trial = False
+            raise AIUnavailable("too many AI requests in flight")
+        with self._lock:
+            self._calls += 1
+            self._in_flight += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._in_flight -= 1
+                if trial:
+                    # a trial that ended without _succeeded/_failed must not keep the circuit shut
+                    self._trial = False
+            self._slots.release()
+
+    def _send(self, path, payload, timeout, api_key, stream=False):
+        """The provider's successful response, retrying 429 / 5xx and connection errors; raises otherwise."""
+        headers = {'Authorization': f'Bearer {api_key or self.api_key}', 'Content-Type': 'application/json'}
+        attempt = 0
+        while True:
+            response = None
+            with self._lock:
+                self._attempts += 1
+            try:
+                response = self.session.post(self.base_url + path, json=payload, headers=headers, timeout=timeout,
+                                             stream=stream)
+                if response.status_code not in RETRY_STATUSES:
+                    response.raise_for_status()
+                    return response
+                error = requests.HTTPError(f"{response.status_code} from AI provider", response=response)
+                response.close()
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = e
+            except requests.HTTPError as e:
+                # other 4xx: retrying won't help. The provider is up, unless it rejects our key.
+                if e.response is not None and e.response.status_code in AUTH_STATUSES:
+                    self._failed(e)
+                else:
+                    self._succeeded()
+                raise
+            except requests.RequestException as e:
+                # anything else from the transport (e.g. ChunkedEncodingError): a failed call, not retried
+                self._failed(e)
+                raise
+            if attempt >= self.max_retries:
+                self._failed(error)
+                raise error
+            delay = self._backoff(attempt, response)
+            attempt += 1
+            with self._lock:
+                self._retries += 1
+            logger.info(f"AI request failed ({error}), retry {attempt}/{self.max_retries} in {delay:.2f}s")
+            self.sleep(delay)
+
+    def post(self, path, payload, timeout=30, api_key=None):
+        """POST JSON to base_url + path and return the decoded response; raises on failure."""
+        with self._slot():
+            response = self._send(path, payload, timeout, api_key)
+            try:
+                result = response.json()
+            except ValueError as e:
+                # 200 with a body that isn't JSON
+                self._failed(e)
+                raise
+            self._succeeded()
+            return result
+
+    def chat(self, payload, timeout=30, api_key=None):
+        """POST /chat/completions; returns the first choice's text, or None when there is none."""
+        result = self.post('/chat/completions', payload, timeout=timeout, api_key=api_key)
+        if 'choices' in result and result['choices']:
+            return result['choices'][0]['message']['content'].strip()
+        return None
+
+    def stream_chat(self, payload, timeout=30, api_key=None):
+        """POST /chat/completions with stream=True and yield the text deltas as they arrive.
+
+        Only the request itself is retried; a stream that breaks part way raises
+        (and counts against the breaker), since its tokens were already yielded.
+        The slot stays taken until the stream ends or the generator is closed.
+        """
+        with self._slot():
+            response = self._send('/chat/completions', dict(payload, stream=True), timeout, api_key, stream=True)
+            try:
+                for line in response.iter_lines(decode_unicode=True):
+                    if not line or not line.startswith('data:'):
+                        continue
+                    data = line[5:].strip()
+                    if data == '[DONE]':
+                        break
+                    choices = json.loads(data).get('choices') or []
+                    delta = choices[0].get('delta', {}).get('content') if choices else None
+                    if delta:
+                        yield delta
+            except (requests.RequestException, ValueError) as e:
+                self._failed(e)
+                raise
+            except GeneratorExit:
+                # the reader went away; the provider was answering fine
+                self._succeeded()
+                raise
+            finally:
+                response.close()
+            self._succeeded()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'base_url': self.base_url,
+                'state': self._state(),
+                'error_count': self.error_count,
+                'last_error': self.last_error,
+                'calls': self._calls,
+                'attempts': self._attempts,
+                'retries': self._retries,
+                'failures': self._failures,
+                'rejected': self._rejected,
+                'in_flight': self._in_flight,
+                'max_concurrency': self.max_concurrency,
+            }
+
+    def close(self):
+        self.session.close()
+
+
+_shared = None
+_shared_pid = None
+_shared_lock = threading.Lock()
+
+
+def get_client():
+    """The process-wide AIClient (recreated after a fork so workers don't share sockets)."""
+    global _shared, _shared_pid
+    with _shared_lock:
+        if _shared is None or _shared_pid != os.getpid():
+            _shared = AIClient(api_key=os.environ.get('OPENAI_API_KEY'))
+            _shared_pid = os.getpid()
+        return _shared
@@ -1,12 +1,13 @@
 from flask import (
     Flask, render_template, request, redirect,
-    session, url_for, flash, jsonify, make_response
+    session, url_for, flash, jsonify, make_response, send_from_directory,
+    Response, stream_with_context
 )
 import sqlite3
 from datetime import datetime
 from datetime import timedelta
-from collections import Counter
 import os
+import atexit
 import logging
 from logging.handlers import RotatingFileHandler
 from werkzeug.utils import secure_filename
@@ -16,6 +17,29 @@ os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 
 # Import AI error handling
 import ai_error_fixes
+import db_pool
+import db_storage
+import migrations
+import catalog_search
+import pagination
+import chapter_pages
+import jobs
+import pdf_pages
+import image_variants
+import user_cache
+import log_writer
+import activity
+import retention
+import reader_stats
+import popularity
+import recommender
+import fragment_cache
+import http_cache
+import ai_cache
+import ai_client
+import text_summary
+import page_ai
+import reading_progress
 
 def allowed_file(filename: str) -> bool:
     return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTS
@@ -73,6 +97,62 @@ ALLOWED_IMG   = {"jpg", "jpeg", "png"}
 app = Flask(__name__)
 app.secret_key = os.environ.get("SECRET_KEY", "novus_secret_key")
 
+# SQLite storage settings (WAL, PRAGMAs, busy-timeout/retry policy)
+STORAGE_CONFIG = db_storage.StorageConfig()
+
+# Pooled SQLite connections (one per request, reused across requests per thread)
+DB_POOL = db_pool.ConnectionPool(
+    DB_PATH,
+    max_idle=int(os.environ.get("DB_POOL_MAX_IDLE", "2") or "2"),
+    timeout=STORAGE_CONFIG.busy_timeout_ms / 1000.0,
+    pragmas=STORAGE_CONFIG.connection_pragmas(),
+    retry=db_storage.retry_on_locked(STORAGE_CONFIG.retry_attempts, STORAGE_CONFIG.retry_base_delay_ms),
+)
+db_pool.init_app(app, DB_POOL)
+CHECKPOINTER = db_storage.CheckpointScheduler(DB_PATH, STORAGE_CONFIG, DB_POOL.connect)
+
+# Background jobs run in this process unless a separate `python jobs.py worker` is used
+jobs.load_handlers()
+JOB_WORKER = jobs.Worker(DB_POOL.connect, exclude=['chapter_ai'])
+# page AI pre-generation is slow and rate limited, so it gets its own queue consumer
+PAGE_AI_WORKER = jobs.Worker(DB_POOL.connect, kinds=['chapter_ai'])
+JOBS_EMBEDDED_WORKER = os.environ.get("JOBS_EMBEDDED_WORKER", "1") != "0"
+# queues a 'retention' job (log expiry/rollup/archival) every RETENTION_INTERVAL seconds
+RETENTION_SCHEDULER = retention.RetentionScheduler(DB_POOL.connect)
+# in-memory top wishlisted / trending lists, re-read every POPULARITY_REFRESH_SECONDS
+POPULARITY = popularity.PopularityBoard(DB_POOL.connect)
+# queues a 'popularity' job (trending score fold) every POPULARITY_FOLD_SECONDS
+POPULARITY_SCHEDULER = popularity.PopularityScheduler(DB_POOL.connect)
+# queues a 'recommendations' job every RECOMMENDER_INTERVAL seconds while books are marked dirty
+RECOMMENDER_SCHEDULER = recommender.RecommendationScheduler(DB_POOL.connect)
+
+# system_logs rows are written in batches by a background thread (see log_writer.py)
+SYSTEM_LOG_WRITER = log_writer.BatchWriter(
+    DB_POOL.connect,
+    """INSERT INTO system_logs (level, category, message, user_id, ip_address, user_agent, details, timestamp)
+       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+    name='system-log-writer',
+    retry=db_storage.retry_on_locked(STORAGE_CONFIG.retry_attempts, STORAGE_CONFIG.retry_base_delay_ms),
+)
+atexit.register(SYSTEM_LOG_WRITER.close)
+
+# activity_log / history events: coalesced per (user, book, type), then batched (see activity.py)
+ACTIVITY_WRITER = log_writer.BatchWriter(
+    DB_POOL.connect,
+    writer=activity.write_rows,
+    name='activity-writer',
+    retry=db_storage.retry_on_locked(STORAGE_CONFIG.retry_attempts, STORAGE_CONFIG.retry_base_delay_ms),
+)
+ACTIVITY = activity.ActivityRecorder(ACTIVITY_WRITER)
+atexit.register(ACTIVITY_WRITER.close)
+
+# manga reader page turns: latest page per (user, chapter), upserted in batches (see reading_progress.py)
+READING_PROGRESS = reading_progress.ProgressBuffer(
+    DB_POOL.connect,
+    retry=db_storage.retry_on_locked(STORAGE_CONFIG.retry_attempts, STORAGE_CONFIG.retry_base_delay_ms),
+)
+atexit.register(READING_PROGRESS.close)
+
 # OAuth Configuration
 if AUTHLIB_AVAILABLE:
     oauth = OAuth(app)
@@ -168,6 +248,7 @@ def esewa_payment_success():
     c.execute("UPDATE users SET plan=?, plan_expires_at=? WHERE id=?", (pending_plan, expires_at, uid))
     conn.commit()
     conn.close()
+    USER_STATE.invalidate(uid)
 
     # Update session
     session["plan"] = pending_plan
@@ -211,6 +292,7 @@ def billing_checkout():
     c.execute("UPDATE users SET plan=?, plan_expires_at=? WHERE id=?", (plan, expires_at, uid))
     conn.commit()
     conn.close()
+    USER_STATE.invalidate(uid)
 
     # For basic plan, apply immediately without payment
     if plan == "basic":
@@ -255,22 +337,89 @@ def billing_checkout():
     return redirect(f"{esewa_url}?{query_string}")
 # -------------------- HELPERS --------------------
 def get_conn():
-    """Return a connection to the SQLite DB."""
-    return sqlite3.connect(DB_PATH)
+    """Return a connection to the SQLite DB.
+
+    Inside a request this is the request's pooled connection (close() is
+    cheap and the connection goes back to the pool on teardown); outside a
+    request it is a new connection the caller must close.
+    """
+    return db_pool.get_connection(DB_POOL)
+
+STORAGE_SELF_CHECK = None
+
+def configure_storage():
+    """Put library.db in the configured journal mode, verify the active
+    PRAGMAs and start the WAL checkpoint scheduler. Safe to call repeatedly."""
+    global STORAGE_SELF_CHECK
+    db_storage.apply_journal_mode(DB_PATH, STORAGE_CONFIG)
+    conn = DB_POOL.connect()
+    try:
+        STORAGE_SELF_CHECK = db_storage.self_check(conn, STORAGE_CONFIG)
+    finally:
+        conn.close()
+    summary = ", ".join(f"{k}={v['actual']}" for k, v in STORAGE_SELF_CHECK['settings'].items())
+    if STORAGE_SELF_CHECK['ok']:
+        logger.info(f"Storage self-check OK: {summary}")
+    else:
+        bad = [k for k, v in STORAGE_SELF_CHECK['settings'].items() if not v['ok']]
+        logger.warning(f"Storage self-check mismatch ({', '.join(bad)}): {summary}")
+    CHECKPOINTER.start()
+    return STORAGE_SELF_CHECK
+
+def _load_user_state(user_id):
+    """The users columns the before_request hooks need, for USER_STATE."""
+    conn = get_conn()
+    try:
+        row = conn.execute("""
+            SELECT COALESCE(is_banned,0), COALESCE(status,'active'), COALESCE(plan,'basic'), plan_expires_at
+            FROM users WHERE id=?
+        """, (user_id,)).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    return {'is_banned': int(row[0]), 'status': row[1], 'plan': row[2], 'plan_expires_at': row[3]}
+
+
+# Ban status and plan per user id; call USER_STATE.invalidate(user_id) after changing them
+USER_STATE = user_cache.UserStateCache(_load_user_state, stamp_path=f"{DB_PATH}.user-state")
+
+# rendered catalog/about/faq content shared by all users; write routes invalidate by tag
+FRAGMENTS = fragment_cache.FragmentCache(os.environ.get("FRAGMENT_CACHE_DIR") or f"{DB_PATH}.fragments")
+
+# ImageSummaryAI results by image content hash + operation + model + prompt version
+AI_RESULTS = ai_cache.ResultCache(DB_POOL.connect)
+
+
+def _render_blocks(template_name, **context):
+    """The template's own blocks (title, content) rendered to strings, for FRAGMENTS."""
+    template = app.jinja_env.get_template(template_name)
+    app.update_template_context(context)
+    ctx = template.new_context(context)
+    return {name: "".join(block(ctx)) for name, block in template.blocks.items()}
+
+
+def _page_fragment(key, tags, template_name, build):
+    """Cached {'blocks': {...}, **extra} for a page; build() -> (context, extra) runs on a miss."""
+    def render():
+        context, extra = build()
+        return dict(extra, blocks=_render_blocks(template_name, **context))
+    return FRAGMENTS.get_or_set(key, tags, render)
+
+
+def _invalidate_pages(book_id=None):
+    """Drop cached catalog pages (and one book's detail data) after a catalog edit."""
+    FRAGMENTS.invalidate('catalog', *([f'book:{book_id}'] if book_id else []))
+
 
 @app.before_request
 def check_banned():
     uid = session.get("user_id")
     if not uid:
         return
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT COALESCE(is_banned,0), COALESCE(status,'active') FROM users WHERE id=?", (uid,))
-    row = c.fetchone()
-    conn.close()
-    if row:
-        is_banned, status = row
-        if int(is_banned) == 1 or status == "banned":
+    state = USER_STATE.get(uid)
+    if state:
+        if state['is_banned'] == 1 or state['status'] == "banned":
             session.clear()
             flash("Your account has been banned.", "danger")
             return redirect(url_for("login"))
@@ -285,6 +434,77 @@ def inject_user_avatar():
     }
 
 
+@app.template_global()
+def media_url(path, content_hash=None):
+    """Content-addressed /media URL of a page, cover or derivative; plain /static for anything else."""
+    digest = http_cache.media_digest(path, content_hash) if http_cache.is_media(path) else None
+    if not digest:
+        return url_for("static", filename=path)
+    return url_for("media", digest=digest, filename=path)
+
+
+@app.template_filter("srcset")
+def srcset_filter(variants):
+    """image_variants list -> srcset attribute value."""
+    return ", ".join(f"{media_url(v['path'])} {v['width']}w" for v in variants or [])
+
+
+@app.template_global()
+def image_src(path, variants=None, variant="medium"):
+    """URL of the named derivative of a static image, or of the original when there is none."""
+    chosen = image_variants.pick(variants or [], variant)
+    return media_url(chosen['path'] if chosen else path)
+
+
+@app.route("/media/<digest>/<path:filename>")
+def media(digest, filename):
+    """Static media under an immutable, content-hashed URL (see http_cache.py).
+
+    A digest that no longer matches the file (it was replaced) redirects to the
+    current URL instead of serving new bytes under an old, forever-cached name.
+    """
+    if not http_cache.is_media(filename):
+        return "Not found", 404
+    current = http_cache.file_digest(filename)
+    if current is None:
+        return "Not found", 404
+    if current != digest:
+        response = redirect(url_for("media", digest=current, filename=filename))
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    response = send_from_directory(http_cache.STATIC_ROOT, filename, max_age=http_cache.MEDIA_MAX_AGE)
+    response.headers['Cache-Control'] = http_cache.MEDIA_CACHE_CONTROL
+    return response
+
+
+def _not_modified(conn, entity, entity_id):
+    """(validators, 304 response or None) for a versioned API resource."""
+    etag, last_modified = http_cache.validators(conn, entity, entity_id)
+    if http_cache.is_fresh(request.environ, etag, last_modified):
+        return (etag, last_modified), http_cache.apply(make_response("", 304), etag, last_modified)
+    return (etag, last_modified), None
+
+
+def _versioned_json(payload, validators):
+    return http_cache.apply(jsonify(payload), *validators)
+
+
+def _queue_image_variants(conn, paths):
+    """Queue resized WebP derivatives of newly uploaded images (see image_variants.py)."""
+    try:
+        image_variants.queue(conn, paths, user_id=session.get("user_id"))
+    except Exception as e:
+        logger.warning(f"Could not queue image derivatives: {e}")
+
+
+def _queue_page_ai(conn, chapter_id):
+    """Queue summaries and text extraction for a chapter's new pages (see page_ai.py)."""
+    try:
+        page_ai.queue(conn, chapter_id, user_id=session.get("user_id"))
+    except Exception as e:
+        logger.warning(f"Could not queue page AI for chapter {chapter_id}: {e}")
+
+
 def allowed(filename, allowed_set):
     return "." in filename and filename.rsplit(".", 1)[1].lower() in allowed_set
 
@@ -330,11 +550,7 @@ def log_system_event(level, category, message, user_id=None, details=None):
         elif level.upper() == 'CRITICAL':
             system_logger.critical(log_message)
 
-        # Log to database
-        conn = get_conn()
-        c = conn.cursor()
-
-        # Get request info if available
+        # Log to database (queued; written in batches off the request thread)
         ip_address = None
         user_agent = None
         try:
@@ -349,13 +565,10 @@ def log_system_event(level, category, message, user_id=None, details=None):
             import json
             details_json = json.dumps(details)[:1000]  # Limit size
 
-        c.execute("""
-            INSERT INTO system_logs (level, category, message, user_id, ip_address, user_agent, details)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (level.upper(), category, message, user_id, ip_address, user_agent, details_json))
-
-        conn.commit()
-        conn.close()
+        # stamp the event now, not when its batch is written
+        timestamp = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        SYSTEM_LOG_WRITER.submit((level.upper(), category, message, user_id, ip_address, user_agent,
+                                  details_json, timestamp))
 
     except Exception as e:
         # Don't let logging errors break the app
@@ -365,427 +578,210 @@ def log_system_event(level, category, message, user_id=None, details=None):
 
 # -------------------- DB INIT --------------------
 def init_db():
-    conn = get_conn()
-    c = conn.cursor()
+    """Bring library.db up to the latest schema version.
 
-    # users
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id       INTEGER PRIMARY KEY,
-            username TEXT UNIQUE,
-            email    TEXT UNIQUE,
-            password TEXT,
-            role     TEXT
-        )
-    """)
+    The schema lives in versioned scripts under migrations/; this is a cheap
+    version check when nothing is pending. CLI: python -m migrations status
+    """
+    applied = migrations.ensure_current(DB_PATH, DB_POOL.connect)
+    if applied:
+        logger.info(f"Schema migrated to version {applied[-1]}")
+    return applied
 
-    # books (with uploader_id and book_type)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS books (
-            id             INTEGER PRIMARY KEY,
-            title          TEXT,
-            author         TEXT,
-            category       TEXT,
-            pdf_filename   TEXT,
-            audio_filename TEXT,
-            created_at     TEXT,
-            cover_path     TEXT,
-            uploader_id    INTEGER,
-            book_type      TEXT DEFAULT 'book'
-        )
-    """)
 
-    # Run quick user-table migrations for older DBs: ensure email, is_banned, status columns exist
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN email TEXT")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN is_banned INTEGER DEFAULT 0")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN status TEXT")
-        conn.commit()
-    
-    except sqlite3.OperationalError:
-        pass
 
-    # Add book_type column if it doesn't exist (migration for existing DBs)
-    try:
-        c.execute("ALTER TABLE books ADD COLUMN book_type TEXT DEFAULT 'book'")
-        conn.commit()
-    except sqlite3.OperationalError:
-        # Column already exists, that's fine
-        pass
+# -------------------- ROUTES --------------------
+SEARCH_RESULTS_LIMIT = 200
 
-    # Add description column if it doesn't exist (migration for existing DBs)
-    try:
-        c.execute("ALTER TABLE books ADD COLUMN description TEXT")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
 
-    # Add email column if it doesn't exist
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN email TEXT")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
+def _search_hit_row(hit):
+    """catalog_search result -> the (id, title, author, category, pdf, audio, cover) row the templates use."""
+    return (hit['id'], hit['title'], hit['author'], hit['category'],
+            hit['pdf_filename'], hit['audio_filename'], hit['cover_path'])
 
-    # Add google_id and facebook_id columns
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN google_id TEXT")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN facebook_id TEXT")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
 
-    # Attempt to create Unique Index on email
-    try:
-        c.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email)")
-        conn.commit()
-    except sqlite3.IntegrityError:
-        print("Warning: Could not create unique index on email due to existing duplicates via init_db.")
-    except Exception as e:
-        print(f"Warning: Issue creating index on email: {e}")
+# Catalog rows as the cards expect them (id, title, author, category, pdf, audio, cover),
+# plus created_at as the keyset pagination key.
+CATALOG_PAGE_SELECT = """
+    SELECT id, title, author, COALESCE(category,'General') AS category,
+           pdf_filename, audio_filename, cover_path, created_at
+    FROM books
+"""
 
-    # Add avatar_url column if it doesn't exist
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN avatar_url TEXT")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
-    # Plan storage
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN plan TEXT")
-        conn.commit()
-    except Exception:
-      pass
 
-    try:
-        c.execute("ALTER TABLE users ADD COLUMN plan_expires_at TEXT")
-        conn.commit()
-    except Exception:
-        pass
+def _catalog_where(book_type, category=None, query=None):
+    """(where, params) selecting books (book_type='book') or manga, optionally filtered."""
+    if book_type == 'manga':
+        where = ["COALESCE(book_type, 'book') = 'manga'"]
+    else:
+        where = ["COALESCE(book_type, 'book') != 'manga'"]
+    params = []
+    if category:
+        where.append("COALESCE(category,'General') = ?")
+        params.append(category)
+    if query:
+        # LIKE fallback for SQLite builds without FTS5
+        where.append("(title LIKE ? OR author LIKE ?)")
+        params.extend([f"%{query}%", f"%{query}%"])
+    return where, params
 
-    # Ensure existing users have a default plan
-    try:
-        c.execute("UPDATE users SET plan='basic' WHERE plan IS NULL")
-        conn.commit()
-    except Exception:
-        pass
 
-    # AI summaries cache table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS ai_summaries (
-            id INTEGER PRIMARY KEY,
-            item_type TEXT,
-            item_id INTEGER,
-            summary TEXT,
-            model TEXT,
-            created_at TEXT,
-            UNIQUE(item_type, item_id)
-        )
-    """)
-    
-    # image summaries cache table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS image_summaries (
-            id INTEGER PRIMARY KEY,
-            chapter_id INTEGER,
-            page_num INTEGER,
-            summary TEXT,
-            created_at TEXT DEFAULT (DATETIME('now')),
-            UNIQUE(chapter_id, page_num)
-        )
-    """)
+def _catalog_page(conn, book_type, category, query, cursor, limit):
+    """One newest-first page of books (book_type='book') or manga, optionally filtered."""
+    where, params = _catalog_where(book_type, category, query)
+    return pagination.keyset_page(conn, CATALOG_PAGE_SELECT, where, params,
+                                  ('created_at', 'id'), lambda row: (row[7], row[0]),
+                                  limit, cursor)
 
-    # created_at trigger
-    c.execute("""
-        CREATE TRIGGER IF NOT EXISTS books_created_at_default
-        AFTER INSERT ON books
-        WHEN NEW.created_at IS NULL
-        BEGIN
-            UPDATE books
-            SET created_at = DATETIME('now')
-            WHERE id = NEW.id;
-        END;
-    """)
 
-    # reading history
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS history (
-            id        INTEGER PRIMARY KEY,
-            user_id   INTEGER,
-            book_id   INTEGER,
-            date_read DATE
-        )
-    """)
+def _favorite_ids(conn, user_id, book_ids):
+    """Which of book_ids the user has favorited."""
+    if not book_ids:
+        return set()
+    marks = ",".join("?" * len(book_ids))
+    rows = conn.execute(f"SELECT book_id FROM favorites WHERE user_id = ? AND book_id IN ({marks})",
+                        [user_id] + list(book_ids)).fetchall()
+    return {row[0] for row in rows}
 
-    # watchlist
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS watchlist (
-            id         INTEGER PRIMARY KEY,
-            user_id    INTEGER NOT NULL,
-            book_id    INTEGER NOT NULL,
-            status     TEXT DEFAULT 'planned',
-            progress   INTEGER DEFAULT 0,
-            created_at TEXT DEFAULT (DATETIME('now')),
-            UNIQUE(user_id, book_id)
-        )
-    """)
 
-    # favorites
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS favorites (
-            id         INTEGER PRIMARY KEY,
-            user_id    INTEGER NOT NULL,
-            book_id    INTEGER NOT NULL,
-            created_at TEXT DEFAULT (DATETIME('now')),
-            UNIQUE(user_id, book_id)
-        )
-    """)
+def _page_json(items, html, next_cursor):
+    """Response shape shared by the "load more" endpoints."""
+    return jsonify({"items": items, "html": html, "next_cursor": next_cursor,
+                    "has_more": next_cursor is not None})
 
-    # reports (user reports on manga/books)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS reports (
-            id INTEGER PRIMARY KEY,
-            user_id INTEGER,
-            manga_id INTEGER,
-            reason TEXT,
-            created_at TEXT DEFAULT (DATETIME('now'))
-        )
-    """)
 
-    # user_reports (user reports on other users)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS user_reports (
-            id INTEGER PRIMARY KEY,
-            reporter_id INTEGER NOT NULL,
-            reported_user_id INTEGER NOT NULL,
-            reason TEXT,
-            created_at TEXT DEFAULT (DATETIME('now')),
-            FOREIGN KEY (reporter_id) REFERENCES users(id),
-            FOREIGN KEY (reported_user_id) REFERENCES users(id)
-        )
-    """)
+# ---------- Home / Dashboard ----------
+@app.route("/")
+def home():
+    if "user_id" not in session:
+        return redirect(url_for("login"))
 
-    # reviews (book/manga reviews)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS reviews (
-            id INTEGER PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            book_id INTEGER NOT NULL,
-            rating INTEGER,
-            content TEXT,
-            created_at TEXT DEFAULT (DATETIME('now')),
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (book_id) REFERENCES books(id)
-        )
-    """)
+    selected = (request.args.get("category") or "").strip()
+    query = (request.args.get("q") or "").strip()
+    role = session.get("role")
 
-    # chapter_reviews (chapter reviews)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS chapter_reviews (
-            id INTEGER PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            chapter_id INTEGER NOT NULL,
-            rating INTEGER,
-            content TEXT,
-            created_at TEXT DEFAULT (DATETIME('now')),
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (chapter_id) REFERENCES chapters(id),
-            UNIQUE(user_id, chapter_id)
-        )
-    """)
+    def build():
+        conn = get_conn()
+        c = conn.cursor()
 
-    # activity log (track user reading activities)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS activity_log (
-            id INTEGER PRIMARY KEY,
-            user_id INTEGER NOT NULL,
-            book_id INTEGER NOT NULL,
-            activity_type TEXT NOT NULL,
-            summary_generated INTEGER DEFAULT 0,
-            timestamp TEXT DEFAULT (DATETIME('now')),
-            FOREIGN KEY (user_id) REFERENCES users(id),
-            FOREIGN KEY (book_id) REFERENCES books(id)
-        )
-    """)
+        # Categories
+        c.execute("SELECT DISTINCT COALESCE(category,'General') FROM books ORDER BY 1")
+        db_categories = [row[0] for row in c.fetchall()]
+
+        extra_categories = [
+            "Action", "Adventure", "Children", "Comedy", "Drama", "Fantasy",
+            "General", "Historical", "Horror", "Mystery", "Poetry",
+            "Romance", "Science Fiction", "Supernatural", "Thriller", "Young Adult",
+        ]
+        categories = sorted(set(db_categories + extra_categories + ["General"]))
+
+        # ranked full-text search when possible, newest-first keyset pages otherwise
+        hits = catalog_search.search(conn, query, book_type='book', category=selected,
+                                     limit=SEARCH_RESULTS_LIMIT) if query else None
+        snippets = {}
+        next_cursor = None
+        if hits is not None:
+            books_raw = [_search_hit_row(h) for h in hits]
+            snippets = {h['id']: h['snippet'] for h in hits if h['snippet']}
+        else:
+            try:
+                page = _catalog_page(conn, 'book', selected, query, request.args.get("cursor"),
+                                     pagination.page_size(request.args.get("limit")))
+            except pagination.InvalidCursor:
+                page = _catalog_page(conn, 'book', selected, query, None, pagination.DEFAULT_PAGE_SIZE)
+            books_raw = [row[:7] for row in page.rows]
+            next_cursor = page.next_cursor
+        images = image_variants.lookup(conn, [book[6] for book in books_raw])
+        conn.close()
 
-    # system logs (track system events, admin actions, errors)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS system_logs (
-            id INTEGER PRIMARY KEY,
-            level TEXT NOT NULL,  -- INFO, WARNING, ERROR, CRITICAL
-            category TEXT NOT NULL,  -- auth, admin, upload, error, system
-            message TEXT NOT NULL,
-            user_id INTEGER,  -- NULL for system events
-            ip_address TEXT,
-            user_agent TEXT,
-            details TEXT,  -- JSON string for additional data
-            timestamp TEXT DEFAULT (DATETIME('now')),
-            FOREIGN KEY (user_id) REFERENCES users(id)
+        # favourite flag left as None: the cards get a <!--fav:ID--> marker filled per user
+        context = dict(
+            books=[list(book) + [None] for book in books_raw],
+            images=images,
+            trending=POPULARITY.top('trending', 5, book_type='book'),
+            snippets=snippets,
+            next_cursor=next_cursor,
+            user_role=role,
+            categories=categories,
+            selected_category=selected,
+            search_query=query,
+            page_endpoint="home",
         )
-    """)
+        return context, {'book_ids': [book[0] for book in books_raw]}
 
-    # team
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS team (
-            id          INTEGER PRIMARY KEY,
-            full_name   TEXT NOT NULL,
-            role        TEXT,
-            bio         TEXT,
-            avatar_path TEXT,
-            initials    TEXT,
-            created_at  TEXT
-        )
-    """)
-        # role change / publisher requests
-    c.execute("""
-    CREATE TABLE IF NOT EXISTS role_requests (
-      id INTEGER PRIMARY KEY,
-      user_id INTEGER NOT NULL,
-      requested_role TEXT NOT NULL,           -- e.g. 'publisher'
-      status TEXT NOT NULL DEFAULT 'pending', -- pending / approved / rejected
-      created_at TEXT DEFAULT (DATETIME('now'))
-    )
-    """)
+    key = ('home', role, tuple(sorted(request.args.items(multi=True))))
+    fragment = _page_fragment(key, ('catalog',), "index.html", build)
 
-    # manga chapters
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS chapters (
-            id          INTEGER PRIMARY KEY,
-            manga_id    INTEGER NOT NULL,
-            chapter_num INTEGER NOT NULL,
-            title       TEXT,
-            pdf_filename TEXT,
-            page_count  INTEGER DEFAULT 0,
-            created_at  TEXT DEFAULT (DATETIME('now')),
-            FOREIGN KEY (manga_id) REFERENCES books(id),
-            UNIQUE(manga_id, chapter_num)
-        )
-    """)
+    # Add favorite status for the heart icons
+    conn = get_conn()
+    user_favorites = _favorite_ids(conn, session["user_id"], fragment['book_ids'])
+    conn.close()
+    heart = render_template("partials/favorite_heart.html")
+    blocks = dict(fragment['blocks'],
+                  content=fragment_cache.inject(fragment['blocks']['content'], 'fav',
+                                                {book_id: heart for book_id in user_favorites}))
+    return render_template("cached_page.html", blocks=blocks)
+
+@app.route("/api/trending")
+def api_trending():
+    """Precomputed popularity lists: ?metric=trending|wishlisted|favorited|read|reviewed&type=book|manga&limit="""
+    if "user_id" not in session:
+        return jsonify({"error": "Not logged in"}), 401
 
-    # Add page_count column to chapters if it doesn't exist (migration for existing DBs)
+    metric = (request.args.get("metric") or "trending").strip()
+    book_type = (request.args.get("type") or "").strip() or None
+    if metric not in popularity.METRICS:
+        return jsonify({"error": f"Unknown metric, use one of: {', '.join(popularity.METRICS)}"}), 400
+    if book_type not in popularity.BOOK_TYPES:
+        return jsonify({"error": "Unknown type, use book or manga"}), 400
     try:
-        c.execute("ALTER TABLE chapters ADD COLUMN page_count INTEGER DEFAULT 0")
-        conn.commit()
-    except sqlite3.OperationalError:
-        pass
+        limit = max(1, min(int(request.args.get("limit", 10)), POPULARITY.k))
+    except ValueError:
+        limit = 10
 
-    # manga characters (for character profiles in reader)
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS manga_characters (
-            id          INTEGER PRIMARY KEY,
-            manga_id    INTEGER NOT NULL,
-            name        TEXT NOT NULL,
-            description TEXT,
-            role        TEXT,
-            avatar_url  TEXT,
-            created_at  TEXT DEFAULT (DATETIME('now')),
-            FOREIGN KEY (manga_id) REFERENCES books(id)
-        )
-    """)
+    items = [dict(item, cover_url=url_for("static", filename=item["cover_path"]) if item["cover_path"] else None,
+                  url=url_for("read_manga" if item["book_type"] == "manga" else "view_book", id=item["id"]))
+             for item in POPULARITY.top(metric, limit, book_type=book_type)]
+    return jsonify({"metric": metric, "type": book_type, "items": items})
 
-    # default users
-    try:
-        c.execute("INSERT INTO users (username, email, password, role) VALUES (?, ?, ?, ?)",
-                  ("admin", "admin@novus.local", "123", "admin"))
-        c.execute("INSERT INTO users (username, email, password, role) VALUES (?, ?, ?, ?)",
-                  ("publisher", "publisher@novus.local", "123", "publisher"))
-        c.execute("INSERT INTO users (username, email, password, role) VALUES (?, ?, ?, ?)",
-                  ("student", "student@novus.local", "123", "student"))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        pass
-    conn.close()
 
+@app.route("/api/books")
+def api_books():
+    """Next page of the home catalog for "load more": ?cursor=&limit=&category=&q="""
+    return _catalog_page_response('book')
 
 
-# -------------------- ROUTES --------------------
-# ---------- Home / Dashboard ----------
-@app.route("/")
-def home():
+def _catalog_page_response(book_type):
     if "user_id" not in session:
-        return redirect(url_for("login"))
+        return jsonify({"error": "Not logged in"}), 401
 
-    selected = (request.args.get("category") or "").strip()
+    category = (request.args.get("category") or "").strip()
     query = (request.args.get("q") or "").strip()
-
     conn = get_conn()
-    c = conn.cursor()
-
-    # Categories
-    c.execute("SELECT DISTINCT COALESCE(category,'General') FROM books ORDER BY 1")
-    db_categories = [row[0] for row in c.fetchall()]
-
-    extra_categories = [
-        "Action", "Adventure", "Children", "Comedy", "Drama", "Fantasy",
-        "General", "Historical", "Horror", "Mystery", "Poetry",
-        "Romance", "Science Fiction", "Supernatural", "Thriller", "Young Adult",
-    ]
-    categories = sorted(set(db_categories + extra_categories + ["General"]))
-
-    # ✅ Actual books query (this is what your cards need) - EXCLUDE MANGA
-    base_sql = """
-        SELECT id,
-               title,
-               author,
-               COALESCE(category,'General') AS category,
-               pdf_filename,
-               audio_filename,
-               cover_path
-        FROM books
-        WHERE COALESCE(book_type, 'book') != 'manga'
-    """
-    params = []
-
-    if selected:
-        base_sql += " AND COALESCE(category,'General') = ?"
-        params.append(selected)
-
-    if query:
-        # simple search across title and author
-        base_sql += " AND (title LIKE ? OR author LIKE ?)"
-        likeq = f"%{query}%"
-        params.extend([likeq, likeq])
-
-    base_sql += " ORDER BY datetime(created_at) DESC"
-
-    c.execute(base_sql, params)
-    books_raw = c.fetchall()
-    
-    # Get user's favorite book IDs for showing heart icons
-    user_favorites = set()
-    if "user_id" in session:
-        c.execute("SELECT book_id FROM favorites WHERE user_id = ?", (session["user_id"],))
-        user_favorites = {row[0] for row in c.fetchall()}
-    
-    # Add favorite status to each book (as a boolean flag)
-    books = []
-    for book in books_raw:
-        is_favorited = book[0] in user_favorites
-        books.append(list(book) + [is_favorited])
+    try:
+        page = _catalog_page(conn, book_type, category, query, request.args.get("cursor"),
+                             pagination.page_size(request.args.get("limit")))
+        rows = [row[:7] for row in page.rows]
+        favorites = _favorite_ids(conn, session["user_id"], [row[0] for row in rows])
+        images = image_variants.lookup(conn, [row[6] for row in rows])
+    except pagination.InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+    finally:
+        conn.close()
 
-    conn.close()
+    items = [{
+        "id": row[0], "title": row[1], "author": row[2], "category": row[3],
+        "cover_url": url_for("static", filename=row[6]) if row[6] else None,
+        "cover_srcset": srcset_filter(images.get(row[6])) or None,
+        "is_favorited": row[0] in favorites,
+    } for row in rows]
+    if book_type == 'manga':
+        html = render_template("partials/manga_cards.html", mangas=rows, images=images, snippets={})
+    else:
+        html = render_template("partials/book_cards.html", snippets={}, images=images, user_role=session.get("role"),
+                               books=[list(row) + [row[0] in favorites] for row in rows])
+    return _page_json(items, html, page.next_cursor)
 
-    return render_template(
-        "index.html",
-        books=books,
-        user_role=session.get("role"),
-        categories=categories,
-        selected_category=selected,
-        search_query=query,
-        page_endpoint="home",
-    )
 
 # ---------- Auth ----------
 @app.route("/login", methods=["GET", "POST"])
@@ -1017,14 +1013,10 @@ def refresh_plan():
     uid = session.get("user_id")
     if not uid:
         return
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("SELECT COALESCE(plan,'basic'), plan_expires_at FROM users WHERE id=?", (uid,))
-    row = c.fetchone()
-    conn.close()
-    if row:
-        session["plan"] = row[0] or "basic"
-        session["plan_expires_at"] = row[1]
+    state = USER_STATE.get(uid)
+    if state:
+        session["plan"] = state['plan'] or "basic"
+        session["plan_expires_at"] = state['plan_expires_at']
         # compute days left if expiry exists and plan is not ultimate
         session["plan_days_left"] = None
         try:
@@ -1141,6 +1133,29 @@ def logout():
 
 
 # ---------- Book Detail ----------
+# Hot queries are module constants so tests/test_query_plans.py checks the SQL the app runs
+BOOK_REVIEWS_QUERY = """
+    SELECT r.id, r.content, r.rating, r.created_at, r.user_id
+    FROM reviews r
+    WHERE r.book_id=?
+    ORDER BY r.created_at DESC
+"""
+
+
+def _with_reviewers(conn, reviews):
+    """(id, content, rating, created_at, username, user_id, avatar_url) rows, dropping deleted reviewers.
+
+    Reviewer names and avatars are read per request: they change without touching the book's cache tag.
+    """
+    user_ids = sorted({row[4] for row in reviews})
+    if not user_ids:
+        return []
+    users = {row[0]: row[1:] for row in conn.execute(
+        f"SELECT id, username, avatar_url FROM users WHERE id IN ({','.join('?' * len(user_ids))})", user_ids)}
+    return [(review_id, content, rating, created_at, users[uid][0], uid, users[uid][1])
+            for review_id, content, rating, created_at, uid in reviews if uid in users]
+
+
 @app.route("/book/<int:id>")
 def view_book(id):
     if "user_id" not in session:
@@ -1149,39 +1164,32 @@ def view_book(id):
     conn = get_conn()
     c = conn.cursor()
 
-    # fetch book
-    c.execute(
-        "SELECT id, title, author, category, pdf_filename, audio_filename, cover_path, description FROM books WHERE id=?",
-        (id,),
-    )
-    book = c.fetchone()
+    def load_book():
+        # book row + reviews: the same for every reader, cached until the book or its reviews change;
+        # who wrote them is joined per request (_with_reviewers)
+        c.execute(
+            "SELECT id, title, author, category, pdf_filename, audio_filename, cover_path, description FROM books WHERE id=?",
+            (id,),
+        )
+        book = c.fetchone()
+        if not book:
+            return None
+        c.execute(BOOK_REVIEWS_QUERY, (id,))
+        return tuple(book), [tuple(row) for row in c.fetchall()]
+
+    # 2: entries shaped before reviews carried only the reviewer's id must not be read back from disk
+    cached = FRAGMENTS.get_or_set(('book', id, 2), (f'book:{id}',), load_book)
+    book, reviews = cached or (None, None)
     if not book:
         conn.close()
         flash("Book not found.", "danger")
         return redirect(url_for("home"))
+    reviews = _with_reviewers(conn, reviews)
 
     user_id = session["user_id"]
 
-    # record in history once per user/book
-    today = datetime.now().strftime("%Y-%m-%d")
-    c.execute("SELECT 1 FROM history WHERE user_id=? AND book_id=?", (user_id, id))
-    if not c.fetchone():
-        c.execute(
-            "INSERT INTO history (user_id, book_id, date_read) VALUES (?, ?, ?)",
-            (user_id, id, today),
-        )
-        conn.commit()
-
-    # Log activity - always log when user reads/views a book
-    try:
-        c.execute("""
-            INSERT INTO activity_log (user_id, book_id, activity_type)
-            VALUES (?, ?, ?)
-        """, (user_id, id, 'read'))
-        conn.commit()
-    except Exception:
-        # don't fail the page if logging fails
-        pass
+    # 'read' activity + history row (once per user/book), written in the background
+    ACTIVITY.record_read(user_id, id)
 
     # watchlist entry for this user/book (if any)
     c.execute(
@@ -1198,58 +1206,26 @@ def view_book(id):
     )
     is_favorited = c.fetchone() is not None
 
-    # --- recommendations (other books) ---
-    try:
-        c.execute("""
-            SELECT id, title, author, category, cover_path
-            FROM books
-            WHERE id != ?
-            ORDER BY RANDOM()
-            LIMIT 3
-        """, (id,))
-        recommendations = c.fetchall()
-    except sqlite3.OperationalError:
-        c.execute("""
-            SELECT id, title, author, category
-            FROM books
-            WHERE id != ?
-            ORDER BY RANDOM()
-            LIMIT 3
-        """, (id,))
-        recommendations = c.fetchall()
-
-    # --- top wishlisted ---
-    try:
-        c.execute("""
-            SELECT b.id, b.title, b.category, b.cover_path, COUNT(*) as cnt
-            FROM watchlist w
-            JOIN books b ON b.id = w.book_id
-            GROUP BY b.id, b.title, b.category, b.cover_path
-            ORDER BY cnt DESC
-            LIMIT 3
-        """)
-        top_wishlisted = c.fetchall()
-    except sqlite3.OperationalError:
-        c.execute("""
-            SELECT b.id, b.title, b.category, COUNT(*) as cnt
-            FROM watchlist w
-            JOIN books b ON b.id = w.book_id
-            GROUP BY b.id, b.title, b.category
-            ORDER BY cnt DESC
-            LIMIT 3
-        """)
-        top_wishlisted = c.fetchall()
-
-    # fetch reviews
-    c.execute("""
-        SELECT r.id, r.content, r.rating, r.created_at,
-               u.username, u.id, u.avatar_url
-        FROM reviews r
-        JOIN users u ON u.id = r.user_id
-        WHERE r.book_id=?
-        ORDER BY datetime(r.created_at) DESC
-    """, (id,))
-    reviews = c.fetchall()
+    # --- recommendations: precomputed neighbours (see recommender.py) ---
+    recommendations = recommender.neighbors(conn, id, 3)
+    if len(recommendations) < 3:
+        # index not built yet for this book: newest books in the same category, then newest overall
+        seen = [id] + [row[0] for row in recommendations]
+        for where, params in (("COALESCE(category, 'General') = ?", [book[3] or 'General']), ("1", [])):
+            c.execute(f"""
+                SELECT id, title, author, category, cover_path
+                FROM books
+                WHERE id NOT IN ({','.join('?' * len(seen))}) AND {where}
+                ORDER BY id DESC
+                LIMIT ?
+            """, seen + params + [3 - len(recommendations)])
+            recommendations += c.fetchall()
+            seen = [id] + [row[0] for row in recommendations]
+            if len(recommendations) >= 3:
+                break
+
+    # --- top wishlisted (precomputed, see popularity.py) ---
+    top_wishlisted = POPULARITY.top('wishlisted', 3)
 
     conn.close()
 
@@ -1273,61 +1249,70 @@ def view_book(id):
 
 
 # ---------- AI Summary Endpoint ----------
+def _summary_request(data):
+    """(text, max_sentences, item_type, item_id, force) from an /ai_summary body, or raise ValueError."""
+    # Validate request with AI error handling
+    is_valid, error_msg = ai_error_fixes.validate_ai_request(data, ['text'])
+    if not is_valid:
+        raise ValueError(error_msg)
+    
+    text = (data.get('text') or '').strip()
+    try:
+        max_sents = int(data.get('max_sentences', 3))
+    except Exception:
+        max_sents = 3
+
+    if not text:
+        raise ValueError('No text provided.')
+
+    # Optional caching parameters
+    item_type = (data.get('item_type') or '').strip() or None
+    try:
+        item_id = int(data.get('item_id')) if data.get('item_id') is not None else None
+    except Exception:
+        item_id = None
+    return text, max_sents, item_type, item_id, bool(data.get('force'))
+
+
+def _event_stream(frames):
+    """Send SSE frames as they are produced (no proxy buffering, no caching)."""
+    return Response(stream_with_context(frames), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/ai_summary', methods=['POST'])
 def ai_summary():
     """Return a short AI-style summary for provided text.
-    POST JSON: { text: string, max_sentences: int (optional) }
+    POST JSON: { text: string, max_sentences: int (optional),
+                 item_type/item_id (optional, cache key), force (optional),
+                 async (optional: 202 + job id to poll at /ai_summary/jobs/<id>) }
     """
     try:
         data = request.get_json() or {}
-        
-        # Validate request with AI error handling
-        is_valid, error_msg = ai_error_fixes.validate_ai_request(data, ['text'])
-        if not is_valid:
-            return jsonify({'error': error_msg}), 400
-        
-        text = (data.get('text') or '').strip()
         try:
-            max_sents = int(data.get('max_sentences', 3))
-        except Exception:
-            max_sents = 3
-
-        if not text:
-            return jsonify({'error': 'No text provided.'}), 400
-
-        # Optional caching parameters
-        item_type = (data.get('item_type') or '').strip() or None
-        try:
-            item_id = int(data.get('item_id')) if data.get('item_id') is not None else None
-        except Exception:
-            item_id = None
-        force = bool(data.get('force'))
+            text, max_sents, item_type, item_id, force = _summary_request(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
+        conn = get_conn()
         # Check cache with optional TTL
         if item_type and item_id and not force:
-            conn = get_conn()
-            c = conn.cursor()
-            c.execute("SELECT id, summary, model, created_at FROM ai_summaries WHERE item_type=? AND item_id=?", (item_type, item_id))
-            row = c.fetchone()
-            if row:
-                rid, summary_text, model_name, created_at = row
-                ttl_days = int(os.environ.get('AI_SUMMARY_TTL_DAYS', '0') or '0')
-                if ttl_days > 0:
-                    try:
-                        created_dt = datetime.fromisoformat(created_at)
-                        age = datetime.utcnow() - created_dt
-                        if age.days >= ttl_days:
-                            # expired, remove
-                            c.execute("DELETE FROM ai_summaries WHERE id=?", (rid,))
-                            conn.commit()
-                            row = None
-                    except Exception:
-                        # if parsing fails, proceed to use cached value
-                        pass
+            hit = text_summary.cached(conn, item_type, item_id)
+            if hit:
+                conn.close()
+                return jsonify(dict(hit, cached=True))
+
+        if data.get('async'):
+            job_id = text_summary.enqueue(conn, text, max_sents, item_type, item_id, force,
+                                          user_id=session.get('user_id'))
             conn.close()
-            if row:
-                # return cached
-                return jsonify({'summary': summary_text, 'cached': True, 'model': model_name, 'cached_at': created_at})
+            return jsonify({'job_id': job_id, 'status': 'queued',
+                            'poll_url': url_for('ai_summary_job', job_id=job_id)}), 202
+
+        # concurrent requests for the same item wait for one generation
+        result = text_summary.generate(conn, text, max_sents, item_type, item_id, force)
+        conn.close()
+        return jsonify(result)
 
     except Exception as e:
         # Handle any unexpected errors with AI error handling
@@ -1338,100 +1323,31 @@ def ai_summary():
             'summary': ai_error_fixes.get_ai_fallback_message()
         }), 500
 
-    def simple_summarize(src, max_sentences=3):
-        import re
-        src = src.replace('\n', ' ').strip()
-        # Split into sentences
-        sents = re.split(r'(?<=[.!?])\s+', src)
-        # If short text, produce a concise variant rather than returning identical text
-        if len(src) < 250:
-            if len(sents) == 1:
-                # single sentence: truncate to ~30 words
-                words = sents[0].split()
-                if len(words) <= 30:
-                    return sents[0]
-                return ' '.join(words[:30]).rstrip() + '…'
-            else:
-                # multiple sentences: return up to max_sentences sentences
-                return ' '.join(sents[:max_sentences])
-
-        # Build frequency table
-        words = re.findall(r"\w+", src.lower())
-        stopwords = set(["the","and","a","an","of","in","to","is","it","that","for","on","with","as","was","are","by","this","be"])
-        freq = {}
-        for w in words:
-            if w in stopwords or len(w) < 3:
-                continue
-            freq[w] = freq.get(w, 0) + 1
-
-        scores = []
-        for i, s in enumerate(sents):
-            s_words = re.findall(r"\w+", s.lower())
-            score = sum(freq.get(w, 0) for w in s_words)
-            scores.append((i, score, s))
-
-        # Pick top sentences
-        top = sorted(scores, key=lambda x: x[1], reverse=True)[:max_sentences]
-        top_sorted = sorted(top, key=lambda x: x[0])
-        summary = ' '.join(s for (_, _, s) in top_sorted)
-        return summary
-
-    # Try using external LLM if configured
-    summary = None
-    used_model = 'simple'
-    OPENAI_KEY = os.environ.get('OPENAI_API_KEY')
-    USE_OPENAI = os.environ.get('USE_OPENAI', '0') in ('1', 'true', 'True')
-
-    def call_openai_summary(src, max_sentences=3):
-        # ensure requests is available and API key present
-        if not REQUESTS_AVAILABLE or not OPENAI_KEY:
-            return None, None
-        model = os.environ.get('OPENAI_MODEL', 'gpt-3.5-turbo')
-        prompt = f"Summarize the following text in {max_sentences} concise sentences:\n\n{src}"
-        headers = {'Authorization': f'Bearer {OPENAI_KEY}', 'Content-Type': 'application/json'}
-        payload = {
-            'model': model,
-            'messages': [{'role': 'user', 'content': prompt}],
-            'max_tokens': 300,
-            'temperature': 0.3,
-        }
-        try:
-            resp = requests.post('https://api.openai.com/v1/chat/completions', json=payload, headers=headers, timeout=10)
-            if resp.status_code == 200:
-                j = resp.json()
-                txt = j['choices'][0]['message']['content'].strip()
-                return txt, model
-        except Exception as e:
-            # Use AI error handling for OpenAI API errors
-            error_details = ai_error_fixes.handle_ai_service_error(e, 'OpenAI')
-            print(f"OpenAI API Error: {error_details['error']}")
-        return None, None
-
-    if OPENAI_KEY and USE_OPENAI:
-        txt, model = call_openai_summary(text, max_sents)
-        if txt:
-            summary = txt
-            used_model = model
-
-    if not summary:
-        summary = simple_summarize(text, max_sents)
-        used_model = 'simple'
-
-    # Store cache if item provided
-    if item_type and item_id:
-        conn = get_conn()
-        c = conn.cursor()
-        now = datetime.utcnow().isoformat()
-        try:
-            c.execute("INSERT OR REPLACE INTO ai_summaries (item_type, item_id, summary, model, created_at) VALUES (?, ?, ?, ?, ?)",
-                      (item_type, item_id, summary, used_model, now))
-            conn.commit()
-        except Exception:
-            pass
-        finally:
-            conn.close()
 
-    return jsonify({'summary': summary, 'cached': False, 'model': used_model})
+@app.route('/ai_summary/stream', methods=['POST'])
+def ai_summary_stream():
+    """/ai_summary as Server-Sent Events: 'token' events while the summary is
+    written, then 'done' with the whole summary (a cached one is just 'done').
+    """
+    try:
+        text, max_sents, item_type, item_id, force = _summary_request(request.get_json() or {})
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    conn = get_conn()
+    return _event_stream(text_summary.stream(conn, text, max_sents, item_type, item_id, force))
+
+
+@app.route('/ai_summary/jobs/<int:job_id>', methods=['GET'])
+def ai_summary_job(job_id):
+    """Status of an async /ai_summary request; the summary once it is done."""
+    conn = get_conn()
+    try:
+        job = jobs.get(conn, job_id)
+    finally:
+        conn.close()
+    if not job or job['kind'] != 'ai_summary' or (job['user_id'] and job['user_id'] != session.get('user_id')):
+        return jsonify({'error': 'job not found'}), 404
+    return jsonify(text_summary.job_view(job))
 
 
 # ---------- Admin: AI Summaries Management ----------
@@ -1448,6 +1364,32 @@ def admin_ai_summaries():
     return render_template('admin_ai_summaries.html', rows=rows, ttl_days=ttl_days)
 
 
+
+# ---------- Admin: page summary / OCR pre-generation ----------
+@app.route('/admin/page_ai')
+@admin_required
+def admin_page_ai():
+    conn = get_conn()
+    chapters = page_ai.coverage(conn)
+    conn.close()
+    if request.args.get('format') == 'json':
+        return jsonify({'chapters': chapters})
+    return render_template('admin_page_ai.html', chapters=chapters, enabled=page_ai.enabled(),
+                           workers=page_ai.WORKERS, rate=page_ai.RATE_PER_MINUTE)
+
+
+@app.route('/admin/page_ai/<int:chapter_id>/queue', methods=['POST'])
+@admin_required
+def admin_page_ai_queue(chapter_id):
+    conn = get_conn()
+    if not conn.execute("SELECT 1 FROM chapters WHERE id = ?", (chapter_id,)).fetchone():
+        conn.close()
+        return jsonify({'error': 'chapter not found'}), 404
+    job_id = page_ai.queue(conn, chapter_id, user_id=session.get("user_id"), force=True)
+    conn.close()
+    return jsonify({'job_id': job_id, 'status_url': url_for('get_job_status', job_id=job_id)})
+
+
 @app.route('/admin/reports')
 @admin_required
 def admin_reports():
@@ -1485,18 +1427,8 @@ def admin_reports():
     return render_template('admin_reports.html', reported_users=reported_users, all_reports=all_reports)
 
 
-@app.route('/admin/system_logs')
-@admin_required
-def admin_system_logs():
-    # Get filter parameters
-    level_filter = request.args.get('level', '').strip()
-    category_filter = request.args.get('category', '').strip()
-    limit = int(request.args.get('limit', 100))
-
-    conn = get_conn()
-    c = conn.cursor()
-
-    # Build query with filters
+def system_logs_query(level, category, limit):
+    """(sql, params) for the admin log list, newest first, optionally filtered."""
     query = """
         SELECT sl.id, sl.level, sl.category, sl.message, sl.user_id, u.username,
                sl.ip_address, sl.timestamp, sl.details
@@ -1505,30 +1437,40 @@ def admin_system_logs():
     """
     params = []
     conditions = []
-
-    if level_filter:
+    if level:
         conditions.append("sl.level = ?")
-        params.append(level_filter.upper())
-
-    if category_filter:
+        params.append(level)
+    if category:
         conditions.append("sl.category = ?")
-        params.append(category_filter)
-
+        params.append(category)
     if conditions:
         query += " WHERE " + " AND ".join(conditions)
-
     query += " ORDER BY sl.timestamp DESC LIMIT ?"
     params.append(limit)
+    return query, params
+
+
+@app.route('/admin/system_logs')
+@admin_required
+def admin_system_logs():
+    # Get filter parameters
+    level_filter = request.args.get('level', '').strip()
+    category_filter = request.args.get('category', '').strip()
+    limit = int(request.args.get('limit', 100))
 
+    # include events still waiting in this process's write queue
+    SYSTEM_LOG_WRITER.flush(timeout=1.0)
+
+    conn = get_conn()
+    c = conn.cursor()
+
+    query, params = system_logs_query(level_filter.upper(), category_filter, limit)
     c.execute(query, params)
     logs = c.fetchall()
 
-    # Get unique levels and categories for filter dropdowns
-    c.execute("SELECT DISTINCT level FROM system_logs ORDER BY level")
-    levels = [row[0] for row in c.fetchall()]
-
-    c.execute("SELECT DISTINCT category FROM system_logs ORDER BY category")
-    categories = [row[0] for row in c.fetchall()]
+    # Levels and categories for the filter dropdowns (kept up to date by triggers)
+    levels = retention.facet_values(conn, 'system_logs', 'level')
+    categories = retention.facet_values(conn, 'system_logs', 'category')
 
     conn.close()
 
@@ -1631,6 +1573,40 @@ def admin_ai_summaries_clear():
         return jsonify({'error': 'unknown action'}), 400
 
 
+@app.route('/admin/metrics')
+@admin_required
+def admin_metrics():
+    """Runtime counters for the storage/caching layers (per worker process)."""
+    return jsonify({
+        'pid': os.getpid(),
+        'db_pool': DB_POOL.stats(),
+        'storage': STORAGE_SELF_CHECK,
+        'wal_checkpoint': CHECKPOINTER.stats(),
+        'jobs': _job_metrics(),
+        'user_state_cache': USER_STATE.stats(),
+        'system_log_writer': SYSTEM_LOG_WRITER.stats(),
+        'activity': ACTIVITY.stats(),
+        'reading_progress': READING_PROGRESS.stats(),
+        'retention': RETENTION_SCHEDULER.stats(),
+        'popularity': dict(POPULARITY.stats(), fold=POPULARITY_SCHEDULER.stats()),
+        'recommendations': dict(RECOMMENDER_SCHEDULER.stats(), numpy=recommender.NUMPY_AVAILABLE),
+        'fragment_cache': FRAGMENTS.stats(),
+        'ai_results': AI_RESULTS.stats(),
+        'ai_client': ai_client.get_client().stats() if ai_client.REQUESTS_AVAILABLE else None,
+        'ai_summary_flights': text_summary.FLIGHTS.stats(),
+    })
+
+
+def _job_metrics():
+    conn = get_conn()
+    try:
+        queue = jobs.counts(conn)
+    finally:
+        conn.close()
+    return {'queue': queue,
+            'embedded_worker': JOB_WORKER.stats() if JOBS_EMBEDDED_WORKER else None,
+            'embedded_page_ai_worker': PAGE_AI_WORKER.stats() if JOBS_EMBEDDED_WORKER else None}
+
 
 @app.post("/book/<int:id>/review")
 def add_review(id):
@@ -1658,6 +1634,7 @@ def add_review(id):
     )
     conn.commit()
     conn.close()
+    FRAGMENTS.invalidate(f'book:{id}')
 
     flash("Review added.", "success")
     return redirect(url_for("view_book", id=id))
@@ -1690,6 +1667,7 @@ def delete_review(review_id):
     c.execute("DELETE FROM reviews WHERE id=?", (review_id,))
     conn.commit()
     conn.close()
+    FRAGMENTS.invalidate(f'book:{book_id}')
     flash("Review deleted.", "success")
     return redirect(url_for("view_book", id=book_id))
 
@@ -1862,7 +1840,9 @@ def add_book():
         VALUES (?, ?, ?, ?, ?, ?, ?, ?)
     """, (title, author, category, pdf_filename, audio_filename, cover_path, book_type, uploader_id))
         conn.commit()
+        _queue_image_variants(conn, [cover_path])
         conn.close()
+        _invalidate_pages()
 
         # Log book upload
         uploader_id = session.get("user_id")
@@ -1902,6 +1882,7 @@ def add_book():
 
         # Get the newly created manga ID
         manga_id = c.lastrowid
+        _invalidate_pages()
 
         # Handle first chapter upload - support both PDF and multiple images
         chapter_format = (request.form.get("chapter_format") or "images").lower().strip()
@@ -1925,16 +1906,16 @@ def add_book():
                     page_count = 1
         else:
             # Handle image uploads (multiple pages)
-            chapter_pages = request.files.getlist("chapter_pages")
+            page_uploads = request.files.getlist("chapter_pages")
 
-            if chapter_pages and len(chapter_pages) > 0:
+            if page_uploads and len(page_uploads) > 0:
                 # Create manga chapter directory
                 chapter_dir = os.path.join(UPLOAD_FOLDER_MANGA, f"manga_{manga_id}_ch1")
                 os.makedirs(chapter_dir, exist_ok=True)
 
                 page_files = []
 
-                for idx, page_file in enumerate(chapter_pages, 1):
+                for idx, page_file in enumerate(page_uploads, 1):
                     if page_file and page_file.filename:
                         # Check file size for each image
                         if page_file.content_length > MAX_IMAGE_SIZE:
@@ -1959,8 +1940,14 @@ def add_book():
                 INSERT INTO chapters (manga_id, chapter_num, title, pdf_filename, page_count)
                 VALUES (?, ?, ?, ?, ?)
             """, (manga_id, 1, "Chapter 1", pages_data, page_count))
+            chapter_id = c.lastrowid
+            chapter_pages.record_pages(conn, chapter_id, chapter_pages.chapter_dir(manga_id, 1),
+                                       pages_data.split(","))
             conn.commit()
+            _queue_page_ai(conn, chapter_id)
 
+        _queue_image_variants(conn, [cover_path] + [f"{chapter_pages.chapter_dir(manga_id, 1)}/{f}"
+                                                    for f in (pages_data or "").split(",") if f])
         conn.close()
 
         # Log manga upload
@@ -2081,7 +2068,10 @@ def edit_book(id):
             """, (title, author, category, description, pdf_filename, audio_filename, cover_path, id))
 
             conn.commit()
+            if cover_file and cover_file.filename:
+                _queue_image_variants(conn, [cover_path])
             conn.close()
+            _invalidate_pages(id)
             flash("Book updated successfully.", "success")
             return redirect(url_for("view_book", id=id))
 
@@ -2144,12 +2134,44 @@ def delete_book(id):
     c.execute("DELETE FROM books     WHERE id=?", (book_id,))
     conn.commit()
     conn.close()
+    _invalidate_pages(book_id)
 
     flash("Book deleted successfully.", "success")
     return redirect(url_for("my_uploads"))
 
 
 # ---------- Profile ----------
+PROFILE_HISTORY_QUERY = """
+    SELECT books.title, books.category, history.date_read, books.author, books.cover_path
+    FROM history
+    JOIN books ON history.book_id = books.id
+    WHERE history.user_id = ?
+    ORDER BY history.date_read DESC
+    LIMIT 6
+"""
+
+# the watchlist's 'reading' rows, with where the manga reader left off
+PROFILE_CURRENTLY_READING_QUERY = """
+    SELECT b.title, b.author, b.cover_path, w.progress, b.id, ch.chapter_num, rr.page_index
+    FROM watchlist w
+    JOIN books b ON w.book_id = b.id
+    LEFT JOIN reading_resume rr ON rr.user_id = w.user_id AND rr.manga_id = w.book_id
+    LEFT JOIN chapters ch ON ch.id = rr.chapter_id
+    WHERE w.user_id = ? AND w.status = 'reading'
+    ORDER BY COALESCE(rr.updated_at, w.created_at) DESC
+    LIMIT 3
+"""
+
+PROFILE_RECENT_ACTIVITY_QUERY = """
+    SELECT al.activity_type, b.title, al.timestamp
+    FROM activity_log al
+    JOIN books b ON al.book_id = b.id
+    WHERE al.user_id = ?
+    ORDER BY al.timestamp DESC
+    LIMIT 7
+"""
+
+
 @app.route("/profile", methods=["GET", "POST"])
 def profile():
     if "user_id" not in session:
@@ -2212,57 +2234,26 @@ def profile():
     conn = get_conn()
     c = conn.cursor()
 
-    # Get reading history
-    c.execute("""
-        SELECT books.title, books.category, history.date_read, books.author, books.cover_path
-        FROM history
-        JOIN books ON history.book_id = books.id
-        WHERE history.user_id = ?
-        ORDER BY history.date_read DESC
-        LIMIT 50
-    """, (user_id,))
+    stats = reader_stats.get(conn, user_id)
+
+    # Recently read books
+    c.execute(PROFILE_HISTORY_QUERY, (user_id,))
     hist = c.fetchall()
 
-    # Get currently reading from watchlist
-    c.execute("""
-        SELECT b.title, b.author, b.cover_path, w.progress
-        FROM watchlist w
-        JOIN books b ON w.book_id = b.id
-        WHERE w.user_id = ? AND w.status = 'reading'
-        ORDER BY w.created_at DESC
-        LIMIT 3
-    """, (user_id,))
+    # Get currently reading from watchlist, with where the manga reader left off
+    c.execute(PROFILE_CURRENTLY_READING_QUERY, (user_id,))
     currently_reading_raw = c.fetchall()
 
     # Get recent activity from activity log
-    c.execute("""
-        SELECT al.activity_type, b.title, al.timestamp
-        FROM activity_log al
-        JOIN books b ON al.book_id = b.id
-        WHERE al.user_id = ?
-        ORDER BY al.timestamp DESC
-        LIMIT 7
-    """, (user_id,))
+    c.execute(PROFILE_RECENT_ACTIVITY_QUERY, (user_id,))
     activity_raw = c.fetchall()
 
-    # Calculate average rating given by user
-    c.execute("""
-        SELECT AVG(rating) FROM reviews WHERE user_id = ?
-    """, (user_id,))
-    avg_rating_row = c.fetchone()
-    avg_rating = round(avg_rating_row[0], 1) if avg_rating_row[0] else None
-
     conn.close()
 
-    total_read = len(hist)
-    fav_genre = "None yet"
-    if total_read:
-        cats = [row[1] for row in hist if row[1]]
-        fav_genre = Counter(cats).most_common(1)[0][0] if cats else "None yet"
-
     # Format currently reading
     currently_reading = [
-        {"title": r[0], "author": r[1], "progress": r[3] or 0, "cover": r[2]}
+        {"id": r[4], "title": r[0], "author": r[1], "progress": r[3] or 0, "cover": r[2],
+         "resume": _resume_point(r[5], r[6])}
         for r in currently_reading_raw
     ]
 
@@ -2323,10 +2314,10 @@ def profile():
         username=session.get("username"),
         avatar_url=session.get("avatar_url"),
         email=session.get("email"),
-        count=total_read,
-        fav=fav_genre,
-        pages_read=None,  # Could be calculated from progress, but leaving as None for now
-        avg_rating=avg_rating,
+        count=stats["read_count"],
+        fav=stats["favorite_genre"] or "None yet",
+        pages_read=stats["pages_read"] or None,
+        avg_rating=stats["avg_rating"],
         currently_reading=currently_reading,
         recent_finished=recent_finished,
         recent_activity=recent_activity
@@ -2348,15 +2339,10 @@ def public_profile(username):
     
     user_id = user[0]
     
-    # Get stats
-    c.execute("SELECT COUNT(*) FROM history WHERE user_id=?", (user_id,))
-    read_count = c.fetchone()[0]
-
-    c.execute("SELECT status, COUNT(*) FROM watchlist WHERE user_id=? GROUP BY status", (user_id,))
-    watchlist_stats = dict(c.fetchall())
-
-    c.execute("SELECT COUNT(*) FROM favorites WHERE user_id=?", (user_id,))
-    fav_count = c.fetchone()[0]
+    stats = reader_stats.get(conn, user_id)
+    read_count = stats["read_count"]
+    watchlist_stats = stats["watchlist_counts"]
+    fav_count = stats["favorite_count"]
 
     # Recent activity
     c.execute("""
@@ -2514,6 +2500,16 @@ def settings():
 
 
 # ---------- Activity Log ----------
+ACTIVITY_LOG_QUERY = """
+    SELECT al.id, al.activity_type, al.summary_generated, b.title, al.timestamp
+    FROM activity_log al
+    JOIN books b ON al.book_id = b.id
+    WHERE al.user_id = ?
+    ORDER BY al.timestamp DESC
+    LIMIT ?
+"""
+
+
 @app.route("/api/activity-log")
 def get_activity_log():
     """Get user's activity log for the modal"""
@@ -2527,19 +2523,7 @@ def get_activity_log():
     c = conn.cursor()
     
     # Get activity log with book details
-    c.execute("""
-        SELECT 
-            al.id,
-            al.activity_type,
-            al.summary_generated,
-            b.title,
-            al.timestamp
-        FROM activity_log al
-        JOIN books b ON al.book_id = b.id
-        WHERE al.user_id = ?
-        ORDER BY al.timestamp DESC
-        LIMIT ?
-    """, (user_id, limit))
+    c.execute(ACTIVITY_LOG_QUERY, (user_id, limit))
     
     activities = []
     for row in c.fetchall():
@@ -2592,26 +2576,20 @@ def log_activity():
     if "user_id" not in session:
         return jsonify({"error": "Not logged in"}), 401
     
-    data = request.get_json()
+    data = request.get_json(silent=True) or {}
     user_id = session["user_id"]
-    book_id = data.get("book_id")
-    activity_type = data.get("type", "read")  # read, started, completed, summarized
+    activity_type = data.get("type", "read")
     summary_generated = 1 if data.get("has_summary") else 0
-    
-    conn = get_conn()
-    c = conn.cursor()
-    
+
     try:
-        c.execute("""
-            INSERT INTO activity_log (user_id, book_id, activity_type, summary_generated)
-            VALUES (?, ?, ?, ?)
-        """, (user_id, book_id, activity_type, summary_generated))
-        conn.commit()
-        conn.close()
-        return jsonify({"success": True})
-    except Exception as e:
-        conn.close()
-        return jsonify({"error": str(e)}), 500
+        book_id = int(data.get("book_id"))
+    except (TypeError, ValueError):
+        return jsonify({"error": "book_id is required"}), 400
+    if activity_type not in activity.ACTIVITY_TYPES:
+        return jsonify({"error": f"type must be one of {', '.join(sorted(activity.ACTIVITY_TYPES))}"}), 400
+
+    queued = ACTIVITY.record(user_id, book_id, activity_type, summary_generated)
+    return jsonify({"success": True, "coalesced": not queued})
 
 
 # ---------- Watchlist ----------
@@ -2623,16 +2601,39 @@ def watchlist():
     conn = get_conn()
     c = conn.cursor()
     
-    # Watchlist books
-    rows = c.execute("""
-        SELECT b.id, b.title, b.author, COALESCE(b.category, 'General'),
-               b.pdf_filename, b.audio_filename, b.cover_path,
-               w.status, w.progress, w.created_at
+    user_id = session["user_id"]
+
+    # Watchlist table: first page only, the rest comes from /api/watchlist
+    try:
+        page = _watchlist_page(conn, user_id, request.args.get("cursor"),
+                               pagination.page_size(request.args.get("limit")))
+    except pagination.InvalidCursor:
+        page = _watchlist_page(conn, user_id, None, pagination.DEFAULT_PAGE_SIZE)
+
+    # Featured cards: newest 3 per status
+    featured_rows = c.execute("""
+        SELECT id, title, author, category, cover_path, status, progress, chapter_num, page_index
+        FROM (
+            SELECT b.id, b.title, b.author, COALESCE(b.category, 'General') AS category,
+                   b.cover_path, w.status, w.progress, ch.chapter_num, rr.page_index,
+                   ROW_NUMBER() OVER (PARTITION BY w.status ORDER BY w.created_at DESC, w.id DESC) AS rn
+            FROM watchlist w
+            JOIN books b ON b.id = w.book_id
+            LEFT JOIN reading_resume rr ON rr.user_id = w.user_id AND rr.manga_id = w.book_id
+            LEFT JOIN chapters ch ON ch.id = rr.chapter_id
+            WHERE w.user_id = ?
+        )
+        WHERE rn <= 3
+    """, (user_id,)).fetchall()
+
+    # Category tags cover the whole watchlist, not just the first page
+    categories = [row[0] for row in c.execute("""
+        SELECT DISTINCT COALESCE(b.category, 'General')
         FROM watchlist w
         JOIN books b ON b.id = w.book_id
         WHERE w.user_id = ?
-        ORDER BY datetime(w.created_at) DESC
-    """, (session["user_id"],)).fetchall()
+        ORDER BY 1
+    """, (user_id,)).fetchall()]
     
     # Recently read books from history
     recently_read = c.execute("""
@@ -2644,10 +2645,7 @@ def watchlist():
         WHERE h.user_id = ?
         ORDER BY h.date_read DESC
         LIMIT 20
-    """, (session["user_id"],)).fetchall()
-    
-    # Get unique categories from watchlist
-    categories = sorted(set([row[3] for row in rows]))
+    """, (user_id,)).fetchall()
     
     conn.close()
 
@@ -2655,21 +2653,68 @@ def watchlist():
     featured_books = {}
     for status in ['planned', 'reading', 'on_hold', 'completed', 'dropped']:
         featured_books[status] = [
-            {"id": r[0], "title": r[1], "author": r[2], "category": r[3], "progress": r[8] or 0, "cover": r[6], "status": r[7]}
-            for r in rows if r[7] == status
-        ][:3]  # First 3 for each status
+            {"id": r[0], "title": r[1], "author": r[2], "category": r[3], "progress": r[6] or 0, "cover": r[4], "status": r[5],
+             "resume": _resume_point(r[7], r[8])}
+            for r in featured_rows if r[5] == status
+        ]
 
-    table_books = [
-        {"id": r[0], "title": r[1], "author": r[2], "category": r[3], "year": "", "rating": 4, "cover": r[6], "status": r[7], "progress": r[8]}
-        for r in rows
-    ]
-    
     recently_read_books = [
         {"id": r[0], "title": r[1], "author": r[2], "category": r[3], "cover": r[6], "date_read": r[7]}
         for r in recently_read
     ]
     
-    return render_template("watchlist.html", featured_books=featured_books, table_books=table_books, categories=categories, recently_read_books=recently_read_books)
+    return render_template("watchlist.html", featured_books=featured_books, table_books=_watchlist_table_books(page.rows),
+                           next_cursor=page.next_cursor, categories=categories, recently_read_books=recently_read_books)
+
+
+def _resume_point(chapter_num, page_index):
+    """{'chapter_num', 'page'} (1-based page) from a reading_resume join, or None."""
+    if chapter_num is None:
+        return None
+    return {"chapter_num": chapter_num, "page": (page_index or 0) + 1}
+
+
+WATCHLIST_PAGE_SELECT = """
+    SELECT b.id, b.title, b.author, COALESCE(b.category, 'General'),
+           b.pdf_filename, b.audio_filename, b.cover_path,
+           w.status, w.progress, w.created_at, w.id
+    FROM watchlist w
+    JOIN books b ON b.id = w.book_id
+"""
+
+
+def _watchlist_page(conn, user_id, cursor, limit):
+    return pagination.keyset_page(conn, WATCHLIST_PAGE_SELECT, ["w.user_id = ?"], [user_id],
+                                  ('w.created_at', 'w.id'), lambda r: (r[9], r[10]), limit, cursor)
+
+
+def _watchlist_table_books(rows):
+    return [
+        {"id": r[0], "title": r[1], "author": r[2], "category": r[3], "year": "", "rating": 4, "cover": r[6], "status": r[7], "progress": r[8]}
+        for r in rows
+    ]
+
+
+@app.route("/api/watchlist")
+def api_watchlist():
+    """Next page of the watchlist table for "load more": ?cursor=&limit="""
+    if "user_id" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    conn = get_conn()
+    try:
+        page = _watchlist_page(conn, session["user_id"], request.args.get("cursor"),
+                               pagination.page_size(request.args.get("limit")))
+    except pagination.InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+    finally:
+        conn.close()
+
+    table_books = _watchlist_table_books(page.rows)
+    items = [{k: book[k] for k in ("id", "title", "author", "category", "status", "progress")}
+             for book in table_books]
+    html = render_template("partials/watchlist_rows.html", table_books=table_books)
+    return _page_json(items, html, page.next_cursor)
 
 
 @app.post("/watchlist/add")
@@ -2791,7 +2836,7 @@ def watchlist_book(book_id):
     # which status was chosen in the dropdown
     status = (request.form.get("status") or "").strip()
 
-    conn = sqlite3.connect("library.db")
+    conn = get_conn()
     c = conn.cursor()
 
     # make sure the book exists
@@ -2836,21 +2881,25 @@ def watchlist_book(book_id):
 
         # Log activity if marked as completed
         if status.lower() == 'completed':
-            try:
-                c.execute("""
-                    INSERT INTO activity_log (user_id, book_id, activity_type)
-                    VALUES (?, ?, ?)
-                """, (user_id, book_id, 'completed'))
-                conn.commit()
-            except Exception:
-                pass
+            ACTIVITY.record(user_id, book_id, 'completed')
 
     conn.commit()
     conn.close()
     return redirect(url_for("view_book", id=book_id))
 
 
-# ---------- Favorites ----------
+# ---------- Favorites ----------
+FAVORITES_QUERY = """
+    SELECT b.id, b.title, b.author, COALESCE(b.category, 'General') AS category,
+           b.pdf_filename, b.audio_filename, b.cover_path,
+           f.created_at
+    FROM favorites f
+    JOIN books b ON b.id = f.book_id
+    WHERE f.user_id = ?
+    ORDER BY f.created_at DESC
+"""
+
+
 @app.route("/favorites")
 def favorites():
     """Display user's favorite books"""
@@ -2861,15 +2910,7 @@ def favorites():
     c = conn.cursor()
     
     # Get favorite books with details
-    favorite_books = c.execute("""
-        SELECT b.id, b.title, b.author, COALESCE(b.category, 'General') AS category,
-               b.pdf_filename, b.audio_filename, b.cover_path,
-               f.created_at
-        FROM favorites f
-        JOIN books b ON b.id = f.book_id
-        WHERE f.user_id = ?
-        ORDER BY datetime(f.created_at) DESC
-    """, (session["user_id"],)).fetchall()
+    favorite_books = c.execute(FAVORITES_QUERY, (session["user_id"],)).fetchall()
     
     # Get unique categories from favorites
     categories = sorted(set([row[3] for row in favorite_books]))
@@ -2946,14 +2987,7 @@ def favorites_add():
         conn.commit()
         
         # Log activity
-        try:
-            c.execute("""
-                INSERT INTO activity_log (user_id, book_id, activity_type)
-                VALUES (?, ?, ?)
-            """, (session["user_id"], book_id, 'favorited'))
-            conn.commit()
-        except Exception:
-            pass
+        ACTIVITY.record(session["user_id"], book_id, 'favorited')
             
         conn.close()
         flash("Book added to favorites!", "success")
@@ -3020,14 +3054,7 @@ def favorites_book(book_id):
         conn.commit()
         
         # Log activity
-        try:
-            c.execute("""
-                INSERT INTO activity_log (user_id, book_id, activity_type)
-                VALUES (?, ?, ?)
-            """, (user_id, book_id, 'favorited'))
-            conn.commit()
-        except Exception:
-            pass
+        ACTIVITY.record(user_id, book_id, 'favorited')
         
         conn.close()
         flash("Added to favorites!", "success")
@@ -3042,50 +3069,141 @@ def manga():
     selected = (request.args.get("category") or "").strip()
     q = (request.args.get("q") or "").strip()
 
-    conn = get_conn()
-    c = conn.cursor()
+    def build():
+        conn = get_conn()
+        c = conn.cursor()
 
-    # Get manga categories
-    c.execute("""
-        SELECT DISTINCT COALESCE(category,'General')
-        FROM books
-        WHERE COALESCE(book_type,'book')='manga'
-        ORDER BY 1
-    """)
-    categories = [row[0] for row in c.fetchall()]
+        # Get manga categories
+        c.execute("""
+            SELECT DISTINCT COALESCE(category,'General')
+            FROM books
+            WHERE COALESCE(book_type,'book')='manga'
+            ORDER BY 1
+        """)
+        categories = [row[0] for row in c.fetchall()]
+
+        hits = catalog_search.search(conn, q, book_type='manga', category=selected,
+                                     limit=SEARCH_RESULTS_LIMIT) if q else None
+        snippets = {}
+        next_cursor = None
+        if hits is not None:
+            mangas = [_search_hit_row(h) for h in hits]
+            snippets = {h['id']: h['snippet'] for h in hits if h['snippet']}
+        else:
+            try:
+                page = _catalog_page(conn, 'manga', selected, q, request.args.get("cursor"),
+                                     pagination.page_size(request.args.get("limit")))
+            except pagination.InvalidCursor:
+                page = _catalog_page(conn, 'manga', selected, q, None, pagination.DEFAULT_PAGE_SIZE)
+            mangas = [row[:7] for row in page.rows]
+            next_cursor = page.next_cursor
+        images = image_variants.lookup(conn, [m[6] for m in mangas])
+        conn.close()
 
-    # Build query for manga
-    base_sql = """
-        SELECT id, title, author, COALESCE(category,'General') AS category,
-               pdf_filename, audio_filename, cover_path
-        FROM books
-        WHERE COALESCE(book_type,'book')='manga'
-    """
-    params = []
+        context = dict(
+            mangas=mangas,
+            images=images,
+            snippets=snippets,
+            next_cursor=next_cursor,
+            categories=categories,
+            selected_category=selected,
+            q=q,
+        )
+        return context, {}
+
+    key = ('manga', tuple(sorted(request.args.items(multi=True))))
+    fragment = _page_fragment(key, ('catalog',), "manga.html", build)
+    return render_template("cached_page.html", blocks=fragment['blocks'], body_class="manga-theme")
 
-    if selected:
-        base_sql += " AND COALESCE(category,'General') = ?"
-        params.append(selected)
 
+@app.route("/api/manga")
+def api_manga_list():
+    """Next page of the manga list for "load more": ?cursor=&limit=&category=&q="""
+    return _catalog_page_response('manga')
+
+
+@app.route("/api/search")
+def api_search():
+    """Ranked catalog search as JSON: ?q=&type=book|manga|all&category=&page=&per_page="""
+    if "user_id" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+
+    q = (request.args.get("q") or "").strip()
+    book_type = request.args.get("type", "all")
+    if book_type not in ("book", "manga", "all"):
+        return jsonify({"error": "type must be book, manga or all"}), 400
+    category = (request.args.get("category") or "").strip() or None
+    page = max(request.args.get("page", 1, type=int) or 1, 1)
+    per_page = min(max(request.args.get("per_page", 20, type=int) or 20, 1), 50)
+
+    results, total = [], 0
     if q:
-        base_sql += " AND (title LIKE ? OR author LIKE ?)"
-        search_term = f"%{q}%"
-        params.extend([search_term, search_term])
+        conn = get_conn()
+        try:
+            kwargs = dict(book_type=None if book_type == "all" else book_type, category=category,
+                          limit=per_page, offset=(page - 1) * per_page)
+            found = catalog_search.search(conn, q, with_total=True, **kwargs)
+            results, total = found if found is not None else catalog_search.like_search(conn, q, **kwargs)
+        finally:
+            conn.close()
 
-    base_sql += " ORDER BY datetime(created_at) DESC"
+    return jsonify({
+        "query": q,
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "has_more": page * per_page < total,
+        "results": [{
+            "id": r["id"],
+            "title": r["title"],
+            "author": r["author"],
+            "category": r["category"],
+            "book_type": r["book_type"],
+            "cover_url": url_for("static", filename=r["cover_path"]) if r["cover_path"] else None,
+            "snippet": str(r["snippet"]) if r["snippet"] else None,
+            "score": r["score"],
+        } for r in results],
+    })
+
+
+@app.route("/api/manga/progress", methods=["GET", "POST"])
+def manga_progress():
+    """Reader position. POST {manga_id, chapter_id, page_index} (batched, see reading_progress.py);
+    GET ?manga_id= -> the resume point plus per-chapter progress for the whole manga."""
+    if "user_id" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    user_id = session["user_id"]
 
-    c.execute(base_sql, params)
-    mangas = c.fetchall()
-    conn.close()
+    if request.method == "GET":
+        manga_id = request.args.get("manga_id", type=int)
+        if not manga_id:
+            return jsonify({"error": "manga_id is required"}), 400
+        conn = get_conn()
+        try:
+            return jsonify(READING_PROGRESS.resume(conn, user_id, manga_id))
+        finally:
+            conn.close()
 
-    return render_template(
-        "manga.html",
-        mangas=mangas,
-        categories=categories,
-        selected_category=selected,
-        q=q,
-        body_class="manga-theme"
-    )
+    data = request.get_json(silent=True) or {}
+    try:
+        manga_id = int(data.get("manga_id"))
+        chapter_id = int(data.get("chapter_id"))
+        page_index = int(data.get("page_index", 0))
+    except (TypeError, ValueError):
+        return jsonify({"error": "manga_id, chapter_id and page_index must be integers"}), 400
+    if not 0 <= page_index <= reading_progress.MAX_PAGE_INDEX:
+        return jsonify({"error": "page_index out of range"}), 400
+    # a chapter that isn't part of the manga is dropped when the batch is written
+    READING_PROGRESS.record(user_id, manga_id, chapter_id, page_index)
+    return jsonify({"success": True})
+
+
+MANGA_CHAPTERS_QUERY = """
+    SELECT id, chapter_num, title, pdf_filename, created_at, page_count
+    FROM chapters
+    WHERE manga_id = ?
+    ORDER BY chapter_num ASC
+"""
 
 
 @app.route("/manga/read/<int:id>")
@@ -3110,13 +3228,10 @@ def read_manga(id):
         return redirect(url_for("manga"))
 
     # Get chapters for this manga
-    c.execute("""
-        SELECT id, chapter_num, title, pdf_filename, created_at, page_count
-        FROM chapters
-        WHERE manga_id = ?
-        ORDER BY chapter_num ASC
-    """, (id,))
+    c.execute(MANGA_CHAPTERS_QUERY, (id,))
     chapters = c.fetchall()
+    pages_by_chapter = chapter_pages.pages_for_manga(conn, id)
+    page_variants = _page_variants(conn, pages_by_chapter)
 
     # Get all manga for series list
     c.execute("""
@@ -3135,10 +3250,30 @@ def read_manga(id):
         manga=manga,
         chapters=chapters,
         related_manga=related_manga,
+        chapter_pages=_reader_pages(pages_by_chapter, page_variants),
         chapter=chapters[0] if chapters else None
     )
 
 
+def _reader_pages(pages_by_chapter, variants):
+    """chapter_pages rows trimmed to what the reader script needs, keyed by chapter id.
+
+    src is the 'full' WebP derivative when there is one; srcset lets narrow screens
+    pick a smaller one.
+    """
+    return {
+        chapter_id: [{'filename': p['filename'], 'url': media_url(p['path'], p['content_hash']),
+                      'src': image_src(p['path'], variants.get(p['path']), 'full'),
+                      'srcset': srcset_filter(variants.get(p['path'])),
+                      'width': p['width'], 'height': p['height'], 'mime': p['mime']} for p in pages]
+        for chapter_id, pages in pages_by_chapter.items()
+    }
+
+
+def _page_variants(conn, pages_by_chapter):
+    return image_variants.lookup(conn, [p['path'] for pages in pages_by_chapter.values() for p in pages])
+
+
 # ---------- Modern Manga Reader (v2) ----------
 @app.route("/manga/<int:id>")
 def manga_reader_v2(id):
@@ -3163,13 +3298,10 @@ def manga_reader_v2(id):
         return redirect(url_for("manga"))
 
     # Get chapters for this manga
-    c.execute("""
-        SELECT id, chapter_num, title, pdf_filename, created_at, page_count
-        FROM chapters
-        WHERE manga_id = ?
-        ORDER BY chapter_num ASC
-    """, (id,))
+    c.execute(MANGA_CHAPTERS_QUERY, (id,))
     chapters = c.fetchall()
+    pages_by_chapter = chapter_pages.pages_for_manga(conn, id)
+    page_variants = _page_variants(conn, pages_by_chapter)
 
     conn.close()
 
@@ -3177,6 +3309,7 @@ def manga_reader_v2(id):
         "manga_reader_new.html",
         manga=manga,
         chapters=chapters,
+        chapter_pages=_reader_pages(pages_by_chapter, page_variants),
         chapter=chapters[0] if chapters else None
     )
 
@@ -3211,7 +3344,8 @@ def upload_chapter(manga_id):
         chapters = c.fetchall()
         conn.close()
 
-        return render_template("upload_chapter.html", manga=manga, chapters=chapters)
+        return render_template("upload_chapter.html", manga=manga, chapters=chapters,
+                               job_id=request.args.get("job", type=int))
 
     # POST - upload chapter
     chapter_num = request.form.get("chapter_num", "").strip()
@@ -3256,6 +3390,7 @@ def upload_chapter(manga_id):
 
     page_count = 0
     pages_data = None
+    pdf_job = None
 
     if chapter_format == "pdf":
         # Handle PDF upload - extract pages as images
@@ -3271,38 +3406,19 @@ def upload_chapter(manga_id):
             flash("Only PDF files are allowed.", "danger")
             return redirect(url_for("upload_chapter", manga_id=manga_id))
         
-        # Save PDF temporarily
+        # Save PDF (kept until the conversion job has run)
         pdf_filename = secure_filename(chapter_pdf.filename)
-        pdf_path = os.path.join(UPLOAD_FOLDER_PDF, pdf_filename)
+        pdf_path = os.path.join(UPLOAD_FOLDER_PDF, f"manga_{manga_id}_ch{chapter_num}_{pdf_filename}")
         chapter_pdf.save(pdf_path)
         
         # Create chapter directory for images
         chapter_dir = os.path.join(UPLOAD_FOLDER_MANGA, f"manga_{manga_id}_ch{chapter_num}")
         os.makedirs(chapter_dir, exist_ok=True)
         
-        # Try to extract PDF pages as images
+        # Pages are extracted in the background (jobs.py / pdf_pages.py)
         if PDF_EXTRACTION_AVAILABLE:
-            try:
-                from PIL import Image
-                images = convert_from_path(pdf_path, dpi=150)
-                page_count = len(images)
-                
-                for idx, img in enumerate(images, 1):
-                    page_filename = f"page_{idx:03d}.png"
-                    img_path = os.path.join(chapter_dir, page_filename)
-                    img.save(img_path, 'PNG')
-                
-                pages_data = ",".join([f"page_{i:03d}.png" for i in range(1, page_count + 1)])
-                flash(f"PDF extracted successfully! {page_count} pages found.", "info")
-            except Exception as e:
-                # Fallback: store PDF filename if extraction fails
-                # Copy PDF to chapter directory so it can be displayed
-                import shutil
-                pdf_dest = os.path.join(chapter_dir, pdf_filename)
-                shutil.copy(pdf_path, pdf_dest)
-                pages_data = pdf_filename
-                page_count = 1
-                flash(f"PDF uploaded (extraction failed, will display PDF in reader): {str(e)}", "warning")
+            pdf_job = {'pdf_path': pdf_path, 'chapter_dir': chapter_pages.chapter_dir(manga_id, chapter_num),
+                       'dpi': pdf_pages.DPI}
         else:
             # If pdf2image not available, copy PDF to chapter directory
             import shutil
@@ -3313,9 +3429,9 @@ def upload_chapter(manga_id):
             flash("PDF uploaded (install pdf2image for page extraction: pip install pdf2image). PDF will display in reader.", "info")
     else:
         # Handle image uploads (multiple pages)
-        chapter_pages = request.files.getlist("chapter_pages")
+        page_uploads = request.files.getlist("chapter_pages")
         
-        if not chapter_pages or len(chapter_pages) == 0:
+        if not page_uploads or len(page_uploads) == 0:
             conn.close()
             flash("At least one image file is required.", "danger")
             return redirect(url_for("upload_chapter", manga_id=manga_id))
@@ -3326,7 +3442,7 @@ def upload_chapter(manga_id):
         
         page_files = []
         
-        for idx, page_file in enumerate(chapter_pages, 1):
+        for idx, page_file in enumerate(page_uploads, 1):
             if page_file and page_file.filename:
                 ext = page_file.filename.rsplit(".", 1)[-1].lower()
                 if ext in ALLOWED_IMG:
@@ -3349,7 +3465,23 @@ def upload_chapter(manga_id):
         INSERT INTO chapters (manga_id, chapter_num, title, pdf_filename, page_count)
         VALUES (?, ?, ?, ?, ?)
     """, (manga_id, chapter_num, chapter_title, pages_data, page_count))
+    chapter_id = c.lastrowid
+    if pages_data:
+        chapter_pages.record_pages(conn, chapter_id, chapter_pages.chapter_dir(manga_id, chapter_num),
+                                   pages_data.split(","))
     conn.commit()
+    _invalidate_pages(manga_id)
+    if pages_data:
+        _queue_image_variants(conn, [f"{chapter_pages.chapter_dir(manga_id, chapter_num)}/{f}"
+                                     for f in pages_data.split(",")])
+        _queue_page_ai(conn, chapter_id)
+
+    if pdf_job:
+        pdf_job['chapter_id'] = chapter_id
+        job_id = jobs.enqueue(conn, 'chapter_pdf', pdf_job, user_id=session.get("user_id"))
+        conn.close()
+        flash(f"Chapter {chapter_num} uploaded. Extracting PDF pages in the background...", "info")
+        return redirect(url_for("upload_chapter", manga_id=manga_id, job=job_id))
     conn.close()
 
     format_label = "PDF" if chapter_format == "pdf" else f"{page_count} pages"
@@ -3448,9 +3580,9 @@ def edit_chapter(manga_id, chapter_num):
             flash("Only PDF files are allowed.", "danger")
             return redirect(url_for("edit_chapter", manga_id=manga_id, chapter_num=chapter_num))
         
-        # Save PDF temporarily
+        # Save PDF (kept until the conversion job has run)
         pdf_filename = secure_filename(chapter_pdf.filename)
-        pdf_path = os.path.join(UPLOAD_FOLDER_PDF, pdf_filename)
+        pdf_path = os.path.join(UPLOAD_FOLDER_PDF, f"manga_{manga_id}_ch{chapter_num}_{pdf_filename}")
         chapter_pdf.save(pdf_path)
         
         # Create/clear chapter directory for images
@@ -3460,28 +3592,18 @@ def edit_chapter(manga_id, chapter_num):
             shutil.rmtree(chapter_dir)
         os.makedirs(chapter_dir, exist_ok=True)
         
-        # Try to extract PDF pages as images
+        # Pages are extracted in the background (jobs.py / pdf_pages.py)
         if PDF_EXTRACTION_AVAILABLE:
-            try:
-                from PIL import Image
-                images = convert_from_path(pdf_path, dpi=150)
-                page_count = len(images)
-                
-                for idx, img in enumerate(images, 1):
-                    page_filename = f"page_{idx:03d}.png"
-                    img_path = os.path.join(chapter_dir, page_filename)
-                    img.save(img_path, 'PNG')
-                
-                pages_data = ",".join([f"page_{i:03d}.png" for i in range(1, page_count + 1)])
-                flash(f"PDF extracted successfully! {page_count} pages found.", "info")
-            except Exception as e:
-                # Fallback: copy PDF to chapter directory
-                import shutil
-                pdf_dest = os.path.join(chapter_dir, pdf_filename)
-                shutil.copy(pdf_path, pdf_dest)
-                pages_data = pdf_filename
-                page_count = 1
-                flash(f"PDF uploaded (extraction failed, will display PDF in reader): {str(e)}", "warning")
+            c.execute("UPDATE chapters SET pdf_filename = NULL, page_count = 0 WHERE id = ?", (chapter_id,))
+            chapter_pages.record_pages(conn, chapter_id, chapter_pages.chapter_dir(manga_id, chapter_num), [])
+            conn.commit()
+            job_id = jobs.enqueue(conn, 'chapter_pdf', {
+                'pdf_path': pdf_path, 'chapter_id': chapter_id,
+                'chapter_dir': chapter_pages.chapter_dir(manga_id, chapter_num), 'dpi': pdf_pages.DPI,
+            }, user_id=session.get("user_id"))
+            conn.close()
+            flash(f"Chapter {chapter_num} updated. Extracting PDF pages in the background...", "info")
+            return redirect(url_for("upload_chapter", manga_id=manga_id, job=job_id))
         else:
             # Copy PDF to chapter directory if extraction not available
             import shutil
@@ -3497,12 +3619,14 @@ def edit_chapter(manga_id, chapter_num):
             SET pdf_filename = ?, page_count = ?
             WHERE id = ?
         """, (pages_data, page_count, chapter_id))
+        chapter_pages.record_pages(conn, chapter_id, chapter_pages.chapter_dir(manga_id, chapter_num),
+                                   pages_data.split(","))
     
     else:
         # Handle image uploads
-        chapter_pages = request.files.getlist("chapter_pages")
+        page_uploads = request.files.getlist("chapter_pages")
         
-        if not chapter_pages or len(chapter_pages) == 0:
+        if not page_uploads or len(page_uploads) == 0:
             conn.commit()
             conn.close()
             flash("No files selected. Chapter title updated.", "info")
@@ -3517,7 +3641,7 @@ def edit_chapter(manga_id, chapter_num):
         
         page_files = []
         
-        for idx, page_file in enumerate(chapter_pages, 1):
+        for idx, page_file in enumerate(page_uploads, 1):
             if page_file and page_file.filename:
                 ext = page_file.filename.rsplit(".", 1)[-1].lower()
                 if ext in ALLOWED_IMG:
@@ -3539,8 +3663,13 @@ def edit_chapter(manga_id, chapter_num):
             SET pdf_filename = ?, page_count = ?
             WHERE id = ?
         """, (pages_data, page_count, chapter_id))
+        chapter_pages.record_pages(conn, chapter_id, chapter_pages.chapter_dir(manga_id, chapter_num),
+                                   pages_data.split(","))
     
     conn.commit()
+    _queue_image_variants(conn, [f"{chapter_pages.chapter_dir(manga_id, chapter_num)}/{f}"
+                                 for f in pages_data.split(",")])
+    _queue_page_ai(conn, chapter_id)
     conn.close()
 
     format_label = "PDF" if chapter_format == "pdf" else f"{page_count} pages"
@@ -3577,8 +3706,10 @@ def delete_chapter_by_num(manga_id, chapter_num):
     
     # Delete from database
     c.execute("DELETE FROM chapters WHERE id = ?", (chapter_id,))
+    image_variants.remove_under(conn, chapter_pages.chapter_dir(manga_id, chapter_num))
     conn.commit()
     conn.close()
+    _invalidate_pages(manga_id)
 
     flash(f"Chapter {chapter_num} deleted successfully!", "success")
     return redirect(url_for("upload_chapter", manga_id=manga_id))
@@ -3646,40 +3777,66 @@ def get_chapter_pages(chapter_id):
         return jsonify({'error': 'login required'}), 401
     
     conn = get_conn()
-    c = conn.cursor()
-    
-    # Get chapter info
-    c.execute("""
-        SELECT id, manga_id, chapter_num, pdf_filename, page_count
-        FROM chapters
-        WHERE id = ?
-    """, (chapter_id,))
-    chapter = c.fetchone()
-    conn.close()
+    try:
+        exists = conn.execute("SELECT 1 FROM chapters WHERE id = ?", (chapter_id,)).fetchone()
+        if exists:
+            validators, not_modified = _not_modified(conn, 'chapter', chapter_id)
+            if not_modified:
+                return not_modified
+        rows = chapter_pages.get_pages(conn, chapter_id) if exists else []
+        variants = image_variants.lookup(conn, [page['path'] for page in rows])
+    finally:
+        conn.close()
     
-    if not chapter:
+    if not exists:
         return jsonify({'error': 'chapter not found'}), 404
     
-    chapter_id, manga_id, chapter_num, pdf_filename, page_count = chapter
+    # image pages only; PDF-only chapters are shown by the reader's PDF embed
+    pages = [{
+        'page_num': page['page_num'],
+        'url': media_url(page['path'], page['content_hash']),
+        'src': image_src(page['path'], variants.get(page['path']), 'full'),
+        'srcset': srcset_filter(variants.get(page['path'])),
+        'width': page['width'],
+        'height': page['height'],
+        'bytes': page['bytes'],
+        'mime': page['mime'],
+    } for page in rows if page['mime'].startswith('image/')]
     
-    # Get list of image files in chapter directory
-    chapter_dir = os.path.join(UPLOAD_FOLDER_MANGA, f"manga_{manga_id}_ch{chapter_num}")
-    pages = []
+    return _versioned_json(pages, validators)
+
+
+# API endpoint for background job status (polled by the upload page)
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job_status(job_id):
+    """Status and progress of a background job."""
+    if 'user_id' not in session:
+        return jsonify({'error': 'login required'}), 401
     
-    if os.path.exists(chapter_dir):
-        # Get all image files
-        image_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.webp'}
-        files = sorted([f for f in os.listdir(chapter_dir) 
-                       if os.path.splitext(f)[1].lower() in image_extensions],
-                      key=lambda x: int(''.join(filter(str.isdigit, x)) or '0'))
-        
-        for idx, filename in enumerate(files, 1):
-            pages.append({
-                'page_num': idx,
-                'url': f'/static/manga/manga_{manga_id}_ch{chapter_num}/{filename}'
-            })
+    conn = get_conn()
+    try:
+        job = jobs.get(conn, job_id)
+    finally:
+        conn.close()
     
-    return jsonify(pages)
+    if not job or (job['user_id'] != session['user_id'] and session.get('role') != 'admin'):
+        return jsonify({'error': 'job not found'}), 404
+    
+    return jsonify({
+        'id': job['id'],
+        'kind': job['kind'],
+        'status': job['status'],
+        'progress': job['progress'],
+        'total': job['total'],
+        'percent': int(100 * job['progress'] / job['total']) if job['total'] else (100 if job['status'] == 'done' else 0),
+        'message': job['message'],
+        'error': job['error'] if job['status'] == 'failed' else None,
+        'result': job['result'],
+        'attempts': job['attempts'],
+        'created_at': job['created_at'],
+        'started_at': job['started_at'],
+        'finished_at': job['finished_at'],
+    })
 
 
 # API endpoint to get chapters for a manga
@@ -3692,6 +3849,11 @@ def get_manga_chapters(manga_id):
     conn = get_conn()
     c = conn.cursor()
     
+    validators, not_modified = _not_modified(conn, 'manga_chapters', manga_id)
+    if not_modified:
+        conn.close()
+        return not_modified
+    
     # Get chapters
     c.execute("""
         SELECT id, chapter_num, title, page_count
@@ -3702,12 +3864,12 @@ def get_manga_chapters(manga_id):
     chapters = c.fetchall()
     conn.close()
     
-    return jsonify([{
+    return _versioned_json([{
         'id': ch[0],
         'chapter_num': ch[1],
         'title': ch[2],
         'page_count': ch[3]
-    } for ch in chapters])
+    } for ch in chapters], validators)
 
 
 # API endpoint to update chapter
@@ -3789,8 +3951,10 @@ def delete_chapter(chapter_id):
     try:
         # Delete chapter from database
         c.execute("DELETE FROM chapters WHERE id = ?", (chapter_id,))
+        image_variants.remove_under(conn, chapter_pages.chapter_dir(manga_id, chapter_num))
         conn.commit()
         conn.close()
+        _invalidate_pages(manga_id)
         
         # Optionally delete chapter files
         import shutil
@@ -3921,6 +4085,14 @@ def user_profile(user_id):
 
 
 # ---------- Manga Character Management ----------
+MANGA_CHARACTERS_QUERY = """
+    SELECT id, name, description, role, avatar_url
+    FROM manga_characters
+    WHERE manga_id = ?
+    ORDER BY id ASC
+"""
+
+
 @app.route('/api/manga/<int:manga_id>/characters', methods=['GET'])
 def get_manga_characters(manga_id):
     """Get all characters for a manga."""
@@ -3936,23 +4108,23 @@ def get_manga_characters(manga_id):
         conn.close()
         return jsonify({'error': 'manga not found'}), 404
     
+    validators, not_modified = _not_modified(conn, 'manga_characters', manga_id)
+    if not_modified:
+        conn.close()
+        return not_modified
+    
     # Get characters
-    c.execute("""
-        SELECT id, name, description, role, avatar_url
-        FROM manga_characters
-        WHERE manga_id = ?
-        ORDER BY id ASC
-    """, (manga_id,))
+    c.execute(MANGA_CHARACTERS_QUERY, (manga_id,))
     characters = c.fetchall()
     conn.close()
     
-    return jsonify([{
+    return _versioned_json([{
         'id': ch[0],
         'name': ch[1],
         'description': ch[2],
         'role': ch[3],
         'avatar_url': ch[4]
-    } for ch in characters])
+    } for ch in characters], validators)
 
 
 @app.route('/api/manga/<int:manga_id>/characters', methods=['POST'])
@@ -4145,26 +4317,30 @@ def about():
     if "user_id" not in session:
         return redirect(url_for("login"))
 
-    conn = get_conn()
-    c = conn.cursor()
-    rows = c.execute("""
-        SELECT full_name, role, bio, avatar_path, initials
-        FROM team
-        ORDER BY id
-    """).fetchall()
-    conn.close()
+    def build():
+        conn = get_conn()
+        c = conn.cursor()
+        rows = c.execute("""
+            SELECT full_name, role, bio, avatar_path, initials
+            FROM team
+            ORDER BY id
+        """).fetchall()
+        conn.close()
 
-    people = []
-    for full, role, bio, avatar_path, initials in rows:
-        people.append({
-            "name": full,
-            "role": role or "Developer",
-            "bio": bio or "Member of the NOVUS project.",
-            "initials": (initials or "".join(s[0] for s in full.split()[:2]).upper()),
-            "avatar": url_for("static", filename=avatar_path)
-                      if avatar_path else url_for("static", filename="img/person.png"),
-        })
-    return render_template("about.html", people=people)
+        people = []
+        for full, role, bio, avatar_path, initials in rows:
+            people.append({
+                "name": full,
+                "role": role or "Developer",
+                "bio": bio or "Member of the NOVUS project.",
+                "initials": (initials or "".join(s[0] for s in full.split()[:2]).upper()),
+                "avatar": url_for("static", filename=avatar_path)
+                          if avatar_path else url_for("static", filename="img/person.png"),
+            })
+        return {"people": people}, {}
+
+    fragment = _page_fragment(('about',), ('team',), "about.html", build)
+    return render_template("cached_page.html", blocks=fragment['blocks'])
 
 
 # ---------- My Uploads ----------
@@ -4178,60 +4354,81 @@ def my_uploads():
     role = session.get("role")
 
     conn = get_conn()
-    c = conn.cursor()
 
-    if role == "admin":
-        c.execute("""
-            SELECT id, title, author,
-                   COALESCE(category,'General') AS category,
-                   pdf_filename,
-                   audio_filename,
-                   cover_path,
-                   created_at,
-                   COALESCE(book_type, 'book') AS book_type
-            FROM books
-            ORDER BY datetime(created_at) DESC
-        """)
-    else:
-        c.execute("""
-            SELECT id, title, author,
-                   COALESCE(category,'General') AS category,
-                   pdf_filename,
-                   audio_filename,
-                   cover_path,
-                   created_at,
-                   COALESCE(book_type, 'book') AS book_type
-            FROM books
-            WHERE uploader_id = ?
-            ORDER BY datetime(created_at) DESC
-        """, (user_id,))
-    books_raw = c.fetchall()
-
-    # Get user's favorite book IDs for showing heart icons
-    user_favorites = set()
-    if "user_id" in session:
-        c.execute("SELECT book_id FROM favorites WHERE user_id = ?", (session["user_id"],))
-        user_favorites = {row[0] for row in c.fetchall()}
-    
-    # Add favorite status to each book (as a boolean flag)
-    books = []
-    for book in books_raw:
-        is_favorited = book[0] in user_favorites
-        books.append(list(book) + [is_favorited])
+    try:
+        page = _uploads_page(conn, user_id, role, request.args.get("cursor"),
+                             pagination.page_size(request.args.get("limit")))
+    except pagination.InvalidCursor:
+        page = _uploads_page(conn, user_id, role, None, pagination.DEFAULT_PAGE_SIZE)
+    books, manga_chapters = _upload_cards(conn, user_id, page.rows)
+    conn.close()
+
+    return render_template("my_uploads.html", books=books, is_admin=(role == "admin"), manga_chapters=manga_chapters,
+                           next_cursor=page.next_cursor)
+
+
+UPLOADS_PAGE_SELECT = """
+    SELECT id, title, author,
+           COALESCE(category,'General') AS category,
+           pdf_filename,
+           audio_filename,
+           cover_path,
+           created_at,
+           COALESCE(book_type, 'book') AS book_type
+    FROM books
+"""
+
+
+def _uploads_where(user_id, role):
+    """Admins page through the whole catalog, publishers through their own uploads."""
+    return ([], []) if role == "admin" else (["uploader_id = ?"], [user_id])
+
+
+def _uploads_page(conn, user_id, role, cursor, limit):
+    where, params = _uploads_where(user_id, role)
+    return pagination.keyset_page(conn, UPLOADS_PAGE_SELECT, where, params,
+                                  ('created_at', 'id'), lambda row: (row[7], row[0]), limit, cursor)
+
 
-    # Fetch chapter counts for manga
+def _upload_cards(conn, user_id, rows):
+    """Rows for one page plus favorite flags (b[9]) and chapter counts for the manga on it."""
+    user_favorites = _favorite_ids(conn, user_id, [row[0] for row in rows])
+    books = [list(row) + [row[0] in user_favorites] for row in rows]
+
+    manga_ids = [book[0] for book in books if book[8] == 'manga']
     manga_chapters = {}
-    for book in books:
-        if book[8] == 'manga':  # book_type
-            c.execute("""
-                SELECT COUNT(*) FROM chapters WHERE manga_id = ?
-            """, (book[0],))
-            count = c.fetchone()[0]
-            manga_chapters[book[0]] = count
+    if manga_ids:
+        marks = ",".join("?" * len(manga_ids))
+        manga_chapters = {mid: 0 for mid in manga_ids}
+        manga_chapters.update(conn.execute(
+            f"SELECT manga_id, COUNT(*) FROM chapters WHERE manga_id IN ({marks}) GROUP BY manga_id",
+            manga_ids).fetchall())
+    return books, manga_chapters
+
+
+@app.route("/api/my-uploads")
+def api_my_uploads():
+    """Next page of my_uploads for "load more": ?cursor=&limit="""
+    role = session.get("role")
+    if "user_id" not in session:
+        return jsonify({"error": "Not logged in"}), 401
+    if role not in ("admin", "publisher"):
+        return jsonify({"error": "Forbidden"}), 403
 
-    conn.close()
+    conn = get_conn()
+    try:
+        page = _uploads_page(conn, session["user_id"], role, request.args.get("cursor"),
+                             pagination.page_size(request.args.get("limit")))
+        books, manga_chapters = _upload_cards(conn, session["user_id"], page.rows)
+    except pagination.InvalidCursor:
+        return jsonify({"error": "Invalid cursor"}), 400
+    finally:
+        conn.close()
 
-    return render_template("my_uploads.html", books=books, is_admin=(role == "admin"), manga_chapters=manga_chapters)
+    items = [{"id": b[0], "title": b[1], "author": b[2], "category": b[3], "book_type": b[8],
+              "created_at": b[7], "chapters": manga_chapters.get(b[0])} for b in books]
+    html = render_template("partials/upload_cards.html", books=books, manga_chapters=manga_chapters)
+    return _page_json(items, html, page.next_cursor)
 
 
 # ---------- Team Admin ----------
@@ -4278,6 +4475,7 @@ def admin_set_plan(user_id):
     c.execute("UPDATE users SET plan=?, plan_expires_at=? WHERE id=?", (plan, expires_at, user_id))
     conn.commit()
     conn.close()
+    USER_STATE.invalidate(user_id)
 
     flash(f"Plan updated to {plan}.", "success")
     return redirect(url_for("user_management"))
@@ -4315,6 +4513,7 @@ def team_admin():
             )
             conn.commit()
             conn.close()
+            FRAGMENTS.invalidate('team')
             flash("Team member added.", "success")
             return redirect(url_for("team_admin"))
 
@@ -4344,6 +4543,7 @@ def team_delete(member_id):
     c.execute("DELETE FROM team WHERE id=?", (member_id,))
     conn.commit()
     conn.close()
+    FRAGMENTS.invalidate('team')
     flash("Team member deleted.", "success")
     return redirect(url_for("team_admin"))
 
@@ -4373,6 +4573,7 @@ def user_ban(user_id):
     c.execute("UPDATE users SET status='banned', is_banned=1 WHERE id=?", (user_id,))
     conn.commit()
     conn.close()
+    USER_STATE.invalidate(user_id)
 
     # Log admin action
     admin_id = session.get("user_id")
@@ -4390,6 +4591,7 @@ def user_unban(user_id):
     c.execute("UPDATE users SET status='active', is_banned=0 WHERE id=?", (user_id,))
     conn.commit()
     conn.close()
+    USER_STATE.invalidate(user_id)
 
     # Log admin action
     admin_id = session.get("user_id")
@@ -4424,6 +4626,7 @@ def user_delete(user_id):
     c.execute("DELETE FROM users WHERE id=?", (user_id,))
     conn.commit()
     conn.close()
+    USER_STATE.invalidate(user_id)
 
     # Log admin action
     admin_id = session.get("user_id")
@@ -4436,7 +4639,8 @@ def user_delete(user_id):
 @app.route("/faq")
 def faq():
     """Display FAQ & Guidelines page"""
-    return render_template("faq.html")
+    fragment = _page_fragment(('faq',), (), "faq.html", lambda: ({}, {}))
+    return render_template("cached_page.html", blocks=fragment['blocks'])
 
 
 # -------------------- ERROR HANDLERS --------------------
@@ -4446,24 +4650,27 @@ def request_entity_too_large(error):
     flash("File upload failed: The uploaded file is too large. Please check file size limits.", "danger")
     return redirect(request.url)
 
-# -------------------- MAIN --------------------
-if __name__ == "__main__":
-    init_db()
-    # Bind to all interfaces and run without the reloader so external tests can connect reliably
-    debug_env = os.environ.get('FLASK_DEBUG', os.environ.get('FLASK_ENV', '0'))
-    debug_mode = str(debug_env).lower() in ('1', 'true', 'yes', 'debug')
-    app.run(host='0.0.0.0', port=5000, debug=debug_mode, use_reloader=False)
-
 # Ensure DB is initialized exactly once when the app receives requests
 _db_init_done = False
 @app.before_request
 def _ensure_db_initialized():
     global _db_init_done
     if not _db_init_done:
+        try:
+            configure_storage()
+        except Exception as e:
+            logger.error(f"Storage configuration failed: {e}")
         try:
             init_db()
-        except Exception:
-            pass
+        except Exception as e:
+            logger.error(f"Schema migration failed: {e}")
+        if JOBS_EMBEDDED_WORKER:
+            JOB_WORKER.start()
+            PAGE_AI_WORKER.start()
+        RETENTION_SCHEDULER.start()
+        POPULARITY.start()
+        POPULARITY_SCHEDULER.start()
+        RECOMMENDER_SCHEDULER.start()
         _db_init_done = True
 
 
@@ -4497,11 +4704,14 @@ def _dev_run_manga_tests():
 # -------------------- IMAGE-TO-SUMMARY AI --------------------
 try:
     from image_summary_ai import ImageSummaryAI
-    IMAGE_AI_AVAILABLE = True
+    IMAGE_AI_AVAILABLE = ai_client.REQUESTS_AVAILABLE
 except ImportError:
     IMAGE_AI_AVAILABLE = False
     print('Warning: image_summary_ai module not found')
 
+# one instance for every request; it talks through the process-wide ai_client
+IMAGE_AI = ImageSummaryAI() if IMAGE_AI_AVAILABLE else None
+
 
 @app.route('/api/manga/page/<int:chapter_id>/<int:page_num>/summarize', methods=['POST'])
 def summarize_manga_page(chapter_id, page_num):
@@ -4509,130 +4719,126 @@ def summarize_manga_page(chapter_id, page_num):
     if 'user_id' not in session:
         return jsonify({'error': 'login required'}), 401
     
-    if not IMAGE_AI_AVAILABLE:
-        return jsonify({'error': 'AI summarization not available'}), 503
-    
     try:
         conn = get_conn()
-        c = conn.cursor()
         
-        # Get chapter and verify access
-        c.execute("""
-            SELECT ch.id, ch.manga_id, b.id
-            FROM chapters ch
-            JOIN books b ON ch.manga_id = b.id
-            WHERE ch.id = ?
-        """, (chapter_id,))
-        chapter_info = c.fetchone()
+        # Page metadata and file path from chapter_pages
+        page = chapter_pages.get_page(conn, chapter_id, page_num)
+        if not page:
+            conn.close()
+            return jsonify({'error': 'page not found'}), 404
         
-        if not chapter_info:
+        # Pre-generated after upload (page_ai.py)
+        stored = page_ai.stored(conn, page)
+        if stored and stored['summary']:
             conn.close()
-            return jsonify({'error': 'chapter not found'}), 404
+            return jsonify({'success': True, 'page_num': page_num, 'summary': stored['summary'], 'cached': True})
         
-        # Construct image path
-        manga_id = chapter_info[1]
-        image_path = os.path.join(
-            UPLOAD_FOLDER_MANGA,
-            f"manga_{manga_id}",
-            f"chapter_{chapter_id}",
-            f"page_{page_num:03d}.jpg"
-        )
+        if not IMAGE_AI_AVAILABLE:
+            conn.close()
+            return jsonify({'error': 'AI summarization not available'}), 503
+        
+        image_path = chapter_pages.page_file(page)
         
         # Check if image exists
         if not os.path.exists(image_path):
             conn.close()
             return jsonify({'error': 'page image not found'}), 404
         
-        # Generate summary
-        ai = ImageSummaryAI()
-        summary = ai.summarize_manga_page(image_path)
+        # Generate summary (or reuse the one made for an identical image)
+        summary, cached = ai_cache.image_result(AI_RESULTS, IMAGE_AI, 'manga_page', image_path,
+                                                page['content_hash'])
         
         # Store summary in database
-        c.execute("""
-            INSERT OR REPLACE INTO image_summaries 
-            (chapter_id, page_num, image_path, summary)
-            VALUES (?, ?, ?, ?)
-        """, (chapter_id, page_num, image_path, summary))
+        page_ai.store(conn, chapter_id, page_num, page['content_hash'], summary=summary)
         conn.commit()
         conn.close()
         
         return jsonify({
             'success': True,
             'page_num': page_num,
-            'summary': summary
+            'summary': summary,
+            'cached': cached
         })
     
     except Exception as e:
         return jsonify({'error': f'Summarization failed: {str(e)}'}), 500
+
+
+@app.route('/api/manga/page/<int:chapter_id>/<int:page_num>/summarize/stream', methods=['POST'])
+def summarize_manga_page_stream(chapter_id, page_num):
+    """summarize_manga_page as Server-Sent Events (see page_ai.stream_summary)"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'login required'}), 401
+    
+    conn = get_conn()
+    page = chapter_pages.get_page(conn, chapter_id, page_num)
+    if not page:
+        conn.close()
+        return jsonify({'error': 'page not found'}), 404
     
+    stored = page_ai.stored(conn, page)
+    if not (stored and stored['summary']):
+        if not IMAGE_AI_AVAILABLE:
+            conn.close()
+            return jsonify({'error': 'AI summarization not available'}), 503
+        if not os.path.exists(chapter_pages.page_file(page)):
+            conn.close()
+            return jsonify({'error': 'page image not found'}), 404
+    
+    return _event_stream(page_ai.stream_summary(conn, page, IMAGE_AI, AI_RESULTS))
+
+
+@app.route('/api/manga/page/<int:chapter_id>/<int:page_num>/extract-text', methods=['POST'])
+def extract_manga_page_text(chapter_id, page_num):
+    """Extract text from a manga page image"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'login required'}), 401
     
-    @app.route('/api/manga/page/<int:chapter_id>/<int:page_num>/extract-text', methods=['POST'])
-    def extract_manga_page_text(chapter_id, page_num):
-        """Extract text from a manga page image"""
-        if 'user_id' not in session:
-            return jsonify({'error': 'login required'}), 401
+    try:
+        conn = get_conn()
+        page = chapter_pages.get_page(conn, chapter_id, page_num)
+        
+        if not page:
+            conn.close()
+            return jsonify({'error': 'page not found'}), 404
+        
+        # Pre-generated after upload (page_ai.py)
+        stored = page_ai.stored(conn, page)
+        if stored and stored['extracted_text']:
+            conn.close()
+            return jsonify({'success': True, 'page_num': page_num, 'extracted_text': stored['extracted_text'],
+                            'cached': True})
         
         if not IMAGE_AI_AVAILABLE:
+            conn.close()
             return jsonify({'error': 'Text extraction not available'}), 503
         
-        try:
-            conn = get_conn()
-            c = conn.cursor()
-            
-            # Get chapter info
-            c.execute("""
-                SELECT manga_id, chapter_num, pdf_filename
-                FROM chapters
-                WHERE id = ?
-            """, (chapter_id,))
-            chapter_info = c.fetchone()
-            
-            if not chapter_info:
-                conn.close()
-                return jsonify({'error': 'chapter not found'}), 404
-            
-            manga_id, chapter_num, pdf_filename = chapter_info
-            
-            # Get page files
-            if pdf_filename and ',' in pdf_filename:
-                page_files = pdf_filename.split(',')
-            else:
-                page_files = [pdf_filename] if pdf_filename else []
-            
-            if page_num < 1 or page_num > len(page_files):
-                conn.close()
-                return jsonify({'error': 'invalid page number'}), 400
-            
-            page_filename = page_files[page_num - 1]
-            
-            # Construct image path
-            image_path = os.path.join(
-                UPLOAD_FOLDER_MANGA,
-                f"manga_{manga_id}_ch{chapter_num}",
-                page_filename
-            )
-            
-            # Check if image exists
-            if not os.path.exists(image_path):
-                conn.close()
-                return jsonify({'error': 'page image not found'}), 404
-            
-            # Extract text
-            ai = ImageSummaryAI()
-            text = ai.extract_text_from_image(image_path)
-            
+        image_path = chapter_pages.page_file(page)
+        
+        # Check if image exists
+        if not os.path.exists(image_path):
             conn.close()
-            
-            return jsonify({
-                'success': True,
-                'page_num': page_num,
-                'extracted_text': text
-            })
+            return jsonify({'error': 'page image not found'}), 404
         
-        except Exception as e:
-            return jsonify({'error': f'Text extraction failed: {str(e)}'}), 500
-    
+        # Extract text
+        text, cached = ai_cache.image_result(AI_RESULTS, IMAGE_AI, 'image_text', image_path,
+                                             page['content_hash'])
+        page_ai.store(conn, chapter_id, page_num, page['content_hash'], text=text)
+        conn.commit()
+        conn.close()
+        
+        return jsonify({
+            'success': True,
+            'page_num': page_num,
+            'extracted_text': text,
+            'cached': cached
+        })
     
+    except Exception as e:
+        return jsonify({'error': f'Text extraction failed: {str(e)}'}), 500
+
+
 @app.route('/api/book/<int:book_id>/cover/analyze', methods=['POST'])
 def analyze_book_cover(book_id):
     """Analyze book/manga cover image using AI"""
@@ -4660,14 +4866,14 @@ def analyze_book_cover(book_id):
             return jsonify({'error': 'cover image not found'}), 404
         
         # Analyze cover
-        ai = ImageSummaryAI()
-        analysis = ai.summarize_book_cover(cover_path)
-        
         conn.close()
+        analysis, cached = ai_cache.image_result(AI_RESULTS, IMAGE_AI, 'book_cover', cover_path)
+        
         return jsonify({
             'success': True,
             'book_id': book_id,
-            'analysis': analysis
+            'analysis': analysis,
+            'cached': cached
         })
     
     except Exception as e:
@@ -4699,19 +4905,30 @@ def extract_image_text():
         image_file.save(temp_path)
         
         # Extract text
-        ai = ImageSummaryAI()
-        text = ai.extract_text_from_image(temp_path)
-        
-        # Clean up temp file
         try:
-            os.remove(temp_path)
-        except:
-            pass
+            text, cached = ai_cache.image_result(AI_RESULTS, IMAGE_AI, 'image_text', temp_path)
+        finally:
+            # Clean up temp file
+            try:
+                os.remove(temp_path)
+            except:
+                pass
         
         return jsonify({
             'success': True,
-            'extracted_text': text
+            'extracted_text': text,
+            'cached': cached
         })
     
     except Exception as e:
         return jsonify({'error': f'Text extraction failed: {str(e)}'}), 500
+
+
+# -------------------- MAIN --------------------
+if __name__ == "__main__":
+    configure_storage()
+    init_db()
+    # Bind to all interfaces and run without the reloader so external tests can connect reliably
+    debug_env = os.environ.get('FLASK_DEBUG', os.environ.get('FLASK_ENV', '0'))
+    debug_mode = str(debug_env).lower() in ('1', 'true', 'yes', 'debug')
+    app.run(host='0.0.0.0', port=5000, debug=debug_mode, use_reloader=False)
@@ -0,0 +1,246 @@
+"""
+Catalog Full-Text Search
+SQLite FTS5 index over book/manga title, author, category, description and
+manga character names, kept in sync with books/manga_characters by triggers.
+Results are ranked with bm25, support prefix matching ("drag" finds
+"Dragon") and carry an HTML-safe highlighted snippet.
+
+CLI:  python catalog_search.py reindex [--db PATH]
+"""
+
+import os
+import re
+import sqlite3
+import logging
+
+from markupsafe import Markup, escape
+
+logger = logging.getLogger('novus.search')
+
+FTS_TABLE = 'books_fts'
+
+# bm25 column weights: title, author, category, description, characters
+BM25_WEIGHTS = (10.0, 5.0, 2.0, 1.0, 3.0)
+
+_CHARACTERS_SQL = "(SELECT group_concat(name, ' ') FROM manga_characters WHERE manga_id = {ref})"
+
+SCHEMA = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        title, author, category, description, characters,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_fts_after_insert AFTER INSERT ON books
+    BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, title, author, category, description, characters)
+        VALUES (NEW.id, NEW.title, NEW.author, NEW.category, NEW.description,
+                {_CHARACTERS_SQL.format(ref='NEW.id')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_fts_after_update
+    AFTER UPDATE OF title, author, category, description ON books
+    BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+        INSERT INTO {FTS_TABLE} (rowid, title, author, category, description, characters)
+        VALUES (NEW.id, NEW.title, NEW.author, NEW.category, NEW.description,
+                {_CHARACTERS_SQL.format(ref='NEW.id')});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_fts_after_delete AFTER DELETE ON books
+    BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = OLD.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_fts_characters_insert AFTER INSERT ON manga_characters
+    BEGIN
+        UPDATE {FTS_TABLE} SET characters = {_CHARACTERS_SQL.format(ref='NEW.manga_id')}
+        WHERE rowid = NEW.manga_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_fts_characters_update AFTER UPDATE ON manga_characters
+    BEGIN
+        UPDATE {FTS_TABLE} SET characters = {_CHARACTERS_SQL.format(ref='OLD.manga_id')}
+        WHERE rowid = OLD.manga_id;
+        UPDATE {FTS_TABLE} SET characters = {_CHARACTERS_SQL.format(ref='NEW.manga_id')}
+        WHERE rowid = NEW.manga_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS books_fts_characters_delete AFTER DELETE ON manga_characters
+    BEGIN
+        UPDATE {FTS_TABLE} SET characters = {_CHARACTERS_SQL.format(ref='OLD.manga_id')}
+        WHERE rowid = OLD.manga_id;
+    END
+    """,
+]
+
+
+def index_exists(conn):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (FTS_TABLE,)
+    ).fetchone() is not None
+
+
+def create_index(conn):
+    """Create the FTS table and sync triggers. Returns False when FTS5 is unavailable."""
+    try:
+        for sql in SCHEMA:
+            conn.execute(sql)
+    except sqlite3.OperationalError as e:
+        if 'fts5' in str(e).lower():
+            logger.warning("SQLite build has no FTS5; catalog search falls back to LIKE.")
+            return False
+        raise
+    return True
+
+
+def rebuild(conn):
+    """Repopulate the index from books + manga_characters. Returns the row count."""
+    conn.execute(f"DELETE FROM {FTS_TABLE}")
+    conn.execute(f"""
+        INSERT INTO {FTS_TABLE} (rowid, title, author, category, description, characters)
+        SELECT b.id, b.title, b.author, b.category, b.description,
+               {_CHARACTERS_SQL.format(ref='b.id')}
+        FROM books b
+    """)
+    return conn.execute(f"SELECT COUNT(*) FROM {FTS_TABLE}").fetchone()[0]
+
+
+# -------------------- QUERYING --------------------
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every word must match, as a prefix."""
+    tokens = _TOKEN.findall((text or '').lower())[:12]
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+
+# control characters as snippet markers so highlighting survives HTML escaping
+_HL_OPEN, _HL_CLOSE = '\x02', '\x03'
+
+
+def _highlight(raw):
+    if not raw:
+        return None
+    html = str(escape(raw))
+    return Markup(html.replace(_HL_OPEN, '<mark>').replace(_HL_CLOSE, '</mark>'))
+
+
+def _type_clause(book_type):
+    if book_type == 'manga':
+        return " AND COALESCE(b.book_type, 'book') = 'manga'"
+    if book_type == 'book':
+        return " AND COALESCE(b.book_type, 'book') != 'manga'"
+    return ""
+
+
+def search(conn, text, book_type=None, category=None, limit=20, offset=0, with_total=False):
+    """Ranked catalog search.
+
+    Returns a list of dicts (id, title, author, category, pdf_filename,
+    audio_filename, cover_path, book_type, snippet, score), best match first,
+    or None when FTS search can't be used (no index / nothing searchable) so
+    the caller can fall back. With with_total=True returns (results, total).
+    """
+    match = build_match_query(text)
+    if not match or not index_exists(conn):
+        return None
+
+    where = f"{FTS_TABLE} MATCH ?" + _type_clause(book_type)
+    params = [match]
+    if category:
+        where += " AND COALESCE(b.category, 'General') = ?"
+        params.append(category)
+
+    weights = ', '.join(str(w) for w in BM25_WEIGHTS)
+    rows = conn.execute(f"""
+        SELECT b.id, b.title, b.author, COALESCE(b.category, 'General'),
+               b.pdf_filename, b.audio_filename, b.cover_path,
+               COALESCE(b.book_type, 'book'),
+               snippet({FTS_TABLE}, -1, '{_HL_OPEN}', '{_HL_CLOSE}', '…', 12),
+               bm25({FTS_TABLE}, {weights}) AS score
+        FROM {FTS_TABLE}
+        JOIN books b ON b.id = {FTS_TABLE}.rowid
+        WHERE {where}
+        ORDER BY score
+        LIMIT ? OFFSET ?
+    """, params + [limit, offset]).fetchall()
+
+    results = [{
+        'id': r[0], 'title': r[1], 'author': r[2], 'category': r[3],
+        'pdf_filename': r[4], 'audio_filename': r[5], 'cover_path': r[6],
+        'book_type': r[7], 'snippet': _highlight(r[8]), 'score': round(-r[9], 4),
+    } for r in rows]
+
+    if not with_total:
+        return results
+    total = conn.execute(f"""
+        SELECT COUNT(*) FROM {FTS_TABLE}
+        JOIN books b ON b.id = {FTS_TABLE}.rowid
+        WHERE {where}
+    """, params).fetchone()[0]
+    return results, total
+
+
+def like_search(conn, text, book_type=None, category=None, limit=20, offset=0):
+    """Fallback for builds without FTS5: unranked title/author LIKE, newest first.
+
+    Same result shape as search(..., with_total=True).
+    """
+    where = "(b.title LIKE ? OR b.author LIKE ?)" + _type_clause(book_type)
+    params = [f"%{text}%", f"%{text}%"]
+    if category:
+        where += " AND COALESCE(b.category, 'General') = ?"
+        params.append(category)
+    rows = conn.execute(f"""
+        SELECT b.id, b.title, b.author, COALESCE(b.category, 'General'),
+               b.pdf_filename, b.audio_filename, b.cover_path,
+               COALESCE(b.book_type, 'book')
+        FROM books b
+        WHERE {where}
+        ORDER BY datetime(b.created_at) DESC
+        LIMIT ? OFFSET ?
+    """, params + [limit, offset]).fetchall()
+    total = conn.execute(f"SELECT COUNT(*) FROM books b WHERE {where}", params).fetchone()[0]
+    results = [{
+        'id': r[0], 'title': r[1], 'author': r[2], 'category': r[3],
+        'pdf_filename': r[4], 'audio_filename': r[5], 'cover_path': r[6],
+        'book_type': r[7], 'snippet': None, 'score': None,
+    } for r in rows]
+    return results, total
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    import argparse
+
+    default_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), "library.db")
+    parser = argparse.ArgumentParser(prog="python catalog_search.py", description="Catalog search index tools")
+    parser.add_argument("command", choices=["reindex"])
+    parser.add_argument("--db", default=default_db)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        if not create_index(conn):
+            print("FTS5 is not available in this SQLite build.")
+            return 1
+        count = rebuild(conn)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Reindexed {count} catalog entries in {args.db}")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
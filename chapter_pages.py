@@ -0,0 +1,181 @@
+"""
+Chapter Page Storage
+One row per manga chapter page in the chapter_pages table (path, size,
+dimensions, content hash, mime type), written when a chapter is uploaded so
+readers and the page APIs get page metadata from a single indexed query
+instead of listing the chapter directory and parsing filenames.
+
+Paths are stored relative to static/, e.g. "manga/manga_6_ch1/page_001.png".
+
+CLI:  python chapter_pages.py backfill [--db PATH]
+"""
+
+import os
+import hashlib
+import logging
+import mimetypes
+import sqlite3
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger('novus.chapter_pages')
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_ROOT = os.path.join(APP_ROOT, "static")
+
+PAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.pdf'}
+
+PAGE_COLUMNS = "chapter_id, page_num, path, width, height, bytes, content_hash, mime"
+
+
+def chapter_dir(manga_id, chapter_num):
+    """Chapter directory relative to static/."""
+    return f"manga/manga_{manga_id}_ch{chapter_num}"
+
+
+def probe(file_path):
+    """Size, sha256, mime type and (for images) pixel dimensions of one page file."""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 16), b''):
+            digest.update(block)
+    mime = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+    width = height = None
+    if PIL_AVAILABLE and mime.startswith('image/'):
+        try:
+            with Image.open(file_path) as img:
+                width, height = img.size
+        except Exception as e:
+            logger.warning(f"Could not read image size of {file_path}: {e}")
+    return {
+        'width': width,
+        'height': height,
+        'bytes': os.path.getsize(file_path),
+        'content_hash': digest.hexdigest(),
+        'mime': mime,
+    }
+
+
+def _page_number(filename):
+    return int(''.join(filter(str.isdigit, filename)) or '0')
+
+
+def list_chapter_files(rel_dir, static_root=STATIC_ROOT):
+    """Page files in a chapter directory, in reading order."""
+    full_dir = os.path.join(static_root, rel_dir)
+    if not os.path.isdir(full_dir):
+        return []
+    files = [f for f in os.listdir(full_dir) if os.path.splitext(f)[1].lower() in PAGE_EXTENSIONS]
+    return sorted(files, key=_page_number)
+
+
+def record_pages(conn, chapter_id, rel_dir, filenames, static_root=STATIC_ROOT):
+    """Replace the chapter's page rows with filenames (in reading order).
+
+    Files that are missing on disk are skipped. Returns the number of pages stored.
+    """
+    conn.execute("DELETE FROM chapter_pages WHERE chapter_id = ?", (chapter_id,))
+    rows = []
+    for filename in filenames:
+        path = f"{rel_dir}/{filename}"
+        full_path = os.path.join(static_root, path)
+        if not os.path.isfile(full_path):
+            logger.warning(f"Chapter {chapter_id}: page file {path} not found, skipped")
+            continue
+        meta = probe(full_path)
+        rows.append((chapter_id, len(rows) + 1, path, meta['width'], meta['height'],
+                     meta['bytes'], meta['content_hash'], meta['mime']))
+    conn.executemany(f"INSERT INTO chapter_pages ({PAGE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    return len(rows)
+
+
+def backfill(conn, static_root=STATIC_ROOT, only_missing=True):
+    """Build page rows for existing chapters from pdf_filename, or the directory listing.
+
+    Returns {chapter_id: pages stored}.
+    """
+    sql = "SELECT id, manga_id, chapter_num, pdf_filename FROM chapters"
+    if only_missing:
+        sql += " WHERE NOT EXISTS (SELECT 1 FROM chapter_pages p WHERE p.chapter_id = chapters.id)"
+    done = {}
+    for chapter_id, manga_id, chapter_num, pdf_filename in conn.execute(sql).fetchall():
+        rel_dir = chapter_dir(manga_id, chapter_num)
+        filenames = [f.strip() for f in (pdf_filename or '').split(',') if f.strip()]
+        if not all(os.path.isfile(os.path.join(static_root, rel_dir, f)) for f in filenames):
+            filenames = []
+        done[chapter_id] = record_pages(conn, chapter_id, rel_dir,
+                                        filenames or list_chapter_files(rel_dir, static_root),
+                                        static_root)
+    return done
+
+
+# -------------------- READS --------------------
+def _as_dict(row):
+    return {
+        'chapter_id': row[0], 'page_num': row[1], 'path': row[2],
+        'width': row[3], 'height': row[4], 'bytes': row[5],
+        'content_hash': row[6], 'mime': row[7],
+        'filename': row[2].rsplit('/', 1)[-1],
+    }
+
+
+def get_pages(conn, chapter_id):
+    rows = conn.execute(f"SELECT {PAGE_COLUMNS} FROM chapter_pages WHERE chapter_id = ? ORDER BY page_num",
+                        (chapter_id,)).fetchall()
+    return [_as_dict(row) for row in rows]
+
+
+def get_page(conn, chapter_id, page_num):
+    row = conn.execute(f"SELECT {PAGE_COLUMNS} FROM chapter_pages WHERE chapter_id = ? AND page_num = ?",
+                       (chapter_id, page_num)).fetchone()
+    return _as_dict(row) if row else None
+
+
+def pages_for_manga(conn, manga_id):
+    """{chapter_id: [page, ...]} for every chapter of a manga, in one query."""
+    rows = conn.execute(f"""
+        SELECT {', '.join('p.' + col for col in PAGE_COLUMNS.split(', '))}
+        FROM chapters ch
+        JOIN chapter_pages p ON p.chapter_id = ch.id
+        WHERE ch.manga_id = ?
+        ORDER BY ch.chapter_num, p.page_num
+    """, (manga_id,)).fetchall()
+    pages = {}
+    for row in rows:
+        pages.setdefault(row[0], []).append(_as_dict(row))
+    return pages
+
+
+def page_file(page, static_root=STATIC_ROOT):
+    """Absolute path of a page returned by get_page()/get_pages()."""
+    return os.path.join(static_root, *page['path'].split('/'))
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python chapter_pages.py", description="Chapter page table tools")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--db", default=os.path.join(APP_ROOT, "library.db"))
+    parser.add_argument("--all", action="store_true", help="rebuild every chapter, not only ones without pages")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        done = backfill(conn, only_missing=not args.all)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Backfilled {len(done)} chapters, {sum(done.values())} pages")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
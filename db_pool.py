@@ -0,0 +1,210 @@
+"""
+SQLite Connection Pool
+Keeps a small per-thread pool of SQLite connections and binds one of them to
+each Flask app/request context, so a request that calls get_conn() several
+times (check_banned, the handler, log_system_event, ...) reuses one connection
+instead of opening a new one each time.
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from flask import g, has_app_context
+
+
+class ConnectionPool:
+    """Per-thread pool of configured SQLite connections."""
+
+    def __init__(self, db_path, max_idle=2, timeout=5.0, pragmas=None, on_connect=None,
+                 retry=None):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.timeout = timeout
+        # list of (name, value) pairs applied to every new connection
+        self.pragmas = list(pragmas or [])
+        # optional callable(conn) run after the pragmas
+        self.on_connect = on_connect
+        # optional decorator wrapped around connection setup (e.g. retry on locked)
+        self._open = retry(self._open_configured) if retry else self._open_configured
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._hits = 0
+        self._misses = 0
+        self._opened = 0
+        self._closed = 0
+        self._discarded = 0
+
+    # ---- connection lifecycle ----
+    def _open_configured(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout)
+        try:
+            for name, value in self.pragmas:
+                conn.execute(f"PRAGMA {name} = {value}")
+            if self.on_connect:
+                self.on_connect(conn)
+        except Exception:
+            conn.close()
+            raise
+        return conn
+
+    def connect(self):
+        """Open a new configured connection that is not tracked by the pool."""
+        conn = self._open()
+        with self._lock:
+            self._opened += 1
+        return conn
+
+    def _idle(self):
+        # connections must never cross a fork (gunicorn --preload)
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._local = threading.local()
+        idle = getattr(self._local, "idle", None)
+        if idle is None:
+            idle = self._local.idle = []
+        return idle
+
+    def acquire(self):
+        """Take an idle connection for the current thread or open a new one."""
+        idle = self._idle()
+        if idle:
+            with self._lock:
+                self._hits += 1
+            return idle.pop()
+        with self._lock:
+            self._misses += 1
+        return self.connect()
+
+    def release(self, conn):
+        """Return a connection to the current thread's pool."""
+        try:
+            # never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._close(conn)
+            with self._lock:
+                self._discarded += 1
+            return
+
+        idle = self._idle()
+        if len(idle) < self.max_idle:
+            idle.append(conn)
+        else:
+            self._close(conn)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._closed += 1
+
+    def close_idle(self):
+        """Close all idle connections held by the current thread."""
+        idle = self._idle()
+        while idle:
+            self._close(idle.pop())
+
+    @contextmanager
+    def connection(self):
+        """Borrow a pooled connection outside of a Flask context (scripts, threads)."""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    # ---- metrics ----
+    def stats(self):
+        with self._lock:
+            hits, misses = self._hits, self._misses
+            stats = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if (hits + misses) else None,
+                "opened": self._opened,
+                "closed": self._closed,
+                "discarded": self._discarded,
+            }
+        stats["idle_this_thread"] = len(self._idle())
+        return stats
+
+
+class _Lease:
+    """The single pooled connection bound to one app context."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.refs = 0
+
+
+class PooledConnection:
+    """
+    Handle returned by get_conn() inside a request.
+    Behaves like a sqlite3.Connection, but close() only gives the handle back;
+    the underlying connection is returned to the pool on app-context teardown.
+    """
+
+    def __init__(self, lease):
+        self._lease = lease
+        self._closed = False
+        lease.refs += 1
+
+    @property
+    def raw(self):
+        return self._lease.conn
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._lease.refs -= 1
+        # last open handle gone: drop uncommitted work like a real close() would
+        if self._lease.refs <= 0 and self._lease.conn.in_transaction:
+            self._lease.conn.rollback()
+
+    def __getattr__(self, name):
+        return getattr(self._lease.conn, name)
+
+    def __enter__(self):
+        self._lease.conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._lease.conn.__exit__(*exc)
+
+
+def init_app(app, pool):
+    """Attach the pool to a Flask app and release connections on teardown."""
+    app.extensions["db_pool"] = pool
+
+    @app.teardown_appcontext
+    def _release_db_connection(exc):
+        lease = g.pop("_db_lease", None)
+        if lease is not None:
+            pool.release(lease.conn)
+
+
+def get_pool(app):
+    return app.extensions["db_pool"]
+
+
+def get_connection(pool):
+    """
+    Return a connection for the caller.
+    Inside an app context every call shares the context's pooled connection;
+    outside of one (scripts, tests) a fresh configured connection is returned
+    and the caller is responsible for closing it.
+    """
+    if not has_app_context():
+        return pool.connect()
+    lease = g.get("_db_lease")
+    if lease is None:
+        lease = g._db_lease = _Lease(pool.acquire())
+    return PooledConnection(lease)
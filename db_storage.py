@@ -0,0 +1,204 @@
+"""
+SQLite Storage Configuration
+WAL mode, per-connection PRAGMAs, busy-timeout/retry policy, a background
+WAL checkpoint scheduler and a startup self-check for library.db.
+
+Every setting can be overridden from the environment (see StorageConfig).
+"""
+
+import os
+import time
+import random
+import sqlite3
+import logging
+import threading
+from functools import wraps
+
+logger = logging.getLogger('novus.storage')
+
+
+def _env_int(name, default):
+    try:
+        return int(os.environ.get(name, default) or default)
+    except ValueError:
+        return default
+
+
+class StorageConfig:
+    """Storage settings for library.db, read from the environment."""
+
+    def __init__(self):
+        self.journal_mode = (os.environ.get('DB_JOURNAL_MODE', 'WAL') or 'WAL').upper()
+        self.synchronous = (os.environ.get('DB_SYNCHRONOUS', 'NORMAL') or 'NORMAL').upper()
+        # negative cache_size is in KiB (SQLite convention): 20 MB page cache
+        self.cache_size = _env_int('DB_CACHE_SIZE', -20000)
+        self.mmap_size = _env_int('DB_MMAP_SIZE', 128 * 1024 * 1024)
+        self.temp_store = (os.environ.get('DB_TEMP_STORE', 'MEMORY') or 'MEMORY').upper()
+        self.busy_timeout_ms = _env_int('DB_BUSY_TIMEOUT_MS', 5000)
+        # retries on top of busy_timeout for SQLITE_BUSY cases it can't wait out
+        self.retry_attempts = _env_int('DB_RETRY_ATTEMPTS', 5)
+        self.retry_base_delay_ms = _env_int('DB_RETRY_BASE_DELAY_MS', 25)
+        self.checkpoint_interval = _env_int('DB_CHECKPOINT_INTERVAL', 300)
+        # WAL size (bytes) above which the scheduler truncates instead of a passive checkpoint
+        self.checkpoint_truncate_bytes = _env_int('DB_CHECKPOINT_TRUNCATE_BYTES', 64 * 1024 * 1024)
+
+    def connection_pragmas(self):
+        """PRAGMAs applied to every new connection (journal_mode is per-database)."""
+        return [
+            ('busy_timeout', self.busy_timeout_ms),
+            ('synchronous', self.synchronous),
+            ('cache_size', self.cache_size),
+            ('mmap_size', self.mmap_size),
+            ('temp_store', self.temp_store),
+        ]
+
+    def as_dict(self):
+        return dict(self.__dict__)
+
+
+# -------------------- RETRY POLICY --------------------
+def is_locked_error(exc):
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    msg = str(exc).lower()
+    return 'database is locked' in msg or 'database is busy' in msg or 'database table is locked' in msg
+
+
+def retry_on_locked(attempts=5, base_delay_ms=25):
+    """Retry a callable when SQLite reports the database as locked/busy.
+
+    busy_timeout already waits for most locks; this covers the cases where
+    SQLite returns SQLITE_BUSY immediately (e.g. a read transaction upgrading
+    to a write in WAL mode). Backoff is exponential with jitter.
+    """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return func(*args, **kwargs)
+                except sqlite3.OperationalError as e:
+                    if not is_locked_error(e) or attempt == attempts - 1:
+                        raise
+                    delay = (base_delay_ms / 1000.0) * (2 ** attempt)
+                    time.sleep(delay + random.uniform(0, delay))
+        return wrapper
+    return decorator
+
+
+# -------------------- SETUP / SELF-CHECK --------------------
+def apply_journal_mode(db_path, config):
+    """Switch the database file to the configured journal mode (persistent for WAL)."""
+    @retry_on_locked(config.retry_attempts, config.retry_base_delay_ms)
+    def _apply():
+        conn = sqlite3.connect(db_path, timeout=config.busy_timeout_ms / 1000.0)
+        try:
+            return conn.execute(f"PRAGMA journal_mode = {config.journal_mode}").fetchone()[0]
+        finally:
+            conn.close()
+    return _apply()
+
+
+_SYNCHRONOUS_NAMES = {0: 'OFF', 1: 'NORMAL', 2: 'FULL', 3: 'EXTRA'}
+_TEMP_STORE_NAMES = {0: 'DEFAULT', 1: 'FILE', 2: 'MEMORY'}
+
+
+def self_check(conn, config):
+    """Read back the active settings on a connection and compare them to the config."""
+    def pragma(name):
+        return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+    actual = {
+        'journal_mode': str(pragma('journal_mode')).upper(),
+        'synchronous': _SYNCHRONOUS_NAMES.get(pragma('synchronous'), pragma('synchronous')),
+        'cache_size': pragma('cache_size'),
+        'mmap_size': pragma('mmap_size'),
+        'temp_store': _TEMP_STORE_NAMES.get(pragma('temp_store'), pragma('temp_store')),
+        'busy_timeout': pragma('busy_timeout'),
+    }
+    expected = {
+        'journal_mode': config.journal_mode,
+        'synchronous': config.synchronous,
+        'cache_size': config.cache_size,
+        'mmap_size': config.mmap_size,
+        'temp_store': config.temp_store,
+        'busy_timeout': config.busy_timeout_ms,
+    }
+    settings = {}
+    for key, want in expected.items():
+        have = actual[key]
+        # some builds cap mmap_size below the requested value
+        ok = (have <= want and have > 0) if key == 'mmap_size' and want > 0 else have == want
+        settings[key] = {'expected': want, 'actual': have, 'ok': ok}
+    return {
+        'ok': all(s['ok'] for s in settings.values()),
+        'sqlite_version': sqlite3.sqlite_version,
+        'settings': settings,
+    }
+
+
+# -------------------- CHECKPOINT SCHEDULER --------------------
+class CheckpointScheduler:
+    """Background thread that checkpoints the WAL so it does not grow unbounded."""
+
+    def __init__(self, db_path, config, connect):
+        self.db_path = db_path
+        self.config = config
+        self.connect = connect
+        self._stop = threading.Event()
+        self._thread = None
+        self.runs = 0
+        self.truncations = 0
+        self.last_result = None
+        self.last_error = None
+
+    def wal_size(self):
+        try:
+            return os.path.getsize(self.db_path + '-wal')
+        except OSError:
+            return 0
+
+    def checkpoint(self):
+        mode = 'TRUNCATE' if self.wal_size() >= self.config.checkpoint_truncate_bytes else 'PASSIVE'
+        conn = self.connect()
+        try:
+            busy, log_frames, checkpointed = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        finally:
+            conn.close()
+        self.runs += 1
+        if mode == 'TRUNCATE':
+            self.truncations += 1
+        self.last_result = {'mode': mode, 'busy': busy, 'log_frames': log_frames,
+                            'checkpointed': checkpointed, 'at': time.time()}
+        return self.last_result
+
+    def _run(self):
+        while not self._stop.wait(self.config.checkpoint_interval):
+            try:
+                self.checkpoint()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"WAL checkpoint failed: {e}")
+
+    def start(self):
+        if self.config.checkpoint_interval <= 0 or self.config.journal_mode != 'WAL':
+            return False
+        if self._thread and self._thread.is_alive():
+            return True
+        self._thread = threading.Thread(target=self._run, name='wal-checkpoint', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'interval': self.config.checkpoint_interval,
+            'runs': self.runs,
+            'truncations': self.truncations,
+            'wal_bytes': self.wal_size(),
+            'last_result': self.last_result,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,216 @@
+"""
+Fragment Cache
+Rendered HTML (and other picklable values) for pages whose content only
+changes when the catalog is edited: home(), manga(), about(), faq() and the
+shared parts of view_book(). Entries are keyed by the caller (route + query
+args + anything else the output depends on) and carry tags such as
+'catalog', 'team' or 'book:<id>'.
+
+Layers:
+  - an in-process LRU (FRAGMENT_CACHE_MAX_ENTRIES, FRAGMENT_CACHE_TTL),
+  - optionally an on-disk store under FRAGMENT_CACHE_DIR/entries shared by
+    all gunicorn workers on the host (FRAGMENT_CACHE_DISK=1).
+
+Invalidation: write routes call invalidate(tag). Each tag has a stamp file
+under FRAGMENT_CACHE_DIR/tags whose mtime is its version; entries remember
+the versions they were rendered at and are discarded on lookup once a tag
+moved, so an edit in one worker invalidates every worker's copy.
+
+Per-user pieces are left out of the cached HTML as <!--name:ID--> markers and
+filled per request with inject().
+"""
+
+import os
+import re
+import time
+import pickle
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+TTL = float(os.environ.get("FRAGMENT_CACHE_TTL", "300") or "300")
+MAX_ENTRIES = int(os.environ.get("FRAGMENT_CACHE_MAX_ENTRIES", "500") or "500")
+DISK = os.environ.get("FRAGMENT_CACHE_DISK", "0") == "1"
+
+_TAG_SAFE = re.compile(r'[^A-Za-z0-9_.-]')
+_MARKER = re.compile(r'<!--([a-z_]+):(\d+)-->')
+
+
+def inject(html, name, pieces):
+    """Replace <!--name:ID--> markers with pieces.get(ID, '')."""
+    def fill(match):
+        if match.group(1) != name:
+            return match.group(0)
+        return pieces.get(int(match.group(2)), '')
+    return _MARKER.sub(fill, html)
+
+
+class FragmentCache:
+    """LRU of key -> value with TTL, tag invalidation and an optional shared disk layer."""
+
+    def __init__(self, directory, ttl=TTL, max_entries=MAX_ENTRIES, disk=DISK, clock=time.time):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.disk = disk
+        self.clock = clock
+        self._entries = OrderedDict()   # key -> (value, {tag: version}, expires)
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._stale = 0
+        self._sets = 0
+        self._evictions = 0
+        self._invalidations = 0
+        self._errors = 0
+
+    # ---- tags ----
+    def _tag_path(self, tag):
+        return os.path.join(self.directory, 'tags', _TAG_SAFE.sub('_', tag))
+
+    def _version(self, tag):
+        try:
+            return os.stat(self._tag_path(tag)).st_mtime_ns
+        except OSError:
+            return 0
+
+    def _current(self, versions):
+        return all(self._version(tag) == version for tag, version in versions.items())
+
+    def invalidate(self, *tags):
+        """Bump each tag's version; entries rendered with an older version are dropped on lookup."""
+        for tag in tags:
+            path = self._tag_path(tag)
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                old = self._version(tag)
+                with open(path, 'a'):
+                    pass
+                # strictly increasing even if the clock hasn't ticked since the last bump
+                stamp = max(time.time_ns(), old + 1)
+                os.utime(path, ns=(stamp, stamp))
+            except OSError:
+                with self._lock:
+                    self._errors += 1
+        with self._lock:
+            self._invalidations += len(tags)
+            for key in [k for k, (_, versions, _) in self._entries.items() if set(versions) & set(tags)]:
+                del self._entries[key]
+
+    # ---- disk layer ----
+    def _entry_path(self, key):
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, 'entries', digest[:2], digest + '.pickle')
+
+    def _disk_get(self, key):
+        try:
+            with open(self._entry_path(key), 'rb') as fh:
+                stored_key, value, versions, expires = pickle.load(fh)
+        except (OSError, EOFError, pickle.PickleError, ValueError):
+            return None
+        if stored_key != key:
+            return None
+        return value, versions, expires
+
+    def _disk_set(self, key, entry):
+        path = self._entry_path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(fd, 'wb') as fh:
+                pickle.dump((key,) + entry, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, path)
+        except OSError:
+            with self._lock:
+                self._errors += 1
+
+    # ---- lookups ----
+    def get(self, key):
+        """Cached value for key, or None if missing, expired or invalidated."""
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        source = 'memory'
+        if entry is None and self.disk:
+            entry = self._disk_get(key)
+            source = 'disk'
+        if entry is not None:
+            value, versions, expires = entry
+            if expires > now and self._current(versions):
+                with self._lock:
+                    if source == 'disk':
+                        self._disk_hits += 1
+                        self._store(key, entry)
+                    else:
+                        self._hits += 1
+                return value
+            with self._lock:
+                self._stale += 1
+                self._entries.pop(key, None)
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def set(self, key, value, tags=(), versions=None):
+        """Store value under tags; `versions` are the tag versions read before it was built."""
+        if versions is None:
+            versions = self.versions(tags)
+        entry = (value, versions, self.clock() + self.ttl)
+        with self._lock:
+            self._store(key, entry)
+            self._sets += 1
+        if self.disk:
+            self._disk_set(key, entry)
+        return value
+
+    def versions(self, tags):
+        return {tag: self._version(tag) for tag in tags}
+
+    def get_or_set(self, key, tags, build):
+        """Cached value for key, or build() stored under tags (a None result isn't stored).
+
+        Tag versions are read before build() runs, so an invalidation racing the
+        render leaves the new entry already stale rather than wrongly fresh.
+        """
+        value = self.get(key)
+        if value is None:
+            versions = self.versions(tags)
+            value = build()
+            if value is not None:
+                self.set(key, value, tags, versions)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            hits = self._hits + self._disk_hits
+            lookups = hits + self._misses
+            return {
+                'hits': self._hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'hit_rate': round(hits / lookups, 4) if lookups else None,
+                'stale': self._stale,
+                'sets': self._sets,
+                'evictions': self._evictions,
+                'invalidations': self._invalidations,
+                'errors': self._errors,
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'disk': self.disk,
+            }
@@ -0,0 +1,227 @@
+"""
+HTTP Caching
+Conditional GETs for the reader APIs and content-addressed media URLs.
+
+Version counters: entity_versions holds one (entity, id) -> version row per
+cacheable API resource, bumped by triggers whenever a row the response is
+built from changes:
+  - 'chapter' (chapter id)           /api/chapter/<id>/pages
+        chapter_pages, image_variants of those pages, the chapter row itself
+  - 'manga_chapters' (manga id)      /api/manga/<id>/chapters
+        chapters
+  - 'manga_characters' (manga id)    /api/manga/<id>/characters
+        manga_characters, the manga's books row (delete / book_type)
+The APIs derive their ETag and Last-Modified from that row before running the
+real query, so a revalidation that matches is answered 304 from one primary
+key lookup.
+
+Media: media_url() turns a path under static/manga, static/covers or
+static/derived into /media/<digest>/<path>, where digest is the start of the
+file's sha256. The content hash changes whenever the file does, so the
+/media route can send `Cache-Control: immutable` with a one-year max-age.
+Digests come from chapter_pages.content_hash when the caller has it, else
+from the file itself, memoised per (mtime, size).
+
+CLI:  python http_cache.py show ENTITY ID [--db PATH]
+"""
+
+import os
+import hashlib
+import sqlite3
+import argparse
+import threading
+from datetime import datetime, timezone
+
+from werkzeug.http import is_resource_modified
+
+import chapter_pages
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_ROOT = chapter_pages.STATIC_ROOT
+
+MEDIA_PREFIXES = ('manga/', 'covers/', 'derived/')
+DIGEST_LENGTH = 16
+MEDIA_MAX_AGE = int(os.environ.get("MEDIA_MAX_AGE", str(365 * 24 * 3600)) or "0")
+MEDIA_CACHE_CONTROL = f"public, max-age={MEDIA_MAX_AGE}, immutable"
+
+# login-only JSON: shared caches must not store it, browsers must revalidate it
+API_CACHE_CONTROL = "private, no-cache"
+
+# bumped when the JSON shape of the versioned APIs changes, so old ETags stop matching
+API_REVISION = 1
+
+ENTITIES = ('chapter', 'manga_chapters', 'manga_characters')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entity_versions (
+    entity      TEXT    NOT NULL,
+    entity_id   INTEGER NOT NULL,
+    version     INTEGER NOT NULL DEFAULT 1,
+    updated_at  TEXT    NOT NULL DEFAULT (DATETIME('now')),
+    PRIMARY KEY (entity, entity_id)
+) WITHOUT ROWID
+"""
+
+
+def _bump(entity, id_expr, source=""):
+    """Upsert statement bumping (entity, id_expr); `source` is an optional FROM ... WHERE ... clause."""
+    if source:
+        select = f"SELECT '{entity}', {id_expr}, 1, DATETIME('now') {source}"
+    else:
+        select = f"VALUES ('{entity}', {id_expr}, 1, DATETIME('now'))"
+    return (f"INSERT INTO entity_versions (entity, entity_id, version, updated_at) {select} "
+            "ON CONFLICT (entity, entity_id) DO UPDATE SET "
+            "version = entity_versions.version + 1, updated_at = excluded.updated_at;")
+
+
+def _pages_of(row, when=""):
+    return _bump('chapter', 'chapter_id', f"FROM chapter_pages WHERE path = {row}.source_path {when}")
+
+
+def _moved(column):
+    """Bump condition for the NEW side of an UPDATE: only when `column` changed (OLD is bumped anyway)."""
+    return f"WHERE NEW.{column} IS NOT OLD.{column}"
+
+
+TRIGGERS = {
+    'entity_versions_pages_ins': ("AFTER INSERT ON chapter_pages", [_bump('chapter', 'NEW.chapter_id')]),
+    'entity_versions_pages_upd': ("AFTER UPDATE ON chapter_pages", [
+        _bump('chapter', 'OLD.chapter_id'), _bump('chapter', 'NEW.chapter_id', _moved('chapter_id'))]),
+    'entity_versions_pages_del': ("AFTER DELETE ON chapter_pages", [_bump('chapter', 'OLD.chapter_id')]),
+    'entity_versions_variants_ins': ("AFTER INSERT ON image_variants", [_pages_of('NEW')]),
+    'entity_versions_variants_upd': ("AFTER UPDATE ON image_variants", [
+        _pages_of('OLD'), _pages_of('NEW', "AND NEW.source_path IS NOT OLD.source_path")]),
+    'entity_versions_variants_del': ("AFTER DELETE ON image_variants", [_pages_of('OLD')]),
+    'entity_versions_chapters_ins': ("AFTER INSERT ON chapters",
+                                     [_bump('chapter', 'NEW.id'), _bump('manga_chapters', 'NEW.manga_id')]),
+    'entity_versions_chapters_upd': ("AFTER UPDATE ON chapters", [
+        _bump('chapter', 'NEW.id'), _bump('manga_chapters', 'OLD.manga_id'),
+        _bump('manga_chapters', 'NEW.manga_id', _moved('manga_id'))]),
+    'entity_versions_chapters_del': ("AFTER DELETE ON chapters",
+                                     [_bump('chapter', 'OLD.id'), _bump('manga_chapters', 'OLD.manga_id')]),
+    'entity_versions_characters_ins': ("AFTER INSERT ON manga_characters",
+                                       [_bump('manga_characters', 'NEW.manga_id')]),
+    'entity_versions_characters_upd': ("AFTER UPDATE ON manga_characters", [
+        _bump('manga_characters', 'OLD.manga_id'), _bump('manga_characters', 'NEW.manga_id', _moved('manga_id'))]),
+    'entity_versions_characters_del': ("AFTER DELETE ON manga_characters",
+                                       [_bump('manga_characters', 'OLD.manga_id')]),
+    # a manga's lists start at version 1, and become 404s (or lists again) with its books row
+    'entity_versions_books_ins': ("AFTER INSERT ON books WHEN COALESCE(NEW.book_type, 'book') = 'manga'",
+                                  [_bump('manga_characters', 'NEW.id'), _bump('manga_chapters', 'NEW.id')]),
+    'entity_versions_books_type': ("AFTER UPDATE OF book_type ON books",
+                                   [_bump('manga_characters', 'NEW.id'), _bump('manga_chapters', 'NEW.id')]),
+    'entity_versions_books_del': ("AFTER DELETE ON books",
+                                  [_bump('manga_characters', 'OLD.id'), _bump('manga_chapters', 'OLD.id')]),
+}
+
+
+def install(conn):
+    conn.execute(SCHEMA)
+    for name, (event, statements) in TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {event} BEGIN {' '.join(statements)} END")
+
+
+def seed(conn):
+    """Version 1 rows for every existing chapter and manga, so they get a Last-Modified from the start."""
+    conn.execute("INSERT OR IGNORE INTO entity_versions (entity, entity_id) SELECT 'chapter', id FROM chapters")
+    for entity in ('manga_chapters', 'manga_characters'):
+        conn.execute("INSERT OR IGNORE INTO entity_versions (entity, entity_id) "
+                     f"SELECT '{entity}', id FROM books WHERE COALESCE(book_type, 'book') = 'manga'")
+
+
+# -------------------- VERSIONED API RESPONSES --------------------
+def version(conn, entity, entity_id):
+    """(version, updated_at as an aware datetime); (0, None) for an entity that never changed."""
+    row = conn.execute("SELECT version, updated_at FROM entity_versions WHERE entity = ? AND entity_id = ?",
+                       (entity, entity_id)).fetchone()
+    if not row:
+        return 0, None
+    return row[0], datetime.strptime(row[1], '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+
+
+def validators(conn, entity, entity_id):
+    """(etag, last_modified) for the entity's current version."""
+    current, updated_at = version(conn, entity, entity_id)
+    return f"{entity}-{entity_id}-v{current}-r{API_REVISION}", updated_at
+
+
+def is_fresh(environ, etag, last_modified):
+    """True when the request's If-None-Match / If-Modified-Since still match (answer 304).
+
+    If-None-Match wins over If-Modified-Since when both are sent (RFC 9110 13.2.2).
+    """
+    if not (environ.get('HTTP_IF_NONE_MATCH') or environ.get('HTTP_IF_MODIFIED_SINCE')):
+        return False
+    return not is_resource_modified(environ, etag=etag, last_modified=last_modified)
+
+
+def apply(response, etag, last_modified):
+    """Set the validators and revalidation policy on a versioned API response (200 or 304)."""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = API_CACHE_CONTROL
+    response.vary.add('Cookie')
+    return response
+
+
+# -------------------- CONTENT-ADDRESSED MEDIA --------------------
+_digests = {}   # full path -> (mtime_ns, size, digest)
+_digests_lock = threading.Lock()
+_MAX_DIGESTS = 20000
+
+
+def is_media(rel_path):
+    return bool(rel_path) and rel_path.startswith(MEDIA_PREFIXES) and '..' not in rel_path.split('/')
+
+
+def file_digest(rel_path, static_root=STATIC_ROOT):
+    """Leading DIGEST_LENGTH hex chars of the file's sha256, or None if it doesn't exist."""
+    full_path = os.path.join(static_root, *rel_path.split('/'))
+    try:
+        st = os.stat(full_path)
+    except OSError:
+        return None
+    with _digests_lock:
+        known = _digests.get(full_path)
+    if known and known[:2] == (st.st_mtime_ns, st.st_size):
+        return known[2]
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 16), b''):
+            digest.update(block)
+    value = digest.hexdigest()[:DIGEST_LENGTH]
+    with _digests_lock:
+        if len(_digests) >= _MAX_DIGESTS:
+            _digests.clear()
+        _digests[full_path] = (st.st_mtime_ns, st.st_size, value)
+    return value
+
+
+def media_digest(rel_path, content_hash=None, static_root=STATIC_ROOT):
+    """Digest for the media URL of rel_path; content_hash is a known sha256 of the file (chapter_pages)."""
+    if content_hash:
+        return content_hash[:DIGEST_LENGTH]
+    return file_digest(rel_path, static_root)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show API resource versions")
+    parser.add_argument("--db", default=os.path.join(APP_ROOT, "library.db"))
+    sub = parser.add_subparsers(dest="command", required=True)
+    show = sub.add_parser("show", help="print the version, ETag and Last-Modified of one resource")
+    show.add_argument("entity", choices=ENTITIES)
+    show.add_argument("id", type=int)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        etag, last_modified = validators(conn, args.entity, args.id)
+        print(f"etag={etag} last_modified={last_modified.isoformat() if last_modified else '-'}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
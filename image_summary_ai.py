@@ -5,11 +5,12 @@ Uses GPT-4 Vision to read images and generate summaries for manga pages and book
 
 import os
 import base64
-import requests
 import json
 import logging
 from pathlib import Path
 
+import ai_client
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,24 +18,43 @@ logger = logging.getLogger(__name__)
 OPENAI_KEY = os.environ.get('OPENAI_API_KEY')
 OPENAI_MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4-turbo')
 
+# Bump an entry whenever its prompt (or max_tokens) changes: results cached
+# under the old version (ai_cache.py) then stop matching.
+PROMPT_VERSIONS = {
+    'manga_page': 1,
+    'book_cover': 1,
+    'image_text': 1,
+}
+
 class ImageSummaryAI:
     """Handle image reading and summary generation using GPT-4 Vision"""
     
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, client=None):
         self.api_key = api_key or OPENAI_KEY
         self.model = OPENAI_MODEL
-        self.error_count = 0
-        self.last_error = None
+        # shared pooled client (ai_client.py); its breaker state is error_count / last_error below
+        self.client = client or ai_client.get_client()
         
-        if self.api_key:
-            self.headers = {
-                'Authorization': f'Bearer {self.api_key}',
-                'Content-Type': 'application/json'
-            }
-        else:
-            self.headers = None
+        if not self.api_key:
             logger.warning("No OpenAI API key found")
     
+    @property
+    def error_count(self):
+        """Consecutive failed calls to the provider (shared by every ImageSummaryAI in the process)."""
+        return self.client.error_count
+    
+    @error_count.setter
+    def error_count(self, value):
+        self.client.error_count = value
+    
+    @property
+    def last_error(self):
+        return self.client.last_error
+    
+    @last_error.setter
+    def last_error(self, value):
+        self.client.last_error = value
+    
     def encode_image_to_base64(self, image_path):
         """Convert image file to base64"""
         try:
@@ -55,10 +75,10 @@ class ImageSummaryAI:
         }
         return media_types.get(ext, 'image/jpeg')
     
-    def summarize_manga_page(self, image_path, max_sentences=5):
-        """
-        Summarize a manga page image
-        Extracts story content and key events
+    def _ask_about_image(self, image_path, prompt, max_tokens, action, stream=False):
+        """Send one image plus a text prompt; `action` names the operation in error messages.
+
+        With stream=True this returns a generator of text deltas instead of the whole reply.
         """
         if not os.path.exists(image_path):
             raise Exception(f"Image not found: {image_path}")
@@ -84,156 +104,62 @@ class ImageSummaryAI:
                             },
                             {
                                 'type': 'text',
-                                'text': f"""Analyze this manga page and provide a concise summary in {max_sentences} sentences or less. 
-                                Focus on:
-                                1. Main events happening
-                                2. Character interactions
-                                3. Plot progression
-                                Keep it brief and clear."""
+                                'text': prompt
                             }
                         ]
                     }
                 ],
-                'max_tokens': 300
+                'max_tokens': max_tokens
             }
             
-            response = requests.post(
-                'https://api.openai.com/v1/chat/completions',
-                json=payload,
-                headers=self.headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            if 'choices' in result and result['choices']:
-                self.error_count = 0  # Reset error count on success
-                return result['choices'][0]['message']['content'].strip()
-            return None
+            if stream:
+                return self._relay(self.client.stream_chat(payload, timeout=30, api_key=self.api_key), action)
+            return self.client.chat(payload, timeout=30, api_key=self.api_key)
             
         except Exception as e:
-            self.error_count += 1
-            self.last_error = str(e)
-            logger.error(f"Failed to summarize manga page: {e}")
-            raise Exception(f"Failed to summarize manga page: {e}")
+            logger.error(f"Failed to {action}: {e}")
+            raise Exception(f"Failed to {action}: {e}")
+    
+    def _relay(self, deltas, action):
+        try:
+            yield from deltas
+        except Exception as e:
+            logger.error(f"Failed to {action}: {e}")
+            raise Exception(f"Failed to {action}: {e}")
+    
+    def summarize_manga_page(self, image_path, max_sentences=5, stream=False):
+        """
+        Summarize a manga page image
+        Extracts story content and key events
+        """
+        return self._ask_about_image(image_path, f"""Analyze this manga page and provide a concise summary in {max_sentences} sentences or less. 
+                                Focus on:
+                                1. Main events happening
+                                2. Character interactions
+                                3. Plot progression
+                                Keep it brief and clear.""", 300, "summarize manga page", stream=stream)
     
     def summarize_book_cover(self, image_path):
         """
         Analyze a book cover image
         Extracts title, author, genre hints from cover design
         """
-        if not os.path.exists(image_path):
-            raise Exception(f"Image not found: {image_path}")
-        
-        if not self.api_key:
-            raise Exception("OpenAI API key not configured")
-        
-        try:
-            base64_image = self.encode_image_to_base64(image_path)
-            media_type = self.get_image_media_type(image_path)
-            
-            payload = {
-                'model': self.model,
-                'messages': [
-                    {
-                        'role': 'user',
-                        'content': [
-                            {
-                                'type': 'image_url',
-                                'image_url': {
-                                    'url': f'data:{media_type};base64,{base64_image}'
-                                }
-                            },
-                            {
-                                'type': 'text',
-                                'text': """Analyze this book/manga cover and provide:
+        return self._ask_about_image(image_path, """Analyze this book/manga cover and provide:
                                 1. Visible title or main text
                                 2. Main visual elements and themes
                                 3. Apparent genre based on design
                                 4. Brief description of what the cover conveys
-                                Keep it concise (3-4 sentences)."""
-                            }
-                        ]
-                    }
-                ],
-                'max_tokens': 250
-            }
-            
-            response = requests.post(
-                'https://api.openai.com/v1/chat/completions',
-                json=payload,
-                headers=self.headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            if 'choices' in result and result['choices']:
-                self.error_count = 0  # Reset error count on success
-                return result['choices'][0]['message']['content'].strip()
-            return None
-            
-        except Exception as e:
-            self.error_count += 1
-            self.last_error = str(e)
-            logger.error(f"Failed to summarize book cover: {e}")
-            raise Exception(f"Failed to summarize book cover: {e}")
+                                Keep it concise (3-4 sentences).""", 250, "summarize book cover")
     
     def extract_text_from_image(self, image_path):
         """
         Extract all visible text from an image
         Useful for manga dialogue and text boxes
         """
-        if not os.path.exists(image_path):
-            raise Exception(f"Image not found: {image_path}")
-        
-        if not self.api_key:
-            raise Exception("OpenAI API key not configured")
-        
-        try:
-            base64_image = self.encode_image_to_base64(image_path)
-            media_type = self.get_image_media_type(image_path)
-            
-            payload = {
-                'model': self.model,
-                'messages': [
-                    {
-                        'role': 'user',
-                        'content': [
-                            {
-                                'type': 'image_url',
-                                'image_url': {
-                                    'url': f'data:{media_type};base64,{base64_image}'
-                                }
-                            },
-                            {
-                                'type': 'text',
-                                'text': """Extract ALL visible text from this image in order.
+        return self._ask_about_image(image_path, """Extract ALL visible text from this image in order.
                                 Include dialogue, captions, and text boxes.
                                 Preserve the reading order as much as possible.
-                                Format as a clean list."""
-                            }
-                        ]
-                    }
-                ],
-                'max_tokens': 1000
-            }
-            
-            response = requests.post(
-                'https://api.openai.com/v1/chat/completions',
-                json=payload,
-                headers=self.headers,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            if 'choices' in result and result['choices']:
-                return result['choices'][0]['message']['content'].strip()
-            return None
-            
-        except Exception as e:
-            raise Exception(f"Failed to extract text from image: {e}")
+                                Format as a clean list.""", 1000, "extract text from image")
 
 
 # Test the module
@@ -0,0 +1,238 @@
+"""
+Image Variants
+Width-bucketed WebP derivatives (thumb / medium / full) of manga pages and
+covers, so the catalog grids and readers can send a srcset and let the
+browser fetch the smallest image that fills the slot instead of the
+original upload (often a 150-dpi PNG).
+
+Derivatives mirror the source path under static/derived/<variant>/, e.g.
+    manga/manga_6_ch1/page_001.png -> derived/medium/manga/manga_6_ch1/page_001.webp
+and are recorded in the image_variants table with their real dimensions.
+A source smaller than a bucket only gets the buckets that shrink it. 'full'
+is always recorded, capped at its bucket width; when WebP would not make an
+unscaled image smaller, 'full' points at the original file instead.
+
+Derivatives are made by the 'image_variants' background job (see jobs.py),
+queued after uploads.
+
+CLI:  python image_variants.py backfill [--db PATH] [--force]
+"""
+
+import os
+import shutil
+import hashlib
+import logging
+import sqlite3
+
+import jobs
+import chapter_pages
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = ImageOps = None
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger('novus.images')
+
+STATIC_ROOT = chapter_pages.STATIC_ROOT
+DERIVED_DIR = "derived"
+
+# (name, max width, WebP quality): smaller images tolerate lower quality
+VARIANTS = (
+    ('thumb', 320, 70),
+    ('medium', 800, 78),
+    ('full', 1600, 82),
+)
+WEBP_METHOD = 5   # 0 fast .. 6 smallest
+
+SOURCE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.bmp'}
+
+VARIANT_COLUMNS = "source_path, variant, path, width, height, bytes"
+
+
+def variant_path(rel_path, variant):
+    """Derivative path (relative to static/) of a source image."""
+    stem = os.path.splitext(rel_path)[0]
+    return f"{DERIVED_DIR}/{variant}/{stem}.webp"
+
+
+def is_source(rel_path):
+    return bool(rel_path) and os.path.splitext(rel_path)[1].lower() in SOURCE_EXTENSIONS \
+        and not rel_path.startswith(DERIVED_DIR + "/")
+
+
+def _file_hash(full_path):
+    digest = hashlib.sha256()
+    with open(full_path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 16), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _save_webp(img, full_path, quality):
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    tmp_path = full_path + ".tmp"
+    img.save(tmp_path, 'WEBP', quality=quality, method=WEBP_METHOD)
+    os.replace(tmp_path, full_path)
+    return os.path.getsize(full_path)
+
+
+def generate(conn, rel_path, static_root=STATIC_ROOT, force=False):
+    """Write the derivatives of one source image and record them.
+
+    Skips work when the recorded derivatives were made from the same file
+    content. Returns the list of variant dicts (empty for non-images).
+    """
+    source_file = os.path.join(static_root, *rel_path.split('/'))
+    if not PIL_AVAILABLE or not is_source(rel_path) or not os.path.isfile(source_file):
+        return []
+
+    source_hash = _file_hash(source_file)
+    if not force:
+        recorded = conn.execute("SELECT COUNT(*) FROM image_variants WHERE source_path = ? AND source_hash = ?",
+                                (rel_path, source_hash)).fetchone()[0]
+        current = lookup(conn, [rel_path]).get(rel_path, []) if recorded else []
+        if current and all(os.path.isfile(os.path.join(static_root, *v['path'].split('/'))) for v in current):
+            return current
+
+    with Image.open(source_file) as img:
+        img = ImageOps.exif_transpose(img)
+        has_alpha = img.mode in ('RGBA', 'LA') or 'transparency' in img.info
+        img = img.convert('RGBA' if has_alpha else 'RGB')
+        src_w, src_h = img.size
+        source_bytes = os.path.getsize(source_file)
+
+        made = []
+        for name, max_width, quality in VARIANTS:
+            if max_width >= src_w and name != 'full':
+                continue
+            width = min(max_width, src_w)
+            height = max(1, round(src_h * width / src_w))
+            resized = img if width == src_w else img.resize((width, height), Image.LANCZOS)
+            path = variant_path(rel_path, name)
+            size = _save_webp(resized, os.path.join(static_root, *path.split('/')), quality)
+            if width == src_w and size >= source_bytes:
+                # re-encoding at the source's own size gained nothing: serve the original
+                os.remove(os.path.join(static_root, *path.split('/')))
+                path, size = rel_path, source_bytes
+            made.append({'variant': name, 'path': path, 'width': width, 'height': height, 'bytes': size})
+
+    conn.execute("DELETE FROM image_variants WHERE source_path = ?", (rel_path,))
+    conn.executemany(
+        "INSERT INTO image_variants (source_path, variant, path, width, height, bytes, source_hash) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(rel_path, v['variant'], v['path'], v['width'], v['height'], v['bytes'], source_hash) for v in made],
+    )
+    return made
+
+
+def remove_under(conn, rel_dir, static_root=STATIC_ROOT):
+    """Drop the derivatives of every source below rel_dir (e.g. a deleted chapter directory)."""
+    conn.execute("DELETE FROM image_variants WHERE source_path LIKE ? ESCAPE '\\'",
+                 (rel_dir.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '/%',))
+    for name, _, _ in VARIANTS:
+        shutil.rmtree(os.path.join(static_root, DERIVED_DIR, name, *rel_dir.split('/')), ignore_errors=True)
+
+
+# -------------------- READS --------------------
+def lookup(conn, paths):
+    """{source_path: [variant, ...]} (narrowest first) for the given source paths."""
+    paths = sorted({p for p in paths if p})
+    found = {}
+    for start in range(0, len(paths), 500):
+        chunk = paths[start:start + 500]
+        rows = conn.execute(
+            f"SELECT {VARIANT_COLUMNS} FROM image_variants "
+            f"WHERE source_path IN ({','.join('?' * len(chunk))}) ORDER BY source_path, width",
+            chunk,
+        ).fetchall()
+        for source_path, variant, path, width, height, size in rows:
+            found.setdefault(source_path, []).append(
+                {'variant': variant, 'path': path, 'width': width, 'height': height, 'bytes': size})
+    return found
+
+
+def pick(variants, variant):
+    """The named variant, or the closest wider one (falling back to the widest)."""
+    order = [name for name, _, _ in VARIANTS]
+    for v in variants:
+        if order.index(v['variant']) >= order.index(variant):
+            return v
+    return variants[-1] if variants else None
+
+
+# -------------------- JOBS / BACKFILL --------------------
+def sources(conn):
+    """Every source image the site serves: chapter pages and book covers."""
+    rows = conn.execute("""
+        SELECT path FROM chapter_pages WHERE mime LIKE 'image/%'
+        UNION
+        SELECT cover_path FROM books WHERE cover_path IS NOT NULL AND cover_path != ''
+    """).fetchall()
+    return [row[0] for row in rows if is_source(row[0])]
+
+
+def generate_all(conn, paths, static_root=STATIC_ROOT, force=False, on_progress=None):
+    """generate() for each path, committing as it goes. Returns the number of sources processed."""
+    done = 0
+    for path in paths:
+        try:
+            generate(conn, path, static_root, force)
+        except Exception as e:
+            logger.warning(f"Could not make derivatives of {path}: {e}")
+        conn.commit()
+        done += 1
+        if on_progress:
+            on_progress(done, len(paths))
+    return done
+
+
+def queue(conn, paths, user_id=None):
+    """Queue an 'image_variants' job for the source images among paths. Returns the job id or None."""
+    paths = [p for p in paths if is_source(p)]
+    if not paths or not PIL_AVAILABLE:
+        return None
+    return jobs.enqueue(conn, 'image_variants', {'paths': paths}, user_id=user_id,
+                        total=len(paths), message='Resizing images')
+
+
+@jobs.handler('image_variants')
+def generate_job(job, ctx):
+    """payload: paths (relative to static/)"""
+    paths = job['payload'].get('paths', [])
+    done = generate_all(ctx.conn, paths,
+                        on_progress=lambda n, total: ctx.progress(n, total, f"Resized {n} of {total} images"))
+    return {'images': done}
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python image_variants.py", description="Image derivative tools")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--db", default=os.path.join(chapter_pages.APP_ROOT, "library.db"))
+    parser.add_argument("--force", action="store_true", help="regenerate derivatives that are up to date")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not PIL_AVAILABLE:
+        print("Pillow is not installed")
+        return 1
+    conn = sqlite3.connect(args.db)
+    try:
+        paths = sources(conn)
+        generate_all(conn, paths, force=args.force,
+                     on_progress=lambda n, total: n % 25 == 0 and print(f"{n}/{total}"))
+        sizes = dict(conn.execute("SELECT variant, SUM(bytes) FROM image_variants GROUP BY variant").fetchall())
+    finally:
+        conn.close()
+    print(f"Processed {len(paths)} images; derivative bytes by variant: {sizes}")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
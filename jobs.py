@@ -0,0 +1,363 @@
+"""
+Background Jobs
+A small SQLite-backed job queue (the jobs table in library.db) plus the
+worker that runs queued jobs outside the request cycle.
+
+    job_id = jobs.enqueue(conn, 'chapter_pdf', {...}, user_id=...)
+    jobs.get(conn, job_id)   # status / progress for /api/jobs/<id>
+
+Handlers register themselves with @jobs.handler('kind') and receive the job
+dict and a JobContext for reporting progress. A job is claimed with a lease;
+if its worker dies the lease expires and another worker picks it up again,
+up to max_attempts.
+
+Workers run either embedded in the web process (a daemon thread, the default
+for single-process setups) or as separate processes. Claims are FIFO, so
+long-running kinds (chapter_ai, minutes per chapter under its rate limit)
+get a worker of their own and the others skip them, see the Procfile:
+
+CLI:  python jobs.py worker [--db PATH] [--once] [--kinds K1,K2] [--exclude K1,K2]
+      python jobs.py status JOB_ID [--db PATH]
+"""
+
+import os
+import json
+import socket
+import logging
+import importlib
+import threading
+
+logger = logging.getLogger('novus.jobs')
+
+LEASE_SECONDS = int(os.environ.get("JOBS_LEASE_SECONDS", "300") or "300")
+POLL_INTERVAL = float(os.environ.get("JOBS_POLL_INTERVAL", "1.0") or "1.0")
+
+# modules whose import registers job handlers
+HANDLER_MODULES = ['pdf_pages', 'image_variants', 'retention', 'recommender', 'text_summary', 'page_ai',
+                   'popularity']
+
+_HANDLERS = {}
+
+JOB_COLUMNS = ("id, kind, payload, status, progress, total, message, result, error, "
+               "attempts, max_attempts, user_id, worker, created_at, started_at, finished_at")
+
+
+def handler(kind):
+    """Register fn(job, ctx) as the handler for jobs of this kind."""
+    def decorator(fn):
+        _HANDLERS[kind] = fn
+        return fn
+    return decorator
+
+
+def load_handlers():
+    for name in HANDLER_MODULES:
+        importlib.import_module(name)
+    return sorted(_HANDLERS)
+
+
+# -------------------- QUEUE --------------------
+def enqueue(conn, kind, payload, user_id=None, max_attempts=2, total=0, message='Queued'):
+    """Add a job and commit. Returns the job id."""
+    cur = conn.execute(
+        "INSERT INTO jobs (kind, payload, user_id, max_attempts, total, message) VALUES (?, ?, ?, ?, ?, ?)",
+        (kind, json.dumps(payload), user_id, max_attempts, total, message),
+    )
+    conn.commit()
+    return cur.lastrowid
+
+
+def _as_dict(row):
+    job = dict(zip([c.strip() for c in JOB_COLUMNS.split(',')], row))
+    job['payload'] = json.loads(job['payload']) if job['payload'] else {}
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+
+def get(conn, job_id):
+    row = conn.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _as_dict(row) if row else None
+
+
+def claim(conn, worker, kinds=None, lease_seconds=LEASE_SECONDS, exclude=()):
+    """Atomically take the oldest runnable job: queued, or running with an expired lease."""
+    kinds = [kind for kind in (kinds or _HANDLERS) if kind not in exclude]
+    if not kinds:
+        return None
+    marks = ",".join("?" * len(kinds))
+    row = conn.execute(f"""
+        UPDATE jobs
+        SET status = 'running', worker = ?, attempts = attempts + 1,
+            started_at = COALESCE(started_at, DATETIME('now')),
+            lease_expires = DATETIME('now', ?), updated_at = DATETIME('now')
+        WHERE id = (
+            SELECT id FROM jobs
+            WHERE kind IN ({marks})
+              AND (status = 'queued' OR (status = 'running' AND lease_expires < DATETIME('now')))
+            ORDER BY id
+            LIMIT 1
+        )
+        RETURNING {JOB_COLUMNS}
+    """, [worker, f"+{int(lease_seconds)} seconds"] + kinds).fetchall()
+    conn.commit()
+    return _as_dict(row[0]) if row else None
+
+
+def update_progress(conn, job_id, progress, total=None, message=None, lease_seconds=LEASE_SECONDS):
+    """Record progress and extend the lease."""
+    conn.execute("""
+        UPDATE jobs
+        SET progress = ?, total = COALESCE(?, total), message = COALESCE(?, message),
+            lease_expires = DATETIME('now', ?), updated_at = DATETIME('now')
+        WHERE id = ?
+    """, (progress, total, message, f"+{int(lease_seconds)} seconds", job_id))
+    conn.commit()
+
+
+def complete(conn, job_id, result=None, message='Done'):
+    conn.execute("""
+        UPDATE jobs
+        SET status = 'done', result = ?, message = ?, error = NULL, lease_expires = NULL,
+            progress = MAX(progress, total), finished_at = DATETIME('now'), updated_at = DATETIME('now')
+        WHERE id = ?
+    """, (json.dumps(result) if result is not None else None, message, job_id))
+    conn.commit()
+
+
+def fail(conn, job_id, error):
+    """Requeue the job if it has attempts left, otherwise mark it failed."""
+    conn.execute("""
+        UPDATE jobs
+        SET status = CASE WHEN attempts < max_attempts THEN 'queued' ELSE 'failed' END,
+            finished_at = CASE WHEN attempts < max_attempts THEN NULL ELSE DATETIME('now') END,
+            message = CASE WHEN attempts < max_attempts THEN 'Retrying' ELSE 'Failed' END,
+            error = ?, lease_expires = NULL, updated_at = DATETIME('now')
+        WHERE id = ?
+    """, (str(error)[:2000], job_id))
+    conn.commit()
+
+
+def counts(conn):
+    return dict(conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+
+# -------------------- WORKER --------------------
+class JobContext:
+    """Passed to handlers: the worker's connection plus progress reporting."""
+
+    def __init__(self, conn, job):
+        self.conn = conn
+        self.job = job
+
+    @property
+    def last_attempt(self):
+        return self.job['attempts'] >= self.job['max_attempts']
+
+    def progress(self, done, total=None, message=None):
+        update_progress(self.conn, self.job['id'], done, total, message)
+
+
+class Worker:
+    """Claims and runs jobs one at a time until stopped.
+
+    kinds limits it to those job kinds (default: every registered handler); exclude skips some.
+    """
+
+    def __init__(self, connect, name=None, kinds=None, poll_interval=POLL_INTERVAL, exclude=()):
+        self.connect = connect
+        self.name = name or f"{socket.gethostname()}:{os.getpid()}"
+        self.kinds = kinds
+        self.exclude = tuple(exclude)
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.processed = 0
+        self.failed = 0
+        self.last_error = None
+
+    def run_once(self):
+        """Run one job if there is one. Returns True when a job was processed."""
+        conn = self.connect()
+        try:
+            job = claim(conn, self.name, self.kinds, exclude=self.exclude)
+            if job is None:
+                return False
+            fn = _HANDLERS.get(job['kind'])
+            logger.info(f"Job {job['id']} ({job['kind']}) started, attempt {job['attempts']}/{job['max_attempts']}")
+            try:
+                if fn is None:
+                    raise RuntimeError(f"no handler for job kind {job['kind']!r}")
+                result = fn(job, JobContext(conn, job))
+            except Exception as e:
+                if conn.in_transaction:
+                    conn.rollback()
+                self.failed += 1
+                self.last_error = str(e)
+                logger.error(f"Job {job['id']} ({job['kind']}) failed: {e}")
+                fail(conn, job['id'], e)
+            else:
+                complete(conn, job['id'], result)
+                logger.info(f"Job {job['id']} ({job['kind']}) done")
+            self.processed += 1
+            return True
+        finally:
+            conn.close()
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                busy = self.run_once()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Job worker error: {e}")
+                busy = False
+            if not busy:
+                self._stop.wait(self.poll_interval)
+
+    def start(self):
+        """Run in a daemon thread (embedded worker)."""
+        if self._thread and self._thread.is_alive():
+            return True
+        self._stop.clear()
+        self._thread = threading.Thread(target=self.run, name=f"job-worker-{'-'.join(self.kinds or ['all'])}",
+                                        daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'name': self.name,
+            'running': bool(self._thread and self._thread.is_alive()),
+            'processed': self.processed,
+            'failed': self.failed,
+            'last_error': self.last_error,
+        }
+
+
+# -------------------- SCHEDULING --------------------
+class Scheduler:
+    """Background thread that queues a `kind` job every interval unless one is pending.
+
+    `due(conn)`, if given, can veto a run (e.g. nothing to do).
+    """
+
+    def __init__(self, connect, kind, interval, payload=None, message='Queued', due=None):
+        self.connect = connect
+        self.kind = kind
+        self.interval = interval
+        self.payload = payload or {}
+        self.message = message
+        self.due = due
+        self._stop = threading.Event()
+        self._thread = None
+        self.queued = 0
+        self.last_job_id = None
+        self.last_error = None
+
+    def enqueue(self):
+        conn = self.connect()
+        try:
+            # IMMEDIATE so schedulers in other processes can't both see nothing pending and both queue
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                pending = conn.execute(
+                    "SELECT 1 FROM jobs WHERE kind = ? AND status IN ('queued', 'running')", (self.kind,)
+                ).fetchone()
+                if pending or (self.due and not self.due(conn)):
+                    conn.rollback()
+                    return None
+                self.last_job_id = enqueue(conn, self.kind, self.payload, message=self.message)
+            except Exception:
+                conn.rollback()
+                raise
+            self.queued += 1
+            return self.last_job_id
+        finally:
+            conn.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.enqueue()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Could not queue {self.kind} job: {e}")
+
+    def start(self):
+        if self.interval <= 0:
+            return False
+        if self._thread and self._thread.is_alive():
+            return True
+        self._thread = threading.Thread(target=self._run, name=f"{self.kind}-scheduler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        return {
+            'running': bool(self._thread and self._thread.is_alive()),
+            'interval': self.interval,
+            'queued': self.queued,
+            'last_job_id': self.last_job_id,
+            'last_error': self.last_error,
+        }
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    import argparse
+    import db_pool
+    import db_storage
+
+    default_db = os.path.join(os.path.dirname(os.path.abspath(__file__)), "library.db")
+    parser = argparse.ArgumentParser(prog="python jobs.py", description="NOVUS background jobs")
+    parser.add_argument("command", choices=["worker", "status"])
+    parser.add_argument("job_id", nargs="?", type=int)
+    parser.add_argument("--db", default=default_db)
+    parser.add_argument("--once", action="store_true", help="process the queue until empty, then exit")
+    parser.add_argument("--kinds", help="comma-separated job kinds to run (default: all)")
+    parser.add_argument("--exclude", help="comma-separated job kinds to leave to other workers")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    pool = db_pool.ConnectionPool(args.db, pragmas=db_storage.StorageConfig().connection_pragmas())
+
+    if args.command == "status":
+        conn = pool.connect()
+        try:
+            job = get(conn, args.job_id) if args.job_id else None
+            print(json.dumps(job, indent=2) if job else json.dumps(counts(conn)))
+        finally:
+            conn.close()
+        return 0
+
+    kinds = load_handlers()
+    if args.kinds:
+        wanted = [kind.strip() for kind in args.kinds.split(',') if kind.strip()]
+        unknown = sorted(set(wanted) - set(kinds))
+        if unknown:
+            parser.error(f"unknown job kinds: {', '.join(unknown)}")
+        kinds = wanted
+    exclude = [kind.strip() for kind in (args.exclude or '').split(',') if kind.strip()]
+    kinds = [kind for kind in kinds if kind not in exclude]
+    worker = Worker(pool.connect, kinds=kinds)
+    logger.info(f"Worker {worker.name} handling: {', '.join(kinds)}")
+    if args.once:
+        while worker.run_once():
+            pass
+        return 0
+    try:
+        worker.run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
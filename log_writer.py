@@ -0,0 +1,250 @@
+"""
+Batched Log Writer
+Moves append-only log INSERTs (system_logs, ...) off the request thread.
+Callers submit() a row tuple into a bounded in-process queue; a background
+thread drains it and writes rows with executemany() in one transaction,
+once BATCH_SIZE rows are waiting or FLUSH_INTERVAL seconds have passed,
+and once more at shutdown (close(), registered with atexit).
+
+When the queue is full, submit() waits up to BLOCK_SECONDS for room
+(backpressure) and then drops the row; drops are counted in stats(), along
+with batch sizes and flush latency (how long the oldest row of a batch
+waited in the queue).
+
+Writers that need more than one statement per batch pass
+writer=fn(conn, rows) instead of sql; fn runs inside the batch transaction.
+
+A batch that hits a constraint (sqlite3.IntegrityError) is retried one row
+at a time, so a bad row only loses itself, not the rows queued next to it.
+"""
+
+import os
+import time
+import queue
+import logging
+import sqlite3
+import threading
+
+logger = logging.getLogger('novus.logwriter')
+
+BATCH_SIZE = int(os.environ.get("LOG_BATCH_SIZE", "200") or "200")
+FLUSH_INTERVAL = float(os.environ.get("LOG_FLUSH_INTERVAL", "1.0") or "1.0")
+MAX_QUEUE = int(os.environ.get("LOG_MAX_QUEUE", "10000") or "10000")
+BLOCK_SECONDS = float(os.environ.get("LOG_BLOCK_SECONDS", "0.05") or "0.05")
+
+
+_INTERVAL = object()   # flush_interval elapsed
+
+
+class _Flush:
+    """Queue marker: write everything before it, then wake the caller."""
+
+    def __init__(self):
+        self.done = threading.Event()
+
+
+class BatchWriter:
+    """Background thread that batch-inserts queued rows with one statement."""
+
+    def __init__(self, connect, sql=None, name='log-writer', batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL, max_queue=MAX_QUEUE, block_seconds=BLOCK_SECONDS,
+                 retry=None, writer=None):
+        self.connect = connect
+        self.sql = sql
+        self.writer = writer
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.block_seconds = block_seconds
+        # optional decorator wrapped around each batch write (e.g. retry on locked)
+        self._write = retry(self._write_batch) if retry else self._write_batch
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._closed = False
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.blocked = 0
+        self.dropped = 0
+        self.failed = 0
+        self.max_batch = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.last_error = None
+        self.last_flush_at = None
+
+    # ---- producer side ----
+    def submit(self, row):
+        """Queue one row for writing. Returns False if it had to be dropped."""
+        self._ensure_thread()
+        item = (time.monotonic(), row)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self.blocked += 1
+            try:
+                self._queue.put(item, timeout=self.block_seconds)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+                return False
+        with self._lock:
+            self.submitted += 1
+        return True
+
+    def flush(self, timeout=5.0):
+        """Block until every row submitted so far has been written. False if that took over timeout."""
+        if self._closed or not self._running():
+            self._drain_inline()
+            return True
+        deadline = time.monotonic() + timeout
+        marker = _Flush()
+        try:
+            self._queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.done.wait(max(0.0, deadline - time.monotonic()))
+
+    def close(self, timeout=5.0):
+        """Write what is queued and stop the thread (atexit hook)."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        if self._running():
+            try:
+                self._queue.put(None, timeout=timeout)
+            except queue.Full:
+                logger.warning(f"{self.name}: queue still full after {timeout}s, closing without the writer thread")
+            else:
+                self._thread.join(timeout)
+        self._drain_inline()
+
+    # ---- consumer side ----
+    def _running(self):
+        return bool(self._thread and self._thread.is_alive() and self._pid == os.getpid())
+
+    def _ensure_thread(self):
+        if self._running() or self._closed:
+            return
+        with self._lock:
+            if self._running():
+                return
+            # a forked worker process inherits the object but not the thread
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        batch, markers = [], []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = _INTERVAL
+            if isinstance(item, _Flush):
+                markers.append(item)
+            elif item is not None and item is not _INTERVAL:
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+            self._write_rows(batch)
+            for marker in markers:
+                marker.done.set()
+            if item is None:
+                return
+            batch, markers = [], []
+            deadline = None
+
+    def _drain_inline(self):
+        items = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _Flush):
+                item.done.set()
+            elif item is not None:
+                items.append(item)
+        self._write_rows(items)
+
+    def _write_batch(self, rows):
+        conn = self.connect()
+        try:
+            if self.writer:
+                self.writer(conn, rows)
+            else:
+                conn.executemany(self.sql, rows)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _write_rows(self, items):
+        if not items:
+            return
+        oldest = min(queued_at for queued_at, _ in items)
+        rows = [row for _, row in items]
+        try:
+            self._write(rows)
+        except sqlite3.IntegrityError as e:
+            logger.warning(f"{self.name}: batch of {len(rows)} rows rejected ({e}), writing row by row")
+            rows = self._write_each(rows)
+        except Exception as e:
+            with self._lock:
+                self.failed += len(rows)
+                self.last_error = str(e)
+            logger.error(f"{self.name}: could not write {len(rows)} rows: {e}")
+            return
+        if not rows:
+            return
+        latency = time.monotonic() - oldest
+        with self._lock:
+            self.written += len(rows)
+            self.batches += 1
+            self.max_batch = max(self.max_batch, len(rows))
+            self.latency_total += latency
+            self.latency_max = max(self.latency_max, latency)
+            self.last_flush_at = time.time()
+
+    def _write_each(self, rows):
+        """Write rows one per transaction; returns the ones that were written."""
+        written = []
+        for row in rows:
+            try:
+                self._write([row])
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                    self.last_error = str(e)
+                logger.error(f"{self.name}: dropped row {row!r}: {e}")
+            else:
+                written.append(row)
+        return written
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': self._running(),
+                'queued': self._queue.qsize(),
+                'submitted': self.submitted,
+                'written': self.written,
+                'batches': self.batches,
+                'avg_batch': round(self.written / self.batches, 2) if self.batches else None,
+                'max_batch': self.max_batch,
+                'avg_flush_latency_ms': round(1000 * self.latency_total / self.batches, 1) if self.batches else None,
+                'max_flush_latency_ms': round(1000 * self.latency_max, 1),
+                'blocked': self.blocked,
+                'dropped': self.dropped,
+                'failed': self.failed,
+                'last_error': self.last_error,
+                'last_flush_at': self.last_flush_at,
+            }
@@ -0,0 +1,280 @@
+"""Baseline schema: every table, column and trigger init_db() used to create
+
+Safe on both fresh databases and ones created by older versions of the app
+(setup_db.py, migrate_db.py, add_status_column.py, books_add_uploader.py):
+tables are created if missing and columns are only added when absent.
+"""
+
+import logging
+import sqlite3
+
+from migrations import add_column
+
+logger = logging.getLogger('novus.migrations')
+
+
+def upgrade(conn):
+    # users
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id       INTEGER PRIMARY KEY,
+            username TEXT UNIQUE,
+            email    TEXT UNIQUE,
+            password TEXT,
+            role     TEXT
+        )
+    """)
+    add_column(conn, "users", "email", "TEXT")
+    add_column(conn, "users", "is_banned", "INTEGER DEFAULT 0")
+    add_column(conn, "users", "status", "TEXT DEFAULT 'active'")
+    add_column(conn, "users", "google_id", "TEXT")
+    add_column(conn, "users", "facebook_id", "TEXT")
+    add_column(conn, "users", "avatar_url", "TEXT")
+    add_column(conn, "users", "plan", "TEXT")
+    add_column(conn, "users", "plan_expires_at", "TEXT")
+
+    try:
+        conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email ON users(email)")
+    except sqlite3.IntegrityError:
+        logger.warning("Could not create unique index on users.email: duplicate emails exist.")
+
+    conn.execute("UPDATE users SET plan='basic' WHERE plan IS NULL")
+
+    # books (with uploader_id and book_type)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS books (
+            id             INTEGER PRIMARY KEY,
+            title          TEXT,
+            author         TEXT,
+            category       TEXT,
+            pdf_filename   TEXT,
+            audio_filename TEXT,
+            created_at     TEXT,
+            cover_path     TEXT,
+            uploader_id    INTEGER,
+            book_type      TEXT DEFAULT 'book'
+        )
+    """)
+    add_column(conn, "books", "created_at", "TEXT")
+    add_column(conn, "books", "cover_path", "TEXT")
+    add_column(conn, "books", "uploader_id", "INTEGER")
+    add_column(conn, "books", "book_type", "TEXT DEFAULT 'book'")
+    add_column(conn, "books", "description", "TEXT")
+
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS books_created_at_default
+        AFTER INSERT ON books
+        WHEN NEW.created_at IS NULL
+        BEGIN
+            UPDATE books
+            SET created_at = DATETIME('now')
+            WHERE id = NEW.id;
+        END
+    """)
+
+    # AI summaries cache
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS ai_summaries (
+            id INTEGER PRIMARY KEY,
+            item_type TEXT,
+            item_id INTEGER,
+            summary TEXT,
+            model TEXT,
+            created_at TEXT,
+            UNIQUE(item_type, item_id)
+        )
+    """)
+
+    # image summaries cache
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS image_summaries (
+            id INTEGER PRIMARY KEY,
+            chapter_id INTEGER,
+            page_num INTEGER,
+            summary TEXT,
+            created_at TEXT DEFAULT (DATETIME('now')),
+            UNIQUE(chapter_id, page_num)
+        )
+    """)
+
+    # reading history
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS history (
+            id        INTEGER PRIMARY KEY,
+            user_id   INTEGER,
+            book_id   INTEGER,
+            date_read DATE
+        )
+    """)
+
+    # watchlist
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS watchlist (
+            id         INTEGER PRIMARY KEY,
+            user_id    INTEGER NOT NULL,
+            book_id    INTEGER NOT NULL,
+            status     TEXT DEFAULT 'planned',
+            progress   INTEGER DEFAULT 0,
+            created_at TEXT DEFAULT (DATETIME('now')),
+            UNIQUE(user_id, book_id)
+        )
+    """)
+
+    # favorites
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS favorites (
+            id         INTEGER PRIMARY KEY,
+            user_id    INTEGER NOT NULL,
+            book_id    INTEGER NOT NULL,
+            created_at TEXT DEFAULT (DATETIME('now')),
+            UNIQUE(user_id, book_id)
+        )
+    """)
+
+    # reports (user reports on manga/books)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reports (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER,
+            manga_id INTEGER,
+            reason TEXT,
+            created_at TEXT DEFAULT (DATETIME('now'))
+        )
+    """)
+
+    # user_reports (user reports on other users)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_reports (
+            id INTEGER PRIMARY KEY,
+            reporter_id INTEGER NOT NULL,
+            reported_user_id INTEGER NOT NULL,
+            reason TEXT,
+            created_at TEXT DEFAULT (DATETIME('now')),
+            FOREIGN KEY (reporter_id) REFERENCES users(id),
+            FOREIGN KEY (reported_user_id) REFERENCES users(id)
+        )
+    """)
+
+    # reviews (book/manga reviews)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reviews (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            book_id INTEGER NOT NULL,
+            rating INTEGER,
+            content TEXT,
+            created_at TEXT DEFAULT (DATETIME('now')),
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (book_id) REFERENCES books(id)
+        )
+    """)
+
+    # chapter_reviews (chapter reviews)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chapter_reviews (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            chapter_id INTEGER NOT NULL,
+            rating INTEGER,
+            content TEXT,
+            created_at TEXT DEFAULT (DATETIME('now')),
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (chapter_id) REFERENCES chapters(id),
+            UNIQUE(user_id, chapter_id)
+        )
+    """)
+
+    # activity log (track user reading activities)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS activity_log (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            book_id INTEGER NOT NULL,
+            activity_type TEXT NOT NULL,
+            summary_generated INTEGER DEFAULT 0,
+            timestamp TEXT DEFAULT (DATETIME('now')),
+            FOREIGN KEY (user_id) REFERENCES users(id),
+            FOREIGN KEY (book_id) REFERENCES books(id)
+        )
+    """)
+
+    # system logs (track system events, admin actions, errors)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS system_logs (
+            id INTEGER PRIMARY KEY,
+            level TEXT NOT NULL,  -- INFO, WARNING, ERROR, CRITICAL
+            category TEXT NOT NULL,  -- auth, admin, upload, error, system
+            message TEXT NOT NULL,
+            user_id INTEGER,  -- NULL for system events
+            ip_address TEXT,
+            user_agent TEXT,
+            details TEXT,  -- JSON string for additional data
+            timestamp TEXT DEFAULT (DATETIME('now')),
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+    # team
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS team (
+            id          INTEGER PRIMARY KEY,
+            full_name   TEXT NOT NULL,
+            role        TEXT,
+            bio         TEXT,
+            avatar_path TEXT,
+            initials    TEXT,
+            created_at  TEXT
+        )
+    """)
+
+    # role change / publisher requests
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS role_requests (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            requested_role TEXT NOT NULL,           -- e.g. 'publisher'
+            status TEXT NOT NULL DEFAULT 'pending', -- pending / approved / rejected
+            created_at TEXT DEFAULT (DATETIME('now'))
+        )
+    """)
+
+    # manga chapters
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chapters (
+            id          INTEGER PRIMARY KEY,
+            manga_id    INTEGER NOT NULL,
+            chapter_num INTEGER NOT NULL,
+            title       TEXT,
+            pdf_filename TEXT,
+            page_count  INTEGER DEFAULT 0,
+            created_at  TEXT DEFAULT (DATETIME('now')),
+            FOREIGN KEY (manga_id) REFERENCES books(id),
+            UNIQUE(manga_id, chapter_num)
+        )
+    """)
+    add_column(conn, "chapters", "page_count", "INTEGER DEFAULT 0")
+
+    # manga characters (for character profiles in reader)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS manga_characters (
+            id          INTEGER PRIMARY KEY,
+            manga_id    INTEGER NOT NULL,
+            name        TEXT NOT NULL,
+            description TEXT,
+            role        TEXT,
+            avatar_url  TEXT,
+            created_at  TEXT DEFAULT (DATETIME('now')),
+            FOREIGN KEY (manga_id) REFERENCES books(id)
+        )
+    """)
+
+    # default users
+    for username, email, role in (
+        ("admin", "admin@novus.local", "admin"),
+        ("publisher", "publisher@novus.local", "publisher"),
+        ("student", "student@novus.local", "student"),
+    ):
+        conn.execute(
+            "INSERT OR IGNORE INTO users (username, email, password, role, plan) VALUES (?, ?, ?, ?, 'basic')",
+            (username, email, "123", role),
+        )
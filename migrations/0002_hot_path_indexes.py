@@ -0,0 +1,37 @@
+"""Secondary indexes for the per-user and per-book hot query paths
+
+Each index matches the WHERE + ORDER BY of a route that used to full-scan
+its table (see tests/test_query_plans.py for the queries they serve).
+"""
+
+INDEXES = [
+    # profile() reading history, public_profile() read count, watchlist()/favorites() "recently read"
+    "CREATE INDEX IF NOT EXISTS idx_history_user_date ON history(user_id, date_read)",
+    # profile() "currently reading", public_profile() status counts
+    "CREATE INDEX IF NOT EXISTS idx_watchlist_user_status ON watchlist(user_id, status, created_at)",
+    # favorites() list
+    "CREATE INDEX IF NOT EXISTS idx_favorites_user_created ON favorites(user_id, created_at)",
+    # profile()/public_profile() recent activity, /api/activity-log, user_profile() activity count
+    "CREATE INDEX IF NOT EXISTS idx_activity_log_user_ts ON activity_log(user_id, timestamp)",
+    # view_book() review listing
+    "CREATE INDEX IF NOT EXISTS idx_reviews_book_created ON reviews(book_id, created_at)",
+    # profile() average rating, user_profile() review count (covering)
+    "CREATE INDEX IF NOT EXISTS idx_reviews_user_rating ON reviews(user_id, rating)",
+    # chapter reviews per chapter
+    "CREATE INDEX IF NOT EXISTS idx_chapter_reviews_chapter ON chapter_reviews(chapter_id, created_at)",
+    # admin_system_logs(): level (+category) filters, category-only filter, unfiltered newest-first
+    "CREATE INDEX IF NOT EXISTS idx_system_logs_level_cat_ts ON system_logs(level, category, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_system_logs_category_ts ON system_logs(category, timestamp)",
+    "CREATE INDEX IF NOT EXISTS idx_system_logs_ts ON system_logs(timestamp)",
+    # reader character panel
+    "CREATE INDEX IF NOT EXISTS idx_manga_characters_manga ON manga_characters(manga_id)",
+    # my_uploads() for publishers, user_profile() uploaded books
+    "CREATE INDEX IF NOT EXISTS idx_books_uploader_created ON books(uploader_id, created_at)",
+    # admin reports page
+    "CREATE INDEX IF NOT EXISTS idx_user_reports_reported ON user_reports(reported_user_id, created_at)",
+]
+
+
+def upgrade(conn):
+    for sql in INDEXES:
+        conn.execute(sql)
@@ -0,0 +1,90 @@
+"""FTS5 catalog search index over books and manga character names
+
+Creates books_fts plus the triggers that keep it in sync (catalog_search.SCHEMA
+as of this version) and fills it from the existing catalog. On SQLite builds
+without FTS5 this is a no-op and search keeps using LIKE.
+"""
+
+import sqlite3
+import logging
+
+logger = logging.getLogger('novus.migrations')
+
+SCHEMA = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+        title, author, category, description, characters,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_after_insert AFTER INSERT ON books
+    BEGIN
+        INSERT INTO books_fts (rowid, title, author, category, description, characters)
+        VALUES (NEW.id, NEW.title, NEW.author, NEW.category, NEW.description,
+                (SELECT group_concat(name, ' ') FROM manga_characters WHERE manga_id = NEW.id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_after_update
+    AFTER UPDATE OF title, author, category, description ON books
+    BEGIN
+        DELETE FROM books_fts WHERE rowid = OLD.id;
+        INSERT INTO books_fts (rowid, title, author, category, description, characters)
+        VALUES (NEW.id, NEW.title, NEW.author, NEW.category, NEW.description,
+                (SELECT group_concat(name, ' ') FROM manga_characters WHERE manga_id = NEW.id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_after_delete AFTER DELETE ON books
+    BEGIN
+        DELETE FROM books_fts WHERE rowid = OLD.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_characters_insert AFTER INSERT ON manga_characters
+    BEGIN
+        UPDATE books_fts SET characters = (SELECT group_concat(name, ' ') FROM manga_characters
+                                           WHERE manga_id = NEW.manga_id)
+        WHERE rowid = NEW.manga_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_characters_update AFTER UPDATE ON manga_characters
+    BEGIN
+        UPDATE books_fts SET characters = (SELECT group_concat(name, ' ') FROM manga_characters
+                                           WHERE manga_id = OLD.manga_id)
+        WHERE rowid = OLD.manga_id;
+        UPDATE books_fts SET characters = (SELECT group_concat(name, ' ') FROM manga_characters
+                                           WHERE manga_id = NEW.manga_id)
+        WHERE rowid = NEW.manga_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS books_fts_characters_delete AFTER DELETE ON manga_characters
+    BEGIN
+        UPDATE books_fts SET characters = (SELECT group_concat(name, ' ') FROM manga_characters
+                                           WHERE manga_id = OLD.manga_id)
+        WHERE rowid = OLD.manga_id;
+    END
+    """,
+]
+
+
+def upgrade(conn):
+    try:
+        for sql in SCHEMA:
+            conn.execute(sql)
+    except sqlite3.OperationalError as e:
+        if 'fts5' in str(e).lower():
+            logger.warning("SQLite build has no FTS5; catalog search falls back to LIKE.")
+            return
+        raise
+    conn.execute("DELETE FROM books_fts")
+    conn.execute("""
+        INSERT INTO books_fts (rowid, title, author, category, description, characters)
+        SELECT b.id, b.title, b.author, b.category, b.description,
+               (SELECT group_concat(name, ' ') FROM manga_characters WHERE manga_id = b.id)
+        FROM books b
+    """)
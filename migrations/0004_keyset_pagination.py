@@ -0,0 +1,25 @@
+"""Indexes on (created_at, id) for keyset pagination of the catalog lists
+
+created_at is normalized to DATETIME() text first so that comparing the raw
+column orders rows the same way ORDER BY datetime(created_at) used to; rows
+without a timestamp sort as oldest.
+"""
+
+EPOCH = '1970-01-01 00:00:00'
+
+INDEXES = [
+    # home() and the admin view of my_uploads()
+    "CREATE INDEX IF NOT EXISTS idx_books_created_id ON books(created_at, id)",
+    # manga() (and home(), which excludes manga) seek on the same expression the queries use
+    "CREATE INDEX IF NOT EXISTS idx_books_type_created ON books(COALESCE(book_type, 'book'), created_at, id)",
+    # watchlist() table
+    "CREATE INDEX IF NOT EXISTS idx_watchlist_user_created ON watchlist(user_id, created_at, id)",
+]
+
+
+def upgrade(conn):
+    for table in ('books', 'watchlist'):
+        conn.execute(f"UPDATE {table} SET created_at = COALESCE(datetime(created_at), ?) "
+                     f"WHERE created_at IS NULL OR created_at IS NOT datetime(created_at)", (EPOCH,))
+    for sql in INDEXES:
+        conn.execute(sql)
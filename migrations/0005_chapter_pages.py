@@ -0,0 +1,96 @@
+"""chapter_pages table: one row per manga page, backfilled from disk
+
+Pages of existing chapters are taken from chapters.pdf_filename when those
+files exist, otherwise from the chapter directory listing (the backfill is
+chapter_pages.backfill as of this version). chapters.pdf_filename is kept for
+older readers.
+"""
+
+import os
+import hashlib
+import logging
+import mimetypes
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    Image = None
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger('novus.migrations')
+
+STATIC_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+
+PAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.webp', '.pdf'}
+
+
+def _probe(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as fh:
+        for block in iter(lambda: fh.read(1 << 16), b''):
+            digest.update(block)
+    mime = mimetypes.guess_type(file_path)[0] or 'application/octet-stream'
+    width = height = None
+    if PIL_AVAILABLE and mime.startswith('image/'):
+        try:
+            with Image.open(file_path) as img:
+                width, height = img.size
+        except Exception as e:
+            logger.warning(f"Could not read image size of {file_path}: {e}")
+    return width, height, os.path.getsize(file_path), digest.hexdigest(), mime
+
+
+def _chapter_files(full_dir):
+    if not os.path.isdir(full_dir):
+        return []
+    files = [f for f in os.listdir(full_dir) if os.path.splitext(f)[1].lower() in PAGE_EXTENSIONS]
+    return sorted(files, key=lambda f: int(''.join(filter(str.isdigit, f)) or '0'))
+
+
+def _backfill(conn, static_root=STATIC_ROOT):
+    chapters = conn.execute("""
+        SELECT id, manga_id, chapter_num, pdf_filename FROM chapters
+        WHERE NOT EXISTS (SELECT 1 FROM chapter_pages p WHERE p.chapter_id = chapters.id)
+    """).fetchall()
+    for chapter_id, manga_id, chapter_num, pdf_filename in chapters:
+        rel_dir = f"manga/manga_{manga_id}_ch{chapter_num}"
+        full_dir = os.path.join(static_root, rel_dir)
+        filenames = [f.strip() for f in (pdf_filename or '').split(',') if f.strip()]
+        if not all(os.path.isfile(os.path.join(full_dir, f)) for f in filenames):
+            filenames = []
+        rows = []
+        for filename in filenames or _chapter_files(full_dir):
+            full_path = os.path.join(full_dir, filename)
+            if not os.path.isfile(full_path):
+                logger.warning(f"Chapter {chapter_id}: page file {rel_dir}/{filename} not found, skipped")
+                continue
+            rows.append((chapter_id, len(rows) + 1, f"{rel_dir}/{filename}") + _probe(full_path))
+        conn.executemany("INSERT INTO chapter_pages (chapter_id, page_num, path, width, height, bytes, "
+                         "content_hash, mime) VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS chapter_pages (
+            chapter_id   INTEGER NOT NULL,
+            page_num     INTEGER NOT NULL,
+            path         TEXT NOT NULL,     -- relative to static/
+            width        INTEGER,
+            height       INTEGER,
+            bytes        INTEGER,
+            content_hash TEXT,              -- sha256 hex
+            mime         TEXT,
+            created_at   TEXT DEFAULT (DATETIME('now')),
+            PRIMARY KEY (chapter_id, page_num),
+            FOREIGN KEY (chapter_id) REFERENCES chapters(id)
+        )
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS chapter_pages_after_chapter_delete
+        AFTER DELETE ON chapters
+        BEGIN
+            DELETE FROM chapter_pages WHERE chapter_id = OLD.id;
+        END
+    """)
+    _backfill(conn)
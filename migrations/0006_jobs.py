@@ -0,0 +1,28 @@
+"""jobs table for the background job queue (see jobs.py)"""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id            INTEGER PRIMARY KEY,
+            kind          TEXT NOT NULL,
+            payload       TEXT,                            -- JSON
+            status        TEXT NOT NULL DEFAULT 'queued',  -- queued / running / done / failed
+            progress      INTEGER DEFAULT 0,
+            total         INTEGER DEFAULT 0,
+            message       TEXT,
+            result        TEXT,                            -- JSON
+            error         TEXT,
+            attempts      INTEGER DEFAULT 0,
+            max_attempts  INTEGER DEFAULT 2,
+            user_id       INTEGER,
+            worker        TEXT,
+            lease_expires TEXT,
+            created_at    TEXT DEFAULT (DATETIME('now')),
+            started_at    TEXT,
+            finished_at   TEXT,
+            updated_at    TEXT DEFAULT (DATETIME('now'))
+        )
+    """)
+    # claim(): oldest queued job / expired leases
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_id ON jobs(status, id)")
@@ -0,0 +1,29 @@
+"""image_variants table: resized WebP derivatives of pages and covers (see image_variants.py)
+
+Existing images are converted by `python image_variants.py backfill`, not
+here, so that startup does not wait on image encoding.
+"""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS image_variants (
+            source_path TEXT NOT NULL,      -- relative to static/
+            variant     TEXT NOT NULL,      -- thumb / medium / full
+            path        TEXT NOT NULL,      -- relative to static/
+            width       INTEGER,
+            height      INTEGER,
+            bytes       INTEGER,
+            source_hash TEXT,               -- sha256 of the source file the variant was made from
+            created_at  TEXT DEFAULT (DATETIME('now')),
+            PRIMARY KEY (source_path, variant)
+        )
+    """)
+    # a replaced or deleted page takes its derivative rows with it
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS image_variants_after_page_delete
+        AFTER DELETE ON chapter_pages
+        BEGIN
+            DELETE FROM image_variants WHERE source_path = OLD.path;
+        END
+    """)
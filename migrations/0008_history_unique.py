@@ -0,0 +1,15 @@
+"""One history row per (user, book), enforced by a unique index
+
+view_book() used to check for an existing row before inserting; the
+activity writer now relies on INSERT OR IGNORE against this key instead.
+Duplicates left by concurrent requests are removed first, keeping the
+earliest row.
+"""
+
+
+def upgrade(conn):
+    conn.execute("""
+        DELETE FROM history
+        WHERE id NOT IN (SELECT MIN(id) FROM history GROUP BY user_id, book_id)
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_history_user_book ON history(user_id, book_id)")
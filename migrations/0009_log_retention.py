@@ -0,0 +1,62 @@
+"""Daily rollup tables, log_facets counters and a timestamp index for log retention (see retention.py)
+
+log_facets keeps a live row count per distinct system_logs level/category,
+maintained by triggers, so the admin log filters don't scan the table.
+"""
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS activity_daily (
+            day           TEXT NOT NULL,        -- YYYY-MM-DD
+            user_id       INTEGER,
+            book_id       INTEGER,
+            activity_type TEXT NOT NULL,
+            count         INTEGER NOT NULL DEFAULT 0,
+            summaries     INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, user_id, book_id, activity_type)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS system_logs_daily (
+            day      TEXT NOT NULL,
+            level    TEXT NOT NULL,
+            category TEXT NOT NULL,
+            count    INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, level, category)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS log_facets (
+            table_name  TEXT NOT NULL,
+            column_name TEXT NOT NULL,
+            value       TEXT NOT NULL,
+            rows        INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (table_name, column_name, value)
+        )
+    """)
+    for column in ('level', 'category'):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS system_logs_facet_{column}_insert
+            AFTER INSERT ON system_logs
+            BEGIN
+                INSERT INTO log_facets (table_name, column_name, value, rows)
+                VALUES ('system_logs', '{column}', NEW.{column}, 1)
+                ON CONFLICT (table_name, column_name, value) DO UPDATE SET rows = rows + 1;
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS system_logs_facet_{column}_delete
+            AFTER DELETE ON system_logs
+            BEGIN
+                UPDATE log_facets SET rows = rows - 1
+                WHERE table_name = 'system_logs' AND column_name = '{column}' AND value = OLD.{column};
+            END
+        """)
+        conn.execute(f"""
+            INSERT OR REPLACE INTO log_facets (table_name, column_name, value, rows)
+            SELECT 'system_logs', '{column}', {column}, COUNT(*) FROM system_logs
+            WHERE {column} IS NOT NULL GROUP BY {column}
+        """)
+    # expiry scans activity_log by age
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_activity_log_ts ON activity_log(timestamp)")
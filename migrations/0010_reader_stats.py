@@ -0,0 +1,148 @@
+"""Materialized per-user reader stats for the profile pages (see reader_stats.py)
+
+Creates user_stats plus the triggers on history, watchlist, favorites,
+reviews and users that keep it current, then fills it from the existing rows.
+The triggers are reader_stats.TRIGGERS as first written; 0017 replaces the
+JSON counter ones.
+"""
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id          INTEGER PRIMARY KEY,
+        read_count       INTEGER NOT NULL DEFAULT 0,
+        genre_counts     TEXT NOT NULL DEFAULT '{}',   -- JSON {genre: books read}
+        favorite_genre   TEXT,
+        watchlist_counts TEXT NOT NULL DEFAULT '{}',   -- JSON {status: entries}
+        favorite_count   INTEGER NOT NULL DEFAULT 0,
+        review_count     INTEGER NOT NULL DEFAULT 0,   -- reviews with a rating
+        rating_sum       INTEGER NOT NULL DEFAULT 0,
+        pages_read       INTEGER NOT NULL DEFAULT 0,
+        updated_at       TEXT DEFAULT (DATETIME('now'))
+    )
+"""
+
+_GENRE = "(SELECT COALESCE(category, 'General') FROM books WHERE id = {book})"
+
+_FAVORITE_GENRE = """
+    UPDATE user_stats SET favorite_genre = (SELECT key FROM json_each(user_stats.genre_counts)
+                                            WHERE value > 0 ORDER BY value DESC, key LIMIT 1)
+    WHERE user_id = {uid};
+"""
+
+
+def _bump(uid, column, key, delta):
+    return f"""
+    UPDATE user_stats SET {column} = json_set({column}, '$."' || {key} || '"',
+                                              MAX(0, COALESCE(json_extract({column}, '$."' || {key} || '"'), 0)
+                                                     + ({delta}))),
+                          updated_at = DATETIME('now')
+    WHERE user_id = {uid} AND {key} IS NOT NULL;
+    """
+
+
+TRIGGERS = {
+    'user_stats_history_insert': f"""
+        AFTER INSERT ON history BEGIN
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+        UPDATE user_stats SET read_count = MAX(0, read_count + 1), updated_at = DATETIME('now')
+        WHERE user_id = NEW.user_id;
+        {_bump('NEW.user_id', 'genre_counts', _GENRE.format(book='NEW.book_id'), 1)}
+        {_FAVORITE_GENRE.format(uid='NEW.user_id')}
+        END
+    """,
+    'user_stats_history_delete': f"""
+        AFTER DELETE ON history BEGIN
+        UPDATE user_stats SET read_count = MAX(0, read_count - 1), updated_at = DATETIME('now')
+        WHERE user_id = OLD.user_id;
+        {_bump('OLD.user_id', 'genre_counts', _GENRE.format(book='OLD.book_id'), -1)}
+        {_FAVORITE_GENRE.format(uid='OLD.user_id')}
+        END
+    """,
+    'user_stats_watchlist_insert': f"""
+        AFTER INSERT ON watchlist BEGIN
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+        {_bump('NEW.user_id', 'watchlist_counts', 'NEW.status', 1)}
+        END
+    """,
+    'user_stats_watchlist_delete': f"""
+        AFTER DELETE ON watchlist BEGIN
+        {_bump('OLD.user_id', 'watchlist_counts', 'OLD.status', -1)}
+        END
+    """,
+    'user_stats_watchlist_status': f"""
+        AFTER UPDATE OF status ON watchlist WHEN OLD.status IS NOT NEW.status BEGIN
+        {_bump('OLD.user_id', 'watchlist_counts', 'OLD.status', -1)}
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+        {_bump('NEW.user_id', 'watchlist_counts', 'NEW.status', 1)}
+        END
+    """,
+    'user_stats_favorites_insert': """
+        AFTER INSERT ON favorites BEGIN
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+        UPDATE user_stats SET favorite_count = MAX(0, favorite_count + 1), updated_at = DATETIME('now')
+        WHERE user_id = NEW.user_id;
+        END
+    """,
+    'user_stats_favorites_delete': """
+        AFTER DELETE ON favorites BEGIN
+        UPDATE user_stats SET favorite_count = MAX(0, favorite_count - 1), updated_at = DATETIME('now')
+        WHERE user_id = OLD.user_id;
+        END
+    """,
+    'user_stats_reviews_insert': """
+        AFTER INSERT ON reviews WHEN NEW.rating IS NOT NULL BEGIN
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+        UPDATE user_stats SET review_count = MAX(0, review_count + 1),
+                              rating_sum = MAX(0, rating_sum + NEW.rating), updated_at = DATETIME('now')
+        WHERE user_id = NEW.user_id;
+        END
+    """,
+    'user_stats_reviews_delete': """
+        AFTER DELETE ON reviews WHEN OLD.rating IS NOT NULL BEGIN
+        UPDATE user_stats SET review_count = MAX(0, review_count - 1),
+                              rating_sum = MAX(0, rating_sum - OLD.rating), updated_at = DATETIME('now')
+        WHERE user_id = OLD.user_id;
+        END
+    """,
+    'user_stats_reviews_rating': """
+        AFTER UPDATE OF rating ON reviews WHEN OLD.rating IS NOT NEW.rating BEGIN
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+        UPDATE user_stats
+        SET review_count = MAX(0, review_count + (NEW.rating IS NOT NULL) - (OLD.rating IS NOT NULL)),
+            rating_sum = MAX(0, rating_sum + COALESCE(NEW.rating, 0) - COALESCE(OLD.rating, 0)),
+            updated_at = DATETIME('now')
+        WHERE user_id = NEW.user_id;
+        END
+    """,
+    'user_stats_user_delete': """
+        AFTER DELETE ON users BEGIN
+        DELETE FROM user_stats WHERE user_id = OLD.id;
+        END
+    """,
+}
+
+
+def upgrade(conn):
+    conn.execute(SCHEMA)
+    for name, body in TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {body}")
+    conn.execute("DELETE FROM user_stats")
+    conn.execute("""
+        INSERT INTO user_stats (user_id, read_count, genre_counts, watchlist_counts,
+                                favorite_count, review_count, rating_sum)
+        SELECT u.id,
+               (SELECT COUNT(*) FROM history h WHERE h.user_id = u.id),
+               (SELECT COALESCE(json_group_object(genre, n), '{}') FROM (
+                    SELECT COALESCE(b.category, 'General') AS genre, COUNT(*) AS n
+                    FROM history h JOIN books b ON b.id = h.book_id
+                    WHERE h.user_id = u.id GROUP BY 1)),
+               (SELECT COALESCE(json_group_object(status, n), '{}') FROM (
+                    SELECT status, COUNT(*) AS n FROM watchlist w
+                    WHERE w.user_id = u.id AND status IS NOT NULL GROUP BY status)),
+               (SELECT COUNT(*) FROM favorites f WHERE f.user_id = u.id),
+               (SELECT COUNT(rating) FROM reviews r WHERE r.user_id = u.id),
+               (SELECT COALESCE(SUM(rating), 0) FROM reviews r WHERE r.user_id = u.id)
+        FROM users u
+    """)
+    conn.execute(_FAVORITE_GENRE.format(uid='user_id'))
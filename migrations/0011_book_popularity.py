@@ -0,0 +1,76 @@
+"""Per-book popularity counters and trending scores (see popularity.py)
+
+Creates book_popularity plus the triggers on watchlist, favorites, history,
+reviews and books that keep it current, then fills it from the existing rows.
+Counters, weights and the trending replay are popularity.py's as of this
+version.
+"""
+
+import os
+import time
+
+HALF_LIFE = float(os.environ.get("POPULARITY_HALF_LIFE_HOURS", "72") or "72") * 3600
+
+# source table -> (counter column, trending weight, timestamp column)
+WEIGHTS = {
+    'watchlist': ('wishlist_count', 3.0, 'created_at'),
+    'favorites': ('favorite_count', 4.0, 'created_at'),
+    'history': ('read_count', 1.0, 'date_read'),
+    'reviews': ('review_count', 2.0, 'created_at'),
+}
+
+
+def upgrade(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS book_popularity (
+            book_id        INTEGER PRIMARY KEY,
+            wishlist_count INTEGER NOT NULL DEFAULT 0,
+            favorite_count INTEGER NOT NULL DEFAULT 0,
+            read_count     INTEGER NOT NULL DEFAULT 0,
+            review_count   INTEGER NOT NULL DEFAULT 0,
+            trend_score    REAL NOT NULL DEFAULT 0,
+            trend_pending  REAL NOT NULL DEFAULT 0,   -- weight added since the last fold
+            trend_at       REAL                       -- epoch seconds of the last fold
+        )
+    """)
+    for table, (column, weight, _) in WEIGHTS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS book_popularity_{table}_insert")
+        conn.execute(f"""
+            CREATE TRIGGER book_popularity_{table}_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO book_popularity (book_id, {column}, trend_pending) VALUES (NEW.book_id, 1, {weight})
+                ON CONFLICT (book_id) DO UPDATE SET {column} = {column} + 1,
+                                                    trend_pending = trend_pending + {weight};
+            END
+        """)
+        conn.execute(f"DROP TRIGGER IF EXISTS book_popularity_{table}_delete")
+        conn.execute(f"""
+            CREATE TRIGGER book_popularity_{table}_delete AFTER DELETE ON {table} BEGIN
+                UPDATE book_popularity SET {column} = MAX(0, {column} - 1) WHERE book_id = OLD.book_id;
+            END
+        """)
+    conn.execute("DROP TRIGGER IF EXISTS book_popularity_book_delete")
+    conn.execute("""
+        CREATE TRIGGER book_popularity_book_delete AFTER DELETE ON books BEGIN
+            DELETE FROM book_popularity WHERE book_id = OLD.id;
+        END
+    """)
+
+    now = time.time()
+    counts = ", ".join(f"(SELECT COUNT(*) FROM {table} t WHERE t.book_id = b.id)" for table in WEIGHTS)
+    conn.execute("DELETE FROM book_popularity")
+    conn.execute(f"""
+        INSERT INTO book_popularity (book_id, {', '.join(c for c, _, _ in WEIGHTS.values())}, trend_at)
+        SELECT b.id, {counts}, ? FROM books b
+    """, (now,))
+    # replay timestamped events with their decay, ignoring anything older than ~10 half-lives
+    scores = {}
+    for table, (_, weight, ts_column) in WEIGHTS.items():
+        rows = conn.execute(
+            f"SELECT book_id, CAST(strftime('%s', {ts_column}) AS REAL) FROM {table} "
+            f"WHERE CAST(strftime('%s', {ts_column}) AS INTEGER) >= ?", (int(now - 10 * HALF_LIFE),)
+        ).fetchall()
+        for book_id, ts in rows:
+            if ts is not None:
+                scores[book_id] = scores.get(book_id, 0.0) + weight * 0.5 ** (max(0.0, now - ts) / HALF_LIFE)
+    conn.executemany("UPDATE book_popularity SET trend_score = ? WHERE book_id = ?",
+                     [(round(score, 4), book_id) for book_id, score in scores.items()])
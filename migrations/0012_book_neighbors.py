@@ -0,0 +1,54 @@
+"""Stored per-book recommendations and the dirty set that drives their refresh (see recommender.py)
+
+Every existing book is marked dirty, so the first 'recommendations' job (or
+`python recommender.py build`) computes the whole index. The tables and
+triggers are recommender.SCHEMA / DIRTY_TRIGGERS as of this version.
+"""
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS book_neighbors (
+        book_id     INTEGER NOT NULL,
+        rank        INTEGER NOT NULL,          -- 0 = most similar
+        neighbor_id INTEGER NOT NULL,
+        score       REAL NOT NULL,
+        PRIMARY KEY (book_id, rank)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_book_neighbors_neighbor ON book_neighbors(neighbor_id)",
+    """
+    CREATE TABLE IF NOT EXISTS book_neighbors_dirty (
+        book_id   INTEGER PRIMARY KEY,
+        marked_at TEXT DEFAULT (DATETIME('now'))
+    )
+    """,
+]
+
+# trigger name -> (event, book id expression)
+DIRTY_TRIGGERS = {
+    'book_neighbors_book_insert': ("AFTER INSERT ON books", "NEW.id"),
+    'book_neighbors_book_update': ("AFTER UPDATE OF category, author, book_type ON books", "NEW.id"),
+    'book_neighbors_history_insert': ("AFTER INSERT ON history", "NEW.book_id"),
+    'book_neighbors_watchlist_insert': ("AFTER INSERT ON watchlist", "NEW.book_id"),
+    'book_neighbors_favorites_insert': ("AFTER INSERT ON favorites", "NEW.book_id"),
+}
+
+
+def upgrade(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+    for name, (event, book_id) in DIRTY_TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"""
+            CREATE TRIGGER {name} {event} WHEN {book_id} IS NOT NULL BEGIN
+                INSERT OR IGNORE INTO book_neighbors_dirty (book_id) VALUES ({book_id});
+            END
+        """)
+    conn.execute("DROP TRIGGER IF EXISTS book_neighbors_book_delete")
+    conn.execute("""
+        CREATE TRIGGER book_neighbors_book_delete AFTER DELETE ON books BEGIN
+            DELETE FROM book_neighbors WHERE book_id = OLD.id OR neighbor_id = OLD.id;
+            DELETE FROM book_neighbors_dirty WHERE book_id = OLD.id;
+        END
+    """)
+    conn.execute("INSERT OR IGNORE INTO book_neighbors_dirty (book_id) SELECT id FROM books")
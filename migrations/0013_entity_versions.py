@@ -0,0 +1,78 @@
+"""Per-resource version counters behind the reader APIs' ETag / Last-Modified (see http_cache.py)
+
+The table and triggers are http_cache.SCHEMA / TRIGGERS as of this version.
+"""
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entity_versions (
+    entity      TEXT    NOT NULL,
+    entity_id   INTEGER NOT NULL,
+    version     INTEGER NOT NULL DEFAULT 1,
+    updated_at  TEXT    NOT NULL DEFAULT (DATETIME('now')),
+    PRIMARY KEY (entity, entity_id)
+) WITHOUT ROWID
+"""
+
+
+def _bump(entity, id_expr, source=""):
+    """Upsert statement bumping (entity, id_expr); `source` is an optional FROM ... WHERE ... clause."""
+    if source:
+        select = f"SELECT '{entity}', {id_expr}, 1, DATETIME('now') {source}"
+    else:
+        select = f"VALUES ('{entity}', {id_expr}, 1, DATETIME('now'))"
+    return (f"INSERT INTO entity_versions (entity, entity_id, version, updated_at) {select} "
+            "ON CONFLICT (entity, entity_id) DO UPDATE SET "
+            "version = entity_versions.version + 1, updated_at = excluded.updated_at;")
+
+
+def _pages_of(row, when=""):
+    return _bump('chapter', 'chapter_id', f"FROM chapter_pages WHERE path = {row}.source_path {when}")
+
+
+def _moved(column):
+    """Bump condition for the NEW side of an UPDATE: only when `column` changed (OLD is bumped anyway)."""
+    return f"WHERE NEW.{column} IS NOT OLD.{column}"
+
+
+TRIGGERS = {
+    'entity_versions_pages_ins': ("AFTER INSERT ON chapter_pages", [_bump('chapter', 'NEW.chapter_id')]),
+    'entity_versions_pages_upd': ("AFTER UPDATE ON chapter_pages", [
+        _bump('chapter', 'OLD.chapter_id'), _bump('chapter', 'NEW.chapter_id', _moved('chapter_id'))]),
+    'entity_versions_pages_del': ("AFTER DELETE ON chapter_pages", [_bump('chapter', 'OLD.chapter_id')]),
+    'entity_versions_variants_ins': ("AFTER INSERT ON image_variants", [_pages_of('NEW')]),
+    'entity_versions_variants_upd': ("AFTER UPDATE ON image_variants", [
+        _pages_of('OLD'), _pages_of('NEW', "AND NEW.source_path IS NOT OLD.source_path")]),
+    'entity_versions_variants_del': ("AFTER DELETE ON image_variants", [_pages_of('OLD')]),
+    'entity_versions_chapters_ins': ("AFTER INSERT ON chapters",
+                                     [_bump('chapter', 'NEW.id'), _bump('manga_chapters', 'NEW.manga_id')]),
+    'entity_versions_chapters_upd': ("AFTER UPDATE ON chapters", [
+        _bump('chapter', 'NEW.id'), _bump('manga_chapters', 'OLD.manga_id'),
+        _bump('manga_chapters', 'NEW.manga_id', _moved('manga_id'))]),
+    'entity_versions_chapters_del': ("AFTER DELETE ON chapters",
+                                     [_bump('chapter', 'OLD.id'), _bump('manga_chapters', 'OLD.manga_id')]),
+    'entity_versions_characters_ins': ("AFTER INSERT ON manga_characters",
+                                       [_bump('manga_characters', 'NEW.manga_id')]),
+    'entity_versions_characters_upd': ("AFTER UPDATE ON manga_characters", [
+        _bump('manga_characters', 'OLD.manga_id'), _bump('manga_characters', 'NEW.manga_id', _moved('manga_id'))]),
+    'entity_versions_characters_del': ("AFTER DELETE ON manga_characters",
+                                       [_bump('manga_characters', 'OLD.manga_id')]),
+    # a manga's lists start at version 1, and become 404s (or lists again) with its books row
+    'entity_versions_books_ins': ("AFTER INSERT ON books WHEN COALESCE(NEW.book_type, 'book') = 'manga'",
+                                  [_bump('manga_characters', 'NEW.id'), _bump('manga_chapters', 'NEW.id')]),
+    'entity_versions_books_type': ("AFTER UPDATE OF book_type ON books",
+                                   [_bump('manga_characters', 'NEW.id'), _bump('manga_chapters', 'NEW.id')]),
+    'entity_versions_books_del': ("AFTER DELETE ON books",
+                                  [_bump('manga_characters', 'OLD.id'), _bump('manga_chapters', 'OLD.id')]),
+}
+
+
+def upgrade(conn):
+    conn.execute(SCHEMA)
+    for name, (event, statements) in TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {event} BEGIN {' '.join(statements)} END")
+    # version 1 rows for every existing chapter and manga, so they get a Last-Modified from the start
+    conn.execute("INSERT OR IGNORE INTO entity_versions (entity, entity_id) SELECT 'chapter', id FROM chapters")
+    for entity in ('manga_chapters', 'manga_characters'):
+        conn.execute("INSERT OR IGNORE INTO entity_versions (entity, entity_id) "
+                     f"SELECT '{entity}', id FROM books WHERE COALESCE(book_type, 'book') = 'manga'")
@@ -0,0 +1,59 @@
+"""Content-addressed ImageSummaryAI result cache (see ai_cache.py)
+
+Existing image_summaries rows are adopted as 'manga_page' results of the
+configured model, keyed by their page's chapter_pages.content_hash. They were
+made with the first version of the manga_page prompt; the key is
+ai_cache.make_key's as of this version.
+"""
+
+import os
+import time
+import hashlib
+
+MODEL = os.environ.get('OPENAI_MODEL', 'gpt-4-turbo')
+PROMPT_VERSION = 1
+TTL = float(os.environ.get("AI_CACHE_TTL_DAYS", "90") or "90") * 86400
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS ai_results (
+        key            TEXT PRIMARY KEY,
+        content_hash   TEXT NOT NULL,
+        operation      TEXT NOT NULL,
+        model          TEXT NOT NULL,
+        prompt_version INTEGER NOT NULL,
+        result         TEXT NOT NULL,
+        bytes          INTEGER NOT NULL,
+        hits           INTEGER NOT NULL DEFAULT 0,
+        created_at     REAL NOT NULL,
+        last_used_at   REAL NOT NULL,
+        expires_at     REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_ai_results_last_used ON ai_results(last_used_at)",
+    "CREATE INDEX IF NOT EXISTS idx_ai_results_expires ON ai_results(expires_at)",
+    "CREATE INDEX IF NOT EXISTS idx_ai_results_hash ON ai_results(content_hash)",
+]
+
+
+def _key(content_hash):
+    raw = f"{content_hash}\0manga_page\0{MODEL}\0{PROMPT_VERSION}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def upgrade(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+    now = time.time()
+    rows = conn.execute("""
+        SELECT DISTINCT p.content_hash, s.summary
+        FROM image_summaries s
+        JOIN chapter_pages p ON p.chapter_id = s.chapter_id AND p.page_num = s.page_num
+        WHERE s.summary IS NOT NULL AND p.content_hash IS NOT NULL
+    """).fetchall()
+    conn.executemany("""
+        INSERT OR IGNORE INTO ai_results (key, content_hash, operation, model, prompt_version, result, bytes,
+                                          created_at, last_used_at, expires_at)
+        VALUES (?, ?, 'manga_page', ?, ?, ?, ?, ?, ?, ?)
+    """, [(_key(content_hash), content_hash, MODEL, PROMPT_VERSION, summary, len(summary.encode('utf-8')),
+           now, now, now + TTL) for content_hash, summary in rows])
@@ -0,0 +1,32 @@
+"""Pre-generated page AI results (see page_ai.py)
+
+image_summaries gains extracted_text next to summary, plus the content_hash
+of the page image both were made from (so a replaced page reads as missing)
+and updated_at. Existing summaries are stamped with their page's hash.
+
+Databases whose table came from setup_image_ai.py lack the baseline's
+UNIQUE(chapter_id, page_num), so INSERT OR REPLACE piled up one row per
+click there; keep the newest row per page and add the unique index the
+upserts need.
+"""
+
+
+def upgrade(conn):
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(image_summaries)")}
+    for name, decl in (('extracted_text', 'TEXT'), ('content_hash', 'TEXT'), ('updated_at', 'TEXT')):
+        if name not in columns:
+            conn.execute(f"ALTER TABLE image_summaries ADD COLUMN {name} {decl}")
+    conn.execute("""
+        DELETE FROM image_summaries
+        WHERE id NOT IN (SELECT MAX(id) FROM image_summaries GROUP BY chapter_id, page_num)
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_image_summaries_page "
+                 "ON image_summaries(chapter_id, page_num)")
+    conn.execute("""
+        UPDATE image_summaries
+        SET content_hash = (SELECT p.content_hash FROM chapter_pages p
+                            WHERE p.chapter_id = image_summaries.chapter_id
+                              AND p.page_num = image_summaries.page_num),
+            updated_at = created_at
+        WHERE content_hash IS NULL
+    """)
@@ -0,0 +1,83 @@
+"""Per-chapter manga reading progress for /api/manga/progress (see reading_progress.py)
+
+Creates reading_progress and reading_resume plus the triggers that keep
+reading_resume, watchlist.progress and user_stats.pages_read current
+(reading_progress.SCHEMA / TRIGGERS as of this version).
+"""
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS reading_progress (
+        user_id    INTEGER NOT NULL,
+        chapter_id INTEGER NOT NULL,
+        manga_id   INTEGER NOT NULL,
+        page_index INTEGER NOT NULL DEFAULT 0,   -- 0-based, where the reader is now
+        max_page   INTEGER NOT NULL DEFAULT 0,   -- furthest page_index reached
+        page_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (user_id, chapter_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_reading_progress_manga ON reading_progress(user_id, manga_id)",
+    "CREATE INDEX IF NOT EXISTS idx_reading_progress_chapter ON reading_progress(chapter_id)",
+    """
+    CREATE TABLE IF NOT EXISTS reading_resume (
+        user_id    INTEGER NOT NULL,
+        manga_id   INTEGER NOT NULL,
+        chapter_id INTEGER NOT NULL,
+        page_index INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (user_id, manga_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_reading_resume_recent ON reading_resume(user_id, updated_at)",
+]
+
+
+def _resume(row):
+    return (f"INSERT INTO reading_resume (user_id, manga_id, chapter_id, page_index, updated_at) "
+            f"VALUES ({row}.user_id, {row}.manga_id, {row}.chapter_id, {row}.page_index, {row}.updated_at) "
+            f"ON CONFLICT (user_id, manga_id) DO UPDATE SET chapter_id = excluded.chapter_id, "
+            f"page_index = excluded.page_index, updated_at = excluded.updated_at "
+            f"WHERE excluded.updated_at >= reading_resume.updated_at;")
+
+
+def _watchlist_percent(row):
+    reached = (f"(SELECT SUM(MIN(rp.max_page + 1, rp.page_count)) FROM reading_progress rp "
+               f"WHERE rp.user_id = {row}.user_id AND rp.manga_id = {row}.manga_id AND rp.page_count > 0)")
+    total = f"(SELECT SUM(page_count) FROM chapters WHERE manga_id = {row}.manga_id)"
+    return (f"UPDATE watchlist SET progress = COALESCE(MIN(100, 100 * {reached} / NULLIF({total}, 0)), progress) "
+            f"WHERE user_id = {row}.user_id AND book_id = {row}.manga_id;")
+
+
+def _pages_read(row, delta):
+    # not INSERT OR IGNORE: the outer upsert's conflict handling would override it inside the trigger
+    return (f"INSERT INTO user_stats (user_id) SELECT {row}.user_id "
+            f"WHERE NOT EXISTS (SELECT 1 FROM user_stats WHERE user_id = {row}.user_id); "
+            f"UPDATE user_stats SET pages_read = pages_read + ({delta}), updated_at = DATETIME('now') "
+            f"WHERE user_id = {row}.user_id;")
+
+
+# trigger name -> (event, body statements)
+TRIGGERS = {
+    'reading_progress_insert': ("AFTER INSERT ON reading_progress", [
+        _resume("NEW"), _watchlist_percent("NEW"), _pages_read("NEW", "NEW.max_page + 1")]),
+    'reading_progress_update': ("AFTER UPDATE ON reading_progress", [
+        _resume("NEW"), _watchlist_percent("NEW")]),
+    'reading_progress_further': ("AFTER UPDATE OF max_page ON reading_progress WHEN NEW.max_page > OLD.max_page", [
+        _pages_read("NEW", "NEW.max_page - OLD.max_page")]),
+    'reading_progress_chapter_delete': ("AFTER DELETE ON chapters", [
+        "DELETE FROM reading_progress WHERE chapter_id = OLD.id;",
+        "DELETE FROM reading_resume WHERE chapter_id = OLD.id;"]),
+    'reading_progress_user_delete': ("AFTER DELETE ON users", [
+        "DELETE FROM reading_progress WHERE user_id = OLD.id;",
+        "DELETE FROM reading_resume WHERE user_id = OLD.id;"]),
+}
+
+
+def upgrade(conn):
+    for statement in SCHEMA:
+        conn.execute(statement)
+    for name, (event, body) in TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {event} BEGIN {' '.join(body)} END")
@@ -0,0 +1,90 @@
+"""Reinstall the user_stats JSON counter triggers (see reader_stats.py)
+
+The JSON counters were bumped through a '$."key"' path, which silently did
+nothing for a genre or status containing a double quote. Recreate those
+triggers with the json_patch form and recount what they missed.
+"""
+
+_GENRE = "(SELECT COALESCE(category, 'General') FROM books WHERE id = {book})"
+
+_FAVORITE_GENRE = """
+    UPDATE user_stats SET favorite_genre = (SELECT key FROM json_each(user_stats.genre_counts)
+                                            WHERE value > 0 ORDER BY value DESC, key LIMIT 1)
+    WHERE user_id = {uid};
+"""
+
+
+def _bump(uid, column, key, delta):
+    current = f"(SELECT value FROM json_each(user_stats.{column}) WHERE key = {key})"
+    return f"""
+    UPDATE user_stats SET {column} = json_patch({column}, json_object({key},
+                                                MAX(0, COALESCE({current}, 0) + ({delta})))),
+                          updated_at = DATETIME('now')
+    WHERE user_id = {uid} AND {key} IS NOT NULL;
+    """
+
+
+TRIGGERS = {
+    'user_stats_history_insert': f"""
+        AFTER INSERT ON history BEGIN
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+        UPDATE user_stats SET read_count = MAX(0, read_count + 1), updated_at = DATETIME('now')
+        WHERE user_id = NEW.user_id;
+        {_bump('NEW.user_id', 'genre_counts', _GENRE.format(book='NEW.book_id'), 1)}
+        {_FAVORITE_GENRE.format(uid='NEW.user_id')}
+        END
+    """,
+    'user_stats_history_delete': f"""
+        AFTER DELETE ON history BEGIN
+        UPDATE user_stats SET read_count = MAX(0, read_count - 1), updated_at = DATETIME('now')
+        WHERE user_id = OLD.user_id;
+        {_bump('OLD.user_id', 'genre_counts', _GENRE.format(book='OLD.book_id'), -1)}
+        {_FAVORITE_GENRE.format(uid='OLD.user_id')}
+        END
+    """,
+    'user_stats_watchlist_insert': f"""
+        AFTER INSERT ON watchlist BEGIN
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+        {_bump('NEW.user_id', 'watchlist_counts', 'NEW.status', 1)}
+        END
+    """,
+    'user_stats_watchlist_delete': f"""
+        AFTER DELETE ON watchlist BEGIN
+        {_bump('OLD.user_id', 'watchlist_counts', 'OLD.status', -1)}
+        END
+    """,
+    'user_stats_watchlist_status': f"""
+        AFTER UPDATE OF status ON watchlist WHEN OLD.status IS NOT NEW.status BEGIN
+        {_bump('OLD.user_id', 'watchlist_counts', 'OLD.status', -1)}
+        INSERT OR IGNORE INTO user_stats (user_id) VALUES (NEW.user_id);
+        {_bump('NEW.user_id', 'watchlist_counts', 'NEW.status', 1)}
+        END
+    """,
+}
+
+
+def upgrade(conn):
+    for name, body in TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {body}")
+    # recount, pages_read included (reading_progress exists since 0016)
+    conn.execute("DELETE FROM user_stats")
+    conn.execute("""
+        INSERT INTO user_stats (user_id, read_count, genre_counts, watchlist_counts,
+                                favorite_count, review_count, rating_sum, pages_read)
+        SELECT u.id,
+               (SELECT COUNT(*) FROM history h WHERE h.user_id = u.id),
+               (SELECT COALESCE(json_group_object(genre, n), '{}') FROM (
+                    SELECT COALESCE(b.category, 'General') AS genre, COUNT(*) AS n
+                    FROM history h JOIN books b ON b.id = h.book_id
+                    WHERE h.user_id = u.id GROUP BY 1)),
+               (SELECT COALESCE(json_group_object(status, n), '{}') FROM (
+                    SELECT status, COUNT(*) AS n FROM watchlist w
+                    WHERE w.user_id = u.id AND status IS NOT NULL GROUP BY status)),
+               (SELECT COUNT(*) FROM favorites f WHERE f.user_id = u.id),
+               (SELECT COUNT(rating) FROM reviews r WHERE r.user_id = u.id),
+               (SELECT COALESCE(SUM(rating), 0) FROM reviews r WHERE r.user_id = u.id),
+               (SELECT COALESCE(SUM(max_page + 1), 0) FROM reading_progress p WHERE p.user_id = u.id)
+        FROM users u
+    """)
+    conn.execute(_FAVORITE_GENRE.format(uid='user_id'))
@@ -0,0 +1,41 @@
+"""Move user_stats genre counts when a book's category changes (see reader_stats.py)
+
+The history triggers count a read under the book's category when the row is
+written and subtract under its category when the row goes, so an edited
+category left the old genre counted for good. Add the trigger that moves
+the counts on edit and recount genre_counts / favorite_genre.
+"""
+
+_CURRENT = "(SELECT value FROM json_each(user_stats.genre_counts) WHERE key = {})"
+_OLD = "COALESCE(OLD.category, 'General')"
+_NEW = "COALESCE(NEW.category, 'General')"
+
+_FAVORITE_GENRE = """
+    UPDATE user_stats SET favorite_genre = (SELECT key FROM json_each(user_stats.genre_counts)
+                                            WHERE value > 0 ORDER BY value DESC, key LIMIT 1)
+"""
+
+TRIGGER = f"""
+    CREATE TRIGGER user_stats_book_category AFTER UPDATE OF category ON books WHEN {_OLD} IS NOT {_NEW} BEGIN
+        UPDATE user_stats
+        SET genre_counts = json_patch(genre_counts, json_object(
+                {_OLD}, MAX(0, COALESCE({_CURRENT.format(_OLD)}, 0) - 1),
+                {_NEW}, COALESCE({_CURRENT.format(_NEW)}, 0) + 1)),
+            updated_at = DATETIME('now')
+        WHERE user_id IN (SELECT user_id FROM history WHERE book_id = NEW.id);
+        {_FAVORITE_GENRE} WHERE user_id IN (SELECT user_id FROM history WHERE book_id = NEW.id);
+    END
+"""
+
+
+def upgrade(conn):
+    conn.execute("DROP TRIGGER IF EXISTS user_stats_book_category")
+    conn.execute(TRIGGER)
+    conn.execute("""
+        UPDATE user_stats SET genre_counts = (
+            SELECT COALESCE(json_group_object(genre, n), '{}') FROM (
+                SELECT COALESCE(b.category, 'General') AS genre, COUNT(*) AS n
+                FROM history h JOIN books b ON b.id = h.book_id
+                WHERE h.user_id = user_stats.user_id GROUP BY 1))
+    """)
+    conn.execute(_FAVORITE_GENRE)
@@ -0,0 +1,27 @@
+"""Drop reading progress recorded past a chapter's end (see reading_progress.py)
+
+Progress for a chapter without a page count yet (a PDF still converting, a
+legacy row) was stored unclamped, and before that progress on any chapter
+could run past its last page; each page claimed was added to
+user_stats.pages_read. Remove the former, clamp the latter and recount
+pages_read.
+"""
+
+
+def upgrade(conn):
+    conn.execute("""
+        DELETE FROM reading_resume WHERE EXISTS (
+            SELECT 1 FROM reading_progress p
+            WHERE p.user_id = reading_resume.user_id AND p.chapter_id = reading_resume.chapter_id
+              AND p.page_count <= 0)
+    """)
+    conn.execute("DELETE FROM reading_progress WHERE page_count <= 0")
+    conn.execute("""
+        UPDATE reading_progress
+        SET page_index = MIN(page_index, page_count - 1), max_page = MIN(max_page, page_count - 1)
+        WHERE max_page >= page_count OR page_index >= page_count
+    """)
+    conn.execute("""
+        UPDATE user_stats SET pages_read = (
+            SELECT COALESCE(SUM(max_page + 1), 0) FROM reading_progress p WHERE p.user_id = user_stats.user_id)
+    """)
@@ -0,0 +1,219 @@
+"""
+Schema Migrations
+Versioned migrations for library.db. Each migration is a module in this
+package named NNNN_description.py that defines upgrade(conn); the number is
+the schema version it produces. Applied versions are recorded in the
+schema_version table.
+
+A migration carries its own copy of the DDL and backfill SQL it runs rather
+than calling install()/rebuild() on the live modules: those keep changing,
+and an old version must keep producing the schema it produced when it was
+written. Changing a module's schema means adding a migration.
+
+At startup the app only runs one cheap "SELECT MAX(version)" check; when
+migrations are pending a file lock makes sure only one gunicorn worker
+applies them while the others wait and then see the new version.
+
+CLI:  python -m migrations [status|upgrade] [--db PATH]
+"""
+
+import os
+import re
+import sqlite3
+import logging
+import importlib.util
+from contextlib import contextmanager
+from datetime import datetime
+
+logger = logging.getLogger('novus.migrations')
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+_MIGRATION_FILE = re.compile(r"^(\d{4})_(\w+)\.py$")
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+class Migration:
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+        self._module = None
+
+    @property
+    def module(self):
+        if self._module is None:
+            spec = importlib.util.spec_from_file_location(f"migrations._m{self.version:04d}", self.path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            self._module = module
+        return self._module
+
+    @property
+    def description(self):
+        doc = (self.module.__doc__ or self.name).strip()
+        return doc.splitlines()[0]
+
+    def upgrade(self, conn):
+        self.module.upgrade(conn)
+
+
+def discover():
+    """Return all migrations in this package ordered by version."""
+    found = []
+    for fname in os.listdir(MIGRATIONS_DIR):
+        m = _MIGRATION_FILE.match(fname)
+        if m:
+            found.append(Migration(int(m.group(1)), m.group(2), os.path.join(MIGRATIONS_DIR, fname)))
+    found.sort(key=lambda mig: mig.version)
+    versions = [mig.version for mig in found]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError(f"Duplicate migration versions: {versions}")
+    return found
+
+
+def latest_version():
+    migrations = discover()
+    return migrations[-1].version if migrations else 0
+
+
+def current_version(conn):
+    """Highest applied version, or 0 for a database that was never migrated."""
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_version").fetchone()
+    except sqlite3.OperationalError:
+        return 0
+    return row[0] or 0
+
+
+# -------------------- HELPERS FOR MIGRATION SCRIPTS --------------------
+def column_exists(conn, table, column):
+    return any(row[1] == column for row in conn.execute(f"PRAGMA table_info({table})"))
+
+
+def table_exists(conn, table):
+    return conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name=?", (table,)
+    ).fetchone() is not None
+
+
+def add_column(conn, table, column, decl):
+    """ALTER TABLE ... ADD COLUMN, skipped when the column is already there."""
+    if not column_exists(conn, table, column):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+# -------------------- RUNNER --------------------
+@contextmanager
+def _file_lock(path):
+    with open(path, 'a+') as fh:
+        if fcntl:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+            else:
+                fh.seek(0)
+                msvcrt.locking(fh.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _ensure_version_table(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version    INTEGER PRIMARY KEY,
+            name       TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+
+
+def _default_connect(db_path):
+    return sqlite3.connect(db_path, timeout=30)
+
+
+def pending(conn):
+    have = current_version(conn)
+    return [mig for mig in discover() if mig.version > have]
+
+
+def upgrade(db_path, connect=None, target=None):
+    """Apply all pending migrations (up to target) under the migration lock.
+
+    Returns the list of versions that were applied by this call.
+    """
+    connect = connect or (lambda: _default_connect(db_path))
+    applied = []
+    with _file_lock(db_path + '.migrate.lock'):
+        conn = connect()
+        # explicit transactions: one BEGIN IMMEDIATE ... COMMIT per migration
+        conn.isolation_level = None
+        try:
+            _ensure_version_table(conn)
+            for mig in pending(conn):
+                if target is not None and mig.version > target:
+                    break
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # re-check inside the write lock in case another process got here first
+                    if current_version(conn) >= mig.version:
+                        conn.execute("ROLLBACK")
+                        continue
+                    mig.upgrade(conn)
+                    conn.execute(
+                        "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+                        (mig.version, mig.name, datetime.utcnow().isoformat()),
+                    )
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    logger.error(f"Migration {mig.version:04d}_{mig.name} failed")
+                    raise
+                applied.append(mig.version)
+                logger.info(f"Applied migration {mig.version:04d}_{mig.name}")
+        finally:
+            conn.close()
+    return applied
+
+
+def ensure_current(db_path, connect=None):
+    """Cheap startup check: upgrade only when the schema is behind."""
+    connect = connect or (lambda: _default_connect(db_path))
+    conn = connect()
+    try:
+        have = current_version(conn)
+    finally:
+        conn.close()
+    if have >= latest_version():
+        return []
+    return upgrade(db_path, connect)
+
+
+def status(db_path, connect=None):
+    connect = connect or (lambda: _default_connect(db_path))
+    conn = connect()
+    try:
+        have = current_version(conn)
+        try:
+            rows = dict(conn.execute("SELECT version, applied_at FROM schema_version").fetchall())
+        except sqlite3.OperationalError:
+            rows = {}
+    finally:
+        conn.close()
+    return {
+        'current': have,
+        'latest': latest_version(),
+        'migrations': [
+            {'version': mig.version, 'name': mig.name, 'description': mig.description,
+             'applied_at': rows.get(mig.version)}
+            for mig in discover()
+        ],
+    }
@@ -0,0 +1,37 @@
+"""Command line entry point: python -m migrations [status|upgrade] [--db PATH]"""
+
+import os
+import sys
+import argparse
+
+import migrations
+
+APP_ROOT = os.path.dirname(migrations.MIGRATIONS_DIR)
+DEFAULT_DB = os.path.join(APP_ROOT, "library.db")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m migrations", description="NOVUS schema migrations")
+    parser.add_argument("command", nargs="?", default="upgrade", choices=["status", "upgrade"])
+    parser.add_argument("--db", default=DEFAULT_DB, help="path to the SQLite database (default: library.db)")
+    parser.add_argument("--target", type=int, default=None, help="stop after this version")
+    args = parser.parse_args(argv)
+
+    if args.command == "upgrade":
+        applied = migrations.upgrade(args.db, target=args.target)
+        if applied:
+            print("Applied: " + ", ".join(f"{v:04d}" for v in applied))
+        else:
+            print("Schema already up to date.")
+
+    info = migrations.status(args.db)
+    print(f"Database: {args.db}")
+    print(f"Schema version: {info['current']} (latest {info['latest']})")
+    for mig in info['migrations']:
+        mark = "x" if mig['applied_at'] else " "
+        print(f"  [{mark}] {mig['version']:04d} {mig['description']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+"""
+Page AI Pre-generation
+After a chapter's pages are stored (image upload, chapter edit, or the
+'chapter_pdf' job) a 'chapter_ai' job summarises every page and extracts
+its text ahead of the first reader, so the reader's "AI Summarize Page" and
+"Extract Text" buttons are answered from the cache instead of waiting on a
+vision-model round trip.
+
+The job runs the pages through a thread pool of PAGE_AI_WORKERS calls,
+throttled to PAGE_AI_RATE_PER_MINUTE by one token bucket (LIMITER) shared
+by every chapter_ai job in the process. The jobs run on a worker of their
+own (Procfile 'page_ai', or PAGE_AI_WORKER in the web process), so a long
+chapter doesn't hold up summaries, PDF conversions and image variants.
+
+Results go through the AI result cache (ai_cache.py, keyed by page content
+hash, so identical pages cost one call) and into image_summaries
+(summary / extracted_text, with the content_hash they were made from).
+
+coverage() is the per-chapter progress view behind /admin/page_ai;
+stream_summary() is the SSE answer for a reader asking before the job got
+to their page.
+
+PAGE_AI_PREGENERATE=0 turns queueing off; nothing is queued without an
+OpenAI key either.
+
+CLI:  python page_ai.py queue CHAPTER_ID [--db PATH]
+      python page_ai.py coverage [--db PATH]
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import jobs
+import ai_cache
+import text_summary
+import chapter_pages
+
+logger = logging.getLogger('novus.page_ai')
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+PREGENERATE = os.environ.get("PAGE_AI_PREGENERATE", "1") != "0"
+WORKERS = int(os.environ.get("PAGE_AI_WORKERS", "3") or "3")
+RATE_PER_MINUTE = float(os.environ.get("PAGE_AI_RATE_PER_MINUTE", "30") or "30")
+
+# operation (ai_cache / image_summary_ai.PROMPT_VERSIONS) -> image_summaries column
+OPERATIONS = {
+    'manga_page': 'summary',
+    'image_text': 'extracted_text',
+}
+
+
+def enabled():
+    return PREGENERATE and bool(os.environ.get('OPENAI_API_KEY'))
+
+
+# -------------------- STORED RESULTS --------------------
+def store(conn, chapter_id, page_num, content_hash, summary=None, text=None):
+    """Upsert a page's summary and/or extracted text; a different content_hash drops the other column."""
+    conn.execute("""
+        INSERT INTO image_summaries (chapter_id, page_num, content_hash, summary, extracted_text, updated_at)
+        VALUES (?, ?, ?, ?, ?, DATETIME('now'))
+        ON CONFLICT (chapter_id, page_num) DO UPDATE SET
+            summary = COALESCE(excluded.summary,
+                               CASE WHEN content_hash IS excluded.content_hash THEN summary END),
+            extracted_text = COALESCE(excluded.extracted_text,
+                                      CASE WHEN content_hash IS excluded.content_hash THEN extracted_text END),
+            content_hash = excluded.content_hash,
+            updated_at = excluded.updated_at
+    """, (chapter_id, page_num, content_hash, summary, text))
+
+
+def stored(conn, page):
+    """{'summary', 'extracted_text'} stored for a chapter_pages row's current file, or None."""
+    row = conn.execute("SELECT summary, extracted_text FROM image_summaries "
+                       "WHERE chapter_id = ? AND page_num = ? AND content_hash = ?",
+                       (page['chapter_id'], page['page_num'], page['content_hash'])).fetchone()
+    return {'summary': row[0], 'extracted_text': row[1]} if row else None
+
+
+def _done(conn, chapter_id):
+    """{(page_num, column)} already stored for the chapter's current page files."""
+    rows = conn.execute("""
+        SELECT s.page_num, s.summary IS NOT NULL, s.extracted_text IS NOT NULL
+        FROM image_summaries s
+        JOIN chapter_pages p ON p.chapter_id = s.chapter_id AND p.page_num = s.page_num
+        WHERE s.chapter_id = ? AND s.content_hash = p.content_hash
+    """, (chapter_id,)).fetchall()
+    done = set()
+    for page_num, has_summary, has_text in rows:
+        if has_summary:
+            done.add((page_num, 'summary'))
+        if has_text:
+            done.add((page_num, 'extracted_text'))
+    return done
+
+
+def coverage(conn, chapter_id=None):
+    """Per chapter: image pages, pages summarised / with text (for the current files) and the latest job."""
+    where = "WHERE ch.id = ?" if chapter_id else ""
+    rows = conn.execute(f"""
+        SELECT ch.id, ch.manga_id, b.title, ch.chapter_num, ch.title,
+               COUNT(p.page_num),
+               COUNT(CASE WHEN s.summary IS NOT NULL THEN 1 END),
+               COUNT(CASE WHEN s.extracted_text IS NOT NULL THEN 1 END)
+        FROM chapters ch
+        JOIN books b ON b.id = ch.manga_id
+        LEFT JOIN chapter_pages p ON p.chapter_id = ch.id AND p.mime LIKE 'image/%'
+        LEFT JOIN image_summaries s ON s.chapter_id = p.chapter_id AND s.page_num = p.page_num
+                                   AND s.content_hash = p.content_hash
+        {where}
+        GROUP BY ch.id
+        ORDER BY b.title, ch.chapter_num
+    """, (chapter_id,) if chapter_id else ()).fetchall()
+    latest = {}
+    for job_id, payload_chapter, status, progress, total, message, error in conn.execute("""
+        SELECT id, json_extract(payload, '$.chapter_id'), status, progress, total, message, error
+        FROM jobs WHERE kind = 'chapter_ai' ORDER BY id
+    """):
+        latest[payload_chapter] = {'id': job_id, 'status': status, 'progress': progress, 'total': total,
+                                   'message': message, 'error': error}
+    result = []
+    for ch_id, manga_id, manga_title, chapter_num, title, pages, summaries, texts in rows:
+        result.append({
+            'chapter_id': ch_id, 'manga_id': manga_id, 'manga_title': manga_title,
+            'chapter_num': chapter_num, 'title': title, 'pages': pages,
+            'summaries': summaries, 'texts': texts,
+            'percent': int(100 * (summaries + texts) / (2 * pages)) if pages else None,
+            'job': latest.get(ch_id),
+        })
+    return result
+
+
+def stream_summary(conn, page, ai, cache):
+    """SSE frames for a page summary: a stored or cached one as a single 'done', else the model's tokens."""
+    from image_summary_ai import PROMPT_VERSIONS
+
+    hit = stored(conn, page)
+    summary = hit and hit['summary']
+    version = PROMPT_VERSIONS['manga_page']
+    if not summary:
+        summary = cache.get(page['content_hash'], 'manga_page', ai.model, version)
+        if summary is not None:
+            store(conn, page['chapter_id'], page['page_num'], page['content_hash'], summary=summary)
+            conn.commit()
+    if summary:
+        yield text_summary.sse('done', {'summary': summary, 'page_num': page['page_num'], 'cached': True})
+        return
+
+    def on_complete(text, model):
+        cache.put(page['content_hash'], 'manga_page', model, version, text)
+        store(conn, page['chapter_id'], page['page_num'], page['content_hash'], summary=text)
+        conn.commit()
+    try:
+        deltas = ai.summarize_manga_page(chapter_pages.page_file(page), stream=True)
+    except Exception as e:
+        yield text_summary.sse('error', {'error': str(e)})
+        return
+    yield from text_summary.relay(deltas, ai.model, on_complete)
+
+
+# -------------------- QUEUE --------------------
+def queue(conn, chapter_id, user_id=None, force=False):
+    """Queue a 'chapter_ai' job for the chapter unless one is pending; returns the job id (or None)."""
+    if not (enabled() or force):
+        return None
+    row = conn.execute("SELECT id FROM jobs WHERE kind = 'chapter_ai' AND status IN ('queued', 'running') "
+                       "AND json_extract(payload, '$.chapter_id') = ?", (chapter_id,)).fetchone()
+    if row:
+        return row[0]
+    return jobs.enqueue(conn, 'chapter_ai', {'chapter_id': chapter_id}, user_id=user_id, max_attempts=3,
+                        message='Waiting to summarize pages')
+
+
+class RateLimiter:
+    """Token bucket: acquire() blocks until one of `rate_per_minute` calls per minute is free."""
+
+    def __init__(self, rate_per_minute=RATE_PER_MINUTE, burst=None, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0.0
+        self.capacity = burst or max(1, WORKERS)
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = float(self.capacity)
+        self._updated = clock()
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self):
+        if not self.interval:
+            return
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) / self.interval)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                delay = (1 - self._tokens) * self.interval
+                self.waited += delay
+            self.sleep(delay)
+
+
+# one budget per process, however many chapter_ai jobs run at once
+LIMITER = RateLimiter()
+
+
+def _db_path(conn):
+    return conn.execute("PRAGMA database_list").fetchone()[2]
+
+
+def pregenerate(conn, chapter_id, ai, cache, workers=WORKERS, limiter=None, on_progress=None):
+    """Summarise and OCR every image page of the chapter that lacks a current result.
+
+    Returns {'pages', 'done', 'cached', 'failed'}.
+    """
+    pages = [p for p in chapter_pages.get_pages(conn, chapter_id) if p['mime'].startswith('image/')]
+    stored = _done(conn, chapter_id)
+    tasks = [(page, operation, column) for page in pages for operation, column in OPERATIONS.items()
+             if (page['page_num'], column) not in stored]
+    limiter = limiter or LIMITER
+    total = len(pages) * len(OPERATIONS)
+    done = total - len(tasks)
+    summary = {'pages': len(pages), 'done': 0, 'cached': 0, 'failed': 0}
+    if on_progress:
+        on_progress(done, total)
+
+    def run(page, operation):
+        from image_summary_ai import PROMPT_VERSIONS
+        method = getattr(ai, ai_cache.OPERATIONS[operation])
+        image_path = chapter_pages.page_file(page)
+
+        def compute():
+            # cache hits don't need an API slot; only real calls wait for the rate limit
+            limiter.acquire()
+            return method(image_path)
+        return cache.get_or_compute(page['content_hash'], operation, ai.model, PROMPT_VERSIONS[operation], compute)
+
+    errors = []
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='page-ai') as pool:
+        futures = {pool.submit(run, page, operation): (page, column) for page, operation, column in tasks}
+        for future in as_completed(futures):
+            page, column = futures[future]
+            try:
+                result, cached = future.result()
+            except Exception as e:
+                summary['failed'] += 1
+                errors.append(str(e))
+                logger.warning(f"Chapter {chapter_id} page {page['page_num']}: {column} failed: {e}")
+                continue
+            if result is None:
+                summary['failed'] += 1
+                continue
+            store(conn, chapter_id, page['page_num'], page['content_hash'],
+                  **({'summary': result} if column == 'summary' else {'text': result}))
+            conn.commit()
+            summary['done'] += 1
+            summary['cached'] += int(cached)
+            done += 1
+            if on_progress:
+                on_progress(done, total)
+    if tasks and summary['failed'] == len(tasks):
+        raise RuntimeError(f"every page AI call failed: {errors[-1]}")
+    return summary
+
+
+@jobs.handler('chapter_ai')
+def chapter_ai_job(job, ctx):
+    """payload: chapter_id"""
+    from image_summary_ai import ImageSummaryAI
+
+    chapter_id = job['payload']['chapter_id']
+    if not ctx.conn.execute("SELECT 1 FROM chapters WHERE id = ?", (chapter_id,)).fetchone():
+        return {'skipped': 'chapter was deleted'}
+    db_path = _db_path(ctx.conn)
+    cache = ai_cache.ResultCache(lambda: sqlite3.connect(db_path, timeout=30))
+    result = pregenerate(ctx.conn, chapter_id, ImageSummaryAI(), cache,
+                         on_progress=lambda done, total: ctx.progress(done, total, f"{done} of {total} page results"))
+    return dict(result, chapter_id=chapter_id)
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog="python page_ai.py", description="Page summary / OCR pre-generation")
+    parser.add_argument("command", choices=["queue", "coverage"])
+    parser.add_argument("chapter_id", type=int, nargs="?")
+    parser.add_argument("--db", default=os.path.join(APP_ROOT, "library.db"))
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        if args.command == "queue":
+            if not args.chapter_id:
+                parser.error("queue needs a CHAPTER_ID")
+            print(f"job {queue(conn, args.chapter_id, force=True)}")
+        else:
+            print(json.dumps(coverage(conn), indent=2))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Keyset Pagination
+Cursor-based paging on an indexed (created_at, id) key, newest first. Each
+page is a "WHERE (created_at, id) < (last_seen) ORDER BY created_at DESC,
+id DESC LIMIT n" range read, so page N costs the same as page 1 no matter how
+large the catalog grows (no OFFSET, no sort over datetime(created_at)).
+
+Cursors are opaque url-safe tokens encoding the key of the last row served.
+"""
+
+import os
+import json
+import base64
+from collections import namedtuple
+
+DEFAULT_PAGE_SIZE = int(os.environ.get("PAGE_SIZE", "24") or "24")
+MAX_PAGE_SIZE = 100
+
+Page = namedtuple('Page', ['rows', 'next_cursor'])
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def page_size(value, default=None):
+    """Clamp a requested page size (e.g. request.args 'limit') to 1..MAX_PAGE_SIZE."""
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        size = default or DEFAULT_PAGE_SIZE
+    return max(1, min(size, MAX_PAGE_SIZE))
+
+
+def encode_cursor(created_at, row_id):
+    raw = json.dumps([created_at, row_id], separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (created_at, id) for a cursor token, None for an empty one."""
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        created_at, row_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise InvalidCursor(token)
+    if not isinstance(created_at, str) or not isinstance(row_id, int):
+        raise InvalidCursor(token)
+    return created_at, row_id
+
+
+def keyset_sql(select_sql, where, key_columns, after=False):
+    """The page query keyset_page runs; with after=True it takes the cursor's key as two more params."""
+    created_col, id_col = key_columns
+    where = list(where)
+    if after:
+        where.append(f"({created_col}, {id_col}) < (?, ?)")
+    sql = select_sql
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql + f" ORDER BY {created_col} DESC, {id_col} DESC LIMIT ?"
+
+
+def keyset_page(conn, select_sql, where, params, key_columns, key, limit, cursor=None):
+    """Fetch one page, newest first.
+
+    select_sql  -- "SELECT ... FROM ... [JOIN ...]" without WHERE/ORDER BY
+    where       -- list of SQL conditions ANDed together (may be empty)
+    key_columns -- (created_at column, id column) as written in the SQL
+    key         -- function row -> (created_at, id) for building the next cursor
+    cursor      -- token from a previous page's next_cursor, or None
+    """
+    params = list(params)
+    after = decode_cursor(cursor)
+    if after is not None:
+        params.extend(after)
+    sql = keyset_sql(select_sql, where, key_columns, after is not None)
+    # one extra row tells us whether there is a next page
+    rows = conn.execute(sql, params + [limit + 1]).fetchall()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*key(rows[-1]))
+    return Page(rows, next_cursor)
@@ -0,0 +1,137 @@
+"""
+PDF Chapter Conversion
+Turns an uploaded chapter PDF into page_NNN.png files as a background job
+('chapter_pdf', see jobs.py). Pages are rendered in small first_page /
+last_page windows spread over a process pool, so memory stays bounded by
+the window size instead of the chapter length and progress is reported as
+windows finish.
+
+The uploaded PDF is deleted once the page rows are committed (or the
+chapter is gone); it stays only when the reader falls back to the PDF.
+"""
+
+import os
+import shutil
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import jobs
+import chapter_pages
+import image_variants
+import page_ai
+
+try:
+    from pdf2image import convert_from_path, pdfinfo_from_path
+    PDF_EXTRACTION_AVAILABLE = True
+except ImportError:
+    convert_from_path = pdfinfo_from_path = None
+    PDF_EXTRACTION_AVAILABLE = False
+
+logger = logging.getLogger('novus.jobs')
+
+DPI = int(os.environ.get("PDF_PAGE_DPI", "150") or "150")
+WINDOW = int(os.environ.get("PDF_PAGE_WINDOW", "4") or "4")
+PROCESSES = int(os.environ.get("PDF_PROCESSES", "0") or "0") or min(4, os.cpu_count() or 1)
+
+
+def page_windows(page_count, window=WINDOW):
+    """[(first_page, last_page), ...] covering 1..page_count."""
+    window = max(1, window)
+    return [(first, min(first + window - 1, page_count)) for first in range(1, page_count + 1, window)]
+
+
+def convert_window(pdf_path, out_dir, first, last, dpi=DPI):
+    """Render pages first..last and save them as PNGs. Runs in a pool process."""
+    images = convert_from_path(pdf_path, dpi=dpi, first_page=first, last_page=last)
+    names = []
+    for page_num, img in enumerate(images, first):
+        name = f"page_{page_num:03d}.png"
+        img.save(os.path.join(out_dir, name), 'PNG')
+        img.close()
+        names.append(name)
+    return names
+
+
+def convert_pdf(pdf_path, out_dir, dpi=DPI, window=WINDOW, processes=PROCESSES, on_progress=None):
+    """Convert every page of pdf_path into out_dir. Returns the filenames in page order."""
+    page_count = int(pdfinfo_from_path(pdf_path)['Pages'])
+    windows = page_windows(page_count, window)
+    os.makedirs(out_dir, exist_ok=True)
+    if on_progress:
+        on_progress(0, page_count)
+
+    done = {}
+    if processes <= 1 or len(windows) == 1:
+        for first, last in windows:
+            done[first] = convert_window(pdf_path, out_dir, first, last, dpi)
+            if on_progress:
+                on_progress(sum(len(n) for n in done.values()), page_count)
+    else:
+        # spawn: the web process that may host the embedded worker is multi-threaded
+        ctx = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=min(processes, len(windows)), mp_context=ctx) as pool:
+            futures = {pool.submit(convert_window, pdf_path, out_dir, first, last, dpi): first
+                       for first, last in windows}
+            for future in as_completed(futures):
+                done[futures[future]] = future.result()
+                if on_progress:
+                    on_progress(sum(len(n) for n in done.values()), page_count)
+
+    return [name for first in sorted(done) for name in done[first]]
+
+
+def _set_chapter_pages(conn, chapter_id, rel_dir, filenames):
+    conn.execute("UPDATE chapters SET pdf_filename = ?, page_count = ? WHERE id = ?",
+                 (",".join(filenames), len(filenames), chapter_id))
+    count = chapter_pages.record_pages(conn, chapter_id, rel_dir, filenames)
+    conn.commit()
+    return count
+
+
+def install_pdf_fallback(conn, payload):
+    """Show the PDF itself in the reader when it can't be converted (old upload behaviour)."""
+    pdf_name = os.path.basename(payload['pdf_path'])
+    out_dir = os.path.join(chapter_pages.STATIC_ROOT, payload['chapter_dir'])
+    os.makedirs(out_dir, exist_ok=True)
+    shutil.copy(payload['pdf_path'], os.path.join(out_dir, pdf_name))
+    return _set_chapter_pages(conn, payload['chapter_id'], payload['chapter_dir'], [pdf_name])
+
+
+def _discard_upload(pdf_path):
+    try:
+        os.remove(pdf_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not remove uploaded PDF {pdf_path}: {e}")
+
+
+@jobs.handler('chapter_pdf')
+def convert_chapter_pdf(job, ctx):
+    """payload: pdf_path (absolute), chapter_id, chapter_dir (relative to static/), dpi"""
+    payload = job['payload']
+    conn = ctx.conn
+    if not conn.execute("SELECT 1 FROM chapters WHERE id = ?", (payload['chapter_id'],)).fetchone():
+        _discard_upload(payload['pdf_path'])
+        return {'skipped': 'chapter was deleted'}
+
+    out_dir = os.path.join(chapter_pages.STATIC_ROOT, payload['chapter_dir'])
+    try:
+        if not PDF_EXTRACTION_AVAILABLE:
+            raise RuntimeError("pdf2image is not installed")
+        filenames = convert_pdf(
+            payload['pdf_path'], out_dir, dpi=payload.get('dpi', DPI),
+            on_progress=lambda done, total: ctx.progress(done, total, f"Converted {done} of {total} pages"),
+        )
+    except Exception:
+        if ctx.last_attempt:
+            install_pdf_fallback(conn, payload)
+            logger.warning(f"Chapter {payload['chapter_id']}: PDF conversion failed, showing the PDF instead")
+        raise
+
+    pages = _set_chapter_pages(conn, payload['chapter_id'], payload['chapter_dir'], filenames)
+    _discard_upload(payload['pdf_path'])
+    image_variants.queue(conn, [f"{payload['chapter_dir']}/{name}" for name in filenames], user_id=job['user_id'])
+    page_ai.queue(conn, payload['chapter_id'], user_id=job['user_id'])
+    return {'chapter_id': payload['chapter_id'], 'pages': pages}
@@ -0,0 +1,297 @@
+"""
+Book Popularity
+Per-book counters (watchlist entries, favourites, readers, reviews) in
+book_popularity, kept current by triggers on the source tables, plus a
+time-decayed trending score, so "top wishlisted" and "trending" lists never
+aggregate watchlist/favorites on a request.
+
+Trending: every new watchlist / favourite / history / review row adds its
+weight (WEIGHTS) to trend_pending. fold_trending() periodically decays all
+scores by 0.5 ** (elapsed / HALF_LIFE) and adds the pending weight, in one
+UPDATE, so a book's score halves every POPULARITY_HALF_LIFE_HOURS without
+new activity.
+
+The fold is the only write and runs in one place: the web app queues a
+'popularity' job every POPULARITY_FOLD_SECONDS (PopularityScheduler), which
+one job worker runs.
+
+PopularityBoard keeps the top POPULARITY_TOP_K books per list and book type
+in memory, re-read every POPULARITY_REFRESH_SECONDS by a background thread;
+view_book(), home() and /api/trending read it. The board only reads: a
+stale board keeps serving its last lists until the thread catches up.
+
+CLI:  python popularity.py rebuild [--db PATH]
+      python popularity.py top [--metric trending] [--type book] [--db PATH]
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+
+import jobs
+
+logger = logging.getLogger('novus.popularity')
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+HALF_LIFE = float(os.environ.get("POPULARITY_HALF_LIFE_HOURS", "72") or "72") * 3600
+REFRESH_SECONDS = float(os.environ.get("POPULARITY_REFRESH_SECONDS", "60") or "60")
+FOLD_SECONDS = int(os.environ.get("POPULARITY_FOLD_SECONDS", "300") or "300")
+TOP_K = int(os.environ.get("POPULARITY_TOP_K", "20") or "20")
+
+# source table -> (counter column, trending weight, timestamp column used by rebuild)
+WEIGHTS = {
+    'watchlist': ('wishlist_count', 3.0, 'created_at'),
+    'favorites': ('favorite_count', 4.0, 'created_at'),
+    'history': ('read_count', 1.0, 'date_read'),
+    'reviews': ('review_count', 2.0, 'created_at'),
+}
+
+# list name -> book_popularity column it ranks by
+METRICS = {
+    'trending': 'trend_score',
+    'wishlisted': 'wishlist_count',
+    'favorited': 'favorite_count',
+    'read': 'read_count',
+    'reviewed': 'review_count',
+}
+BOOK_TYPES = (None, 'book', 'manga')
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS book_popularity (
+        book_id        INTEGER PRIMARY KEY,
+        wishlist_count INTEGER NOT NULL DEFAULT 0,
+        favorite_count INTEGER NOT NULL DEFAULT 0,
+        read_count     INTEGER NOT NULL DEFAULT 0,
+        review_count   INTEGER NOT NULL DEFAULT 0,
+        trend_score    REAL NOT NULL DEFAULT 0,
+        trend_pending  REAL NOT NULL DEFAULT 0,   -- weight added since the last fold
+        trend_at       REAL                       -- epoch seconds of the last fold
+    )
+"""
+
+
+def install(conn):
+    """Create book_popularity and its triggers (idempotent)."""
+    conn.execute(SCHEMA)
+    for table, (column, weight, _) in WEIGHTS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS book_popularity_{table}_insert")
+        conn.execute(f"""
+            CREATE TRIGGER book_popularity_{table}_insert AFTER INSERT ON {table} BEGIN
+                INSERT INTO book_popularity (book_id, {column}, trend_pending) VALUES (NEW.book_id, 1, {weight})
+                ON CONFLICT (book_id) DO UPDATE SET {column} = {column} + 1,
+                                                    trend_pending = trend_pending + {weight};
+            END
+        """)
+        conn.execute(f"DROP TRIGGER IF EXISTS book_popularity_{table}_delete")
+        conn.execute(f"""
+            CREATE TRIGGER book_popularity_{table}_delete AFTER DELETE ON {table} BEGIN
+                UPDATE book_popularity SET {column} = MAX(0, {column} - 1) WHERE book_id = OLD.book_id;
+            END
+        """)
+    conn.execute("DROP TRIGGER IF EXISTS book_popularity_book_delete")
+    conn.execute("""
+        CREATE TRIGGER book_popularity_book_delete AFTER DELETE ON books BEGIN
+            DELETE FROM book_popularity WHERE book_id = OLD.id;
+        END
+    """)
+
+
+def rebuild(conn, now=None, half_life=HALF_LIFE):
+    """Recompute the counters and trending scores from the source tables. Returns the books scored."""
+    now = time.time() if now is None else now
+    counts = ", ".join(f"(SELECT COUNT(*) FROM {table} t WHERE t.book_id = b.id)" for table in WEIGHTS)
+    conn.execute("DELETE FROM book_popularity")
+    conn.execute(f"""
+        INSERT INTO book_popularity (book_id, {', '.join(c for c, _, _ in WEIGHTS.values())}, trend_at)
+        SELECT b.id, {counts}, ? FROM books b
+    """, (now,))
+    # replay timestamped events with their decay, ignoring anything older than ~10 half-lives
+    since = now - 10 * half_life
+    scores = {}
+    for table, (_, weight, ts_column) in WEIGHTS.items():
+        rows = conn.execute(
+            f"SELECT book_id, CAST(strftime('%s', {ts_column}) AS REAL) FROM {table} "
+            f"WHERE CAST(strftime('%s', {ts_column}) AS INTEGER) >= ?", (int(since),)
+        ).fetchall()
+        for book_id, ts in rows:
+            if ts is not None:
+                scores[book_id] = scores.get(book_id, 0.0) + weight * 0.5 ** (max(0.0, now - ts) / half_life)
+    conn.executemany("UPDATE book_popularity SET trend_score = ? WHERE book_id = ?",
+                     [(round(score, 4), book_id) for book_id, score in scores.items()])
+    return conn.execute("SELECT COUNT(*) FROM book_popularity").fetchone()[0]
+
+
+def fold_trending(conn, now=None, half_life=HALF_LIFE):
+    """Decay every trending score to `now` and add the pending weight. Returns the rows updated."""
+    now = time.time() if now is None else now
+    # IMMEDIATE so two processes folding at once don't both apply the same decay
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        last = conn.execute("SELECT MAX(trend_at) FROM book_popularity").fetchone()[0]
+        factor = 0.5 ** (max(0.0, now - last) / half_life) if last else 1.0
+        cur = conn.execute("""
+            UPDATE book_popularity
+            SET trend_score = CASE WHEN trend_score * :f + trend_pending < 0.001 THEN 0
+                                   ELSE trend_score * :f + trend_pending END,
+                trend_pending = 0,
+                trend_at = :now
+            WHERE trend_score > 0 OR trend_pending != 0
+        """, {'f': factor, 'now': now})
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return cur.rowcount
+
+
+def top(conn, metric='trending', book_type=None, limit=TOP_K):
+    """The `limit` books with the highest `metric`, as dicts."""
+    column = METRICS[metric]
+    where, params = "", []
+    if book_type:
+        where, params = "AND COALESCE(b.book_type, 'book') = ?", [book_type]
+    rows = conn.execute(f"""
+        SELECT b.id, b.title, b.author, b.category, b.cover_path, COALESCE(b.book_type, 'book'), p.{column}
+        FROM book_popularity p JOIN books b ON b.id = p.book_id
+        WHERE p.{column} > 0 {where}
+        ORDER BY p.{column} DESC, b.id DESC
+        LIMIT ?
+    """, params + [limit]).fetchall()
+    keys = ('id', 'title', 'author', 'category', 'cover_path', 'book_type', 'score')
+    return [dict(zip(keys, row)) for row in rows]
+
+
+# -------------------- SCHEDULING --------------------
+@jobs.handler('popularity')
+def popularity_job(job, ctx):
+    folded = fold_trending(ctx.conn)
+    return {'folded': folded}
+
+
+class PopularityScheduler(jobs.Scheduler):
+    """Queues a 'popularity' job (fold the trending scores) every interval unless one is pending."""
+
+    def __init__(self, connect, interval=FOLD_SECONDS):
+        super().__init__(connect, 'popularity', interval, message='Folding trending scores')
+
+
+class PopularityBoard:
+    """In-memory top-K lists per (metric, book type), re-read on an interval."""
+
+    def __init__(self, connect, interval=REFRESH_SECONDS, k=TOP_K, clock=time.time):
+        self.connect = connect
+        self.interval = interval
+        self.k = k
+        self.clock = clock
+        self._lists = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.refreshes = 0
+        self.reads = 0
+        self.inline_refreshes = 0
+        self.last_error = None
+
+    def refresh(self):
+        """Reload every list (read only; the scores are folded by the 'popularity' job)."""
+        with self._refresh_lock:
+            conn = self.connect()
+            try:
+                lists = {(metric, book_type): top(conn, metric, book_type, self.k)
+                         for metric in METRICS for book_type in BOOK_TYPES}
+            finally:
+                conn.close()
+            with self._lock:
+                self._lists = lists
+                self._loaded_at = self.clock()
+                self.refreshes += 1
+
+    def _stale(self):
+        return self._loaded_at is None or self.clock() - self._loaded_at > 2 * max(self.interval, 1)
+
+    def top(self, metric='trending', limit=10, book_type=None):
+        """Up to `limit` (<= k) entries of a list; loads inline only before the first refresh."""
+        if metric not in METRICS:
+            raise ValueError(f"unknown popularity metric: {metric}")
+        if self._loaded_at is None:
+            try:
+                self.refresh()
+                with self._lock:
+                    self.inline_refreshes += 1
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Popularity refresh failed: {e}")
+        with self._lock:
+            self.reads += 1
+            return list(self._lists.get((metric, book_type), ())[:limit])
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.warning(f"Popularity refresh failed: {e}")
+
+    def start(self):
+        if self.interval <= 0:
+            return False
+        if self._thread and self._thread.is_alive():
+            return True
+        self._thread = threading.Thread(target=self._run, name='popularity', daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': bool(self._thread and self._thread.is_alive()),
+                'interval': self.interval,
+                'top_k': self.k,
+                'stale': self._stale(),
+                'refreshes': self.refreshes,
+                'inline_refreshes': self.inline_refreshes,
+                'reads': self.reads,
+                'loaded_at': self._loaded_at,
+                'last_error': self.last_error,
+            }
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog="python popularity.py", description="Book popularity tools")
+    parser.add_argument("command", choices=["rebuild", "top"])
+    parser.add_argument("--db", default=os.path.join(APP_ROOT, "library.db"))
+    parser.add_argument("--metric", choices=sorted(METRICS), default="trending")
+    parser.add_argument("--type", choices=["book", "manga"], default=None)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        if args.command == "rebuild":
+            install(conn)
+            count = rebuild(conn)
+            conn.commit()
+            print(f"Rebuilt popularity for {count} books")
+        else:
+            fold_trending(conn)
+            print(json.dumps(top(conn, args.metric, args.type, args.limit), indent=2))
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Reader Stats
+One user_stats row per user with the numbers the profile pages show: books
+read (history rows) and their genre histogram, favourite genre, watchlist
+counts per status, favourites, review count / rating sum, pages read
+(the pages reached in the manga reader; reading_progress.py adds to it).
+
+The row is kept current by triggers on history, watchlist, favorites and
+reviews, so every write path (including book and user deletion) updates it
+without code changes in the routes; profile() and public_profile() read it
+with one primary-key lookup. A history row counts under its book's
+category, and a category edit moves every reader's count of that book to
+the new genre; `rebuild` recomputes everything from the source tables.
+
+CLI:  python reader_stats.py rebuild [--db PATH] [--user USER_ID]
+"""
+
+import os
+import json
+import sqlite3
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS user_stats (
+        user_id          INTEGER PRIMARY KEY,
+        read_count       INTEGER NOT NULL DEFAULT 0,
+        genre_counts     TEXT NOT NULL DEFAULT '{}',   -- JSON {genre: books read}
+        favorite_genre   TEXT,
+        watchlist_counts TEXT NOT NULL DEFAULT '{}',   -- JSON {status: entries}
+        favorite_count   INTEGER NOT NULL DEFAULT 0,
+        review_count     INTEGER NOT NULL DEFAULT 0,   -- reviews with a rating
+        rating_sum       INTEGER NOT NULL DEFAULT 0,
+        pages_read       INTEGER NOT NULL DEFAULT 0,
+        updated_at       TEXT DEFAULT (DATETIME('now'))
+    )
+"""
+
+
+def _ensure(uid):
+    return f"INSERT OR IGNORE INTO user_stats (user_id) VALUES ({uid});"
+
+
+def _add(uid, column, delta):
+    return (f"UPDATE user_stats SET {column} = MAX(0, {column} + ({delta})), updated_at = DATETIME('now') "
+            f"WHERE user_id = {uid};")
+
+
+def _bump(uid, column, key, delta):
+    """+delta on one key of a JSON counter column; key must not be NULL.
+
+    json_object/json_each rather than a '$."key"' path: SQLite can't escape a quote inside a path label.
+    """
+    current = f"(SELECT value FROM json_each(user_stats.{column}) WHERE key = {key})"
+    return (f"UPDATE user_stats SET {column} = json_patch({column}, json_object({key}, "
+            f"MAX(0, COALESCE({current}, 0) + ({delta})))), updated_at = DATETIME('now') "
+            f"WHERE user_id = {uid} AND {key} IS NOT NULL;")
+
+
+def _move_genre(old_key, new_key, book_id):
+    """Move one count from old_key to new_key in genre_counts of every reader of book_id (read once each)."""
+    current = "(SELECT value FROM json_each(user_stats.genre_counts) WHERE key = {})"
+    return (f"UPDATE user_stats SET genre_counts = json_patch(genre_counts, json_object("
+            f"{old_key}, MAX(0, COALESCE({current.format(old_key)}, 0) - 1), "
+            f"{new_key}, COALESCE({current.format(new_key)}, 0) + 1)), updated_at = DATETIME('now') "
+            f"WHERE user_id IN (SELECT user_id FROM history WHERE book_id = {book_id}); "
+            f"UPDATE user_stats SET favorite_genre = (SELECT key FROM json_each(user_stats.genre_counts) "
+            f"WHERE value > 0 ORDER BY value DESC, key LIMIT 1) "
+            f"WHERE user_id IN (SELECT user_id FROM history WHERE book_id = {book_id});")
+
+
+def _genre(book_id):
+    return f"(SELECT COALESCE(category, 'General') FROM books WHERE id = {book_id})"
+
+
+def _favorite_genre(uid):
+    return (f"UPDATE user_stats SET favorite_genre = (SELECT key FROM json_each(user_stats.genre_counts) "
+            f"WHERE value > 0 ORDER BY value DESC, key LIMIT 1) WHERE user_id = {uid};")
+
+
+# trigger name -> (event, body statements)
+TRIGGERS = {
+    'user_stats_history_insert': ("AFTER INSERT ON history", [
+        _ensure("NEW.user_id"), _add("NEW.user_id", "read_count", 1),
+        _bump("NEW.user_id", "genre_counts", _genre("NEW.book_id"), 1), _favorite_genre("NEW.user_id")]),
+    'user_stats_history_delete': ("AFTER DELETE ON history", [
+        _add("OLD.user_id", "read_count", -1),
+        _bump("OLD.user_id", "genre_counts", _genre("OLD.book_id"), -1), _favorite_genre("OLD.user_id")]),
+    'user_stats_book_category': ("AFTER UPDATE OF category ON books "
+                                 "WHEN COALESCE(OLD.category, 'General') IS NOT COALESCE(NEW.category, 'General')", [
+        _move_genre("COALESCE(OLD.category, 'General')", "COALESCE(NEW.category, 'General')", "NEW.id")]),
+    'user_stats_watchlist_insert': ("AFTER INSERT ON watchlist", [
+        _ensure("NEW.user_id"), _bump("NEW.user_id", "watchlist_counts", "NEW.status", 1)]),
+    'user_stats_watchlist_delete': ("AFTER DELETE ON watchlist", [
+        _bump("OLD.user_id", "watchlist_counts", "OLD.status", -1)]),
+    'user_stats_watchlist_status': ("AFTER UPDATE OF status ON watchlist WHEN OLD.status IS NOT NEW.status", [
+        _bump("OLD.user_id", "watchlist_counts", "OLD.status", -1),
+        _ensure("NEW.user_id"), _bump("NEW.user_id", "watchlist_counts", "NEW.status", 1)]),
+    'user_stats_favorites_insert': ("AFTER INSERT ON favorites", [
+        _ensure("NEW.user_id"), _add("NEW.user_id", "favorite_count", 1)]),
+    'user_stats_favorites_delete': ("AFTER DELETE ON favorites", [
+        _add("OLD.user_id", "favorite_count", -1)]),
+    'user_stats_reviews_insert': ("AFTER INSERT ON reviews WHEN NEW.rating IS NOT NULL", [
+        _ensure("NEW.user_id"), _add("NEW.user_id", "review_count", 1),
+        _add("NEW.user_id", "rating_sum", "NEW.rating")]),
+    'user_stats_reviews_delete': ("AFTER DELETE ON reviews WHEN OLD.rating IS NOT NULL", [
+        _add("OLD.user_id", "review_count", -1), _add("OLD.user_id", "rating_sum", "-OLD.rating")]),
+    'user_stats_reviews_rating': ("AFTER UPDATE OF rating ON reviews WHEN OLD.rating IS NOT NEW.rating", [
+        _ensure("NEW.user_id"),
+        _add("NEW.user_id", "review_count", "(NEW.rating IS NOT NULL) - (OLD.rating IS NOT NULL)"),
+        _add("NEW.user_id", "rating_sum", "COALESCE(NEW.rating, 0) - COALESCE(OLD.rating, 0)")]),
+    'user_stats_user_delete': ("AFTER DELETE ON users", [
+        "DELETE FROM user_stats WHERE user_id = OLD.id;"]),
+}
+
+
+def install(conn):
+    """Create user_stats and its triggers (idempotent)."""
+    conn.execute(SCHEMA)
+    for name, (event, body) in TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {event} BEGIN {' '.join(body)} END")
+
+
+def rebuild(conn, user_id=None):
+    """Recompute user_stats from history/watchlist/favorites/reviews/reading_progress. Returns the rows written."""
+    where, params = ("WHERE u.id = ?", (user_id,)) if user_id is not None else ("", ())
+    has_progress = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                                "AND name = 'reading_progress'").fetchone()
+    pages_read = ("(SELECT COALESCE(SUM(max_page + 1), 0) FROM reading_progress p WHERE p.user_id = u.id)"
+                  if has_progress else "0")
+    conn.execute("DELETE FROM user_stats" + (" WHERE user_id = ?" if user_id is not None else ""), params)
+    cur = conn.execute(f"""
+        INSERT INTO user_stats (user_id, read_count, genre_counts, watchlist_counts,
+                                favorite_count, review_count, rating_sum, pages_read)
+        SELECT u.id,
+               (SELECT COUNT(*) FROM history h WHERE h.user_id = u.id),
+               (SELECT COALESCE(json_group_object(genre, n), '{{}}') FROM (
+                    SELECT COALESCE(b.category, 'General') AS genre, COUNT(*) AS n
+                    FROM history h JOIN books b ON b.id = h.book_id
+                    WHERE h.user_id = u.id GROUP BY 1)),
+               (SELECT COALESCE(json_group_object(status, n), '{{}}') FROM (
+                    SELECT status, COUNT(*) AS n FROM watchlist w
+                    WHERE w.user_id = u.id AND status IS NOT NULL GROUP BY status)),
+               (SELECT COUNT(*) FROM favorites f WHERE f.user_id = u.id),
+               (SELECT COUNT(rating) FROM reviews r WHERE r.user_id = u.id),
+               (SELECT COALESCE(SUM(rating), 0) FROM reviews r WHERE r.user_id = u.id),
+               {pages_read}
+        FROM users u {where}
+    """, params)
+    conn.execute(f"""
+        UPDATE user_stats SET favorite_genre = (
+            SELECT key FROM json_each(user_stats.genre_counts) WHERE value > 0 ORDER BY value DESC, key LIMIT 1)
+        {"WHERE user_id = ?" if user_id is not None else ""}
+    """, params)
+    return cur.rowcount
+
+
+def get(conn, user_id):
+    """Stats for one user (zeros for users without a row)."""
+    row = conn.execute("""
+        SELECT read_count, genre_counts, favorite_genre, watchlist_counts,
+               favorite_count, review_count, rating_sum, pages_read
+        FROM user_stats WHERE user_id = ?
+    """, (user_id,)).fetchone()
+    if not row:
+        row = (0, '{}', None, '{}', 0, 0, 0, 0)
+    read_count, genres, favorite_genre, watchlist, favorites, reviews, rating_sum, pages = row
+    return {
+        'read_count': read_count,
+        'genre_counts': json.loads(genres or '{}'),
+        'favorite_genre': favorite_genre,
+        'watchlist_counts': {k: v for k, v in json.loads(watchlist or '{}').items() if v},
+        'favorite_count': favorites,
+        'review_count': reviews,
+        'avg_rating': round(rating_sum / reviews, 1) if reviews else None,
+        'pages_read': pages,
+    }
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python reader_stats.py", description="Reader stats tools")
+    parser.add_argument("command", choices=["rebuild"])
+    parser.add_argument("--db", default=os.path.join(APP_ROOT, "library.db"))
+    parser.add_argument("--user", type=int, default=None, help="only this user id")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    try:
+        install(conn)
+        count = rebuild(conn, args.user)
+        conn.commit()
+    finally:
+        conn.close()
+    print(f"Rebuilt stats for {count} users")
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -0,0 +1,333 @@
+"""
+Reading Progress
+Where each user is in each manga chapter, for /api/manga/progress (the
+reader saves the page on every page turn and asks for its resume point on
+load).
+
+reading_progress has one row per (user, chapter): the current page_index,
+the furthest page reached (max_page) and the chapter's page_count at the
+time. Triggers keep the rest current:
+
+  reading_resume        (user, manga) -> the chapter/page touched last, so
+                        profile() and watchlist() get "continue reading" from
+                        a primary-key join in the queries they already run
+  watchlist.progress    % of the manga's pages reached, on the user's
+                        watchlist row for it (if any)
+  user_stats.pages_read grows by the new pages reached (reader_stats.py)
+
+Writes are batched: ProgressBuffer keeps only the latest page per (user,
+chapter) in memory and upserts the whole set every
+READING_PROGRESS_FLUSH_SECONDS (or once READING_PROGRESS_MAX_PENDING keys
+are waiting, and at shutdown), so a reader paging through a chapter costs
+one row write per flush instead of one per page turn. resume() overlays the
+pending entries on the stored ones, so the worker that took the page turn
+answers with it immediately; other worker processes see it after the flush.
+
+CLI:  python reading_progress.py show USER_ID MANGA_ID [--db PATH]
+"""
+
+import os
+import time
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+
+logger = logging.getLogger('novus.reading_progress')
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+FLUSH_SECONDS = float(os.environ.get("READING_PROGRESS_FLUSH_SECONDS", "5") or "5")
+MAX_PENDING = int(os.environ.get("READING_PROGRESS_MAX_PENDING", "5000") or "5000")
+MAX_PAGE_INDEX = 100000
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS reading_progress (
+        user_id    INTEGER NOT NULL,
+        chapter_id INTEGER NOT NULL,
+        manga_id   INTEGER NOT NULL,
+        page_index INTEGER NOT NULL DEFAULT 0,   -- 0-based, where the reader is now
+        max_page   INTEGER NOT NULL DEFAULT 0,   -- furthest page_index reached
+        page_count INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (user_id, chapter_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_reading_progress_manga ON reading_progress(user_id, manga_id)",
+    "CREATE INDEX IF NOT EXISTS idx_reading_progress_chapter ON reading_progress(chapter_id)",
+    """
+    CREATE TABLE IF NOT EXISTS reading_resume (
+        user_id    INTEGER NOT NULL,
+        manga_id   INTEGER NOT NULL,
+        chapter_id INTEGER NOT NULL,
+        page_index INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT NOT NULL,
+        PRIMARY KEY (user_id, manga_id)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_reading_resume_recent ON reading_resume(user_id, updated_at)",
+]
+
+
+def _resume(row):
+    return (f"INSERT INTO reading_resume (user_id, manga_id, chapter_id, page_index, updated_at) "
+            f"VALUES ({row}.user_id, {row}.manga_id, {row}.chapter_id, {row}.page_index, {row}.updated_at) "
+            f"ON CONFLICT (user_id, manga_id) DO UPDATE SET chapter_id = excluded.chapter_id, "
+            f"page_index = excluded.page_index, updated_at = excluded.updated_at "
+            f"WHERE excluded.updated_at >= reading_resume.updated_at;")
+
+
+def _watchlist_percent(row):
+    reached = (f"(SELECT SUM(MIN(rp.max_page + 1, rp.page_count)) FROM reading_progress rp "
+               f"WHERE rp.user_id = {row}.user_id AND rp.manga_id = {row}.manga_id AND rp.page_count > 0)")
+    total = f"(SELECT SUM(page_count) FROM chapters WHERE manga_id = {row}.manga_id)"
+    return (f"UPDATE watchlist SET progress = COALESCE(MIN(100, 100 * {reached} / NULLIF({total}, 0)), progress) "
+            f"WHERE user_id = {row}.user_id AND book_id = {row}.manga_id;")
+
+
+def _pages_read(row, delta):
+    # not INSERT OR IGNORE: the outer upsert's conflict handling would override it inside the trigger
+    return (f"INSERT INTO user_stats (user_id) SELECT {row}.user_id "
+            f"WHERE NOT EXISTS (SELECT 1 FROM user_stats WHERE user_id = {row}.user_id); "
+            f"UPDATE user_stats SET pages_read = pages_read + ({delta}), updated_at = DATETIME('now') "
+            f"WHERE user_id = {row}.user_id;")
+
+
+# trigger name -> (event, body statements)
+TRIGGERS = {
+    'reading_progress_insert': ("AFTER INSERT ON reading_progress", [
+        _resume("NEW"), _watchlist_percent("NEW"), _pages_read("NEW", "NEW.max_page + 1")]),
+    'reading_progress_update': ("AFTER UPDATE ON reading_progress", [
+        _resume("NEW"), _watchlist_percent("NEW")]),
+    'reading_progress_further': ("AFTER UPDATE OF max_page ON reading_progress WHEN NEW.max_page > OLD.max_page", [
+        _pages_read("NEW", "NEW.max_page - OLD.max_page")]),
+    'reading_progress_chapter_delete': ("AFTER DELETE ON chapters", [
+        "DELETE FROM reading_progress WHERE chapter_id = OLD.id;",
+        "DELETE FROM reading_resume WHERE chapter_id = OLD.id;"]),
+    'reading_progress_user_delete': ("AFTER DELETE ON users", [
+        "DELETE FROM reading_progress WHERE user_id = OLD.id;",
+        "DELETE FROM reading_resume WHERE user_id = OLD.id;"]),
+}
+
+# only chapters of the manga the client named, with a known page_count (not a PDF still being
+# converted), are accepted; pages past the end are clamped to the last page so they can't
+# inflate pages_read
+UPSERT = """
+    INSERT INTO reading_progress (user_id, chapter_id, manga_id, page_index, max_page, page_count, updated_at)
+    SELECT :user_id, ch.id, ch.manga_id, MIN(:page_index, ch.page_count - 1), MIN(:max_page, ch.page_count - 1),
+           ch.page_count, :updated_at
+    FROM chapters ch WHERE ch.id = :chapter_id AND ch.manga_id = :manga_id AND ch.page_count > 0
+    ON CONFLICT (user_id, chapter_id) DO UPDATE SET
+        page_index = excluded.page_index,
+        max_page = MAX(reading_progress.max_page, excluded.max_page),
+        page_count = excluded.page_count,
+        updated_at = excluded.updated_at
+"""
+
+
+def install(conn):
+    """Create the tables and triggers (idempotent)."""
+    for statement in SCHEMA:
+        conn.execute(statement)
+    for name, (event, body) in TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"CREATE TRIGGER {name} {event} BEGIN {' '.join(body)} END")
+
+
+def write(conn, entries):
+    """Upsert entries: (user_id, manga_id, chapter_id, page_index, max_page, updated_at) tuples."""
+    keys = ('user_id', 'manga_id', 'chapter_id', 'page_index', 'max_page', 'updated_at')
+    conn.executemany(UPSERT, [dict(zip(keys, entry)) for entry in entries])
+
+
+def _entry(chapter_id, page_index, max_page, page_count, updated_at):
+    return {
+        'chapter_id': chapter_id,
+        'page_index': page_index,
+        'max_page': max_page,
+        'page_count': page_count,
+        'completed': bool(page_count) and max_page + 1 >= page_count,
+        'updated_at': updated_at,
+    }
+
+
+def resume(conn, user_id, manga_id, pending=()):
+    """Resume point and per-chapter progress for one manga in one query.
+
+    pending: not yet written (chapter_id, page_index, max_page, updated_at) tuples, which win.
+    """
+    chapters = {}
+    page_counts = {}
+    for chapter_id, page_count, page_index, max_page, updated_at in conn.execute("""
+        SELECT ch.id, COALESCE(ch.page_count, 0), rp.page_index, rp.max_page, rp.updated_at
+        FROM chapters ch
+        LEFT JOIN reading_progress rp ON rp.user_id = ? AND rp.chapter_id = ch.id
+        WHERE ch.manga_id = ?
+    """, (user_id, manga_id)):
+        page_counts[chapter_id] = page_count
+        if updated_at is not None:
+            chapters[chapter_id] = _entry(chapter_id, page_index, max_page, page_count, updated_at)
+    for chapter_id, page_index, max_page, updated_at in pending:
+        page_count = page_counts.get(chapter_id, 0)
+        if page_count > 0:      # the rest would be dropped by the write
+            page_index, max_page = min(page_index, page_count - 1), min(max_page, page_count - 1)
+            stored = chapters.get(chapter_id, {}).get('max_page', 0)
+            chapters[chapter_id] = _entry(chapter_id, page_index, max(max_page, stored), page_count, updated_at)
+    last = max(chapters.values(), key=lambda e: e['updated_at'], default=None)
+    return {
+        'manga_id': manga_id,
+        'chapter_id': last['chapter_id'] if last else None,
+        'page_index': last['page_index'] if last else 0,
+        'updated_at': last['updated_at'] if last else None,
+        'chapters': sorted(chapters.values(), key=lambda e: e['chapter_id']),
+    }
+
+
+class ProgressBuffer:
+    """Latest page per (user, chapter), upserted in one transaction every flush_interval."""
+
+    def __init__(self, connect, flush_interval=FLUSH_SECONDS, max_pending=MAX_PENDING, retry=None,
+                 name='reading-progress'):
+        self.connect = connect
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.name = name
+        self._write = retry(self._write_batch) if retry else self._write_batch
+        self._pending = {}
+        self._writing = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._pid = None
+        self.recorded = 0
+        self.coalesced = 0
+        self.written = 0
+        self.flushes = 0
+        self.failed = 0
+        self.last_error = None
+        self.last_flush_at = None
+
+    def record(self, user_id, manga_id, chapter_id, page_index):
+        """Remember the reader's page; written on the next flush."""
+        key = (user_id, chapter_id)
+        updated_at = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        with self._lock:
+            previous = self._pending.get(key)
+            max_page = max(page_index, previous[4]) if previous and previous[1] == manga_id else page_index
+            self._pending[key] = (user_id, manga_id, chapter_id, page_index, max_page, updated_at)
+            self.recorded += 1
+            if previous:
+                self.coalesced += 1
+            full = len(self._pending) >= self.max_pending
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def pending(self, user_id, manga_id):
+        """(chapter_id, page_index, max_page, updated_at) not written yet for one user's manga."""
+        with self._lock:
+            entries = dict(self._writing)
+            entries.update(self._pending)
+        return [(e[2], e[3], e[4], e[5]) for e in entries.values() if e[0] == user_id and e[1] == manga_id]
+
+    def resume(self, conn, user_id, manga_id):
+        return resume(conn, user_id, manga_id, self.pending(user_id, manga_id))
+
+    def flush(self):
+        """Write everything recorded so far. Returns the number of rows written."""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._writing = batch
+            if not batch:
+                return 0
+            try:
+                self._write(list(batch.values()))
+            except Exception as e:
+                with self._lock:
+                    # keep them for the next flush unless the reader has moved on since
+                    for key, entry in batch.items():
+                        newer = self._pending.get(key)
+                        self._pending[key] = (newer[:4] + (max(newer[4], entry[4]),) + newer[5:]) if newer else entry
+                    self._writing = {}
+                    self.failed += 1
+                    self.last_error = str(e)
+                logger.error(f"{self.name}: could not write {len(batch)} rows: {e}")
+                return 0
+            with self._lock:
+                self._writing = {}
+                self.written += len(batch)
+                self.flushes += 1
+                self.last_flush_at = time.time()
+            return len(batch)
+
+    def _write_batch(self, entries):
+        conn = self.connect()
+        try:
+            write(conn, entries)
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _ensure_thread(self):
+        if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            # a forked worker process inherits the object but not the thread
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def close(self):
+        """Write what is pending and stop the thread (atexit hook)."""
+        self._stop.set()
+        self._wake.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'running': bool(self._thread and self._thread.is_alive()),
+                'pending': len(self._pending),
+                'recorded': self.recorded,
+                'coalesced': self.coalesced,
+                'written': self.written,
+                'flushes': self.flushes,
+                'failed': self.failed,
+                'last_error': self.last_error,
+                'last_flush_at': self.last_flush_at,
+                'flush_interval': self.flush_interval,
+            }
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(prog="python reading_progress.py", description="Manga reading progress")
+    parser.add_argument("command", choices=["show"])
+    parser.add_argument("user_id", type=int)
+    parser.add_argument("manga_id", type=int)
+    parser.add_argument("--db", default=os.path.join(APP_ROOT, "library.db"))
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        print(json.dumps(resume(conn, args.user_id, args.manga_id), indent=2))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
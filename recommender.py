@@ -0,0 +1,297 @@
+"""
+Book Recommendations
+An item-item "readers also liked" index for view_book(). For every book the
+top RECOMMENDER_TOP_N most similar books of the same type are stored in
+book_neighbors (book_id, rank) so a page view is one primary-key range read.
+
+Similarity is computed offline with NumPy:
+
+    score = W_INTERACTIONS * cosine(interactions of A, interactions of B)
+          + W_CATEGORY     * (same category)
+          + W_AUTHOR       * (same author)
+
+where a user's interaction weight with a book is the sum of history (1),
+watchlist (2) and favorites (3) rows. Interactions form a dense
+users x books float32 matrix; neighbour scores are produced in row blocks
+(BLOCK_SIZE books at a time) with one matrix product each.
+
+Incremental refresh: triggers mark books in book_neighbors_dirty when a book
+is added or its category/author changes, or a new interaction arrives. The
+'recommendations' job recomputes the dirty books, every book sharing a reader
+with one of them and every book whose list currently contains one of them.
+Category/author overlap with books outside that set is only picked up by
+`build --full`, which recomputes everything.
+
+NumPy is optional at runtime: without it view_book() falls back to newest
+books in the same category, and the job is not scheduled.
+
+CLI:  python recommender.py build [--full] [--db PATH]
+      python recommender.py show BOOK_ID [--db PATH]
+"""
+
+import os
+import sqlite3
+import logging
+
+import jobs
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+logger = logging.getLogger('novus.recommender')
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+TOP_N = int(os.environ.get("RECOMMENDER_TOP_N", "12") or "12")
+INTERVAL = int(os.environ.get("RECOMMENDER_INTERVAL", "600") or "600")
+BLOCK_SIZE = 256
+
+W_INTERACTIONS = float(os.environ.get("RECOMMENDER_W_INTERACTIONS", "0.7") or "0.7")
+W_CATEGORY = float(os.environ.get("RECOMMENDER_W_CATEGORY", "0.2") or "0.2")
+W_AUTHOR = float(os.environ.get("RECOMMENDER_W_AUTHOR", "0.1") or "0.1")
+
+INTERACTIONS = """
+    SELECT user_id, book_id, SUM(weight) FROM (
+        SELECT user_id, book_id, 1 AS weight FROM history
+        UNION ALL SELECT user_id, book_id, 2 FROM watchlist
+        UNION ALL SELECT user_id, book_id, 3 FROM favorites
+    ) WHERE user_id IS NOT NULL AND book_id IS NOT NULL
+    GROUP BY user_id, book_id
+"""
+
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS book_neighbors (
+        book_id     INTEGER NOT NULL,
+        rank        INTEGER NOT NULL,          -- 0 = most similar
+        neighbor_id INTEGER NOT NULL,
+        score       REAL NOT NULL,
+        PRIMARY KEY (book_id, rank)
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_book_neighbors_neighbor ON book_neighbors(neighbor_id)",
+    """
+    CREATE TABLE IF NOT EXISTS book_neighbors_dirty (
+        book_id   INTEGER PRIMARY KEY,
+        marked_at TEXT DEFAULT (DATETIME('now'))
+    )
+    """,
+]
+
+# trigger name -> (event, book id expression)
+DIRTY_TRIGGERS = {
+    'book_neighbors_book_insert': ("AFTER INSERT ON books", "NEW.id"),
+    'book_neighbors_book_update': ("AFTER UPDATE OF category, author, book_type ON books", "NEW.id"),
+    'book_neighbors_history_insert': ("AFTER INSERT ON history", "NEW.book_id"),
+    'book_neighbors_watchlist_insert': ("AFTER INSERT ON watchlist", "NEW.book_id"),
+    'book_neighbors_favorites_insert': ("AFTER INSERT ON favorites", "NEW.book_id"),
+}
+
+
+def install(conn):
+    """Create the neighbour tables and dirty-marking triggers (idempotent)."""
+    for statement in SCHEMA:
+        conn.execute(statement)
+    for name, (event, book_id) in DIRTY_TRIGGERS.items():
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+        conn.execute(f"""
+            CREATE TRIGGER {name} {event} WHEN {book_id} IS NOT NULL BEGIN
+                INSERT OR IGNORE INTO book_neighbors_dirty (book_id) VALUES ({book_id});
+            END
+        """)
+    conn.execute("DROP TRIGGER IF EXISTS book_neighbors_book_delete")
+    conn.execute("""
+        CREATE TRIGGER book_neighbors_book_delete AFTER DELETE ON books BEGIN
+            DELETE FROM book_neighbors WHERE book_id = OLD.id OR neighbor_id = OLD.id;
+            DELETE FROM book_neighbors_dirty WHERE book_id = OLD.id;
+        END
+    """)
+
+
+# -------------------- LOOKUP --------------------
+def neighbors(conn, book_id, limit=3):
+    """Stored recommendations for a book: (id, title, author, category, cover_path) rows, best first."""
+    return conn.execute("""
+        SELECT b.id, b.title, b.author, b.category, b.cover_path
+        FROM book_neighbors n JOIN books b ON b.id = n.neighbor_id
+        WHERE n.book_id = ?
+        ORDER BY n.rank
+        LIMIT ?
+    """, (book_id, limit)).fetchall()
+
+
+# -------------------- MODEL --------------------
+def _codes(values):
+    """Integer label per value (equal values -> equal codes)."""
+    return np.unique(np.array(values, dtype=object).astype(str), return_inverse=True)[1]
+
+
+def load_model(conn):
+    """Books, their labels and the users x books interaction matrix."""
+    books = conn.execute("""
+        SELECT id, COALESCE(category, 'General'), LOWER(TRIM(COALESCE(author, ''))), COALESCE(book_type, 'book')
+        FROM books ORDER BY id
+    """).fetchall()
+    ids = np.array([row[0] for row in books], dtype=np.int64)
+    index = {book_id: i for i, book_id in enumerate(ids.tolist())}
+
+    authors = [row[2] for row in books]
+    author = _codes(authors)
+    author[np.array([not a for a in authors], dtype=bool)] = -1   # unknown author matches nobody
+
+    rows = [(u, index[b], w) for u, b, w in conn.execute(INTERACTIONS) if b in index]
+    users = {u: i for i, u in enumerate(sorted({u for u, _, _ in rows}))}
+    matrix = np.zeros((len(users), len(ids)), dtype=np.float32)
+    if rows:
+        u, b, w = zip(*rows)
+        matrix[[users[x] for x in u], list(b)] = w
+    return {
+        'ids': ids,
+        'index': index,
+        'category': _codes([row[1] for row in books]),
+        'author': author,
+        'kind': _codes([row[3] for row in books]),
+        'matrix': matrix,
+        'norms': np.sqrt((matrix * matrix).sum(axis=0)),
+    }
+
+
+def scores(model, rows):
+    """Similarity of the books at `rows` (column indices) to every book: a len(rows) x books array.
+
+    Other book types and the book itself score -1.
+    """
+    matrix, norms = model['matrix'], model['norms']
+    co = matrix[:, rows].T @ matrix
+    denom = norms[rows][:, None] * norms[None, :]
+    cosine = np.divide(co, denom, out=np.zeros_like(co), where=denom > 0)
+    score = W_INTERACTIONS * cosine
+    score += W_CATEGORY * (model['category'][rows][:, None] == model['category'][None, :])
+    author = model['author']
+    score += W_AUTHOR * ((author[rows][:, None] == author[None, :]) & (author[rows][:, None] >= 0))
+    score[model['kind'][rows][:, None] != model['kind'][None, :]] = -1
+    score[np.arange(len(rows)), rows] = -1
+    return score
+
+
+def top_neighbors(model, rows, n=TOP_N):
+    """{book_id: [(neighbor_id, score), ...]} for the books at `rows`, best first."""
+    ids = model['ids']
+    result = {}
+    for start in range(0, len(rows), BLOCK_SIZE):
+        block = np.asarray(rows[start:start + BLOCK_SIZE])
+        score = scores(model, block)
+        k = min(n, score.shape[1])
+        candidates = np.argpartition(-score, k - 1, axis=1)[:, :k] if k else np.zeros((len(block), 0), int)
+        for i, row in enumerate(block.tolist()):
+            cand = candidates[i]
+            # best score first, newer book first on ties
+            cand = cand[np.lexsort((-ids[cand], -score[i, cand]))]
+            result[int(ids[row])] = [(int(ids[j]), round(float(score[i, j]), 4)) for j in cand if score[i, j] > 0]
+    return result
+
+
+# -------------------- REFRESH --------------------
+def related(model, book_ids):
+    """The given books plus every book sharing a reader with one of them."""
+    cols = [model['index'][b] for b in book_ids if b in model['index']]
+    if not cols:
+        return set(book_ids)
+    matrix = model['matrix']
+    readers = matrix[:, cols].sum(axis=1) > 0
+    shared = np.nonzero(matrix[readers].sum(axis=0))[0]
+    return set(book_ids) | {int(model['ids'][i]) for i in shared}
+
+
+def refresh(conn, full=False, n=TOP_N):
+    """Recompute neighbour lists for dirty books (or all of them). Returns the number of books updated."""
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("numpy is required to build recommendations (pip install numpy)")
+    dirty = [row[0] for row in conn.execute("SELECT book_id FROM book_neighbors_dirty")]
+    # taken before computing, so marks added meanwhile are picked up by the next run
+    conn.execute("DELETE FROM book_neighbors_dirty")
+    conn.commit()
+    try:
+        model = load_model(conn)
+        if full:
+            targets = list(model['index'])
+        else:
+            targets = related(model, dirty)
+            for start in range(0, len(dirty), 500):
+                chunk = dirty[start:start + 500]
+                targets.update(row[0] for row in conn.execute(
+                    f"SELECT DISTINCT book_id FROM book_neighbors WHERE neighbor_id IN ({','.join('?' * len(chunk))})",
+                    chunk))
+            targets = [book_id for book_id in targets if book_id in model['index']]
+        lists = top_neighbors(model, [model['index'][book_id] for book_id in targets], n)
+
+        if full:
+            conn.execute("DELETE FROM book_neighbors")
+        else:
+            conn.executemany("DELETE FROM book_neighbors WHERE book_id = ?", [(b,) for b in lists])
+        conn.executemany(
+            "INSERT INTO book_neighbors (book_id, rank, neighbor_id, score) VALUES (?, ?, ?, ?)",
+            [(book_id, rank, neighbor, score)
+             for book_id, items in lists.items() for rank, (neighbor, score) in enumerate(items)],
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        conn.executemany("INSERT OR IGNORE INTO book_neighbors_dirty (book_id) VALUES (?)", [(b,) for b in dirty])
+        conn.commit()
+        raise
+    return len(lists)
+
+
+def has_dirty(conn):
+    return conn.execute("SELECT 1 FROM book_neighbors_dirty LIMIT 1").fetchone() is not None
+
+
+@jobs.handler('recommendations')
+def recommendations_job(job, ctx):
+    payload = job['payload'] or {}
+    updated = refresh(ctx.conn, full=bool(payload.get('full')))
+    logger.info(f"Recommendations refreshed for {updated} books")
+    return {'updated': updated}
+
+
+class RecommendationScheduler(jobs.Scheduler):
+    """Queues a 'recommendations' job every interval while books are marked dirty."""
+
+    def __init__(self, connect, interval=INTERVAL):
+        super().__init__(connect, 'recommendations', interval if NUMPY_AVAILABLE else 0,
+                         message='Refreshing recommendations', due=has_dirty)
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python recommender.py", description="Book recommendations")
+    parser.add_argument("command", choices=["build", "show"])
+    parser.add_argument("book_id", nargs="?", type=int)
+    parser.add_argument("--full", action="store_true", help="recompute every book, not only dirty ones")
+    parser.add_argument("--db", default=os.path.join(APP_ROOT, "library.db"))
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        if args.command == "show":
+            if args.book_id is None:
+                parser.error("show needs a BOOK_ID")
+            for row in neighbors(conn, args.book_id, TOP_N):
+                print(f"{row[0]:>6}  {row[1]}  ({row[3] or 'General'})")
+        else:
+            print(f"Updated recommendations for {refresh(conn, full=args.full)} books")
+    finally:
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
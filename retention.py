@@ -0,0 +1,242 @@
+"""
+Log Retention
+Keeps activity_log and system_logs bounded. Rows older than their table's
+TTL are, in small batches of one short transaction each:
+
+  1. rolled up into daily aggregates (activity_daily: count per
+     day/user/book/type; system_logs_daily: count per day/level/category),
+  2. appended to gzip'd JSON-lines archives under ARCHIVE_DIR
+     (<table>/<YYYY-MM>.jsonl.gz, one gzip member per batch),
+  3. deleted.
+
+TTLs are in days, per table with optional per-category overrides (the
+activity type for activity_log, the category for system_logs), set from
+the environment:
+    RETENTION_DAYS_ACTIVITY_LOG=180
+    RETENTION_DAYS_SYSTEM_LOGS=90
+    RETENTION_DAYS_SYSTEM_LOGS_ADMIN=365   (category 'admin')
+0 disables expiry for that table or category.
+
+The web app queues a 'retention' job every RETENTION_INTERVAL seconds (see
+RetentionScheduler), so one worker runs it at a time.
+
+CLI:  python retention.py run [--db PATH] [--max-batches N]
+      python retention.py policies
+"""
+
+import os
+import gzip
+import json
+import time
+import sqlite3
+import logging
+from datetime import datetime, timedelta
+
+import jobs
+
+logger = logging.getLogger('novus.retention')
+
+APP_ROOT = os.path.dirname(os.path.abspath(__file__))
+ARCHIVE_DIR = os.environ.get("RETENTION_ARCHIVE_DIR") or os.path.join(APP_ROOT, "archive")
+BATCH_SIZE = int(os.environ.get("RETENTION_BATCH_SIZE", "500") or "500")
+INTERVAL = int(os.environ.get("RETENTION_INTERVAL", "3600") or "3600")
+
+# table -> (category column, default TTL days, {category: TTL days})
+DEFAULT_POLICIES = {
+    'activity_log': ('activity_type', 180, {}),
+    'system_logs': ('category', 90, {'admin': 365}),
+}
+
+TABLE_COLUMNS = {
+    'activity_log': ('id', 'user_id', 'book_id', 'activity_type', 'summary_generated', 'timestamp'),
+    'system_logs': ('id', 'level', 'category', 'message', 'user_id', 'ip_address', 'user_agent',
+                    'details', 'timestamp'),
+}
+
+
+def load_policies(environ=None):
+    """{table: {'column': ..., 'default': days, 'categories': {category: days}}} with env overrides."""
+    environ = os.environ if environ is None else environ
+    policies = {}
+    for table, (column, default, categories) in DEFAULT_POLICIES.items():
+        prefix = f"RETENTION_DAYS_{table.upper()}"
+        categories = dict(categories)
+        for key, value in environ.items():
+            if key.startswith(prefix + "_") and value.strip():
+                categories[key[len(prefix) + 1:].lower()] = int(value)
+        days = environ.get(prefix, "").strip()
+        policies[table] = {'column': column, 'default': int(days) if days else default,
+                           'categories': categories}
+    return policies
+
+
+# -------------------- ROLLUPS --------------------
+def _rollup_activity(conn, rows):
+    counts = {}
+    for row in rows:
+        key = ((row['timestamp'] or '')[:10], row['user_id'], row['book_id'], row['activity_type'])
+        count, summaries = counts.get(key, (0, 0))
+        counts[key] = (count + 1, summaries + (1 if row['summary_generated'] else 0))
+    conn.executemany("""
+        INSERT INTO activity_daily (day, user_id, book_id, activity_type, count, summaries)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (day, user_id, book_id, activity_type)
+        DO UPDATE SET count = count + excluded.count, summaries = summaries + excluded.summaries
+    """, [key + value for key, value in counts.items()])
+
+
+def _rollup_system_logs(conn, rows):
+    counts = {}
+    for row in rows:
+        key = ((row['timestamp'] or '')[:10], row['level'], row['category'])
+        counts[key] = counts.get(key, 0) + 1
+    conn.executemany("""
+        INSERT INTO system_logs_daily (day, level, category, count) VALUES (?, ?, ?, ?)
+        ON CONFLICT (day, level, category) DO UPDATE SET count = count + excluded.count
+    """, [key + (count,) for key, count in counts.items()])
+
+
+ROLLUPS = {'activity_log': _rollup_activity, 'system_logs': _rollup_system_logs}
+
+
+# -------------------- ARCHIVE --------------------
+def _archive(rows, table, archive_dir):
+    """Append rows to <archive_dir>/<table>/<YYYY-MM>.jsonl.gz. Returns the files written."""
+    by_month = {}
+    for row in rows:
+        by_month.setdefault((row['timestamp'] or '0000-00')[:7], []).append(row)
+    written = []
+    os.makedirs(os.path.join(archive_dir, table), exist_ok=True)
+    for month, month_rows in sorted(by_month.items()):
+        path = os.path.join(archive_dir, table, f"{month}.jsonl.gz")
+        with gzip.open(path, 'at', encoding='utf-8') as fh:
+            for row in month_rows:
+                fh.write(json.dumps(row, separators=(',', ':')) + "\n")
+        written.append(path)
+    return written
+
+
+def read_archive(path):
+    """Rows from one archive file (all gzip members)."""
+    with gzip.open(path, 'rt', encoding='utf-8') as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+# -------------------- EXPIRY --------------------
+def _expiry_rules(policy, now):
+    """[(where, params)] selecting expired rows, one per category override plus the default."""
+    column = policy['column']
+    cutoff = lambda days: (now - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    rules = []
+    for category, days in sorted(policy['categories'].items()):
+        if days > 0:
+            rules.append((f"{column} = ? AND timestamp < ?", [category, cutoff(days)]))
+    if policy['default'] > 0:
+        where = "timestamp < ?"
+        params = [cutoff(policy['default'])]
+        if policy['categories']:
+            where = f"{column} NOT IN ({','.join('?' * len(policy['categories']))}) AND " + where
+            params = sorted(policy['categories']) + params
+        rules.append((where, params))
+    return rules
+
+
+def expire_batch(conn, table, where, params, batch_size=BATCH_SIZE, archive_dir=ARCHIVE_DIR):
+    """Roll up, archive and delete one batch of expired rows. Returns the number of rows removed."""
+    columns = TABLE_COLUMNS[table]
+    rows = conn.execute(
+        f"SELECT {', '.join(columns)} FROM {table} WHERE {where} ORDER BY timestamp LIMIT ?",
+        params + [batch_size],
+    ).fetchall()
+    if not rows:
+        return 0
+    rows = [dict(zip(columns, row)) for row in rows]
+    # archive first: a crash before the commit leaves rows both archived and live,
+    # and the next run archives them again rather than losing them
+    _archive(rows, table, archive_dir)
+    try:
+        ROLLUPS[table](conn, rows)
+        ids = [row['id'] for row in rows]
+        conn.execute(f"DELETE FROM {table} WHERE id IN ({','.join('?' * len(ids))})", ids)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return len(rows)
+
+
+def run(conn, policies=None, now=None, batch_size=BATCH_SIZE, max_batches=None,
+        archive_dir=ARCHIVE_DIR, pause=0.0):
+    """Expire everything past its TTL, batch by batch. Returns {table: rows removed}."""
+    policies = policies or load_policies()
+    now = now or datetime.utcnow()
+    removed = {}
+    batches = 0
+    for table, policy in policies.items():
+        removed[table] = 0
+        for where, params in _expiry_rules(policy, now):
+            while max_batches is None or batches < max_batches:
+                n = expire_batch(conn, table, where, params, batch_size, archive_dir)
+                if not n:
+                    break
+                removed[table] += n
+                batches += 1
+                if pause:
+                    # let request threads take the write lock between batches
+                    time.sleep(pause)
+    return removed
+
+
+# -------------------- FACETS --------------------
+def facet_values(conn, table, column):
+    """Distinct values of a column with live rows, from the log_facets counters."""
+    rows = conn.execute(
+        "SELECT value FROM log_facets WHERE table_name = ? AND column_name = ? AND rows > 0 ORDER BY value",
+        (table, column),
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+# -------------------- SCHEDULING --------------------
+@jobs.handler('retention')
+def retention_job(job, ctx):
+    payload = job['payload'] or {}
+    removed = run(ctx.conn, max_batches=payload.get('max_batches'), pause=0.05)
+    logger.info(f"Retention run removed {removed}")
+    return {'removed': removed}
+
+
+class RetentionScheduler(jobs.Scheduler):
+    """Queues a 'retention' job every interval unless one is pending."""
+
+    def __init__(self, connect, interval=INTERVAL):
+        super().__init__(connect, 'retention', interval, message='Expiring old log rows')
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python retention.py", description="Log retention")
+    parser.add_argument("command", choices=["run", "policies"])
+    parser.add_argument("--db", default=os.path.join(APP_ROOT, "library.db"))
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    if args.command == "policies":
+        print(json.dumps(load_policies(), indent=2))
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    conn = sqlite3.connect(args.db, timeout=30)
+    try:
+        removed = run(conn, max_batches=args.max_batches, pause=0.05)
+    finally:
+        conn.close()
+    print(json.dumps(removed))
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
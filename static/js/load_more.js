@@ -0,0 +1,57 @@
+// Load More / Infinite Scroll
+// Progressive enhancement for keyset-paginated lists. Markup:
+//   <div data-load-more data-url="/api/..." data-cursor="..." data-target="#grid" [data-count="#n"]>
+//     <a href="?cursor=...">Load more</a>
+//   </div>
+// Without JS the link just opens the next page.
+
+(function () {
+  if (window.novusLoadMore) return;  // included by several templates
+
+  function loadMore(container) {
+    if (container.dataset.loading || !container.isConnected) return;
+    container.dataset.loading = '1';
+
+    const url = new URL(container.dataset.url, window.location.origin);
+    url.searchParams.set('cursor', container.dataset.cursor);
+
+    fetch(url, { headers: { 'Accept': 'application/json' }, credentials: 'same-origin' })
+      .then(response => {
+        if (!response.ok) throw new Error('HTTP ' + response.status);
+        return response.json();
+      })
+      .then(data => {
+        const target = document.querySelector(container.dataset.target);
+        target.insertAdjacentHTML('beforeend', data.html);
+
+        const counter = container.dataset.count && document.querySelector(container.dataset.count);
+        if (counter) counter.textContent = parseInt(counter.textContent, 10) + data.items.length;
+
+        if (data.next_cursor) {
+          container.dataset.cursor = data.next_cursor;
+        } else {
+          container.remove();
+        }
+        document.dispatchEvent(new CustomEvent('novus:page-loaded', { detail: { target: target, items: data.items } }));
+      })
+      .catch(err => console.error('Load more failed:', err))
+      .finally(() => { delete container.dataset.loading; });
+  }
+
+  window.novusLoadMore = loadMore;
+
+  document.addEventListener('click', function (e) {
+    const link = e.target.closest('[data-load-more] a');
+    if (!link) return;
+    e.preventDefault();
+    loadMore(link.closest('[data-load-more]'));
+  });
+
+  // Infinite scroll: fetch the next page as the "Load more" row approaches the viewport
+  if ('IntersectionObserver' in window) {
+    const observer = new IntersectionObserver(entries => {
+      entries.forEach(entry => { if (entry.isIntersecting) loadMore(entry.target); });
+    }, { rootMargin: '400px' });
+    document.querySelectorAll('[data-load-more]').forEach(el => observer.observe(el));
+  }
+})();
@@ -0,0 +1,52 @@
+// Streamed AI Summaries
+// POSTs to an SSE endpoint (/ai_summary/stream, /api/manga/page/.../summarize/stream)
+// and reads the events as they arrive:
+//   token {text}                     -> onToken(text), append to what is shown
+//   done  {summary, model, cached}   -> resolves with the data (a cached summary is only this)
+//   error {error}                    -> rejects
+// EventSource can't POST, so the stream is read from fetch().
+
+(function () {
+  if (window.novusSummaryStream) return;  // included by several templates
+
+  function parseFrame(frame) {
+    let event = 'message';
+    const data = [];
+    frame.split('\n').forEach(line => {
+      if (line.startsWith('event:')) event = line.slice(6).trim();
+      else if (line.startsWith('data:')) data.push(line.slice(5).trim());
+    });
+    return { event: event, data: data.length ? JSON.parse(data.join('\n')) : {} };
+  }
+
+  async function summaryStream(url, body, onToken) {
+    const resp = await fetch(url, {
+      method: 'POST', credentials: 'same-origin',
+      headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
+      body: body ? JSON.stringify(body) : undefined
+    });
+    if (!resp.ok || !resp.body) {
+      const data = await resp.json().catch(() => ({}));
+      throw new Error(data.error || 'HTTP ' + resp.status);
+    }
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      let end;
+      while ((end = buffer.indexOf('\n\n')) !== -1) {
+        const frame = parseFrame(buffer.slice(0, end));
+        buffer = buffer.slice(end + 2);
+        if (frame.event === 'token' && onToken) onToken(frame.data.text);
+        else if (frame.event === 'done') return frame.data;
+        else if (frame.event === 'error') throw new Error(frame.data.error || 'Summary failed');
+      }
+    }
+    throw new Error('Summary stream ended early');
+  }
+
+  window.novusSummaryStream = summaryStream;
+})();
@@ -0,0 +1,321 @@
+"""
+Extractive Summarizer
+The local summariser behind text_summary.simple_summarize (the /ai_summary
+fallback when OpenAI is off or down): picks the max_sentences most central
+sentences of a text and returns them in their original order.
+
+Scoring (SUMMARIZER_METHOD):
+
+  tfidf     cosine similarity of each sentence's TF-IDF vector to the
+            document centroid (sublinear tf, sentence-level idf)
+  textrank  PageRank over the sentence cosine-similarity graph; documents
+            longer than TEXTRANK_MAX_SENTENCES use tfidf instead, since the
+            graph is n x n
+
+Sentences and words are split with precompiled patterns, stopwords are a
+fixed frozenset, and each sentence is tokenised once. With NumPy the
+(sentence, term) weights of a whole batch of documents are flat arrays
+reduced with bincount, so summarize_many() scores hundreds of documents in
+one pass; without it a pure-Python version of the tfidf scoring is used.
+
+Texts under SHORT_TEXT characters keep the old behaviour: the first
+max_sentences sentences, or one sentence cut to 30 words.
+
+CLI:  python summarizer.py bench [--docs N] [--sentences N] [--repeat N]
+      python summarizer.py summarize FILE [--sentences N] [--method tfidf|textrank]
+"""
+
+import os
+import re
+import math
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+METHOD = os.environ.get("SUMMARIZER_METHOD", "tfidf")
+METHODS = ('tfidf', 'textrank')
+TEXTRANK_MAX_SENTENCES = int(os.environ.get("TEXTRANK_MAX_SENTENCES", "800") or "800")
+TEXTRANK_DAMPING = 0.85
+SHORT_TEXT = 250
+SHORT_SENTENCE_WORDS = 30
+MIN_WORD_LENGTH = 3
+
+SENTENCE_RE = re.compile(r'(?<=[.!?])\s+')
+# words of at least MIN_WORD_LENGTH characters (a shorter run of \w can't match part way)
+WORD_RE = re.compile(r"\w{3,}")
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are aren't as at be because been before being
+below between both but by can cannot could couldn't did didn't do does doesn't doing don't down during
+each even ever every few for from further get gets got had hadn't has hasn't have haven't having he her
+here hers herself him himself his how however i if in into is isn't it its itself just let like made
+make many may me might more most much must my myself never no nor not now of off often on once one only
+or other others our ours ourselves out over own per rather same say says she should shouldn't since so
+some still such than that the their theirs them themselves then there these they this those though
+through thus to too under until up upon us very via was wasn't we were weren't what when where whether
+which while who whom whose why will with within without won't would wouldn't yet you your yours
+yourself yourselves
+""".split())
+
+
+# -------------------- TOKENISING --------------------
+def split_sentences(text):
+    text = text.replace('\n', ' ').strip()
+    return [s for s in SENTENCE_RE.split(text) if s]
+
+
+def tokenize(sentence):
+    """Content words of a sentence: lowercased, at least MIN_WORD_LENGTH characters, no stopwords."""
+    return [w for w in WORD_RE.findall(sentence.lower()) if w not in STOPWORDS]
+
+
+def _words(sentence):
+    """tokenize() minus the stopword filter, which the NumPy path applies once per distinct word."""
+    return WORD_RE.findall(sentence.lower())
+
+
+def _short_summary(sentences, max_sentences):
+    if len(sentences) == 1:
+        words = sentences[0].split()
+        if len(words) <= SHORT_SENTENCE_WORDS:
+            return sentences[0]
+        return ' '.join(words[:SHORT_SENTENCE_WORDS]).rstrip() + '…'
+    return ' '.join(sentences[:max_sentences])
+
+
+# -------------------- SCORING (NumPy) --------------------
+def _encode(documents):
+    """Flat arrays for a batch: per content word its sentence and term id, and per sentence its document.
+
+    documents are lists of _words() lists; stopwords are dropped here by term id.
+    """
+    lengths, doc_of_sentence, words = [], [], []
+    for d, sentences in enumerate(documents):
+        for tokens in sentences:
+            lengths.append(len(tokens))
+            words.extend(tokens)
+        doc_of_sentence.extend([d] * len(sentences))
+    # dict.fromkeys / map keep the per-token work in C
+    vocab = {w: i for i, w in enumerate(dict.fromkeys(words))}
+    term = np.array(list(map(vocab.__getitem__, words)), dtype=np.int64)
+    sentence = np.repeat(np.arange(len(lengths), dtype=np.int64), lengths)
+    stop = np.array([w in STOPWORDS for w in vocab], dtype=bool)
+    keep = ~stop[term]
+    return sentence[keep], term[keep], np.array(doc_of_sentence, dtype=np.int64), max(len(vocab), 1)
+
+
+def _tfidf_weights(sentence, term, doc_of_sentence, n_terms):
+    """L2-normalised TF-IDF weight per distinct (sentence, term) pair, idf taken within each document."""
+    pairs, counts = np.unique(sentence * n_terms + term, return_counts=True)
+    ps, pt = np.divmod(pairs, n_terms)
+    pd = doc_of_sentence[ps]
+    doc_terms, doc_term_of_pair, df = np.unique(pd * n_terms + pt, return_inverse=True, return_counts=True)
+    sentences_in_doc = np.bincount(doc_of_sentence)
+    idf = np.log((1.0 + sentences_in_doc[pd]) / (1.0 + df[doc_term_of_pair])) + 1.0
+    w = (1.0 + np.log(counts)) * idf
+    norms = np.sqrt(np.bincount(ps, weights=w * w, minlength=len(doc_of_sentence)))
+    return ps, pt, doc_term_of_pair, doc_terms, w / norms[ps]
+
+
+def _tfidf_scores(ps, doc_term_of_pair, doc_terms, w, doc_of_sentence, n_terms):
+    """Each sentence's cosine with its document's centroid (mean of its sentence vectors)."""
+    sentences_in_doc = np.bincount(doc_of_sentence)
+    centroid = np.bincount(doc_term_of_pair, weights=w, minlength=len(doc_terms))
+    centroid = centroid / sentences_in_doc[doc_terms // n_terms]
+    return np.bincount(ps, weights=w * centroid[doc_term_of_pair], minlength=len(doc_of_sentence))
+
+
+def _textrank(rows, cols, w, n, iterations=100, tol=1e-6):
+    """PageRank scores over the cosine-similarity graph of one document's n sentences."""
+    terms, local = np.unique(cols, return_inverse=True)
+    vectors = np.zeros((n, len(terms)))
+    vectors[rows, local] = w
+    similarity = vectors @ vectors.T
+    np.fill_diagonal(similarity, 0.0)
+    out = similarity.sum(axis=1, keepdims=True)
+    # sentences with no neighbours jump anywhere
+    transition = np.where(out > 0, similarity / np.where(out > 0, out, 1.0), 1.0 / n)
+    rank = np.full(n, 1.0 / n)
+    for _ in range(iterations):
+        updated = (1 - TEXTRANK_DAMPING) / n + TEXTRANK_DAMPING * (transition.T @ rank)
+        if np.abs(updated - rank).sum() < tol:
+            return updated
+        rank = updated
+    return rank
+
+
+def _scores_numpy(documents, method):
+    sentence, term, doc_of_sentence, n_terms = _encode(documents)
+    if not len(doc_of_sentence):
+        return []
+    ps, pt, doc_term_of_pair, doc_terms, w = _tfidf_weights(sentence, term, doc_of_sentence, n_terms)
+    scores = _tfidf_scores(ps, doc_term_of_pair, doc_terms, w, doc_of_sentence, n_terms)
+    bounds = np.concatenate([[0], np.cumsum([len(d) for d in documents])])
+    if method == 'textrank':
+        pair_bounds = np.searchsorted(ps, bounds)
+        for d in range(len(documents)):
+            first, last = bounds[d], bounds[d + 1]
+            n = last - first
+            if 1 < n <= TEXTRANK_MAX_SENTENCES and pair_bounds[d + 1] > pair_bounds[d]:
+                span = slice(pair_bounds[d], pair_bounds[d + 1])
+                scores[first:last] = _textrank(ps[span] - first, pt[span], w[span], n)
+    return [scores[bounds[d]:bounds[d + 1]] for d in range(len(documents))]
+
+
+# -------------------- SCORING (pure Python) --------------------
+def _scores_python(documents):
+    """The tfidf scores without NumPy (same formula, one document at a time)."""
+    result = []
+    for sentences in documents:
+        n = len(sentences)
+        counts = []
+        df = {}
+        for tokens in sentences:
+            c = {}
+            for t in tokens:
+                c[t] = c.get(t, 0) + 1
+            counts.append(c)
+            for t in c:
+                df[t] = df.get(t, 0) + 1
+        vectors = []
+        for c in counts:
+            v = {t: (1.0 + math.log(k)) * (math.log((1.0 + n) / (1.0 + df[t])) + 1.0) for t, k in c.items()}
+            norm = math.sqrt(sum(x * x for x in v.values())) or 1.0
+            vectors.append({t: x / norm for t, x in v.items()})
+        centroid = {}
+        for v in vectors:
+            for t, x in v.items():
+                centroid[t] = centroid.get(t, 0.0) + x / n
+        result.append([sum(x * centroid[t] for t, x in v.items()) for v in vectors])
+    return result
+
+
+# -------------------- API --------------------
+def _pick(sentences, scores, max_sentences):
+    """The top max_sentences by score (earlier sentence wins a tie), in reading order."""
+    order = sorted(range(len(sentences)), key=lambda i: (-scores[i], i))[:max_sentences]
+    return ' '.join(sentences[i] for i in sorted(order))
+
+
+def summarize_many(texts, max_sentences=3, method=METHOD):
+    """Summaries of a batch of texts, scored together in one pass."""
+    if method not in METHODS:
+        raise ValueError(f"unknown summarizer method {method!r} (expected one of {', '.join(METHODS)})")
+    summaries = [None] * len(texts)
+    pending, documents = [], []
+    for i, text in enumerate(texts):
+        sentences = split_sentences(text)
+        if len(text.strip()) < SHORT_TEXT:
+            summaries[i] = _short_summary(sentences, max_sentences)
+        elif len(sentences) <= max_sentences:
+            summaries[i] = ' '.join(sentences)
+        else:
+            pending.append((i, sentences))
+            documents.append([_words(s) if NUMPY_AVAILABLE else tokenize(s) for s in sentences])
+    if documents:
+        scored = _scores_numpy(documents, method) if NUMPY_AVAILABLE else _scores_python(documents)
+        for (i, sentences), scores in zip(pending, scored):
+            summaries[i] = _pick(sentences, [float(x) for x in scores], max_sentences)
+    return summaries
+
+
+def summarize(text, max_sentences=3, method=METHOD):
+    return summarize_many([text], max_sentences, method)[0]
+
+
+# -------------------- BENCHMARK --------------------
+def reference_summarize(src, max_sentences=3):
+    """The summariser this module replaced (word-frequency sums), kept as the benchmark baseline."""
+    stopwords = set(["the", "and", "a", "an", "of", "in", "to", "is", "it", "that", "for", "on", "with", "as",
+                     "was", "are", "by", "this", "be"])
+    src = src.replace('\n', ' ').strip()
+    sents = re.split(r'(?<=[.!?])\s+', src)
+    if len(src) < 250:
+        return _short_summary(sents, max_sentences)
+    words = re.findall(r"\w+", src.lower())
+    freq = {}
+    for w in words:
+        if w in stopwords or len(w) < 3:
+            continue
+        freq[w] = freq.get(w, 0) + 1
+    scores = []
+    for i, s in enumerate(sents):
+        s_words = re.findall(r"\w+", s.lower())
+        scores.append((i, sum(freq.get(w, 0) for w in s_words), s))
+    top = sorted(scores, key=lambda x: x[1], reverse=True)[:max_sentences]
+    return ' '.join(s for (_, _, s) in sorted(top, key=lambda x: x[0]))
+
+
+def synthetic_text(rng, sentences, vocabulary):
+    """A deterministic pseudo-description: sentences of 8-24 words drawn with a Zipf-like skew."""
+    out = []
+    for _ in range(sentences):
+        words = [vocabulary[min(int(rng.paretovariate(1.2)) - 1, len(vocabulary) - 1)]
+                 for _ in range(rng.randint(8, 24))]
+        out.append(' '.join(words).capitalize() + rng.choice('..!?'))
+    return ' '.join(out)
+
+
+def benchmark(docs=200, sentences=150, repeat=3, seed=7):
+    """{implementation: best seconds} summarising `docs` texts of `sentences` sentences each."""
+    import random
+    import time
+
+    rng = random.Random(seed)
+    vocabulary = [''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 10)))
+                  for _ in range(5000)] + sorted(STOPWORDS)
+    rng.shuffle(vocabulary)
+    texts = [synthetic_text(rng, sentences, vocabulary) for _ in range(docs)]
+    runs = {
+        'reference (per text)': lambda: [reference_summarize(t) for t in texts],
+        'tfidf (per text)': lambda: [summarize(t, method='tfidf') for t in texts],
+        'tfidf (batched)': lambda: summarize_many(texts, method='tfidf'),
+        'textrank (batched)': lambda: summarize_many(texts, method='textrank'),
+    }
+    timings = {}
+    for name, run in runs.items():
+        best = None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        timings[name] = best
+    return {'docs': docs, 'sentences_per_doc': sentences, 'chars': sum(len(t) for t in texts),
+            'numpy': NUMPY_AVAILABLE, 'seconds': timings}
+
+
+# -------------------- CLI --------------------
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="python summarizer.py", description="Extractive summarizer")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("bench", help="time this module against the old summariser")
+    bench.add_argument("--docs", type=int, default=200)
+    bench.add_argument("--sentences", type=int, default=150)
+    bench.add_argument("--repeat", type=int, default=3)
+    one = sub.add_parser("summarize", help="summarise a text file")
+    one.add_argument("file")
+    one.add_argument("--sentences", type=int, default=3)
+    one.add_argument("--method", choices=METHODS, default=METHOD)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        result = benchmark(args.docs, args.sentences, args.repeat)
+        print(f"{result['docs']} texts x {result['sentences_per_doc']} sentences "
+              f"({result['chars'] / 1e6:.1f} MB), numpy={result['numpy']}")
+        baseline = result['seconds']['reference (per text)']
+        for name, seconds in result['seconds'].items():
+            print(f"  {name:<22} {seconds * 1000:9.1f} ms  {baseline / seconds:5.2f}x")
+    else:
+        with open(args.file, encoding='utf-8') as fh:
+            print(summarize(fh.read(), args.sentences, args.method))
+
+
+if __name__ == "__main__":
+    main()
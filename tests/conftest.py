@@ -0,0 +1,35 @@
+"""Shared test helpers: a freshly migrated database and a clock the test moves by hand."""
+import sqlite3
+
+import pytest
+
+import migrations
+
+
+class FakeClock:
+    """Stand-in for time.time / time.monotonic; set .now to move it."""
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture
+def migrated_db(tmp_path):
+    """Path of an empty database with every migration applied."""
+    db = str(tmp_path / 'test.db')
+    migrations.upgrade(db)
+    return db
+
+
+@pytest.fixture
+def connect(migrated_db):
+    """Connection factory for migrated_db, the shape the pools and writers take."""
+    return lambda: sqlite3.connect(migrated_db)
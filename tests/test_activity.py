@@ -0,0 +1,98 @@
+import sqlite3
+import uuid
+
+import activity
+import log_writer
+import migrations
+
+
+def make_recorder(connect, clock, window=300):
+    writer = log_writer.BatchWriter(connect, writer=activity.write_rows, batch_size=50, flush_interval=60)
+    return activity.ActivityRecorder(writer, window=window, clock=clock), writer
+
+
+def rows(db, sql):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute(sql).fetchall()
+    finally:
+        conn.close()
+
+
+def test_repeats_inside_the_window_are_coalesced(migrated_db, connect, clock):
+    recorder, writer = make_recorder(connect, clock)
+    db = migrated_db
+    assert recorder.record_read(1, 7)
+    assert not recorder.record_read(1, 7)
+    assert recorder.record(1, 7, 'favorited')
+    assert recorder.record_read(2, 7)
+    clock.now = 301
+    assert recorder.record_read(1, 7)
+    writer.flush()
+
+    assert rows(db, "SELECT user_id, book_id, activity_type FROM activity_log ORDER BY id") == [
+        (1, 7, 'read'), (1, 7, 'favorited'), (2, 7, 'read'), (1, 7, 'read')]
+    # second read after the window hits the unique key and is ignored
+    assert rows(db, "SELECT user_id, book_id FROM history ORDER BY user_id") == [(1, 7), (2, 7)]
+
+    stats = recorder.stats()
+    assert (stats['accepted'], stats['coalesced']) == (4, 1)
+    assert stats['writer']['written'] == 7 and stats['writer']['batches'] == 1
+    assert stats['writer']['avg_flush_latency_ms'] is not None
+    writer.close()
+
+
+def test_migration_removes_duplicate_history(tmp_path):
+    db = str(tmp_path / 'history.db')
+    migrations.upgrade(db, target=7)
+    conn = sqlite3.connect(db)
+    conn.executemany("INSERT INTO history (user_id, book_id, date_read) VALUES (?, ?, ?)",
+                     [(1, 2, '2025-01-01'), (1, 2, '2025-01-02'), (1, 3, '2025-01-02')])
+    conn.commit()
+    conn.close()
+    migrations.upgrade(db)
+    assert rows(db, "SELECT user_id, book_id, date_read FROM history ORDER BY id") == [
+        (1, 2, '2025-01-01'), (1, 3, '2025-01-02')]
+
+
+def test_view_book_and_log_activity_are_buffered():
+    from app import app, get_conn, ACTIVITY_WRITER
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    conn = get_conn()
+    name = f"activity_{uuid.uuid4().hex[:8]}"
+    user_id = conn.execute("INSERT INTO users (username, password, role) VALUES (?, 'x', 'reader')",
+                           (name,)).lastrowid
+    book_id = conn.execute("SELECT id FROM books ORDER BY id LIMIT 1").fetchone()[0]
+    conn.commit()
+    conn.close()
+    try:
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['username'] = name
+            sess['role'] = 'reader'
+        assert client.get(f'/book/{book_id}').status_code == 200
+        assert client.get(f'/book/{book_id}').status_code == 200
+        r = client.post('/api/log-activity', json={'book_id': book_id, 'type': 'summarized', 'has_summary': True})
+        assert r.get_json() == {'success': True, 'coalesced': False}
+        r = client.post('/api/log-activity', json={'book_id': book_id, 'type': 'summarized'})
+        assert r.get_json()['coalesced'] is True
+        assert client.post('/api/log-activity', json={}).status_code == 400
+        assert client.post('/api/log-activity', json={'book_id': book_id, 'type': None}).status_code == 400
+        assert client.post('/api/log-activity', json={'book_id': 'x', 'type': 'read'}).status_code == 400
+        assert ACTIVITY_WRITER.flush()
+
+        conn = get_conn()
+        logged = conn.execute("SELECT activity_type, summary_generated FROM activity_log WHERE user_id = ? "
+                              "ORDER BY id", (user_id,)).fetchall()
+        history = conn.execute("SELECT COUNT(*) FROM history WHERE user_id = ?", (user_id,)).fetchone()[0]
+        conn.close()
+        assert logged == [('read', 0), ('summarized', 1)]
+        assert history == 1
+    finally:
+        conn = get_conn()
+        for table in ('activity_log', 'history', 'users'):
+            conn.execute(f"DELETE FROM {table} WHERE {'id' if table == 'users' else 'user_id'} = ?", (user_id,))
+        conn.commit()
+        conn.close()
@@ -0,0 +1,158 @@
+import os
+import shutil
+import uuid
+
+import pytest
+
+import ai_cache
+import chapter_pages
+
+
+def test_hit_needs_same_hash_operation_model_and_prompt(connect):
+    cache = ai_cache.ResultCache(connect, touch_interval=0)
+    calls = []
+    compute = lambda: calls.append(1) or 'a summary'
+    assert cache.get_or_compute('h1', 'manga_page', 'gpt', 1, compute) == ('a summary', False)
+    assert cache.get_or_compute('h1', 'manga_page', 'gpt', 1, compute) == ('a summary', True)
+    for other in [('h2', 'manga_page', 'gpt', 1), ('h1', 'image_text', 'gpt', 1),
+                  ('h1', 'manga_page', 'gpt-5', 1), ('h1', 'manga_page', 'gpt', 2)]:
+        assert cache.get_or_compute(*other, compute)[1] is False
+    assert len(calls) == 5
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['computes'], stats['saved_calls_total']) == (1, 5, 5, 1)
+    assert stats['by_operation']['manga_page']['saved_calls'] == 1
+
+
+def test_failures_and_empty_results_are_not_stored(connect):
+    cache = ai_cache.ResultCache(connect)
+
+    def boom():
+        raise RuntimeError('429')
+    with pytest.raises(RuntimeError):
+        cache.get_or_compute('h', 'book_cover', 'gpt', 1, boom)
+    assert cache.get_or_compute('h', 'book_cover', 'gpt', 1, lambda: None) == (None, False)
+    assert cache.stats()['entries'] == 0
+    assert cache.stats()['failures'] == 1
+
+
+def test_ttl_and_lru_limits(connect, clock):
+    cache = ai_cache.ResultCache(connect, ttl=100, max_entries=2, max_bytes=10, clock=clock,
+                                 touch_interval=0, evict_every=1)
+    cache.put('a', 'op', 'm', 1, 'aaa')
+    clock.now += 1
+    cache.put('b', 'op', 'm', 1, 'bbb')
+    clock.now += 1
+    assert cache.get('a', 'op', 'm', 1) == 'aaa'    # a is now the most recently used
+    clock.now += 1
+    cache.put('c', 'op', 'm', 1, 'ccc')
+    assert cache.get('b', 'op', 'm', 1) is None     # over max_entries: b evicted
+    clock.now += 1
+    cache.put('d', 'op', 'm', 1, 'dddddd')           # 12 bytes with a and c: the oldest goes
+    assert cache.get('a', 'op', 'm', 1) is None
+    assert cache.get('c', 'op', 'm', 1) == 'ccc'
+    assert cache.get('d', 'op', 'm', 1) == 'dddddd'
+    clock.now += 200
+    assert cache.get('d', 'op', 'm', 1) is None     # expired
+    cache.put('e', 'op', 'm', 1, 'e')
+    assert cache.stats()['entries'] == 1
+    assert cache.stats()['expired'] >= 1
+
+
+def test_hits_are_written_at_most_once_per_touch_interval(connect, clock):
+    cache = ai_cache.ResultCache(connect, touch_interval=300, evict_every=3, max_entries=1, clock=clock)
+    cache.put('a', 'op', 'm', 1, 'aaa')
+    stored = lambda: connect().execute("SELECT hits, last_used_at FROM ai_results WHERE content_hash = 'a'").fetchone()
+    for _ in range(3):
+        assert cache.get('a', 'op', 'm', 1) == 'aaa'
+    assert stored() == (0, clock.now)             # hits counted in memory only
+    clock.now += 301
+    assert cache.get('a', 'op', 'm', 1) == 'aaa'
+    assert stored() == (4, clock.now)
+    assert cache.stats()['hits'] == 4
+
+    cache.put('b', 'op', 'm', 1, 'bbb')
+    assert cache.stats()['entries'] == 2          # over max_entries until the third insert
+    cache.put('c', 'op', 'm', 1, 'ccc')
+    assert cache.stats()['entries'] == 1 and cache.stats()['evictions'] == 2
+
+
+class FakeAI:
+    model = 'fake-vision'
+
+    def __init__(self):
+        self.calls = []
+
+    def extract_text_from_image(self, image_path):
+        self.calls.append(image_path)
+        return f"text of {os.path.basename(image_path)}"
+
+
+def test_identical_images_share_one_call(connect, tmp_path):
+    cache = ai_cache.ResultCache(connect)
+    ai = FakeAI()
+    for name in ('one.png', 'two.png'):
+        (tmp_path / name).write_bytes(b'same pixels')
+    first = ai_cache.image_result(cache, ai, 'image_text', str(tmp_path / 'one.png'))
+    second = ai_cache.image_result(cache, ai, 'image_text', str(tmp_path / 'two.png'))
+    assert first == ('text of one.png', False)
+    assert second == ('text of one.png', True)
+    assert len(ai.calls) == 1
+
+
+def test_page_summary_endpoint_consults_the_cache(monkeypatch):
+    import app as app_module
+    from app import app, get_conn, AI_RESULTS
+
+    calls = []
+
+    class StubAI:
+        model = f"stub-{uuid.uuid4().hex[:6]}"   # fresh key space for this run
+
+        def summarize_manga_page(self, image_path, max_sentences=5):
+            calls.append(image_path)
+            return 'They fight.'
+    monkeypatch.setattr(app_module, 'IMAGE_AI', StubAI())
+    monkeypatch.setattr(app_module, 'IMAGE_AI_AVAILABLE', True)
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['username'] = 'admin'
+        sess['role'] = 'admin'
+    conn = get_conn()
+    manga_id = conn.execute("INSERT INTO books (title, book_type) VALUES ('AI cache', 'manga')").lastrowid
+    chapter_id = conn.execute("INSERT INTO chapters (manga_id, chapter_num) VALUES (?, 1)", (manga_id,)).lastrowid
+    rel_dir = chapter_pages.chapter_dir(manga_id, 1)
+    os.makedirs(os.path.join(chapter_pages.STATIC_ROOT, rel_dir), exist_ok=True)
+    with open(os.path.join(chapter_pages.STATIC_ROOT, rel_dir, 'page_001.png'), 'wb') as fh:
+        fh.write(uuid.uuid4().bytes)
+    chapter_pages.record_pages(conn, chapter_id, rel_dir, ['page_001.png'])
+    conn.commit()
+    conn.close()
+    try:
+        url = f'/api/manga/page/{chapter_id}/1/summarize'
+        first = client.post(url).get_json()
+        conn = get_conn()   # forget the stored page result so the next call goes to the AI cache
+        conn.execute("DELETE FROM image_summaries WHERE chapter_id = ?", (chapter_id,))
+        conn.commit()
+        conn.close()
+        second = client.post(url).get_json()
+        assert (first['summary'], first['cached']) == ('They fight.', False)
+        assert (second['summary'], second['cached']) == ('They fight.', True)
+        assert len(calls) == 1
+        assert AI_RESULTS.stats()['hits'] >= 1
+        conn = get_conn()
+        assert conn.execute("SELECT summary FROM image_summaries WHERE chapter_id = ?",
+                            (chapter_id,)).fetchone()[0] == 'They fight.'
+        conn.close()
+    finally:
+        shutil.rmtree(os.path.join(chapter_pages.STATIC_ROOT, rel_dir), ignore_errors=True)
+        conn = get_conn()
+        conn.execute("DELETE FROM image_summaries WHERE chapter_id = ?", (chapter_id,))
+        conn.execute("DELETE FROM chapter_pages WHERE chapter_id = ?", (chapter_id,))
+        conn.execute("DELETE FROM ai_results WHERE model = ?", (StubAI.model,))
+        conn.execute("DELETE FROM chapters WHERE id = ?", (chapter_id,))
+        conn.execute("DELETE FROM books WHERE id = ?", (manga_id,))
+        conn.commit()
+        conn.close()
@@ -0,0 +1,228 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import ai_client
+from image_summary_ai import ImageSummaryAI
+
+
+class StubOpenAI:
+    """Local OpenAI-compatible server answering /chat/completions from a script of statuses."""
+
+    def __init__(self, statuses=(), delay=0.0):
+        self.statuses = list(statuses)
+        self.delay = delay
+        self.stream_words = []
+        self.cut_stream = False
+        self.requests = []
+        self.ports = set()
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'   # keep-alive, so connection reuse is observable
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with stub.lock:
+                    stub.requests.append(body)
+                    stub.ports.add(self.client_address[1])
+                    stub.active += 1
+                    stub.max_active = max(stub.max_active, stub.active)
+                    status = stub.statuses.pop(0) if stub.statuses else 200
+                time.sleep(stub.delay)
+                if status == 200 and body.get('stream'):
+                    words = stub.stream_words or [f"reply {len(stub.requests)}"]
+                    chunks = [{'choices': [{'delta': {'content': w}}]} for w in words]
+                    data = ''.join(f"data: {json.dumps(c)}\n\n" for c in chunks)
+                    data = (data + ("" if stub.cut_stream else "data: [DONE]\n\n")).encode()
+                    if stub.cut_stream:
+                        data += b"data: {not json"
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/event-stream')
+                    self.send_header('Content-Length', str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                    with stub.lock:
+                        stub.active -= 1
+                    return
+                if status == 200:
+                    payload = {'choices': [{'message': {'content': f" reply {len(stub.requests)} "}}]}
+                else:
+                    payload = {'error': {'message': f'status {status}'}}
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                if status == 429:
+                    self.send_header('Retry-After', '0')
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                with stub.lock:
+                    stub.active -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubOpenAI()
+    yield server
+    server.close()
+
+
+def make_client(stub, **kwargs):
+    kwargs.setdefault('sleep', lambda seconds: None)
+    return ai_client.AIClient(base_url=stub.url, api_key='test-key', **kwargs)
+
+
+def ask(client):
+    return client.chat({'model': 'stub', 'messages': [{'role': 'user', 'content': 'hi'}]})
+
+
+def test_reuses_one_connection(stub):
+    client = make_client(stub)
+    assert [ask(client) for _ in range(3)] == ['reply 1', 'reply 2', 'reply 3']
+    assert len(stub.ports) == 1
+
+
+def test_retries_429_and_5xx_then_succeeds(stub):
+    stub.statuses = [429, 503]
+    delays = []
+    client = make_client(stub, sleep=delays.append)
+    assert ask(client) == 'reply 3'
+    assert delays[0] == 0                   # Retry-After honoured
+    stats = client.stats()
+    assert (stats['attempts'], stats['retries'], stats['error_count']) == (3, 2, 0)
+
+
+def test_client_errors_are_not_retried(stub):
+    stub.statuses = [400]
+    client = make_client(stub)
+    with pytest.raises(ai_client.requests.HTTPError):
+        ask(client)
+    assert len(stub.requests) == 1
+    assert client.state() == 'closed'
+
+
+def test_breaker_opens_fails_fast_and_recovers(stub, clock):
+    client = make_client(stub, max_retries=1, breaker_threshold=2, breaker_reset=30, clock=clock)
+    stub.statuses = [500] * 4
+    for _ in range(2):
+        with pytest.raises(ai_client.requests.HTTPError):
+            ask(client)
+    assert client.state() == 'open'
+    assert client.error_count == 2 and '500' in client.last_error
+    sent = len(stub.requests)
+    with pytest.raises(ai_client.AIUnavailable):
+        ask(client)
+    assert len(stub.requests) == sent        # failed fast, provider not contacted
+
+    clock.now += 31                          # half open: one trial call goes out
+    assert ask(client) == f'reply {sent + 1}'
+    assert client.state() == 'closed' and client.error_count == 0
+
+
+def test_failed_trial_reopens(stub, clock):
+    client = make_client(stub, max_retries=0, breaker_threshold=1, breaker_reset=30, clock=clock)
+    stub.statuses = [502, 502]
+    with pytest.raises(ai_client.requests.HTTPError):
+        ask(client)
+    clock.now += 31
+    with pytest.raises(ai_client.requests.HTTPError):
+        ask(client)
+    assert client.state() == 'open'
+
+
+def test_other_transport_errors_count_and_release_the_trial(stub, monkeypatch, clock):
+    client = make_client(stub, max_retries=0, breaker_threshold=1, breaker_reset=30, clock=clock)
+    stub.statuses = [502]
+    with pytest.raises(ai_client.requests.HTTPError):
+        ask(client)
+    clock.now += 31
+    real_post = client.session.post
+    monkeypatch.setattr(client.session, 'post', lambda *a, **kw: (_ for _ in ()).throw(
+        ai_client.requests.exceptions.ChunkedEncodingError('truncated')))
+    with pytest.raises(ai_client.requests.exceptions.ChunkedEncodingError):
+        ask(client)                          # the trial call fails: open again
+    assert client.state() == 'open' and 'truncated' in client.last_error
+    monkeypatch.setattr(client.session, 'post', real_post)
+    clock.now += 31
+    assert ask(client).startswith('reply')   # the next trial goes out and closes it
+    assert client.state() == 'closed'
+
+
+def test_trial_without_an_outcome_is_released(stub, clock):
+    client = make_client(stub, max_retries=0, breaker_threshold=1, breaker_reset=30, clock=clock)
+    stub.statuses = [502]
+    with pytest.raises(ai_client.requests.HTTPError):
+        ask(client)
+    clock.now += 31
+    with pytest.raises(RuntimeError):
+        with client._slot():
+            raise RuntimeError('caller bug')
+    assert ask(client).startswith('reply')
+
+
+def test_concurrency_is_bounded(stub):
+    stub.delay = 0.05
+    client = make_client(stub, max_concurrency=2)
+    threads = [threading.Thread(target=ask, args=(client,)) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(stub.requests) == 6
+    assert stub.max_active <= 2
+
+
+def test_image_summary_ai_shares_the_breaker(stub, tmp_path):
+    image = tmp_path / 'page.png'
+    image.write_bytes(b'\x89PNG fake')
+    client = make_client(stub, max_retries=0, breaker_threshold=1)
+    first, second = ImageSummaryAI(api_key='k', client=client), ImageSummaryAI(api_key='k', client=client)
+    assert first.summarize_manga_page(str(image)) == 'reply 1'
+    assert stub.requests[0]['messages'][0]['content'][0]['image_url']['url'].startswith('data:image/png;base64,')
+    stub.statuses = [503]
+    with pytest.raises(Exception):
+        first.extract_text_from_image(str(image))
+    assert second.error_count == 1 and second.last_error
+    with pytest.raises(Exception, match='circuit open'):
+        second.summarize_book_cover(str(image))
+    assert len(stub.requests) == 2
+
+
+def test_stream_chat_relays_deltas(stub):
+    stub.statuses = [503]
+    stub.stream_words = ['The ', 'hero ', 'wins.']
+    client = make_client(stub)
+    pieces = list(client.stream_chat({'model': 'stub', 'messages': []}))
+    assert pieces == ['The ', 'hero ', 'wins.']
+    assert stub.requests[-1]['stream'] is True
+    stats = client.stats()
+    assert (stats['retries'], stats['in_flight'], stats['error_count']) == (1, 0, 0)
+
+
+def test_broken_stream_counts_as_failure(stub):
+    stub.stream_words = ['half']
+    stub.cut_stream = True
+    client = make_client(stub)
+    deltas = client.stream_chat({'model': 'stub', 'messages': []})
+    assert next(deltas) == 'half'
+    with pytest.raises(ValueError):
+        next(deltas)
+    assert client.error_count == 1 and client.stats()['in_flight'] == 0
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+import catalog_search
+
+
+@pytest.fixture
+def conn(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    conn.execute("INSERT INTO books (id, title, author, category, description, book_type) VALUES "
+                 "(1, 'Dragon Tales', 'Ann Lee', 'Fantasy', 'A young <b>rider</b> and her dragon', 'manga')")
+    conn.execute("INSERT INTO books (id, title, author, category, description, book_type) VALUES "
+                 "(2, 'Cooking Basics', 'Dragomir Petrov', 'General', 'Recipes', 'book')")
+    conn.execute("INSERT INTO books (id, title, author, category, description, book_type) VALUES "
+                 "(3, 'Sea Stories', 'Mara Bell', 'Adventure', 'Pirates', 'manga')")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_prefix_match_ranks_title_above_author(conn):
+    results = catalog_search.search(conn, 'drag')
+    assert [r['id'] for r in results] == [1, 2]
+
+
+def test_type_and_category_filters(conn):
+    assert [r['id'] for r in catalog_search.search(conn, 'drag', book_type='book')] == [2]
+    assert catalog_search.search(conn, 'drag', category='Adventure') == []
+
+
+def test_triggers_keep_index_in_sync(conn):
+    conn.execute("INSERT INTO manga_characters (manga_id, name) VALUES (3, 'Captain Nemo')")
+    conn.execute("UPDATE books SET title = 'Ocean Stories' WHERE id = 3")
+    conn.execute("DELETE FROM books WHERE id = 2")
+    assert [r['id'] for r in catalog_search.search(conn, 'nemo')] == [3]
+    assert [r['id'] for r in catalog_search.search(conn, 'ocean')] == [3]
+    assert [r['id'] for r in catalog_search.search(conn, 'drag')] == [1]
+
+
+def test_snippet_is_highlighted_and_escaped(conn):
+    snippet = str(catalog_search.search(conn, 'rider')[0]['snippet'])
+    assert '<mark>rider</mark>' in snippet
+    assert '&lt;b&gt;' in snippet
+
+
+def test_total_and_rebuild(conn):
+    results, total = catalog_search.search(conn, 'stories', limit=1, with_total=True)
+    assert total == 1 and len(results) == 1
+    conn.execute(f"DELETE FROM {catalog_search.FTS_TABLE}")
+    assert catalog_search.search(conn, 'stories') == []
+    assert catalog_search.rebuild(conn) == 3
+    assert [r['id'] for r in catalog_search.search(conn, 'stories')] == [3]
+
+
+def test_punctuation_only_query_falls_back(conn):
+    assert catalog_search.search(conn, '"*()') is None
+
+
+def test_api_search_requires_login_and_paginates():
+    from app import app
+
+    client = app.test_client()
+    assert client.get('/api/search?q=a').status_code == 401
+
+    client.post('/login', data={'username': 'admin', 'password': '123'})
+    r = client.get('/api/search?q=a&per_page=1')
+    assert r.status_code == 200
+    data = r.get_json()
+    assert data['page'] == 1 and data['per_page'] == 1
+    assert len(data['results']) <= 1
+    assert client.get('/api/search?q=a&type=bogus').status_code == 400
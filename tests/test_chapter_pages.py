@@ -0,0 +1,89 @@
+import sqlite3
+
+import pytest
+
+import chapter_pages
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+
+@pytest.fixture
+def env(tmp_path, migrated_db):
+    static_root = tmp_path / 'static'
+    conn = sqlite3.connect(migrated_db)
+    conn.execute("INSERT INTO books (id, title, book_type) VALUES (1, 'Test Manga', 'manga')")
+    conn.execute("INSERT INTO chapters (id, manga_id, chapter_num, pdf_filename, page_count) "
+                 "VALUES (10, 1, 1, 'page_002.png,page_010.png', 2)")
+    # second chapter has no usable pdf_filename, so the directory listing is used
+    conn.execute("INSERT INTO chapters (id, manga_id, chapter_num, pdf_filename, page_count) "
+                 "VALUES (11, 1, 2, NULL, 0)")
+    for rel_dir, names in (('manga/manga_1_ch1', ('page_002.png', 'page_010.png')),
+                           ('manga/manga_1_ch2', ('page_10.png', 'page_9.png'))):
+        (static_root / rel_dir).mkdir(parents=True)
+        for i, name in enumerate(names):
+            path = static_root / rel_dir / name
+            if Image:
+                Image.new('RGB', (30 + i, 40)).save(path)
+            else:
+                path.write_bytes(b'not really a png %d' % i)
+    yield conn, str(static_root)
+    conn.close()
+
+
+def test_backfill_orders_pages_and_records_metadata(env):
+    conn, static_root = env
+    assert chapter_pages.backfill(conn, static_root) == {10: 2, 11: 2}
+
+    pages = chapter_pages.get_pages(conn, 10)
+    assert [p['filename'] for p in pages] == ['page_002.png', 'page_010.png']
+    assert [p['page_num'] for p in pages] == [1, 2]
+    assert pages[0]['mime'] == 'image/png'
+    assert pages[0]['bytes'] > 0 and len(pages[0]['content_hash']) == 64
+    if Image:
+        assert (pages[0]['width'], pages[0]['height']) == (30, 40)
+
+    # numeric, not lexicographic, order from the directory listing
+    assert [p['filename'] for p in chapter_pages.get_pages(conn, 11)] == ['page_9.png', 'page_10.png']
+
+    # already-populated chapters are skipped
+    assert chapter_pages.backfill(conn, static_root) == {}
+
+
+def test_pages_for_manga_and_cleanup_on_delete(env):
+    conn, static_root = env
+    chapter_pages.backfill(conn, static_root)
+    by_chapter = chapter_pages.pages_for_manga(conn, 1)
+    assert sorted(by_chapter) == [10, 11]
+    assert chapter_pages.get_page(conn, 10, 2)['path'] == 'manga/manga_1_ch1/page_010.png'
+
+    conn.execute("DELETE FROM chapters WHERE id = 10")
+    assert chapter_pages.get_pages(conn, 10) == []
+
+
+def test_record_pages_skips_missing_files(env):
+    conn, static_root = env
+    stored = chapter_pages.record_pages(conn, 10, 'manga/manga_1_ch1',
+                                        ['page_002.png', 'missing.png'], static_root)
+    assert stored == 1
+
+
+def test_chapter_pages_api_reads_the_table():
+    from app import app, get_conn
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    conn = get_conn()
+    row = conn.execute("SELECT chapter_id, COUNT(*) FROM chapter_pages "
+                       "WHERE mime LIKE 'image/%' GROUP BY chapter_id LIMIT 1").fetchone()
+    conn.close()
+    if not row:
+        pytest.skip('no chapter pages in library.db')
+
+    client.post('/login', data={'username': 'admin', 'password': '123'})
+    pages = client.get(f'/api/chapter/{row[0]}/pages').get_json()
+    assert len(pages) == row[1]
+    assert [p['page_num'] for p in pages] == list(range(1, row[1] + 1))
+    assert pages[0]['url'].startswith('/media/') and '/manga/' in pages[0]['url']   # content-addressed
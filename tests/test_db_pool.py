@@ -0,0 +1,63 @@
+from app import app, DB_POOL
+
+
+def test_request_reuses_pooled_connection():
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': '123'})
+
+    before = DB_POOL.stats()
+    # three catalog page loads; each takes one pooled connection and hands it back
+    for _ in range(3):
+        r = client.get('/')
+        assert r.status_code == 200
+    after = DB_POOL.stats()
+
+    # one acquire per request, served from the idle pool after the first
+    assert after['hits'] - before['hits'] >= 2
+    assert after['opened'] - before['opened'] <= 1
+
+
+def test_close_inside_request_keeps_shared_connection():
+    from app import get_conn
+    with app.test_request_context('/'):
+        first = get_conn()
+        second = get_conn()
+        assert first.raw is second.raw
+        second.close()
+        # the first handle is still usable after another handle is closed
+        assert first.execute("SELECT 1").fetchone() == (1,)
+        first.close()
+
+
+def test_admin_metrics_exposes_pool_counters():
+    client = app.test_client()
+    client.post('/login', data={'username': 'admin', 'password': '123'})
+    r = client.get('/admin/metrics')
+    assert r.status_code == 200
+    data = r.get_json()
+    assert 'hits' in data['db_pool'] and 'misses' in data['db_pool']
+
+
+def test_storage_self_check_reports_wal():
+    from app import configure_storage
+    report = configure_storage()
+    assert report['settings']['journal_mode']['actual'] == 'WAL'
+    assert report['settings']['synchronous']['ok']
+    assert report['settings']['busy_timeout']['ok']
+
+
+def test_retry_on_locked_retries_then_succeeds():
+    import sqlite3
+    import db_storage
+
+    calls = []
+
+    @db_storage.retry_on_locked(attempts=3, base_delay_ms=1)
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise sqlite3.OperationalError('database is locked')
+        return 'ok'
+
+    assert flaky() == 'ok'
+    assert len(calls) == 3
@@ -0,0 +1,148 @@
+import uuid
+
+import fragment_cache
+
+
+def test_lru_and_ttl(tmp_path, clock):
+    cache = fragment_cache.FragmentCache(str(tmp_path), ttl=60, max_entries=2, clock=clock)
+    calls = []
+    build = lambda name: (lambda: calls.append(name) or f"<p>{name}</p>")
+    assert cache.get_or_set('a', (), build('a')) == '<p>a</p>'
+    assert cache.get_or_set('a', (), build('a')) == '<p>a</p>'
+    cache.get_or_set('b', (), build('b'))
+    cache.get('a')                      # a is now most recently used
+    cache.get_or_set('c', (), build('c'))
+    assert cache.get('b') is None       # evicted
+    assert cache.get('a') == '<p>a</p>'
+    clock.now += 61
+    assert cache.get('a') is None
+    assert cache.get_or_set('missing', (), lambda: None) is None
+    assert calls == ['a', 'b', 'c']
+    stats = cache.stats()
+    assert (stats['hits'], stats['evictions'], stats['stale']) == (3, 1, 1)
+
+
+def test_tag_invalidation_reaches_other_workers(tmp_path):
+    web1 = fragment_cache.FragmentCache(str(tmp_path))
+    web2 = fragment_cache.FragmentCache(str(tmp_path))
+    for cache in (web1, web2):
+        cache.set(('home', 'reader'), 'old home', ('catalog',))
+        cache.set(('book', 1), 'book 1', ('book:1',))
+        cache.set(('about',), 'team', ('team',))
+    web1.invalidate('catalog', 'book:1')
+    web1.invalidate('catalog')          # repeated bumps stay strictly increasing
+    assert web2.get(('home', 'reader')) is None
+    assert web2.get(('book', 1)) is None
+    assert web2.get(('about',)) == 'team'
+
+
+def test_disk_layer_is_shared(tmp_path):
+    web1 = fragment_cache.FragmentCache(str(tmp_path), disk=True)
+    web2 = fragment_cache.FragmentCache(str(tmp_path), disk=True)
+    web1.set(('manga', ()), {'blocks': {'content': 'x'}}, ('catalog',))
+    assert web2.get(('manga', ())) == {'blocks': {'content': 'x'}}
+    assert web2.stats()['disk_hits'] == 1
+    web2.invalidate('catalog')
+    assert web1.get(('manga', ())) is None
+
+
+def test_inject_fills_only_named_markers():
+    html = "<div><!--fav:3--></div><div><!--fav:4--></div><!--other:3-->"
+    assert fragment_cache.inject(html, 'fav', {3: '<b>H</b>'}) == "<div><b>H</b></div><div></div><!--other:3-->"
+
+
+def test_home_is_cached_per_role_with_hearts_per_user():
+    from app import app, get_conn, FRAGMENTS, _invalidate_pages
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    conn = get_conn()
+    users = []
+    for _ in range(2):
+        name = f"frag_{uuid.uuid4().hex[:8]}"
+        users.append(conn.execute("INSERT INTO users (username, password, role) VALUES (?, 'x', 'reader')",
+                                  (name,)).lastrowid)
+    book_id = conn.execute("SELECT id FROM books WHERE COALESCE(book_type, 'book') = 'book' "
+                           "ORDER BY id DESC LIMIT 1").fetchone()[0]
+    conn.execute("INSERT INTO favorites (user_id, book_id) VALUES (?, ?)", (users[0], book_id))
+    conn.commit()
+    conn.close()
+    title = f"Fresh {uuid.uuid4().hex[:6]}"
+    try:
+        pages = []
+        for user_id in users:
+            client = app.test_client()
+            with client.session_transaction() as sess:
+                sess['user_id'] = user_id
+                sess['username'] = 'reader'
+                sess['role'] = 'reader'
+            r = client.get('/')
+            assert r.status_code == 200
+            pages.append(r.data.decode())
+        assert pages[0].count('favorite-heart-top-right') == pages[1].count('favorite-heart-top-right') + 1
+        assert '<!--fav:' not in pages[1]
+        before = FRAGMENTS.stats()['hits']
+        assert client.get('/').status_code == 200
+        assert FRAGMENTS.stats()['hits'] > before
+
+        conn = get_conn()
+        conn.execute("INSERT INTO books (title, author, category, book_type) VALUES (?, 'A', 'General', 'book')",
+                     (title,))
+        conn.commit()
+        conn.close()
+        assert title not in client.get('/').get_data(as_text=True)   # cached until a write invalidates
+        _invalidate_pages()
+        assert title in client.get('/').get_data(as_text=True)
+    finally:
+        conn = get_conn()
+        conn.execute("DELETE FROM books WHERE title = ?", (title,))
+        for user_id in users:
+            conn.execute("DELETE FROM favorites WHERE user_id = ?", (user_id,))
+            conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        conn.commit()
+        conn.close()
+        _invalidate_pages()
+
+
+def test_book_page_shows_current_reviewer_names():
+    from app import app, get_conn
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    suffix = uuid.uuid4().hex[:8]
+    conn = get_conn()
+    reviewer = conn.execute("INSERT INTO users (username, password, role) VALUES (?, 'x', 'reader')",
+                            (f'before_{suffix}',)).lastrowid
+    book_id = conn.execute("INSERT INTO books (title, author, category, book_type) VALUES (?, 'A', 'General', 'book')",
+                           (f'Reviewed {suffix}',)).lastrowid
+    conn.execute("INSERT INTO reviews (user_id, book_id, rating, content) VALUES (?, ?, 5, ?)",
+                 (reviewer, book_id, f'Loved it {suffix}'))
+    conn.commit()
+    conn.close()
+    try:
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'admin'
+            sess['role'] = 'admin'
+        page = client.get(f'/book/{book_id}').get_data(as_text=True)
+        assert f'before_{suffix}' in page and f'Loved it {suffix}' in page
+
+        conn = get_conn()   # a rename (profile()) leaves the cached book entry in place
+        conn.execute("UPDATE users SET username = ? WHERE id = ?", (f'after_{suffix}', reviewer))
+        conn.commit()
+        conn.close()
+        page = client.get(f'/book/{book_id}').get_data(as_text=True)
+        assert f'after_{suffix}' in page and f'before_{suffix}' not in page
+
+        conn = get_conn()   # and so does user_delete
+        conn.execute("DELETE FROM users WHERE id = ?", (reviewer,))
+        conn.commit()
+        conn.close()
+        assert f'Loved it {suffix}' not in client.get(f'/book/{book_id}').get_data(as_text=True)
+    finally:
+        conn = get_conn()
+        conn.execute("DELETE FROM reviews WHERE book_id = ?", (book_id,))
+        conn.execute("DELETE FROM books WHERE id = ?", (book_id,))
+        conn.execute("DELETE FROM users WHERE id = ?", (reviewer,))
+        conn.commit()
+        conn.close()
@@ -0,0 +1,164 @@
+import os
+import sqlite3
+import uuid
+
+import pytest
+
+import http_cache
+
+
+@pytest.fixture
+def conn(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    conn.execute("INSERT INTO books (id, title, book_type) VALUES (501, 'M', 'manga')")
+    conn.execute("INSERT INTO chapters (id, manga_id, chapter_num) VALUES (601, 501, 1)")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def _version(conn, entity, entity_id):
+    return http_cache.version(conn, entity, entity_id)[0]
+
+
+def test_triggers_bump_the_right_resource(conn):
+    chapters = _version(conn, 'manga_chapters', 501)
+    assert chapters >= 1
+    conn.execute("INSERT INTO chapter_pages (chapter_id, page_num, path, bytes, content_hash, mime) "
+                 "VALUES (601, 1, 'manga/manga_501_ch1/page_001.png', 1, 'ab', 'image/png')")
+    page_version = _version(conn, 'chapter', 601)
+    assert page_version >= 1
+    conn.execute("INSERT INTO image_variants (source_path, variant, path, width, height, bytes, source_hash) "
+                 "VALUES ('manga/manga_501_ch1/page_001.png', 'full', 'derived/full/x.webp', 10, 10, 1, 'ab')")
+    assert _version(conn, 'chapter', 601) == page_version + 1
+    assert _version(conn, 'manga_chapters', 501) == chapters   # pages don't change the chapter list
+
+    conn.execute("UPDATE chapters SET title = 'Renamed' WHERE id = 601")
+    assert _version(conn, 'manga_chapters', 501) == chapters + 1
+    characters = _version(conn, 'manga_characters', 501)
+    conn.execute("INSERT INTO manga_characters (manga_id, name) VALUES (501, 'Guts')")
+    assert _version(conn, 'manga_characters', 501) == characters + 1
+    assert _version(conn, 'manga_characters', 999) == 0
+
+
+def test_validators_change_with_version(conn):
+    etag, last_modified = http_cache.validators(conn, 'manga_characters', 501)
+    assert last_modified is not None and last_modified.tzinfo is not None
+    conn.execute("INSERT INTO manga_characters (manga_id, name) VALUES (501, 'Casca')")
+    assert http_cache.validators(conn, 'manga_characters', 501)[0] != etag
+    assert http_cache.validators(conn, 'manga_characters', 999) == (f"manga_characters-999-v0-r{http_cache.API_REVISION}", None)
+
+
+def test_media_digest_follows_file_content(tmp_path):
+    os.makedirs(tmp_path / 'covers')
+    path = tmp_path / 'covers' / 'a.png'
+    path.write_bytes(b'one')
+    first = http_cache.file_digest('covers/a.png', str(tmp_path))
+    assert len(first) == http_cache.DIGEST_LENGTH
+    path.write_bytes(b'two!')
+    assert http_cache.file_digest('covers/a.png', str(tmp_path)) != first
+    assert http_cache.file_digest('covers/missing.png', str(tmp_path)) is None
+    assert http_cache.media_digest('covers/a.png', 'f' * 64) == 'f' * http_cache.DIGEST_LENGTH
+    assert not http_cache.is_media('css/site.css')
+    assert not http_cache.is_media('covers/../library.db')
+
+
+@pytest.fixture
+def reader():
+    from app import app, get_conn
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['username'] = 'admin'
+        sess['role'] = 'admin'
+    conn = get_conn()
+    manga_id = conn.execute("INSERT INTO books (title, author, category, book_type) VALUES (?, 'A', 'Action', 'manga')",
+                            (f"Etag {uuid.uuid4().hex[:6]}",)).lastrowid
+    chapter_id = conn.execute("INSERT INTO chapters (manga_id, chapter_num, title) VALUES (?, 1, 'One')",
+                              (manga_id,)).lastrowid
+    conn.execute("INSERT INTO chapter_pages (chapter_id, page_num, path, width, height, bytes, content_hash, mime) "
+                 "VALUES (?, 1, ?, 10, 10, 3, ?, 'image/png')",
+                 (chapter_id, f"manga/manga_{manga_id}_ch1/page_001.png", 'c' * 64))
+    conn.commit()
+    conn.close()
+    try:
+        yield client, get_conn, manga_id, chapter_id
+    finally:
+        conn = get_conn()
+        conn.execute("DELETE FROM chapter_pages WHERE chapter_id = ?", (chapter_id,))
+        conn.execute("DELETE FROM manga_characters WHERE manga_id = ?", (manga_id,))
+        conn.execute("DELETE FROM chapters WHERE manga_id = ?", (manga_id,))
+        conn.execute("DELETE FROM books WHERE id = ?", (manga_id,))
+        conn.commit()
+        conn.close()
+
+
+def test_apis_answer_304_until_the_resource_changes(reader):
+    client, get_conn, manga_id, chapter_id = reader
+    for url, change in [
+        (f'/api/chapter/{chapter_id}/pages',
+         "UPDATE chapter_pages SET width = 20 WHERE chapter_id = {chapter}"),
+        (f'/api/manga/{manga_id}/chapters',
+         "INSERT INTO chapters (manga_id, chapter_num) VALUES ({manga}, 2)"),
+        (f'/api/manga/{manga_id}/characters',
+         "INSERT INTO manga_characters (manga_id, name) VALUES ({manga}, 'Puck')"),
+    ]:
+        first = client.get(url)
+        assert first.status_code == 200, url
+        etag = first.headers['ETag']
+        assert first.headers['Cache-Control'] == http_cache.API_CACHE_CONTROL
+        assert first.headers['Last-Modified']
+
+        again = client.get(url, headers={'If-None-Match': etag})
+        assert again.status_code == 304, url
+        assert again.data == b''
+        assert again.headers['ETag'] == etag
+        assert client.get(url, headers={'If-Modified-Since': first.headers['Last-Modified']}).status_code == 304
+        assert client.get(url, headers={'If-None-Match': '"something-else"'}).status_code == 200
+
+        conn = get_conn()
+        conn.execute(change.format(chapter=chapter_id, manga=manga_id))
+        conn.commit()
+        conn.close()
+        changed = client.get(url, headers={'If-None-Match': etag})
+        assert changed.status_code == 200, url
+        assert changed.headers['ETag'] != etag
+        assert changed.get_json() != first.get_json()
+
+
+def test_page_urls_are_content_addressed(reader):
+    client, _, manga_id, chapter_id = reader
+    pages = client.get(f'/api/chapter/{chapter_id}/pages').get_json()
+    assert pages[0]['url'] == f"/media/{'c' * http_cache.DIGEST_LENGTH}/manga/manga_{manga_id}_ch1/page_001.png"
+
+
+def test_media_route_serves_immutable_and_redirects_stale_digests():
+    from app import app
+
+    client = app.test_client()
+    name = f"covers/test_media_{uuid.uuid4().hex[:8]}.png"
+    full_path = os.path.join(http_cache.STATIC_ROOT, *name.split('/'))
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    with open(full_path, 'wb') as fh:
+        fh.write(b'\x89PNG version one')
+    try:
+        digest = http_cache.file_digest(name)
+        r = client.get(f'/media/{digest}/{name}')
+        assert r.status_code == 200
+        assert r.data == b'\x89PNG version one'
+        assert r.headers['Cache-Control'] == http_cache.MEDIA_CACHE_CONTROL
+        r.close()
+
+        with open(full_path, 'wb') as fh:
+            fh.write(b'\x89PNG version two, longer')
+        stale = client.get(f'/media/{digest}/{name}')
+        assert stale.status_code == 302
+        assert stale.headers['Location'].endswith(f'/media/{http_cache.file_digest(name)}/{name}')
+        assert 'immutable' not in stale.headers.get('Cache-Control', '')
+
+        assert client.get(f'/media/{digest}/css/style.css').status_code == 404
+        assert client.get(f'/media/{digest}/covers/nope.png').status_code == 404
+    finally:
+        os.remove(full_path)
@@ -0,0 +1,108 @@
+import os
+import sqlite3
+
+import pytest
+
+import chapter_pages
+import image_variants
+
+Image = pytest.importorskip("PIL.Image")
+
+
+@pytest.fixture
+def env(tmp_path, migrated_db):
+    static_root = tmp_path / 'static'
+    conn = sqlite3.connect(migrated_db)
+    conn.execute("INSERT INTO books (id, title, book_type, cover_path) VALUES (1, 'Test Manga', 'manga', 'covers/c.png')")
+    conn.execute("INSERT INTO chapters (id, manga_id, chapter_num, pdf_filename, page_count) "
+                 "VALUES (10, 1, 1, 'page_001.png,page_002.png', 2)")
+    (static_root / 'covers').mkdir(parents=True)
+    (static_root / 'manga/manga_1_ch1').mkdir(parents=True)
+    Image.new('RGB', (200, 300), 'red').save(static_root / 'covers/c.png')
+    # noisy pages so the PNGs are big, like pdf2image output
+    for name, width in (('page_001.png', 1000), ('page_002.png', 500)):
+        Image.effect_noise((width, width * 3 // 2), 40).convert('RGB').save(static_root / 'manga/manga_1_ch1' / name)
+    chapter_pages.backfill(conn, str(static_root))
+    yield conn, str(static_root)
+    conn.close()
+
+
+def test_generate_width_buckets(env):
+    conn, static_root = env
+    made = image_variants.generate(conn, 'manga/manga_1_ch1/page_001.png', static_root)
+    assert [(v['variant'], v['width'], v['height']) for v in made] == [
+        ('thumb', 320, 480), ('medium', 800, 1200), ('full', 1000, 1500)]
+    for v in made:
+        assert v['path'] == image_variants.variant_path('manga/manga_1_ch1/page_001.png', v['variant'])
+        with Image.open(os.path.join(static_root, v['path'])) as img:
+            assert img.format == 'WEBP' and img.width == v['width']
+
+    # narrower than the medium bucket: no upscaled copies
+    made = image_variants.generate(conn, 'manga/manga_1_ch1/page_002.png', static_root)
+    assert [v['variant'] for v in made] == ['thumb', 'full']
+    assert made[-1]['width'] == 500
+
+    found = image_variants.lookup(conn, ['manga/manga_1_ch1/page_001.png', 'covers/missing.png'])
+    assert list(found) == ['manga/manga_1_ch1/page_001.png']
+    assert image_variants.pick(found['manga/manga_1_ch1/page_001.png'], 'medium')['width'] == 800
+    assert image_variants.pick(made, 'medium')['variant'] == 'full'
+
+
+def test_generate_skips_unchanged_sources(env):
+    conn, static_root = env
+    first = image_variants.generate(conn, 'covers/c.png', static_root)
+    mtime = os.path.getmtime(os.path.join(static_root, first[0]['path']))
+    again = image_variants.generate(conn, 'covers/c.png', static_root)
+    assert [v['path'] for v in again] == [v['path'] for v in first]
+    assert os.path.getmtime(os.path.join(static_root, first[0]['path'])) == mtime
+    assert image_variants.generate(conn, 'books/x.pdf', static_root) == []
+
+
+def test_backfill_sources_and_cleanup(env):
+    conn, static_root = env
+    paths = image_variants.sources(conn)
+    assert sorted(paths) == ['covers/c.png', 'manga/manga_1_ch1/page_001.png', 'manga/manga_1_ch1/page_002.png']
+    assert image_variants.generate_all(conn, paths, static_root) == 3
+
+    # replacing a chapter's pages drops their variant rows (trigger) ...
+    chapter_pages.record_pages(conn, 10, 'manga/manga_1_ch1', [], static_root)
+    assert image_variants.lookup(conn, paths[1:]) == {}
+    # ... and deleting the chapter removes the files too
+    image_variants.remove_under(conn, 'manga/manga_1_ch1', static_root)
+    assert not os.path.exists(os.path.join(static_root, 'derived', 'full', 'manga', 'manga_1_ch1'))
+    assert 'covers/c.png' in image_variants.lookup(conn, paths)
+
+
+def test_catalog_cards_get_srcset():
+    from app import app, get_conn
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    conn = get_conn()
+    cover = conn.execute("SELECT cover_path FROM books WHERE cover_path IS NOT NULL "
+                         "AND COALESCE(book_type, 'book') != 'manga' ORDER BY created_at DESC, id DESC LIMIT 1").fetchone()
+    if cover is None:
+        conn.close()
+        pytest.skip("no book covers in library.db")
+    rows = [(cover[0], 'thumb', image_variants.variant_path(cover[0], 'thumb'), 320, 480, 1),
+            (cover[0], 'full', image_variants.variant_path(cover[0], 'full'), 640, 960, 2)]
+    conn.executemany("INSERT OR REPLACE INTO image_variants (source_path, variant, path, width, height, bytes) "
+                     "VALUES (?, ?, ?, ?, ?, ?)", rows)
+    conn.commit()
+    try:
+        with client.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'admin'
+            sess['role'] = 'admin'
+        html = client.get('/?limit=100').get_data(as_text=True)
+        thumb, full = rows[0][2], rows[1][2]
+        assert f'src="/static/{thumb}"' in html
+        assert f'srcset="/static/{thumb} 320w, /static/{full} 640w"' in html
+
+        items = client.get('/api/books?limit=100').get_json()['items']
+        item = next(i for i in items if i['cover_url'] == f'/static/{cover[0]}')
+        assert item['cover_srcset'] == f'/static/{thumb} 320w, /static/{full} 640w'
+    finally:
+        conn.execute("DELETE FROM image_variants WHERE source_path = ?", (cover[0],))
+        conn.commit()
+        conn.close()
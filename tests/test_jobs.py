@@ -0,0 +1,151 @@
+import shutil
+
+import pytest
+
+import jobs
+import pdf_pages
+import chapter_pages
+
+
+@jobs.handler('test_echo')
+def _echo(job, ctx):
+    ctx.progress(1, 2, 'halfway')
+    if job['payload'].get('explode'):
+        raise ValueError('boom')
+    return {'echo': job['payload']['value']}
+
+
+def test_worker_runs_job_and_records_result(connect):
+    conn = connect()
+    job_id = jobs.enqueue(conn, 'test_echo', {'value': 42}, user_id=1)
+    assert jobs.get(conn, job_id)['status'] == 'queued'
+
+    worker = jobs.Worker(connect, kinds=['test_echo'])
+    assert worker.run_once() is True
+    assert worker.run_once() is False
+
+    job = jobs.get(conn, job_id)
+    assert job['status'] == 'done'
+    assert job['result'] == {'echo': 42}
+    assert job['progress'] == job['total'] == 2
+    assert job['attempts'] == 1
+
+
+def test_failed_job_is_retried_then_marked_failed(connect):
+    conn = connect()
+    job_id = jobs.enqueue(conn, 'test_echo', {'explode': True}, max_attempts=2)
+    worker = jobs.Worker(connect, kinds=['test_echo'])
+
+    worker.run_once()
+    assert jobs.get(conn, job_id)['status'] == 'queued'
+    worker.run_once()
+    job = jobs.get(conn, job_id)
+    assert job['status'] == 'failed'
+    assert 'boom' in job['error']
+    assert worker.failed == 2
+
+
+def test_expired_lease_is_reclaimed(connect):
+    conn = connect()
+    job_id = jobs.enqueue(conn, 'test_echo', {'value': 1})
+    assert jobs.claim(conn, 'dead-worker', ['test_echo'])['id'] == job_id
+    # still leased: nobody else may take it
+    assert jobs.claim(conn, 'other', ['test_echo']) is None
+
+    conn.execute("UPDATE jobs SET lease_expires = DATETIME('now', '-1 seconds') WHERE id = ?", (job_id,))
+    conn.commit()
+    job = jobs.claim(conn, 'other', ['test_echo'])
+    assert job['id'] == job_id and job['worker'] == 'other' and job['attempts'] == 2
+
+
+def test_schedulers_in_two_processes_queue_one_job(connect):
+    import threading
+
+    other = jobs.Scheduler(connect, 'test_echo', 60, payload={'value': 2})
+    results = []
+
+    def due(conn):
+        # the other process's scheduler checks while this one is between its check and its insert
+        racer = threading.Thread(target=lambda: results.append(other.enqueue()))
+        racer.start()
+        racer.join(0.2)
+        return True
+
+    first = jobs.Scheduler(connect, 'test_echo', 60, payload={'value': 1}, due=due).enqueue()
+    while not results:
+        threading.Event().wait(0.01)
+    assert first and results == [None]
+    conn = connect()
+    assert conn.execute("SELECT COUNT(*) FROM jobs WHERE kind = 'test_echo'").fetchone()[0] == 1
+    conn.close()
+
+
+def test_excluded_kinds_are_left_for_other_workers(connect):
+    conn = connect()
+    slow = jobs.enqueue(conn, 'test_echo', {'value': 1})
+    assert jobs.Worker(connect, kinds=['test_echo'], exclude=['test_echo']).run_once() is False
+    assert jobs.claim(conn, 'w', ['test_echo'], exclude=['other'])['id'] == slow
+    conn.close()
+
+
+def test_page_windows_cover_every_page_once():
+    assert pdf_pages.page_windows(10, 4) == [(1, 4), (5, 8), (9, 10)]
+    assert pdf_pages.page_windows(1, 4) == [(1, 1)]
+    assert pdf_pages.page_windows(0, 4) == []
+
+
+@pytest.mark.skipif(not (pdf_pages.PDF_EXTRACTION_AVAILABLE and shutil.which('pdftoppm')),
+                    reason='pdf2image/poppler not installed')
+def test_convert_pdf_in_windows_across_processes(tmp_path):
+    from PIL import Image
+
+    pdf = str(tmp_path / 'chapter.pdf')
+    pages = [Image.new('RGB', (100, 150), (i * 20, 0, 0)) for i in range(5)]
+    pages[0].save(pdf, save_all=True, append_images=pages[1:])
+
+    seen = []
+    names = pdf_pages.convert_pdf(pdf, str(tmp_path / 'out'), dpi=20, window=2, processes=2,
+                                  on_progress=lambda done, total: seen.append((done, total)))
+    assert names == [f'page_{i:03d}.png' for i in range(1, 6)]
+    assert seen[0] == (0, 5) and seen[-1] == (5, 5)
+
+
+def test_converted_upload_is_removed(connect, tmp_path, monkeypatch):
+    monkeypatch.setattr(chapter_pages, 'STATIC_ROOT', str(tmp_path / 'static'))
+    monkeypatch.setattr(pdf_pages, 'PDF_EXTRACTION_AVAILABLE', True)
+    monkeypatch.setattr(pdf_pages, 'convert_pdf', lambda pdf_path, out_dir, **kw: ['page_001.png', 'page_002.png'])
+    monkeypatch.setattr(pdf_pages.image_variants, 'queue', lambda *a, **kw: None)
+    monkeypatch.setattr(pdf_pages.page_ai, 'queue', lambda *a, **kw: None)
+    conn = connect()
+    chapter_id = conn.execute("INSERT INTO chapters (manga_id, chapter_num) VALUES (1, 1)").lastrowid
+    conn.commit()
+    pdfs = []
+    for name in ('converted.pdf', 'orphan.pdf'):
+        pdfs.append(tmp_path / name)
+        pdfs[-1].write_bytes(b'%PDF-1.4')
+    jobs.enqueue(conn, 'chapter_pdf', {'pdf_path': str(pdfs[0]), 'chapter_id': chapter_id,
+                                       'chapter_dir': 'uploads/manga/manga_1_ch1'})
+    jobs.enqueue(conn, 'chapter_pdf', {'pdf_path': str(pdfs[1]), 'chapter_id': chapter_id + 1,
+                                       'chapter_dir': 'uploads/manga/manga_1_ch2'})
+    worker = jobs.Worker(connect, kinds=['chapter_pdf'])
+    assert worker.run_once() and worker.run_once()
+    assert conn.execute("SELECT page_count FROM chapters WHERE id = ?", (chapter_id,)).fetchone()[0] == 2
+    assert not pdfs[0].exists() and not pdfs[1].exists()
+    conn.close()
+
+
+def test_job_status_endpoint():
+    from app import app, get_conn
+
+    conn = get_conn()
+    job_id = jobs.enqueue(conn, 'test_echo', {'value': 1}, user_id=3)
+    conn.close()
+
+    client = app.test_client()
+    assert client.get(f'/api/jobs/{job_id}').status_code == 401
+
+    client.post('/login', data={'username': 'admin', 'password': '123'})
+    data = client.get(f'/api/jobs/{job_id}').get_json()
+    assert data['id'] == job_id and data['kind'] == 'test_echo'
+    assert data['status'] in ('queued', 'running', 'done')
+    assert client.get('/api/jobs/999999').status_code == 404
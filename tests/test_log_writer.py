@@ -0,0 +1,142 @@
+import sqlite3
+import threading
+
+import log_writer
+
+
+def make_writer(tmp_path, **kwargs):
+    db = str(tmp_path / 'logs.db')
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE logs (msg TEXT)")
+    conn.commit()
+    conn.close()
+    connect = kwargs.pop('connect', lambda: sqlite3.connect(db))
+    writer = log_writer.BatchWriter(connect, "INSERT INTO logs (msg) VALUES (?)", **kwargs)
+    return writer, db
+
+
+def count(db):
+    conn = sqlite3.connect(db)
+    try:
+        return conn.execute("SELECT COUNT(*) FROM logs").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_rows_are_written_in_batches(tmp_path):
+    writer, db = make_writer(tmp_path, batch_size=10, flush_interval=60)
+    for i in range(25):
+        assert writer.submit((f"event {i}",))
+    assert writer.flush()
+    assert count(db) == 25
+    stats = writer.stats()
+    assert stats['written'] == 25 and stats['dropped'] == 0
+    assert stats['batches'] == 3 and stats['max_batch'] == 10
+    writer.close()
+
+
+def test_flush_interval_writes_a_partial_batch(tmp_path):
+    writer, db = make_writer(tmp_path, batch_size=100, flush_interval=0.05)
+    writer.submit(("one",))
+    for _ in range(100):
+        if writer.stats()['written']:
+            break
+        threading.Event().wait(0.02)
+    assert count(db) == 1
+    writer.close()
+
+
+def test_full_queue_drops_and_close_drains(tmp_path):
+    db = str(tmp_path / 'logs.db')
+    gate = threading.Event()
+
+    def slow_connect():
+        gate.wait(5)
+        return sqlite3.connect(db)
+
+    writer, db = make_writer(tmp_path, connect=slow_connect, batch_size=1, flush_interval=60,
+                             max_queue=3, block_seconds=0.01)
+    results = [writer.submit((f"e{i}",)) for i in range(10)]
+    assert results.count(False) > 0
+    stats = writer.stats()
+    assert stats['dropped'] == results.count(False) and stats['blocked'] >= stats['dropped']
+
+    gate.set()
+    writer.close()
+    assert count(db) == results.count(True)
+    assert not writer.stats()['running']
+
+
+def test_flush_gives_up_on_a_full_queue(tmp_path):
+    db = str(tmp_path / 'logs.db')
+    gate = threading.Event()
+
+    def stuck_connect():
+        gate.wait(5)
+        return sqlite3.connect(db)
+
+    writer, db = make_writer(tmp_path, connect=stuck_connect, batch_size=1, flush_interval=60,
+                             max_queue=2, block_seconds=0.01)
+    for i in range(5):
+        writer.submit((f"e{i}",))
+    assert writer.flush(timeout=0.1) is False     # returns instead of waiting for room
+    gate.set()
+    assert writer.flush()
+    writer.close()
+
+
+def test_close_does_not_hang_on_a_full_queue(tmp_path, caplog):
+    db = str(tmp_path / 'logs.db')
+    gate = threading.Event()
+
+    def stuck_connect():
+        gate.wait(5)
+        return sqlite3.connect(db)
+
+    writer, db = make_writer(tmp_path, connect=stuck_connect, batch_size=1, flush_interval=60,
+                             max_queue=2, block_seconds=0.01)
+    for i in range(5):
+        writer.submit((f"e{i}",))
+    threading.Timer(0.5, gate.set).start()      # the stuck write finishes after close gave up on the queue
+    writer.close(timeout=0.1)
+    assert 'queue still full' in caplog.text
+    assert writer.stats()['queued'] == 0           # what was left got written inline
+
+
+def test_a_rejected_row_does_not_lose_its_batch(tmp_path):
+    db = str(tmp_path / 'logs.db')
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE logs (msg TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+    writer = log_writer.BatchWriter(lambda: sqlite3.connect(db), "INSERT INTO logs (msg) VALUES (?)",
+                                    batch_size=100, flush_interval=60)
+    for msg in ("a", None, "b"):
+        writer.submit((msg,))
+    assert writer.flush()
+    assert count(db) == 2
+    stats = writer.stats()
+    assert (stats['written'], stats['failed']) == (2, 1)
+    writer.close()
+
+
+def test_log_system_event_is_queued_and_flushed():
+    import uuid
+    from app import app, get_conn, log_system_event, SYSTEM_LOG_WRITER
+
+    app.test_client().get('/login')  # first request runs the migrations
+    marker = f"batched log test {uuid.uuid4().hex}"
+    with app.test_request_context('/', headers={'User-Agent': 'pytest'}):
+        log_system_event('INFO', 'system', marker, None, {'k': 1})
+    assert SYSTEM_LOG_WRITER.flush()
+
+    conn = get_conn()
+    try:
+        row = conn.execute("SELECT level, user_agent, details, timestamp FROM system_logs WHERE message = ?",
+                           (marker,)).fetchone()
+        conn.execute("DELETE FROM system_logs WHERE message = ?", (marker,))
+        conn.commit()
+    finally:
+        conn.close()
+    assert row[:3] == ('INFO', 'pytest', '{"k": 1}')
+    assert row[3]
@@ -0,0 +1,57 @@
+import os
+import ast
+import sqlite3
+
+import migrations
+
+
+def test_fresh_database_reaches_latest_version(tmp_path):
+    db = str(tmp_path / 'fresh.db')
+    applied = migrations.upgrade(db)
+    assert applied == [m.version for m in migrations.discover()]
+
+    conn = sqlite3.connect(db)
+    assert migrations.current_version(conn) == migrations.latest_version()
+    users = {row[0] for row in conn.execute("SELECT username FROM users")}
+    conn.close()
+    assert {'admin', 'publisher', 'student'} <= users
+
+
+def test_startup_check_is_a_noop_when_current(tmp_path):
+    db = str(tmp_path / 'current.db')
+    migrations.upgrade(db)
+    assert migrations.ensure_current(db) == []
+
+
+def test_legacy_database_gets_missing_columns(tmp_path):
+    # schema as created by the old setup_db.py
+    db = str(tmp_path / 'legacy.db')
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE books (id INTEGER PRIMARY KEY, title TEXT, author TEXT, category TEXT, pdf_filename TEXT, audio_filename TEXT)")
+    conn.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, role TEXT)")
+    conn.execute("INSERT INTO users (username, password, role) VALUES ('admin', '123', 'admin')")
+    conn.commit()
+    conn.close()
+
+    migrations.upgrade(db)
+
+    conn = sqlite3.connect(db)
+    for table, column in (('books', 'book_type'), ('books', 'uploader_id'), ('books', 'description'),
+                          ('users', 'is_banned'), ('users', 'plan'), ('users', 'status')):
+        assert migrations.column_exists(conn, table, column), f'{table}.{column} missing'
+    assert conn.execute("SELECT plan FROM users WHERE username='admin'").fetchone()[0] == 'basic'
+    conn.close()
+
+
+def test_migrations_do_not_import_app_modules():
+    # an old migration must not change when reader_stats.py & co. do
+    app_modules = {os.path.splitext(f)[0] for f in os.listdir(os.path.dirname(migrations.MIGRATIONS_DIR))
+                   if f.endswith('.py')}
+    for mig in migrations.discover():
+        with open(mig.path) as fh:
+            tree = ast.parse(fh.read())
+        imported = {alias.name.split('.')[0] for node in ast.walk(tree) if isinstance(node, ast.Import)
+                    for alias in node.names}
+        imported |= {node.module.split('.')[0] for node in ast.walk(tree)
+                     if isinstance(node, ast.ImportFrom) and node.module}
+        assert not imported & app_modules, f"{mig.path} imports {imported & app_modules}"
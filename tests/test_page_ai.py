@@ -0,0 +1,225 @@
+import json
+import threading
+import uuid
+
+import pytest
+
+import ai_cache
+import jobs
+import page_ai
+
+
+class StubAI:
+    model = 'stub-vision'
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _call(self, kind, image_path):
+        with self.lock:
+            self.calls.append((kind, image_path))
+        if self.fail:
+            raise RuntimeError('503 from AI provider')
+        return f"{kind} of {image_path.rsplit('/', 1)[-1]}"
+
+    def summarize_manga_page(self, image_path, max_sentences=5):
+        return self._call('summary', image_path)
+
+    def extract_text_from_image(self, image_path):
+        return self._call('text', image_path)
+
+
+def events(frames):
+    """[(event, data)] from SSE frames."""
+    parsed = []
+    for frame in ''.join(frames).strip().split('\n\n'):
+        event, data = frame.split('\n')
+        parsed.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return parsed
+
+
+def make_chapter(conn, hashes):
+    manga_id = conn.execute("INSERT INTO books (title, book_type) VALUES ('Pregen', 'manga')").lastrowid
+    chapter_id = conn.execute("INSERT INTO chapters (manga_id, chapter_num) VALUES (?, 1)", (manga_id,)).lastrowid
+    conn.executemany("INSERT INTO chapter_pages (chapter_id, page_num, path, content_hash, mime) "
+                     "VALUES (?, ?, ?, ?, 'image/png')",
+                     [(chapter_id, n, f"manga/{manga_id}/chapter_1/page_{n:03d}.png", h)
+                      for n, h in enumerate(hashes, 1)])
+    conn.commit()
+    return chapter_id
+
+
+def test_rate_limiter_spaces_calls_after_the_burst(clock):
+    slept = []
+
+    def sleep(seconds):
+        slept.append(seconds)
+        clock.now += seconds
+    limiter = page_ai.RateLimiter(rate_per_minute=60, burst=2, clock=clock, sleep=sleep)
+    for _ in range(4):
+        limiter.acquire()
+    assert slept == [1.0, 1.0]
+    clock.now += 10                   # idle time refills only up to the burst
+    for _ in range(3):
+        limiter.acquire()
+    assert slept == [1.0, 1.0, 1.0]
+
+
+def test_pregenerate_fills_every_page_once(connect):
+    conn = connect()
+    chapter_id = make_chapter(conn, ['h1', 'h2', 'h1'])      # page 3 repeats page 1's image
+    ai = StubAI()
+    cache = ai_cache.ResultCache(connect)
+    progress = []
+    result = page_ai.pregenerate(conn, chapter_id, ai, cache, workers=2,
+                                 limiter=page_ai.RateLimiter(rate_per_minute=0),
+                                 on_progress=lambda done, total: progress.append((done, total)))
+    assert result == {'pages': 3, 'done': 6, 'cached': result['cached'], 'failed': 0}
+    assert progress[0] == (0, 6) and progress[-1] == (6, 6)
+    # one call per distinct image and operation, at most; the duplicate may race its twin
+    assert {kind for kind, _ in ai.calls} == {'summary', 'text'} and len(ai.calls) <= 6
+
+    page = {'chapter_id': chapter_id, 'page_num': 2, 'content_hash': 'h2'}
+    assert page_ai.stored(conn, page) == {'summary': 'summary of page_002.png',
+                                          'extracted_text': 'text of page_002.png'}
+    [row] = page_ai.coverage(conn, chapter_id)
+    assert (row['pages'], row['summaries'], row['texts'], row['percent']) == (3, 3, 3, 100)
+
+    ai.calls.clear()
+    assert page_ai.pregenerate(conn, chapter_id, ai, cache)['done'] == 0
+    assert ai.calls == []
+
+    # a replaced page image no longer counts as covered
+    conn.execute("UPDATE chapter_pages SET content_hash = 'h9' WHERE chapter_id = ? AND page_num = 2", (chapter_id,))
+    [row] = page_ai.coverage(conn, chapter_id)
+    assert (row['summaries'], row['texts']) == (2, 2)
+    assert page_ai.stored(conn, dict(page, content_hash='h9')) is None
+    conn.close()
+
+
+def test_store_keeps_the_other_column_only_for_the_same_image(connect):
+    conn = connect()
+    page_ai.store(conn, 1, 1, 'h1', summary='s')
+    page_ai.store(conn, 1, 1, 'h1', text='t')
+    assert conn.execute("SELECT summary, extracted_text FROM image_summaries").fetchone() == ('s', 't')
+    page_ai.store(conn, 1, 1, 'h2', text='t2')
+    assert conn.execute("SELECT summary, extracted_text FROM image_summaries").fetchone() == (None, 't2')
+    conn.close()
+
+
+def test_job_is_deduplicated_and_fails_when_every_call_fails(connect, monkeypatch):
+    monkeypatch.setenv('OPENAI_API_KEY', 'test-key')
+    conn = connect()
+    chapter_id = make_chapter(conn, ['x1'])
+    first = page_ai.queue(conn, chapter_id)
+    assert page_ai.queue(conn, chapter_id) == first
+
+    stub = StubAI(fail=True)
+    monkeypatch.setattr('image_summary_ai.ImageSummaryAI', lambda: stub)
+    limiter = page_ai.RateLimiter(rate_per_minute=0)
+    calls = []
+    monkeypatch.setattr(limiter, 'acquire', lambda: calls.append(1))
+    monkeypatch.setattr(page_ai, 'LIMITER', limiter)
+    jobs.load_handlers()
+    worker = jobs.Worker(connect, kinds=['chapter_ai'])
+    assert worker.run_once()
+    job = jobs.get(conn, first)
+    assert job['status'] == 'queued' and '503' in job['error']   # retried
+
+    stub.fail = False
+    assert worker.run_once()
+    job = jobs.get(conn, first)
+    assert job['status'] == 'done' and job['result']['done'] == 2
+    assert len(calls) == 4                                        # both attempts drew on the one shared budget
+    [row] = page_ai.coverage(conn, chapter_id)
+    assert row['percent'] == 100 and row['job']['status'] == 'done'
+
+    monkeypatch.delenv('OPENAI_API_KEY')
+    assert page_ai.queue(conn, chapter_id) is None              # not configured: nothing queued
+    conn.close()
+
+
+def test_reader_gets_the_pregenerated_result(monkeypatch):
+    import app as app_module
+    from app import app, get_conn
+
+    monkeypatch.setattr(app_module, 'IMAGE_AI_AVAILABLE', False)   # no AI call can be made
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['username'] = 'admin'
+        sess['role'] = 'admin'
+    conn = get_conn()
+    chapter_id = make_chapter(conn, [uuid.uuid4().hex])
+    page_hash = conn.execute("SELECT content_hash FROM chapter_pages WHERE chapter_id = ?",
+                             (chapter_id,)).fetchone()[0]
+    page_ai.store(conn, chapter_id, 1, page_hash, summary='Precomputed.', text='HELLO')
+    conn.commit()
+    conn.close()
+    try:
+        summary = client.post(f'/api/manga/page/{chapter_id}/1/summarize').get_json()
+        assert (summary['summary'], summary['cached']) == ('Precomputed.', True)
+        text = client.post(f'/api/manga/page/{chapter_id}/1/extract-text').get_json()
+        assert text['extracted_text'] == 'HELLO'
+
+        chapters = client.get('/admin/page_ai?format=json').get_json()['chapters']
+        [row] = [ch for ch in chapters if ch['chapter_id'] == chapter_id]
+        assert (row['summaries'], row['texts']) == (1, 1)
+        assert client.get('/admin/page_ai').status_code == 200
+        queued = client.post(f'/admin/page_ai/{chapter_id}/queue').get_json()
+        assert queued['status_url'] == f"/api/jobs/{queued['job_id']}"
+    finally:
+        conn = get_conn()
+        manga_id = conn.execute("SELECT manga_id FROM chapters WHERE id = ?", (chapter_id,)).fetchone()[0]
+        conn.execute("DELETE FROM jobs WHERE kind = 'chapter_ai' AND json_extract(payload, '$.chapter_id') = ?",
+                     (chapter_id,))
+        conn.execute("DELETE FROM image_summaries WHERE chapter_id = ?", (chapter_id,))
+        conn.execute("DELETE FROM chapter_pages WHERE chapter_id = ?", (chapter_id,))
+        conn.execute("DELETE FROM chapters WHERE id = ?", (chapter_id,))
+        conn.execute("DELETE FROM books WHERE id = ?", (manga_id,))
+        conn.commit()
+        conn.close()
+
+
+def test_page_summary_streams_then_replays(monkeypatch):
+    import app as app_module
+    from app import app, get_conn
+
+    class StreamingAI:
+        model = f"stub-{uuid.uuid4().hex[:6]}"
+
+        def summarize_manga_page(self, image_path, max_sentences=5, stream=False):
+            assert stream
+            return iter(['Two ', 'ninjas ', 'duel.'])
+    monkeypatch.setattr(app_module, 'IMAGE_AI', StreamingAI())
+    monkeypatch.setattr(app_module, 'IMAGE_AI_AVAILABLE', True)
+    monkeypatch.setattr(app_module.chapter_pages, 'page_file', lambda page: __file__)   # any existing file
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+    conn = get_conn()
+    chapter_id = make_chapter(conn, [uuid.uuid4().hex])
+    conn.close()
+    url = f'/api/manga/page/{chapter_id}/1/summarize/stream'
+    try:
+        frames = events([client.post(url).get_data(as_text=True)])
+        assert [data['text'] for event, data in frames if event == 'token'] == ['Two ', 'ninjas ', 'duel.']
+        assert frames[-1] == ('done', {'summary': 'Two ninjas duel.', 'model': StreamingAI.model, 'cached': False})
+        replay = events([client.post(url).get_data(as_text=True)])
+        assert replay == [('done', {'summary': 'Two ninjas duel.', 'page_num': 1, 'cached': True})]
+        assert client.post(f'/api/manga/page/{chapter_id}/9/summarize/stream').status_code == 404
+    finally:
+        conn = get_conn()
+        manga_id = conn.execute("SELECT manga_id FROM chapters WHERE id = ?", (chapter_id,)).fetchone()[0]
+        conn.execute("DELETE FROM ai_results WHERE model = ?", (StreamingAI.model,))
+        conn.execute("DELETE FROM image_summaries WHERE chapter_id = ?", (chapter_id,))
+        conn.execute("DELETE FROM chapter_pages WHERE chapter_id = ?", (chapter_id,))
+        conn.execute("DELETE FROM chapters WHERE id = ?", (chapter_id,))
+        conn.execute("DELETE FROM books WHERE id = ?", (manga_id,))
+        conn.commit()
+        conn.close()
@@ -0,0 +1,118 @@
+import sqlite3
+
+import pytest
+
+import popularity
+from conftest import FakeClock
+
+HOUR = 3600.0
+
+
+@pytest.fixture
+def db(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    conn.executemany("INSERT INTO books (id, title, category, book_type) VALUES (?, ?, 'Fantasy', ?)",
+                     [(101, 'A', 'book'), (102, 'B', 'book'), (103, 'M', 'manga')])
+    conn.commit()
+    conn.close()
+    return migrated_db
+
+
+def test_counters_follow_writes(db):
+    conn = sqlite3.connect(db)
+    conn.executemany("INSERT INTO watchlist (user_id, book_id, status) VALUES (?, ?, 'planned')",
+                     [(1, 101), (2, 101), (1, 102)])
+    conn.execute("INSERT INTO favorites (user_id, book_id) VALUES (1, 102)")
+    conn.execute("DELETE FROM watchlist WHERE user_id = 1 AND book_id = 101")
+    conn.commit()
+    assert [(r['id'], r['score']) for r in popularity.top(conn, 'wishlisted')] == [(102, 1), (101, 1)]
+    assert [(r['id'], r['score']) for r in popularity.top(conn, 'favorited')] == [(102, 1)]
+
+    live = conn.execute("SELECT book_id, wishlist_count, favorite_count FROM book_popularity "
+                        "WHERE book_id > 100 AND wishlist_count + favorite_count > 0 ORDER BY book_id").fetchall()
+    popularity.rebuild(conn)
+    assert conn.execute("SELECT book_id, wishlist_count, favorite_count FROM book_popularity "
+                        "WHERE book_id > 100 AND wishlist_count + favorite_count > 0 ORDER BY book_id").fetchall() == live
+
+    conn.execute("DELETE FROM books WHERE id = 102")
+    assert conn.execute("SELECT COUNT(*) FROM book_popularity WHERE book_id = 102").fetchone()[0] == 0
+    conn.close()
+
+
+def test_trending_decays_with_half_life(db):
+    clock = FakeClock(1_800_000_000.0)
+    board = popularity.PopularityBoard(lambda: sqlite3.connect(db), interval=60, clock=clock)
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO favorites (user_id, book_id) VALUES (1, 101)")      # weight 4
+    conn.commit()
+    popularity.fold_trending(conn, clock.now, half_life=24 * HOUR)
+    board.refresh()
+    assert [(r['id'], r['score']) for r in board.top('trending')] == [(101, 4.0)]
+
+    clock.now += 24 * HOUR
+    conn.executemany("INSERT INTO history (user_id, book_id, date_read) VALUES (?, 102, '2026-01-01')",
+                     [(1,), (2,), (3,)])                                          # 3 x weight 1
+    conn.commit()
+    popularity.fold_trending(conn, clock.now, half_life=24 * HOUR)
+    board.refresh()
+    scores = {r['id']: r['score'] for r in board.top('trending')}
+    assert scores[101] == pytest.approx(2.0)   # one half-life later
+    assert scores[102] == pytest.approx(3.0)
+    assert [r['id'] for r in board.top('trending')] == [102, 101]
+    conn.close()
+
+
+def test_board_serves_from_memory_until_stale(db):
+    clock = FakeClock(1_800_000_000.0)
+    board = popularity.PopularityBoard(lambda: sqlite3.connect(db), interval=60, clock=clock)
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO watchlist (user_id, book_id, status) VALUES (1, 103, 'reading')")
+    conn.commit()
+    assert [r['id'] for r in board.top('wishlisted', book_type='manga')] == [103]
+    assert board.top('wishlisted', book_type='book') == []
+
+    conn.execute("INSERT INTO watchlist (user_id, book_id, status) VALUES (1, 101, 'planned')")
+    conn.commit()
+    assert [r['id'] for r in board.top('wishlisted')] == [103]     # cached list
+    clock.now += 121
+    assert [r['id'] for r in board.top('wishlisted')] == [103]     # stale, but reads never reload
+    assert board.stats()['stale']
+    board.refresh()                                                # the background thread's job
+    assert [r['id'] for r in board.top('wishlisted')] == [103, 101]
+    assert board.stats()['inline_refreshes'] == 1
+    with pytest.raises(ValueError):
+        board.top('loudest')
+    conn.close()
+
+
+def test_fold_runs_as_a_single_job(db):
+    import jobs
+
+    conn = sqlite3.connect(db)
+    conn.execute("INSERT INTO favorites (user_id, book_id) VALUES (1, 101)")
+    conn.commit()
+    scheduler = popularity.PopularityScheduler(lambda: sqlite3.connect(db), interval=60)
+    assert scheduler.enqueue() and scheduler.enqueue() is None   # one pending fold at a time
+    jobs.load_handlers()
+    assert jobs.Worker(lambda: sqlite3.connect(db), kinds=['popularity']).run_once()
+    assert conn.execute("SELECT trend_score, trend_pending FROM book_popularity WHERE book_id = 101").fetchone() \
+        == (4.0, 0)
+    conn.close()
+
+
+def test_api_trending():
+    from app import app
+
+    client = app.test_client()
+    assert client.get('/api/trending').status_code == 401
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['username'] = 'admin'
+        sess['role'] = 'admin'
+    r = client.get('/api/trending?metric=wishlisted&limit=5')
+    assert r.status_code == 200
+    data = r.get_json()
+    assert data['metric'] == 'wishlisted' and len(data['items']) <= 5
+    assert all({'id', 'title', 'score', 'url'} <= set(item) for item in data['items'])
+    assert client.get('/api/trending?metric=nope').status_code == 400
+    assert client.get('/api/trending?type=comic').status_code == 400
@@ -0,0 +1,75 @@
+"""EXPLAIN QUERY PLAN regression test: hot queries must not full-scan their tables."""
+import re
+import sqlite3
+
+import pytest
+
+import app
+import migrations
+import pagination
+
+HOT_QUERIES = {
+    'profile_history': (app.PROFILE_HISTORY_QUERY, (1,)),
+    'profile_currently_reading': (app.PROFILE_CURRENTLY_READING_QUERY, (1,)),
+    'profile_recent_activity': (app.PROFILE_RECENT_ACTIVITY_QUERY, (1,)),
+    'activity_log_api': (app.ACTIVITY_LOG_QUERY, (1, 5)),
+    'view_book_reviews': (app.BOOK_REVIEWS_QUERY, (1,)),
+    'favorites_list': (app.FAVORITES_QUERY, (1,)),
+    'chapters_for_manga': (app.MANGA_CHAPTERS_QUERY, (1,)),
+    'manga_characters': (app.MANGA_CHARACTERS_QUERY, (1,)),
+    'system_logs_unfiltered': app.system_logs_query('', '', 100),
+    'system_logs_level': app.system_logs_query('INFO', '', 100),
+    'system_logs_level_category': app.system_logs_query('INFO', 'auth', 100),
+    'system_logs_category': app.system_logs_query('', 'auth', 100),
+}
+
+
+def keyset_queries():
+    """The first and a later page of each pagination.keyset_page user in app.py."""
+    pages = {
+        'home': (app.CATALOG_PAGE_SELECT, *app._catalog_where('book'), ('created_at', 'id')),
+        'manga': (app.CATALOG_PAGE_SELECT, *app._catalog_where('manga'), ('created_at', 'id')),
+        'my_uploads_admin': (app.UPLOADS_PAGE_SELECT, *app._uploads_where(1, 'admin'), ('created_at', 'id')),
+        'my_uploads_publisher': (app.UPLOADS_PAGE_SELECT, *app._uploads_where(1, 'publisher'),
+                                 ('created_at', 'id')),
+        'watchlist': (app.WATCHLIST_PAGE_SELECT, ["w.user_id = ?"], [1], ('w.created_at', 'w.id')),
+    }
+    queries = {}
+    for name, (select_sql, where, params, key_columns) in pages.items():
+        queries[f'{name}_first'] = (pagination.keyset_sql(select_sql, where, key_columns),
+                                    [*params, 25])
+        queries[f'{name}_page'] = (pagination.keyset_sql(select_sql, where, key_columns, after=True),
+                                   [*params, '2025-01-01 00:00:00', 10, 25])
+    return queries
+
+
+# Keyset pages (pagination.keyset_page) must walk an index in order: no full scan, no sort
+KEYSET_QUERIES = keyset_queries()
+
+# "SCAN t" / "SCAN t AS x" without "USING ... INDEX" means a full table scan
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: AS \w+)?$")
+
+
+@pytest.fixture(scope='module')
+def conn(tmp_path_factory):
+    db = str(tmp_path_factory.mktemp('plans') / 'plans.db')
+    migrations.upgrade(db)
+    conn = sqlite3.connect(db)
+    yield conn
+    conn.close()
+
+
+@pytest.mark.parametrize('name', sorted(HOT_QUERIES))
+def test_hot_query_uses_an_index(conn, name):
+    sql, params = HOT_QUERIES[name]
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    scans = [detail for detail in plan if FULL_SCAN.match(detail.strip())]
+    assert not scans, f"{name} falls back to a full scan: {plan}"
+
+
+@pytest.mark.parametrize('name', sorted(KEYSET_QUERIES))
+def test_keyset_page_reads_an_index_in_order(conn, name):
+    sql, params = KEYSET_QUERIES[name]
+    plan = [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+    assert not [d for d in plan if FULL_SCAN.match(d.strip())], f"{name} full-scans: {plan}"
+    assert not [d for d in plan if 'TEMP B-TREE' in d], f"{name} sorts instead of using an index: {plan}"
@@ -0,0 +1,139 @@
+import sqlite3
+import uuid
+
+import pytest
+
+import reader_stats
+
+
+@pytest.fixture
+def conn(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    conn.execute("INSERT INTO users (id, username, password, role) VALUES (7, 'reader7', 'x', 'reader')")
+    conn.executemany("INSERT INTO books (id, title, category) VALUES (?, ?, ?)",
+                     [(1, 'A', 'Fantasy'), (2, 'B', 'Fantasy'), (3, 'C', 'Horror'), (4, 'D', None)])
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def snapshot(conn, user_id=7):
+    stats = reader_stats.get(conn, user_id)
+    stats['genre_counts'] = {k: v for k, v in stats['genre_counts'].items() if v}
+    return stats
+
+
+def test_triggers_track_every_write_path(conn):
+    conn.executemany("INSERT INTO history (user_id, book_id, date_read) VALUES (7, ?, '2026-01-01')",
+                     [(1,), (3,), (4,)])
+    conn.executemany("INSERT INTO watchlist (user_id, book_id, status) VALUES (7, ?, ?)",
+                     [(1, 'reading'), (2, 'planned'), (3, 'planned')])
+    conn.executemany("INSERT INTO favorites (user_id, book_id) VALUES (7, ?)", [(1,), (2,)])
+    conn.executemany("INSERT INTO reviews (user_id, book_id, rating, content) VALUES (7, ?, ?, '')",
+                     [(1, 5), (2, 4), (3, None)])
+    stats = snapshot(conn)
+    assert stats['read_count'] == 3
+    assert stats['genre_counts'] == {'Fantasy': 1, 'Horror': 1, 'General': 1}
+    assert stats['favorite_genre'] == 'Fantasy'   # ties break alphabetically
+    assert stats['watchlist_counts'] == {'reading': 1, 'planned': 2}
+    assert stats['favorite_count'] == 2
+    assert (stats['review_count'], stats['avg_rating']) == (2, 4.5)
+
+    conn.execute("INSERT INTO history (user_id, book_id, date_read) VALUES (7, 2, '2026-01-02')")
+    conn.execute("UPDATE watchlist SET status = 'completed' WHERE book_id = 1")
+    conn.execute("UPDATE watchlist SET progress = 50 WHERE book_id = 2")
+    conn.execute("DELETE FROM favorites WHERE book_id = 2")
+    conn.execute("UPDATE reviews SET rating = 3 WHERE book_id = 3")
+    conn.execute("DELETE FROM reviews WHERE book_id = 1")
+    stats = snapshot(conn)
+    assert stats['genre_counts'] == {'Fantasy': 2, 'Horror': 1, 'General': 1}
+    assert stats['watchlist_counts'] == {'completed': 1, 'planned': 2}
+    assert stats['favorite_count'] == 1
+    assert (stats['review_count'], stats['avg_rating']) == (2, 3.5)
+
+    # deleting a book (delete_book removes its history and watchlist rows first)
+    conn.execute("DELETE FROM history WHERE book_id = 1")
+    conn.execute("DELETE FROM history WHERE book_id = 2")
+    conn.execute("DELETE FROM watchlist WHERE book_id = 1")
+    stats = snapshot(conn)
+    assert stats['read_count'] == 2
+    assert stats['favorite_genre'] == 'General'
+    assert stats['watchlist_counts'] == {'planned': 2}
+
+    live = snapshot(conn)
+    reader_stats.rebuild(conn)
+    assert snapshot(conn) == live
+
+    conn.execute("DELETE FROM users WHERE id = 7")
+    assert conn.execute("SELECT COUNT(*) FROM user_stats WHERE user_id = 7").fetchone()[0] == 0
+
+
+def test_genres_with_quotes_are_counted(conn):
+    conn.execute("""UPDATE books SET category = 'Sci "Fi"' WHERE id = 1""")
+    conn.execute("INSERT INTO history (user_id, book_id, date_read) VALUES (7, 1, '2026-01-01')")
+    assert snapshot(conn)['genre_counts'] == {'Sci "Fi"': 1}
+    assert snapshot(conn)['favorite_genre'] == 'Sci "Fi"'
+    conn.execute("DELETE FROM history WHERE book_id = 1")
+    assert snapshot(conn)['genre_counts'] == {}
+
+
+def test_category_edit_then_book_delete_leaves_no_genre(conn):
+    conn.execute("INSERT INTO users (id, username, password, role) VALUES (8, 'reader8', 'x', 'reader')")
+    conn.executemany("INSERT INTO history (user_id, book_id, date_read) VALUES (?, ?, '2026-01-01')",
+                     [(7, 1), (8, 1), (8, 3)])
+    conn.execute("UPDATE books SET category = 'Horror' WHERE id = 1")    # edit_book
+    assert snapshot(conn)['genre_counts'] == {'Horror': 1}
+    assert snapshot(conn, 8)['genre_counts'] == {'Horror': 2}
+    conn.execute("UPDATE books SET category = NULL WHERE id = 1")        # counted as 'General' either way
+    conn.execute("UPDATE books SET category = 'General' WHERE id = 1")
+    assert snapshot(conn)['genre_counts'] == {'General': 1}
+
+    conn.execute("DELETE FROM history WHERE book_id = 1")               # delete_book
+    stats = snapshot(conn)
+    assert (stats['read_count'], stats['genre_counts'], stats['favorite_genre']) == (0, {}, None)
+    assert snapshot(conn, 8)['genre_counts'] == {'Horror': 1}
+
+
+def test_rebuild_fixes_drift(conn):
+    conn.execute("INSERT INTO history (user_id, book_id, date_read) VALUES (7, 1, '2026-01-01')")
+    conn.execute("UPDATE books SET category = 'Horror' WHERE id = 1")   # not tracked by triggers
+    conn.execute("UPDATE user_stats SET favorite_count = 99 WHERE user_id = 7")
+    assert reader_stats.rebuild(conn, user_id=7) == 1
+    stats = snapshot(conn)
+    assert stats['favorite_genre'] == 'Horror'
+    assert stats['favorite_count'] == 0
+    assert reader_stats.get(conn, 12345)['read_count'] == 0
+
+
+def test_profile_pages_read_the_stats_row():
+    from app import app, get_conn
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    name = f"stats_{uuid.uuid4().hex[:8]}"
+    conn = get_conn()
+    user_id = conn.execute("INSERT INTO users (username, password, role) VALUES (?, 'x', 'reader')",
+                           (name,)).lastrowid
+    book_id = conn.execute("SELECT id FROM books ORDER BY id LIMIT 1").fetchone()[0]
+    conn.execute("INSERT INTO favorites (user_id, book_id) VALUES (?, ?)", (user_id, book_id))
+    conn.execute("INSERT INTO watchlist (user_id, book_id, status) VALUES (?, ?, 'reading')", (user_id, book_id))
+    conn.execute("UPDATE user_stats SET read_count = 4242 WHERE user_id = ?", (user_id,))
+    conn.commit()
+    conn.close()
+    try:
+        r = client.get(f'/u/{name}')
+        assert r.status_code == 200 and b'4242' in r.data
+
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['username'] = name
+            sess['role'] = 'reader'
+        r = client.get('/profile')
+        assert r.status_code == 200 and b'4242' in r.data
+    finally:
+        conn = get_conn()
+        conn.execute("DELETE FROM favorites WHERE user_id = ?", (user_id,))
+        conn.execute("DELETE FROM watchlist WHERE user_id = ?", (user_id,))
+        conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        conn.commit()
+        conn.close()
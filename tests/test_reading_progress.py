@@ -0,0 +1,135 @@
+import sqlite3
+import uuid
+
+import pytest
+
+import reader_stats
+import reading_progress
+
+
+@pytest.fixture
+def db(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    conn.execute("INSERT INTO users (id, username, password, role) VALUES (7, 'reader7', 'x', 'reader')")
+    conn.executemany("INSERT INTO books (id, title, book_type) VALUES (?, ?, 'manga')", [(1, 'M'), (2, 'N')])
+    conn.executemany("INSERT INTO chapters (id, manga_id, chapter_num, page_count) VALUES (?, ?, ?, ?)",
+                     [(10, 1, 1, 10), (11, 1, 2, 10), (20, 2, 1, 5)])
+    conn.execute("INSERT INTO watchlist (user_id, book_id, status) VALUES (7, 1, 'reading')")
+    conn.commit()
+    conn.close()
+    return migrated_db
+
+
+def test_page_turns_are_coalesced_into_one_write(db):
+    writes = []
+    buffer = reading_progress.ProgressBuffer(lambda: sqlite3.connect(db), flush_interval=60,
+                                             retry=lambda fn: lambda entries: (writes.append(len(entries)),
+                                                                               fn(entries)))
+    for page in range(6):
+        buffer.record(7, 1, 10, page)
+    buffer.record(7, 1, 10, 2)          # paged back
+    buffer.record(7, 1, 99, 3)          # not a chapter of manga 1
+    assert buffer.stats()['coalesced'] == 6
+    assert buffer.flush() == 2 and writes == [2]
+    assert buffer.flush() == 0
+
+    conn = sqlite3.connect(db)
+    assert conn.execute("SELECT chapter_id, page_index, max_page, page_count FROM reading_progress").fetchall() \
+        == [(10, 2, 5, 10)]
+    conn.close()
+    buffer.close()
+
+
+def test_triggers_feed_resume_watchlist_and_pages_read(db):
+    conn = sqlite3.connect(db)
+    reading_progress.write(conn, [(7, 1, 10, 4, 4, '2026-01-01 10:00:00')])
+    assert conn.execute("SELECT progress FROM watchlist WHERE book_id = 1").fetchone()[0] == 25   # 5 of 20 pages
+    reading_progress.write(conn, [(7, 1, 10, 9, 9, '2026-01-01 10:05:00'),
+                                  (7, 1, 11, 1, 1, '2026-01-01 10:06:00'),
+                                  (7, 2, 20, 0, 0, '2026-01-01 10:07:00')])   # not on the watchlist
+    reading_progress.write(conn, [(7, 1, 10, 0, 0, '2026-01-01 10:08:00')])   # re-reading adds nothing
+    assert conn.execute("SELECT progress FROM watchlist WHERE book_id = 1").fetchone()[0] == 60
+    assert conn.execute("SELECT manga_id, chapter_id, page_index FROM reading_resume ORDER BY manga_id").fetchall() \
+        == [(1, 10, 0), (2, 20, 0)]
+    assert reader_stats.get(conn, 7)['pages_read'] == 13
+    reader_stats.rebuild(conn, 7)
+    assert reader_stats.get(conn, 7)['pages_read'] == 13
+
+    conn.execute("DELETE FROM chapters WHERE id = 10")
+    assert conn.execute("SELECT COUNT(*) FROM reading_progress WHERE chapter_id = 10").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM reading_resume WHERE manga_id = 1").fetchone()[0] == 0
+
+    reading_progress.write(conn, [(7, 1, 11, 100000, 100000, '2026-01-01 10:09:00')])   # past the last page
+    assert conn.execute("SELECT page_index, max_page FROM reading_progress WHERE chapter_id = 11").fetchone() \
+        == (9, 9)
+    assert reader_stats.get(conn, 7)['pages_read'] == 21
+
+    # no page count yet (a PDF still converting): nothing is stored or credited
+    conn.execute("INSERT INTO chapters (id, manga_id, chapter_num, page_count) VALUES (12, 1, 3, 0)")
+    reading_progress.write(conn, [(7, 1, 12, 100000, 100000, '2026-01-01 10:10:00')])
+    assert conn.execute("SELECT COUNT(*) FROM reading_progress WHERE chapter_id = 12").fetchone()[0] == 0
+    assert reader_stats.get(conn, 7)['pages_read'] == 21
+    assert reading_progress.resume(conn, 7, 1, pending=[(12, 5, 5, '2026-01-01 10:11:00')])['chapter_id'] == 11
+    conn.close()
+
+
+def test_resume_overlays_pending_page_turns(db):
+    conn = sqlite3.connect(db)
+    reading_progress.write(conn, [(7, 1, 10, 7, 7, '2026-01-01 10:00:00')])
+    conn.commit()
+    buffer = reading_progress.ProgressBuffer(lambda: sqlite3.connect(db), flush_interval=60)
+    buffer.record(7, 1, 11, 3)
+    buffer.record(7, 1, 10, 2)
+    point = buffer.resume(conn, 7, 1)
+    assert (point['chapter_id'], point['page_index']) == (10, 2)
+    assert [(c['chapter_id'], c['page_index'], c['max_page']) for c in point['chapters']] == [(10, 2, 7), (11, 3, 3)]
+    assert reading_progress.resume(conn, 7, 2)['chapter_id'] is None
+    buffer.close()
+    assert reading_progress.resume(conn, 7, 1)['chapter_id'] == 10
+    conn.close()
+
+
+def test_progress_endpoint():
+    from app import app, get_conn, READING_PROGRESS
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    assert client.get('/api/manga/progress?manga_id=1').status_code == 401
+
+    suffix = uuid.uuid4().hex[:8]
+    conn = get_conn()
+    user_id = conn.execute("INSERT INTO users (username, password, role) VALUES (?, 'x', 'reader')",
+                           (f'progress_{suffix}',)).lastrowid
+    manga_id = conn.execute("INSERT INTO books (title, author, book_type) VALUES (?, 'A. Author', 'manga')",
+                            (f'Progress {suffix}',)).lastrowid
+    chapter_id = conn.execute("INSERT INTO chapters (manga_id, chapter_num, page_count) VALUES (?, 1, 8)",
+                              (manga_id,)).lastrowid
+    conn.execute("INSERT INTO watchlist (user_id, book_id, status) VALUES (?, ?, 'reading')", (user_id, manga_id))
+    conn.commit()
+    conn.close()
+    try:
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['username'] = f'progress_{suffix}'
+            sess['role'] = 'reader'
+        for page in (1, 2, 3):
+            r = client.post('/api/manga/progress', json={'manga_id': manga_id, 'chapter_id': chapter_id,
+                                                         'page_index': page})
+            assert r.status_code == 200
+        assert client.post('/api/manga/progress', json={'manga_id': manga_id, 'chapter_id': 'x'}).status_code == 400
+        body = client.get(f'/api/manga/progress?manga_id={manga_id}').get_json()
+        assert (body['chapter_id'], body['page_index']) == (chapter_id, 3)   # answered before the flush
+
+        READING_PROGRESS.flush()
+        conn = get_conn()
+        assert conn.execute("SELECT progress FROM watchlist WHERE user_id = ?", (user_id,)).fetchone()[0] == 50
+        conn.close()
+        assert b'Continue Ch. 1 &middot; p. 4' in client.get('/watchlist').data
+    finally:
+        conn = get_conn()
+        conn.execute("DELETE FROM watchlist WHERE user_id = ?", (user_id,))
+        conn.execute("DELETE FROM chapters WHERE id = ?", (chapter_id,))
+        conn.execute("DELETE FROM books WHERE id = ?", (manga_id,))
+        conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        conn.commit()
+        conn.close()
@@ -0,0 +1,92 @@
+import sqlite3
+
+import pytest
+
+import recommender
+
+needs_numpy = pytest.mark.skipif(not recommender.NUMPY_AVAILABLE, reason="numpy not installed")
+
+
+@pytest.fixture
+def conn(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    conn.execute("DELETE FROM books")
+    conn.executemany("INSERT INTO books (id, title, author, category, book_type) VALUES (?, ?, ?, ?, ?)", [
+        (1, 'Dune', 'Frank Herbert', 'Science Fiction', 'book'),
+        (2, 'Dune Messiah', 'Frank Herbert', 'Science Fiction', 'book'),
+        (3, 'Neuromancer', 'William Gibson', 'Science Fiction', 'book'),
+        (4, 'Emma', 'Jane Austen', 'Romance', 'book'),
+        (5, 'Persuasion', 'Jane Austen', 'Romance', 'book'),
+        (6, 'Berserk', 'Kentaro Miura', 'Fantasy', 'manga'),
+    ])
+    # users 1-3 read sci-fi, 4-5 read Austen; user 3 also liked Emma
+    conn.executemany("INSERT INTO history (user_id, book_id, date_read) VALUES (?, ?, '2026-01-01')",
+                     [(1, 1), (1, 3), (2, 1), (2, 3), (3, 1), (3, 2), (4, 4), (4, 5), (5, 4), (5, 5), (3, 4)])
+    conn.execute("INSERT INTO favorites (user_id, book_id) VALUES (2, 3)")
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+@needs_numpy
+def test_full_build_ranks_co_read_books_first(conn):
+    assert recommender.refresh(conn, full=True) == 6
+    assert [row[0] for row in recommender.neighbors(conn, 1, 5)] == [2, 3, 4]   # same author + co-read
+    assert [row[0] for row in recommender.neighbors(conn, 4, 5)] == [5, 2, 1]     # nothing shared with 3
+    assert recommender.neighbors(conn, 6, 5) == []   # only manga of its kind
+    assert not recommender.has_dirty(conn)
+
+
+@needs_numpy
+def test_incremental_refresh_only_touches_dirty_books(conn):
+    recommender.refresh(conn, full=True)
+    conn.execute("INSERT INTO books (id, title, author, category, book_type) "
+                 "VALUES (7, 'Sense and Sensibility', 'Jane Austen', 'Romance', 'book')")
+    conn.executemany("INSERT INTO history (user_id, book_id, date_read) VALUES (?, 7, '2026-01-02')", [(4,), (5,)])
+    conn.commit()
+    assert [row[0] for row in conn.execute("SELECT book_id FROM book_neighbors_dirty")] == [7]
+
+    updated = recommender.refresh(conn)
+    assert updated == 3    # book 7 plus books 4 and 5, which share its readers
+    assert [row[0] for row in recommender.neighbors(conn, 7, 2)] == [5, 4]
+    assert 7 in [row[0] for row in recommender.neighbors(conn, 4, 3)]
+
+    conn.execute("DELETE FROM books WHERE id = 7")
+    assert conn.execute("SELECT COUNT(*) FROM book_neighbors WHERE 7 IN (book_id, neighbor_id)").fetchone()[0] == 0
+
+
+def test_refresh_requires_numpy(conn, monkeypatch):
+    monkeypatch.setattr(recommender, 'NUMPY_AVAILABLE', False)
+    with pytest.raises(RuntimeError):
+        recommender.refresh(conn)
+    assert recommender.has_dirty(conn)
+
+
+def test_view_book_reads_stored_neighbors():
+    from app import app, get_conn
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    with client.session_transaction() as sess:
+        sess['user_id'] = 1
+        sess['username'] = 'admin'
+        sess['role'] = 'admin'
+    conn = get_conn()
+    ids = [row[0] for row in conn.execute("SELECT id FROM books ORDER BY id LIMIT 4")]
+    conn.execute("DELETE FROM book_neighbors WHERE book_id = ?", (ids[0],))
+    conn.executemany("INSERT INTO book_neighbors (book_id, rank, neighbor_id, score) VALUES (?, ?, ?, 1)",
+                     [(ids[0], rank, neighbor) for rank, neighbor in enumerate(ids[1:])])
+    title = conn.execute("SELECT title FROM books WHERE id = ?", (ids[1],)).fetchone()[0]
+    conn.commit()
+    conn.close()
+    try:
+        r = client.get(f'/book/{ids[0]}')
+        assert r.status_code == 200
+        assert title.encode() in r.data
+        # a book without stored neighbours still gets recommendations
+        assert client.get(f'/book/{ids[1]}').status_code == 200
+    finally:
+        conn = get_conn()
+        conn.execute("DELETE FROM book_neighbors WHERE book_id = ?", (ids[0],))
+        conn.commit()
+        conn.close()
@@ -0,0 +1,85 @@
+import os
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+import retention
+
+NOW = datetime(2026, 6, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def conn(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    conn.executemany(
+        "INSERT INTO activity_log (user_id, book_id, activity_type, summary_generated, timestamp) VALUES (?, ?, ?, ?, ?)",
+        [(1, 10, 'read', 0, '2025-01-05 10:00:00'),
+         (1, 10, 'read', 1, '2025-01-05 18:00:00'),
+         (2, 10, 'favorited', 0, '2025-02-01 09:00:00'),
+         (1, 11, 'read', 0, '2026-05-30 09:00:00')],
+    )
+    conn.executemany(
+        "INSERT INTO system_logs (level, category, message, timestamp) VALUES (?, ?, ?, ?)",
+        [('INFO', 'auth', 'old login', '2026-01-01 00:00:00'),
+         ('WARNING', 'admin', 'old ban', '2026-01-01 00:00:00'),
+         ('INFO', 'auth', 'recent login', '2026-05-31 00:00:00')],
+    )
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def test_policies_from_environment():
+    policies = retention.load_policies({'RETENTION_DAYS_SYSTEM_LOGS': '30',
+                                        'RETENTION_DAYS_SYSTEM_LOGS_AUTH': '7',
+                                        'RETENTION_DAYS_ACTIVITY_LOG_READ': '0'})
+    assert policies['system_logs']['default'] == 30
+    assert policies['system_logs']['categories'] == {'admin': 365, 'auth': 7}
+    assert policies['activity_log']['default'] == 180
+    assert policies['activity_log']['categories'] == {'read': 0}
+
+
+def test_run_rolls_up_archives_and_deletes(conn, tmp_path):
+    archive_dir = str(tmp_path / 'archive')
+    removed = retention.run(conn, retention.load_policies({}), now=NOW, batch_size=2, archive_dir=archive_dir)
+    assert removed == {'activity_log': 3, 'system_logs': 1}
+
+    assert conn.execute("SELECT book_id FROM activity_log").fetchall() == [(11,)]
+    assert conn.execute("SELECT day, user_id, book_id, activity_type, count, summaries FROM activity_daily "
+                        "ORDER BY day, user_id").fetchall() == [
+        ('2025-01-05', 1, 10, 'read', 2, 1), ('2025-02-01', 2, 10, 'favorited', 1, 0)]
+    # 'admin' is kept for a year
+    assert sorted(r[0] for r in conn.execute("SELECT message FROM system_logs")) == ['old ban', 'recent login']
+    assert conn.execute("SELECT * FROM system_logs_daily").fetchall() == [('2026-01-01', 'INFO', 'auth', 1)]
+
+    archived = retention.read_archive(os.path.join(archive_dir, 'activity_log', '2025-01.jsonl.gz'))
+    assert [row['summary_generated'] for row in archived] == [0, 1]
+    assert len(retention.read_archive(os.path.join(archive_dir, 'activity_log', '2025-02.jsonl.gz'))) == 1
+    assert retention.read_archive(os.path.join(archive_dir, 'system_logs', '2026-01.jsonl.gz'))[0]['message'] == 'old login'
+
+    # nothing left to do
+    assert retention.run(conn, retention.load_policies({}), now=NOW, archive_dir=archive_dir) == {
+        'activity_log': 0, 'system_logs': 0}
+
+
+def test_max_batches_bounds_a_run(conn, tmp_path):
+    removed = retention.run(conn, retention.load_policies({}), now=NOW, batch_size=1, max_batches=2,
+                            archive_dir=str(tmp_path / 'archive'))
+    assert sum(removed.values()) == 2
+
+
+def test_facets_follow_inserts_and_deletes(conn, tmp_path):
+    assert retention.facet_values(conn, 'system_logs', 'level') == ['INFO', 'WARNING']
+    assert retention.facet_values(conn, 'system_logs', 'category') == ['admin', 'auth']
+    conn.execute("DELETE FROM system_logs WHERE category = 'admin'")
+    conn.execute("INSERT INTO system_logs (level, category, message) VALUES ('ERROR', 'upload', 'x')")
+    assert retention.facet_values(conn, 'system_logs', 'level') == ['ERROR', 'INFO']
+    assert retention.facet_values(conn, 'system_logs', 'category') == ['auth', 'upload']
+
+
+def test_scheduler_queues_one_job_at_a_time(connect):
+    scheduler = retention.RetentionScheduler(connect, interval=0)
+    first = scheduler.enqueue()
+    assert first and scheduler.enqueue() is None
+    assert not scheduler.start()
@@ -0,0 +1,68 @@
+import random
+
+import pytest
+
+import summarizer
+
+DUNE = ("Paul Atreides moves to the desert planet Arrakis. The planet is the only source of the spice. "
+        "House Harkonnen betrays House Atreides and Paul flees into the desert. "
+        "The Fremen of the desert take Paul in and he learns their ways. "
+        "Paul leads the Fremen against the Harkonnen and the Emperor for control of the spice.")
+OFF_TOPIC = "Tea was served at four."
+
+
+def corpus(n, sentences=40, seed=3):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(300)] + sorted(summarizer.STOPWORDS)
+    return [summarizer.synthetic_text(rng, sentences, vocabulary) for _ in range(n)]
+
+
+def test_short_texts_keep_the_old_behaviour():
+    long_sentence = ' '.join(['word'] * 40) + '.'
+    assert summarizer.summarize(long_sentence, 1) == ' '.join(['word'] * 30) + '…'
+    assert summarizer.summarize("One. Two. Three.", 2) == "One. Two."
+    assert summarizer.summarize(" Just one line. ", 3) == "Just one line."
+
+
+@pytest.mark.parametrize('method', summarizer.METHODS)
+def test_picks_central_sentences_in_reading_order(method):
+    text = DUNE + ' ' + OFF_TOPIC + ' ' + OFF_TOPIC.replace('four', 'five')
+    summary = summarizer.summarize(text, 2, method)
+    assert OFF_TOPIC not in summary
+    picked = summarizer.split_sentences(summary)
+    positions = [summarizer.split_sentences(text).index(s) for s in picked]
+    assert len(picked) == 2 and positions == sorted(positions)
+
+
+def test_tokens_skip_stopwords_and_short_words():
+    assert summarizer.tokenize("The Fremen of the desert AND an ox") == ['fremen', 'desert']
+
+
+def test_batch_matches_one_at_a_time():
+    texts = corpus(6) + [DUNE, "short."]
+    for method in summarizer.METHODS:
+        assert summarizer.summarize_many(texts, 3, method) == [summarizer.summarize(t, 3, method) for t in texts]
+
+
+def test_pure_python_scoring_agrees_with_numpy(monkeypatch):
+    texts = corpus(4) + [DUNE]
+    with_numpy = summarizer.summarize_many(texts, 3, 'tfidf')
+    monkeypatch.setattr(summarizer, 'NUMPY_AVAILABLE', False)
+    assert summarizer.summarize_many(texts, 3, 'tfidf') == with_numpy
+
+
+def test_texts_without_content_words_fall_back_to_the_opening():
+    text = ' '.join(["It is what it is."] * 80)
+    assert summarizer.summarize(text, 2) == "It is what it is. It is what it is."
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        summarizer.summarize(DUNE, 2, 'lsa')
+
+
+def test_benchmark_reports_every_implementation():
+    result = summarizer.benchmark(docs=3, sentences=30, repeat=1)
+    assert set(result['seconds']) == {'reference (per text)', 'tfidf (per text)', 'tfidf (batched)',
+                                      'textrank (batched)'}
+    assert all(seconds > 0 for seconds in result['seconds'].values())
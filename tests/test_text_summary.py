@@ -0,0 +1,227 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+
+import pytest
+
+import jobs
+import text_summary
+
+LONG_TEXT = ("Paul Atreides moves to the desert planet Arrakis. The planet is the only source of the spice. "
+             "House Harkonnen betrays House Atreides and Paul flees into the desert. "
+             "The Fremen of the desert take Paul in and he learns their ways. "
+             "Paul leads the Fremen against the Harkonnen and the Emperor for control of the spice.")
+
+
+def test_single_flight_runs_once_per_key():
+    flights = text_summary.SingleFlight()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return 'summary'
+
+    threads = [threading.Thread(target=lambda: results.append(flights.do('book:1', slow))) for _ in range(5)]
+    for t in threads:
+        t.start()
+    while flights.stats()['coalesced'] < 4:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert sorted(results) == [('summary', False)] + [('summary', True)] * 4
+    assert flights.stats()['in_flight'] == 0
+    assert flights.do('book:1', lambda: 'again') == ('again', False)   # nothing in flight any more
+
+
+def test_single_flight_shares_errors():
+    flights = text_summary.SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    errors = []
+
+    def failing():
+        started.set()
+        release.wait(5)
+        raise RuntimeError('provider down')
+
+    def call():
+        try:
+            flights.do('k', failing)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=call)
+    follower.start()
+    while flights.stats()['coalesced'] < 1:
+        time.sleep(0.01)
+    release.set()
+    leader.join()
+    follower.join()
+    assert errors == ['provider down', 'provider down']
+
+
+def events(frames):
+    """[(event, data)] from SSE frames."""
+    parsed = []
+    for frame in ''.join(frames).strip().split('\n\n'):
+        event, data = frame.split('\n')
+        parsed.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return parsed
+
+
+def test_concurrent_requests_for_one_item_share_a_generation(migrated_db, monkeypatch):
+    calls = []
+
+    def slow_summarize(text, max_sentences=3):
+        calls.append(text)
+        time.sleep(0.2)
+        return 'one summary', 'stub-model'
+    monkeypatch.setattr(text_summary, 'summarize', slow_summarize)
+
+    results = []
+
+    def request():
+        conn = sqlite3.connect(migrated_db, timeout=5)
+        try:
+            results.append(text_summary.generate(conn, LONG_TEXT, 3, 'book', 42))
+        finally:
+            conn.close()
+
+    threads = [threading.Thread(target=request) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
+    assert {r['summary'] for r in results} == {'one summary'}
+    assert sum(r['coalesced'] for r in results) == 3
+
+    conn = sqlite3.connect(migrated_db)
+    assert text_summary.cached(conn, 'book', 42)['model'] == 'stub-model'
+    assert text_summary.generate(conn, LONG_TEXT, 3, 'book', 42)['cached'] is True
+    conn.close()
+
+
+def test_async_jobs_are_deduplicated_per_item(migrated_db):
+    conn = sqlite3.connect(migrated_db)
+    first = text_summary.enqueue(conn, LONG_TEXT, 2, 'book', 7)
+    assert text_summary.enqueue(conn, LONG_TEXT, 2, 'book', 7) == first
+    other = text_summary.enqueue(conn, LONG_TEXT, 2, 'book', 8)
+    assert other != first
+
+    jobs.load_handlers()
+    worker = jobs.Worker(lambda: sqlite3.connect(migrated_db), kinds=['ai_summary'])
+    assert worker.run_once() and worker.run_once()
+    view = text_summary.job_view(jobs.get(conn, first))
+    assert view['status'] == 'done' and view['model'] == 'simple'
+    assert view['summary'] == text_summary.simple_summarize(LONG_TEXT, 2)
+    # finished jobs don't absorb new requests
+    assert text_summary.enqueue(conn, LONG_TEXT, 2, 'book', 7, force=True) not in (first, other)
+    conn.close()
+
+
+def test_async_mode_over_http():
+    from app import app, get_conn
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    item_id = 900000 + uuid.uuid4().int % 99999
+    try:
+        r = client.post('/ai_summary', json={'text': LONG_TEXT, 'item_type': 'test', 'item_id': item_id,
+                                             'async': True})
+        assert r.status_code == 202
+        poll_url = r.get_json()['poll_url']
+        assert poll_url == f"/ai_summary/jobs/{r.get_json()['job_id']}"
+
+        jobs.load_handlers()
+        jobs.Worker(get_conn, kinds=['ai_summary']).run_once()   # don't wait for the embedded worker's poll
+        deadline = time.time() + 10
+        while True:
+            body = client.get(poll_url).get_json()
+            if body['status'] in ('done', 'failed') or time.time() > deadline:
+                break
+            time.sleep(0.2)
+        assert body['status'] == 'done'
+        assert body['summary']
+
+        again = client.post('/ai_summary', json={'text': LONG_TEXT, 'item_type': 'test', 'item_id': item_id,
+                                                 'async': True})
+        assert again.status_code == 200 and again.get_json()['cached'] is True   # cache answers directly
+        assert client.get('/ai_summary/jobs/999999999').status_code == 404
+    finally:
+        conn = get_conn()
+        conn.execute("DELETE FROM ai_summaries WHERE item_type = 'test' AND item_id = ?", (item_id,))
+        conn.commit()
+        conn.close()
+
+
+def test_stream_fallback_then_cached_replay(migrated_db, monkeypatch):
+    monkeypatch.delenv('OPENAI_API_KEY', raising=False)
+    conn = sqlite3.connect(migrated_db)
+    first = events(text_summary.stream(conn, LONG_TEXT, 2, 'book', 5))
+    expected = text_summary.simple_summarize(LONG_TEXT, 2)
+    assert first == [('token', {'text': expected}),
+                     ('done', {'summary': expected, 'model': 'simple', 'cached': False})]
+    replay = events(text_summary.stream(conn, LONG_TEXT, 2, 'book', 5))
+    assert len(replay) == 1 and replay[0][0] == 'done' and replay[0][1]['cached'] is True
+    conn.close()
+
+
+def test_stream_relays_provider_tokens(migrated_db, monkeypatch):
+    monkeypatch.setattr(text_summary, 'stream_openai_summary',
+                        lambda text, max_sentences: (iter(['Paul ', 'rules ', 'Arrakis.']), 'stub-model'))
+    conn = sqlite3.connect(migrated_db)
+    frames = events(text_summary.stream(conn, LONG_TEXT, 3, 'book', 6))
+    assert [data['text'] for event, data in frames if event == 'token'] == ['Paul ', 'rules ', 'Arrakis.']
+    assert frames[-1] == ('done', {'summary': 'Paul rules Arrakis.', 'model': 'stub-model', 'cached': False})
+    assert text_summary.cached(conn, 'book', 6)['summary'] == 'Paul rules Arrakis.'
+    conn.close()
+
+
+def test_stream_failures(migrated_db, monkeypatch):
+    def broken(pieces):
+        yield from pieces
+        raise RuntimeError('connection reset')
+    conn = sqlite3.connect(migrated_db)
+    # nothing streamed yet: the local summary takes over
+    monkeypatch.setattr(text_summary, 'stream_openai_summary', lambda text, n: (broken([]), 'stub-model'))
+    assert events(text_summary.stream(conn, LONG_TEXT, 2, 'book', 7))[-1][1]['model'] == 'simple'
+    # cut off half way: report it, cache nothing
+    monkeypatch.setattr(text_summary, 'stream_openai_summary', lambda text, n: (broken(['Paul ']), 'stub-model'))
+    frames = events(text_summary.stream(conn, LONG_TEXT, 2, 'book', 8))
+    assert [event for event, _ in frames] == ['token', 'error']
+    assert text_summary.cached(conn, 'book', 8) is None
+    conn.close()
+
+
+def test_stream_endpoint():
+    from app import app, get_conn
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    item_id = 900000 + uuid.uuid4().int % 99999
+    try:
+        r = client.post('/ai_summary/stream', json={'text': LONG_TEXT, 'item_type': 'test', 'item_id': item_id})
+        assert r.status_code == 200 and r.mimetype == 'text/event-stream'
+        assert r.headers['Cache-Control'] == 'no-cache'
+        frames = events([r.get_data(as_text=True)])
+        assert frames[-1][0] == 'done' and frames[-1][1]['summary']
+        again = events([client.post('/ai_summary/stream', json={'text': LONG_TEXT, 'item_type': 'test',
+                                                                'item_id': item_id}).get_data(as_text=True)])
+        assert [event for event, _ in again] == ['done'] and again[0][1]['cached'] is True
+        assert client.post('/ai_summary/stream', json={'text': ''}).status_code == 400
+    finally:
+        conn = get_conn()
+        conn.execute("DELETE FROM ai_summaries WHERE item_type = 'test' AND item_id = ?", (item_id,))
+        conn.commit()
+        conn.close()
@@ -0,0 +1,101 @@
+import uuid
+
+import user_cache
+from conftest import FakeClock
+
+
+def make_cache(tmp_path=None, **kwargs):
+    calls = []
+    users = {1: {'is_banned': 0, 'status': 'active', 'plan': 'basic', 'plan_expires_at': None}}
+
+    def load(user_id):
+        calls.append(user_id)
+        return users.get(user_id)
+
+    stamp = str(tmp_path / 'db.user-state') if tmp_path else None
+    clock = kwargs.pop('clock', FakeClock())
+    return user_cache.UserStateCache(load, stamp_path=stamp, clock=clock, **kwargs), users, calls, clock
+
+
+def test_hits_until_ttl_expires():
+    cache, users, calls, clock = make_cache(ttl=30)
+    assert cache.get(1)['plan'] == 'basic'
+    assert cache.get(1)['plan'] == 'basic'
+    assert cache.get(2) is None and cache.get(2) is None   # unknown users are cached too
+    assert calls == [1, 2]
+
+    clock.now = 31
+    cache.get(1)
+    assert calls == [1, 2, 1]
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['expired']) == (2, 3, 1)
+    assert stats['hit_rate'] == 0.4
+
+
+def test_invalidate_is_seen_by_other_processes(tmp_path):
+    # two caches sharing a stamp file stand in for two worker processes
+    web1, users, calls1, _ = make_cache(tmp_path, ttl=300)
+    web2 = user_cache.UserStateCache(web1.load, stamp_path=web1.stamp_path, ttl=300, clock=web1.clock)
+    assert web1.get(1)['status'] == 'active'
+    assert web2.get(1)['status'] == 'active'
+
+    users[1] = dict(users[1], is_banned=1, status='banned')
+    web1.invalidate(1)
+    assert web1.get(1)['status'] == 'banned'
+    assert web2.get(1)['status'] == 'banned'
+    assert web2.stats()['remote_clears'] == 1
+    assert web1.stats()['remote_clears'] == 0
+
+
+def test_load_racing_an_invalidation_is_not_stored():
+    cache, users, calls, _ = make_cache(ttl=300)
+    original_load = cache.load
+
+    def slow_load(user_id):
+        state = original_load(user_id)
+        cache.invalidate(user_id)   # a ban lands while the old row is in flight
+        return state
+
+    cache.load = slow_load
+    cache.get(1)
+    cache.load = original_load
+    cache.get(1)
+    assert calls == [1, 1]
+
+
+def test_ban_takes_effect_on_next_request():
+    from app import app, get_conn, USER_STATE
+
+    client = app.test_client()
+    client.get('/login')  # first request runs the migrations
+    name = f"cache_{uuid.uuid4().hex[:8]}"
+    conn = get_conn()
+    cur = conn.execute("INSERT INTO users (username, password, role) VALUES (?, 'x', 'reader')", (name,))
+    user_id = cur.lastrowid
+    conn.commit()
+    conn.close()
+    try:
+        with client.session_transaction() as sess:
+            sess['user_id'] = user_id
+            sess['username'] = name
+            sess['role'] = 'reader'
+        assert client.get('/faq').status_code == 200
+        before = USER_STATE.stats()['hits']
+        assert client.get('/faq').status_code == 200
+        assert USER_STATE.stats()['hits'] > before
+
+        admin = app.test_client()
+        with admin.session_transaction() as sess:
+            sess['user_id'] = 1
+            sess['username'] = 'admin'
+            sess['role'] = 'admin'
+        admin.post(f'/admin/users/{user_id}/ban')
+
+        r = client.get('/faq')
+        assert r.status_code == 302 and '/login' in r.headers['Location']
+    finally:
+        conn = get_conn()
+        conn.execute("DELETE FROM users WHERE id = ?", (user_id,))
+        conn.commit()
+        conn.close()
+        USER_STATE.invalidate(user_id)
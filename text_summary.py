@@ -0,0 +1,294 @@
+"""
+Text Summaries
+The summariser behind /ai_summary: an OpenAI chat call through ai_client
+when USE_OPENAI and OPENAI_API_KEY are set, falling back to a local
+extractive summary (simple_summarize, see summarizer.py), with results
+cached per item in ai_summaries (AI_SUMMARY_TTL_DAYS, 0 = never expire).
+
+Coalescing: FLIGHTS makes concurrent requests for the same item share one
+generation (single-flight keyed like the cache), so a burst of readers
+opening a new book pays for one LLM call, not one each. The key is per
+process; across gunicorn workers the async mode below coalesces through the
+jobs table instead.
+
+Async mode: enqueue() queues an 'ai_summary' job (or returns the id of the
+one already queued or running for the item); the client polls
+/ai_summary/jobs/<id> so a slow LLM call never holds a sync web worker.
+
+Streaming: stream() yields Server-Sent Events for /ai_summary/stream: a
+'token' event per piece of the model's reply as it arrives, then 'done'
+once the summary is stored. A cached summary replays as a single 'done';
+the simple_summarize fallback arrives as one 'token' then 'done', so the
+browser handles every path the same way. relay() is shared with the page
+summaries (page_ai.stream_summary).
+"""
+
+import os
+import json
+import logging
+import threading
+from datetime import datetime
+
+import jobs
+import ai_client
+import summarizer
+import ai_error_fixes
+
+logger = logging.getLogger('novus.text_summary')
+
+
+def simple_summarize(src, max_sentences=3):
+    """The local extractive summary (summarizer.py)."""
+    return summarizer.summarize(src, max_sentences)
+
+
+def _openai_request(src, max_sentences):
+    """(payload, model) for the chat completion that summarises src."""
+    model = os.environ.get('OPENAI_MODEL', 'gpt-3.5-turbo')
+    prompt = f"Summarize the following text in {max_sentences} concise sentences:\n\n{src}"
+    return {
+        'model': model,
+        'messages': [{'role': 'user', 'content': prompt}],
+        'max_tokens': 300,
+        'temperature': 0.3,
+    }, model
+
+
+def call_openai_summary(src, max_sentences=3):
+    """(summary, model) from OpenAI, or (None, None) when it isn't configured or the call failed."""
+    openai_key = os.environ.get('OPENAI_API_KEY')
+    if not ai_client.REQUESTS_AVAILABLE or not openai_key:
+        return None, None
+    payload, model = _openai_request(src, max_sentences)
+    try:
+        # shared pooled client: retries 429/5xx, fails fast while the provider is down
+        txt = ai_client.get_client().chat(payload, timeout=10, api_key=openai_key)
+        if txt:
+            return txt, model
+    except Exception as e:
+        # Use AI error handling for OpenAI API errors
+        error_details = ai_error_fixes.handle_ai_service_error(e, 'OpenAI')
+        logger.warning(f"OpenAI API Error: {error_details['error']}")
+    return None, None
+
+
+def openai_enabled():
+    return bool(os.environ.get('OPENAI_API_KEY')) and os.environ.get('USE_OPENAI', '0') in ('1', 'true', 'True')
+
+
+def summarize(text, max_sentences=3):
+    """(summary, model): OpenAI when enabled and answering, else the local extract ('simple')."""
+    if openai_enabled():
+        txt, model = call_openai_summary(text, max_sentences)
+        if txt:
+            return txt, model
+    return simple_summarize(text, max_sentences), 'simple'
+
+
+# -------------------- CACHE --------------------
+def cache_key(item_type, item_id):
+    return f"{item_type}:{item_id}" if item_type and item_id else None
+
+
+def cached(conn, item_type, item_id):
+    """{'summary', 'model', 'cached_at'} for the item, or None (expired rows are deleted)."""
+    row = conn.execute("SELECT id, summary, model, created_at FROM ai_summaries WHERE item_type=? AND item_id=?",
+                       (item_type, item_id)).fetchone()
+    if not row:
+        return None
+    rid, summary_text, model_name, created_at = row
+    ttl_days = int(os.environ.get('AI_SUMMARY_TTL_DAYS', '0') or '0')
+    if ttl_days > 0:
+        try:
+            age = datetime.utcnow() - datetime.fromisoformat(created_at)
+            if age.days >= ttl_days:
+                conn.execute("DELETE FROM ai_summaries WHERE id=?", (rid,))
+                conn.commit()
+                return None
+        except Exception:
+            # if parsing fails, proceed to use cached value
+            pass
+    return {'summary': summary_text, 'model': model_name, 'cached_at': created_at}
+
+
+def store(conn, item_type, item_id, summary, model):
+    try:
+        conn.execute("INSERT OR REPLACE INTO ai_summaries (item_type, item_id, summary, model, created_at) "
+                     "VALUES (?, ?, ?, ?, ?)", (item_type, item_id, summary, model, datetime.utcnow().isoformat()))
+        conn.commit()
+    except Exception as e:
+        logger.warning(f"Could not cache summary for {item_type} {item_id}: {e}")
+
+
+# -------------------- SINGLE FLIGHT --------------------
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Concurrent do(key, fn) calls with the same key run fn once and share its result (or error)."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.followers = 0
+        self.errors = 0
+
+    def do(self, key, fn):
+        """(result, shared): shared is True when another caller's in-flight fn() produced it."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+        try:
+            call.result = fn()
+        except Exception as e:
+            call.error = e
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.followers,
+                'errors': self.errors,
+            }
+
+
+FLIGHTS = SingleFlight()
+
+
+def generate(conn, text, max_sentences=3, item_type=None, item_id=None, force=False):
+    """{'summary', 'model', 'cached', 'coalesced', ...} for the item, generating once per key in flight."""
+    key = cache_key(item_type, item_id)
+
+    def build():
+        # a request that finished while this one waited may already have stored it
+        hit = cached(conn, item_type, item_id) if key and not force else None
+        if hit:
+            return dict(hit, cached=True)
+        summary, model = summarize(text, max_sentences)
+        if key:
+            store(conn, item_type, item_id, summary, model)
+        return {'summary': summary, 'model': model, 'cached': False}
+
+    if not key:
+        return dict(build(), coalesced=False)
+    result, shared = FLIGHTS.do(key, build)
+    return dict(result, coalesced=shared)
+
+
+# -------------------- ASYNC JOBS --------------------
+def enqueue(conn, text, max_sentences=3, item_type=None, item_id=None, force=False, user_id=None):
+    """Queue an 'ai_summary' job, or return the id of the one already pending for the same item."""
+    key = cache_key(item_type, item_id)
+    if key:
+        row = conn.execute("SELECT id FROM jobs WHERE kind = 'ai_summary' AND status IN ('queued', 'running') "
+                           "AND json_extract(payload, '$.key') = ? ORDER BY id LIMIT 1", (key,)).fetchone()
+        if row:
+            return row[0]
+    return jobs.enqueue(conn, 'ai_summary', {
+        'key': key, 'text': text, 'max_sentences': max_sentences,
+        'item_type': item_type, 'item_id': item_id, 'force': bool(force),
+    }, user_id=user_id, message='Summarizing')
+
+
+@jobs.handler('ai_summary')
+def summary_job(job, ctx):
+    p = job['payload']
+    return generate(ctx.conn, p['text'], p.get('max_sentences', 3),
+                    p.get('item_type'), p.get('item_id'), p.get('force', False))
+
+
+def job_view(job):
+    """The /ai_summary/jobs/<id> body for an 'ai_summary' job."""
+    body = {'job_id': job['id'], 'status': job['status'], 'message': job['message']}
+    if job['status'] == 'done' and job['result']:
+        body.update(job['result'])
+    elif job['status'] == 'failed':
+        body['error'] = job['error']
+    return body
+
+
+# -------------------- STREAMING --------------------
+def sse(event, data):
+    """One Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+def relay(deltas, model, on_complete, fallback=None):
+    """SSE frames for a streamed completion: 'token' per delta, then 'done' (or 'error').
+
+    deltas: iterable of text pieces, or None when there is no provider to stream from.
+    fallback: () -> (text, model) used when nothing was streamed; its text is sent as one 'token'.
+    on_complete(text, model) stores the finished text before 'done' goes out.
+    """
+    parts = []
+    if deltas is not None:
+        try:
+            for delta in deltas:
+                parts.append(delta)
+                yield sse('token', {'text': delta})
+        except Exception as e:
+            logger.warning(f"AI stream failed after {len(parts)} pieces: {e}")
+            if parts:
+                # the reader already has half a summary; don't splice a different one onto it
+                yield sse('error', {'error': 'The summary was cut off, please try again'})
+                return
+    text = ''.join(parts).strip()
+    if not text:
+        text, model = fallback() if fallback else (None, None)
+        if not text:
+            yield sse('error', {'error': 'Summary not available'})
+            return
+        yield sse('token', {'text': text})
+    try:
+        on_complete(text, model)
+    except Exception as e:
+        logger.warning(f"Could not store streamed summary: {e}")
+    yield sse('done', {'summary': text, 'model': model, 'cached': False})
+
+
+def stream_openai_summary(src, max_sentences=3):
+    """(deltas, model) of OpenAI's streamed summary, or (None, None) when it isn't enabled."""
+    if not (openai_enabled() and ai_client.REQUESTS_AVAILABLE):
+        return None, None
+    payload, model = _openai_request(src, max_sentences)
+    return ai_client.get_client().stream_chat(payload, timeout=10, api_key=os.environ['OPENAI_API_KEY']), model
+
+
+def stream(conn, text, max_sentences=3, item_type=None, item_id=None, force=False):
+    """SSE frames for /ai_summary/stream (see the module docstring)."""
+    key = cache_key(item_type, item_id)
+    hit = cached(conn, item_type, item_id) if key and not force else None
+    if hit:
+        yield sse('done', dict(hit, cached=True))
+        return
+    deltas, model = stream_openai_summary(text, max_sentences)
+
+    def on_complete(summary, model):
+        if key:
+            store(conn, item_type, item_id, summary, model)
+    yield from relay(deltas, model, on_complete,
+                     fallback=lambda: (simple_summarize(text, max_sentences), 'simple'))
@@ -0,0 +1,121 @@
+"""
+User State Cache
+Per-process cache of the users columns the before_request hooks need
+(ban status and plan), keyed by user id, so check_banned() and
+refresh_plan() don't query users on every request.
+
+Entries live for a short TTL. Writes that change them (ban, unban, delete,
+plan changes) call invalidate(), which drops the local entry and touches a
+stamp file next to the database; every process stats that file on lookup
+and clears its cache when the stamp moved, so a ban takes effect on the
+next request in every worker, not after the TTL.
+"""
+
+import os
+import time
+import threading
+
+TTL = float(os.environ.get("USER_CACHE_TTL", "30") or "30")
+MAX_ENTRIES = int(os.environ.get("USER_CACHE_MAX_ENTRIES", "10000") or "10000")
+
+_MISSING = object()
+
+
+class UserStateCache:
+    """user_id -> state dict (or None for unknown users) with TTL and invalidation."""
+
+    def __init__(self, load, ttl=TTL, stamp_path=None, max_entries=MAX_ENTRIES, clock=time.monotonic):
+        # load(user_id) -> dict, or None when the user doesn't exist
+        self.load = load
+        self.ttl = ttl
+        self.stamp_path = stamp_path
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = {}
+        self._generation = 0   # bumped on every clear; loads that straddle one aren't stored
+        self._lock = threading.Lock()
+        self._stamp = self._read_stamp()
+        self._hits = 0
+        self._misses = 0
+        self._expired = 0
+        self._invalidations = 0
+        self._remote_clears = 0
+
+    # ---- cross-process invalidation ----
+    def _read_stamp(self):
+        if not self.stamp_path:
+            return None
+        try:
+            return os.stat(self.stamp_path).st_mtime_ns
+        except OSError:
+            return None
+
+    def _touch_stamp(self):
+        if not self.stamp_path:
+            return
+        try:
+            with open(self.stamp_path, 'a'):
+                pass
+            os.utime(self.stamp_path)
+        except OSError:
+            pass
+
+    def _check_stamp(self):
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            with self._lock:
+                self._stamp = stamp
+                self._entries.clear()
+                self._generation += 1
+                self._remote_clears += 1
+
+    # ---- lookups ----
+    def get(self, user_id):
+        """Cached state for user_id, loading it on a miss or after the TTL."""
+        self._check_stamp()
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(user_id, _MISSING)
+            if entry is not _MISSING:
+                state, expires = entry
+                if expires > now:
+                    self._hits += 1
+                    return state
+                self._expired += 1
+            self._misses += 1
+            generation = self._generation
+        state = self.load(user_id)
+        with self._lock:
+            if generation == self._generation:
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+                self._entries[user_id] = (state, now + self.ttl)
+        return state
+
+    def invalidate(self, user_id=None):
+        """Forget user_id here and signal other processes to re-read their entries.
+
+        The whole local cache is dropped after the stamp is re-read, so a stamp
+        touched by another process in between isn't lost. These writes are rare.
+        """
+        self._touch_stamp()
+        stamp = self._read_stamp()
+        with self._lock:
+            self._stamp = stamp
+            self._entries.clear()
+            self._generation += 1
+            self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self._hits, self._misses
+            return {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 4) if (hits + misses) else None,
+                "expired": self._expired,
+                "invalidations": self._invalidations,
+                "remote_clears": self._remote_clears,
+                "size": len(self._entries),
+                "ttl": self.ttl,
+            }